@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+A registry of the image features (output columns) computed by the benchmark
+driver.
+
+Each output column of `AbstractCleaningAlgorithm.run()` (e.g.
+"img_ref_sum_pe" or "img_cleaned_hillas_2_psi") is produced by a function
+registered here. These functions take a `FeatureContext` giving access to
+the images and to intermediate results (e.g. the Hillas parameters of an
+image) which are computed once, the first time they are needed. Thus
+`compute_features()` only computes the requested columns and their
+dependencies: for instance, requesting "img_cleaned_hillas_2_psi" computes
+the Hillas parameters of the cleaned image but none of the other features.
+
+The context is built from the following items:
+
+- "input_img", "reference_img", "cleaned_img" and "pixels_position" (the
+  images and the pixels position);
+- "benchmark_method" (for the "score" and "score_name" columns).
+"""
+
+__all__ = ['FeatureContext',
+           'compute_features',
+           'get_column_names',
+           'register_feature',
+           'register_intermediate']
+
+import collections
+
+import numpy as np
+import astropy.units as u
+
+from datapipe.benchmark import assess
+
+from datapipe.image.hillas_parameters import get_hillas_parameters
+
+from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stats
+from datapipe.image.kill_isolated_pixels import number_of_islands
+
+from datapipe.image.signal_to_border_distance import signal_to_border
+from datapipe.image.signal_to_border_distance import signal_to_border_distance
+from datapipe.image.signal_to_border_distance import pemax_on_border
+
+FEATURE_REGISTRY = collections.OrderedDict()     # column name -> function(context)
+INTERMEDIATE_REGISTRY = {}                       # intermediate result name -> function(context)
+
+# REGISTRY ####################################################################
+
+def register_feature(column_name, function):
+    """Register the function producing the `column_name` output column."""
+    FEATURE_REGISTRY[column_name] = function
+
+
+def register_intermediate(name, function):
+    """Register the function producing the `name` intermediate result."""
+    INTERMEDIATE_REGISTRY[name] = function
+
+
+def get_column_names(prefix=""):
+    """Return the name of the registered columns starting with `prefix`
+    (in registration order)."""
+    return [column_name for column_name in FEATURE_REGISTRY if column_name.startswith(prefix)]
+
+
+class FeatureContext(object):
+    """The images and the (lazily computed) intermediate results used by
+    feature functions.
+
+    `context[name]` returns the item given to the constructor or computes
+    (once) the registered intermediate result `name`.
+    """
+
+    def __init__(self, **item_dict):
+        self._item_dict = dict(item_dict)
+
+    def __setitem__(self, name, value):
+        self._item_dict[name] = value
+
+    def __getitem__(self, name):
+        if name not in self._item_dict:
+            if name not in INTERMEDIATE_REGISTRY:
+                raise KeyError(name)
+            self._item_dict[name] = INTERMEDIATE_REGISTRY[name](self)
+        return self._item_dict[name]
+
+
+def compute_features(column_list, context):
+    """Compute the `column_list` columns.
+
+    Parameters
+    ----------
+    column_list : list
+        The name of the columns to compute.
+    context : FeatureContext
+        The images used to compute the features. It keeps the intermediate
+        results thus it can be shared by several calls for the same image.
+
+    Returns
+    -------
+    dict
+        The value of each column.
+
+    Raises
+    ------
+    ValueError
+        If a column is unknown.
+    """
+
+    feature_dict = {}
+
+    for column_name in column_list:
+        try:
+            function = FEATURE_REGISTRY[column_name]
+        except KeyError:
+            raise ValueError("Unknown output column: {}".format(column_name))
+
+        feature_dict[column_name] = function(context)
+
+    return feature_dict
+
+# FEATURES ####################################################################
+
+def _hillas_miss(hillas_params):
+    try:
+        return float(hillas_params.miss.value)
+    except:
+        return None
+
+
+def _register_image_features(prefix, img_name, border_features=False, island_features=False, hillas_features=False):
+    """Register the features of the `img_name` image (with the `prefix`
+    column name prefix)."""
+
+    if border_features:
+        register_feature(prefix + "_signal_to_border", lambda context: signal_to_border(context[img_name]))                   # TODO: NaN
+        register_feature(prefix + "_signal_to_border_distance", lambda context: signal_to_border_distance(context[img_name])) # TODO: NaN
+        register_feature(prefix + "_pemax_on_border", lambda context: pemax_on_border(context[img_name]))                     # TODO: NaN
+
+    if island_features:
+        islands_stats_name = img_name + "_islands_stats"
+        register_intermediate(islands_stats_name, lambda context: kill_isolated_pixels_stats(context[img_name]))             # TODO: NaN
+
+        register_feature(prefix + "_islands_delta_pe", lambda context: context[islands_stats_name][0])
+        register_feature(prefix + "_islands_delta_abs_pe", lambda context: context[islands_stats_name][1])
+        register_feature(prefix + "_islands_delta_num_pixels", lambda context: context[islands_stats_name][2])
+        register_feature(prefix + "_num_islands", lambda context: number_of_islands(context[img_name]))                     # TODO: NaN
+
+    register_feature(prefix + "_sum_pe", lambda context: float(np.nansum(context[img_name])))
+    register_feature(prefix + "_min_pe", lambda context: float(np.nanmin(context[img_name])))
+    register_feature(prefix + "_max_pe", lambda context: float(np.nanmax(context[img_name])))
+    register_feature(prefix + "_num_pix", lambda context: int( (context[img_name][np.isfinite(context[img_name])] > 0).sum() ))
+
+    if hillas_features:
+        hillas_name = img_name + "_hillas_2"
+        register_intermediate(hillas_name, lambda context: get_hillas_parameters(context[img_name], 2, context["pixels_position"]))
+
+        register_feature(prefix + "_hillas_2_size",     lambda context: float(context[hillas_name].size))
+        register_feature(prefix + "_hillas_2_cen_x",    lambda context: context[hillas_name].cen_x.value)
+        register_feature(prefix + "_hillas_2_cen_y",    lambda context: context[hillas_name].cen_y.value)
+        register_feature(prefix + "_hillas_2_length",   lambda context: context[hillas_name].length.value)
+        register_feature(prefix + "_hillas_2_width",    lambda context: context[hillas_name].width.value)
+        register_feature(prefix + "_hillas_2_r",        lambda context: context[hillas_name].r.value)
+        register_feature(prefix + "_hillas_2_phi",      lambda context: context[hillas_name].phi.to(u.rad).value)
+        register_feature(prefix + "_hillas_2_psi",      lambda context: context[hillas_name].psi.to(u.rad).value)
+        register_feature(prefix + "_hillas_2_miss",     lambda context: _hillas_miss(context[hillas_name]))
+        register_feature(prefix + "_hillas_2_kurtosis", lambda context: context[hillas_name].kurtosis)
+        register_feature(prefix + "_hillas_2_skewness", lambda context: context[hillas_name].skewness)
+
+
+# Reference image
+_register_image_features("img_ref", "reference_img", border_features=True, island_features=True, hillas_features=True)
+
+# Input image
+_register_image_features("img_in", "input_img")
+
+# Cleaning assessment
+register_intermediate("assessment", lambda context: assess.assess_image_cleaning(context["input_img"],
+                                                                                 context["cleaned_img"],
+                                                                                 context["reference_img"],
+                                                                                 context["pixels_position"],
+                                                                                 context["benchmark_method"]))    # TODO: NaN
+
+register_feature("score", lambda context: context["assessment"][0])
+register_feature("score_name", lambda context: context["assessment"][1])
+
+# Cleaned image
+_register_image_features("img_cleaned", "cleaned_img", border_features=True, hillas_features=True)
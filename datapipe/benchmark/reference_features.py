@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Compute and cache the features of reference images.
+
+The features of a reference image (signal to border, islands, Hillas
+parameters, ...) don't depend on the cleaning algorithm nor on its
+parameters thus they can be computed once and reused by all benchmark runs
+(tailcut or mr_filter parameter sweeps, optimizers, ...).
+
+The cache is content-addressed: entries are identified by a hash of the
+reference image and of the pixels position (plus a version number to
+invalidate entries when the feature code changes). Thus an entry is
+automatically invalidated when the image file is modified and it can be
+shared by several image sets containing the same events.
+"""
+
+__all__ = ['compute_reference_features',
+           'ReferenceFeatureCache']
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from datapipe.benchmark.features import FeatureContext
+from datapipe.benchmark.features import compute_features
+from datapipe.benchmark.features import get_column_names
+
+# Increment this number each time the "img_ref_*" features of
+# datapipe.benchmark.features change (this invalidates all cache entries).
+FEATURES_VERSION = 1
+
+###############################################################################
+
+def compute_reference_features(reference_img, pixels_position):
+    """Compute the "img_ref_*" items of the benchmark output for one image.
+
+    Parameters
+    ----------
+    reference_img : array_like
+        The reference image.
+    pixels_position : array_like
+        The position of each pixel of `reference_img`.
+
+    Returns
+    -------
+    dict
+        The reference image features.
+    """
+
+    context = FeatureContext(reference_img=reference_img, pixels_position=pixels_position)
+
+    return compute_features(get_column_names("img_ref_"), context)
+
+
+class ReferenceFeatureCache(object):
+    """A persistent cache of reference image features.
+
+    Each entry is a small JSON file stored in `cache_dir`. Entries are
+    written atomically so the same cache directory can be used concurrently
+    by several processes (e.g. the workers of
+    `AbstractCleaningAlgorithm.run()`).
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def get_key(self, reference_img, pixels_position):
+        """Return the key of the entry of `reference_img`."""
+
+        reference_img = np.ascontiguousarray(reference_img, dtype=np.float64)
+        pixels_position = np.ascontiguousarray(pixels_position, dtype=np.float64)
+
+        hash_object = hashlib.sha1()
+        hash_object.update("v{};{};{}".format(FEATURES_VERSION, reference_img.shape, pixels_position.shape).encode())
+        hash_object.update(reference_img.tobytes())
+        hash_object.update(pixels_position.tobytes())
+
+        return hash_object.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def load(self, key):
+        """Return the features saved with `key` or `None` if there is no
+        (valid) entry for `key`."""
+
+        try:
+            with open(self.get_entry_path(key), "r") as fd:
+                feature_dict = json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(feature_dict, dict):
+            return None
+
+        return feature_dict
+
+    def save(self, key, feature_dict):
+        """Save `feature_dict` with `key`."""
+
+        entry_path = self.get_entry_path(key)
+        entry_dir = os.path.dirname(entry_path)
+
+        os.makedirs(entry_dir, exist_ok=True)
+
+        # Write a temporary file then rename it so that concurrent readers
+        # never see a partially written entry
+        fd, tmp_file_path = tempfile.mkstemp(dir=entry_dir, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as tmp_fd:
+                json.dump(feature_dict, tmp_fd, sort_keys=True)
+            os.replace(tmp_file_path, entry_path)
+        except:
+            os.remove(tmp_file_path)
+            raise
+
+    def get_features(self, reference_img, pixels_position):
+        """Return the features of `reference_img`; they are computed (and
+        saved) only if they are not already in the cache."""
+
+        key = self.get_key(reference_img, pixels_position)
+
+        feature_dict = self.load(key)
+
+        if feature_dict is None:
+            feature_dict = compute_reference_features(reference_img, pixels_position)
+            self.save(key, feature_dict)
+
+        return feature_dict
@@ -21,12 +21,20 @@
 # THE SOFTWARE.
 
 __all__ = ['abstract_cleaning_algorithm',
+           'cdf_builder',
            'fft',
+           'mrfilter_engine',
+           'multi_run',
            'null',
            'null_ref',
+           'result_cache',
+           'roi_cleaning',
            'tailcut',
+           'tailcut_engine',
            'tailcut_jd',
+           'wavelet_plane_cache',
            'wavelets_mrfilter',
            'wavelets_mrtransform',
+           'wavelets_starlet',
            'inverse_transform_sampling']
 
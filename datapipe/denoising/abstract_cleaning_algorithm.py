@@ -22,6 +22,7 @@
 
 import copy
 import datetime
+import functools
 import json
 import os
 import math
@@ -31,23 +32,24 @@ import sys
 import time
 import traceback
 
-import astropy.units as u
-
-from datapipe.image.hillas_parameters import get_hillas_parameters
-
-from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stats
-from datapipe.image.kill_isolated_pixels import number_of_islands
-
-from datapipe.image.signal_to_border_distance import signal_to_border
-from datapipe.image.signal_to_border_distance import signal_to_border_distance
-from datapipe.image.signal_to_border_distance import pemax_on_border
-
-from datapipe.benchmark import assess
+from datapipe.benchmark.features import FeatureContext
+from datapipe.benchmark.features import compute_features
+from datapipe.benchmark.features import get_column_names
+from datapipe.benchmark.reference_features import ReferenceFeatureCache
+from datapipe.denoising.result_cache import CleaningResultCache
 from datapipe.io import images
+from datapipe.io import json_lines
+from datapipe.io.json_lines import JsonLinesWriter
+from datapipe.utils.parallel import parallel_map
+from datapipe.utils.prefetch import prefetch_map
+from datapipe.utils.timing import StageTimer
+from datapipe.utils.timing import format_timing_report
 
 # TODO:
 # - maj les modules de Tino
 
+OUTPUT_FORMATS = ("json", "jsonl")
+
 ###############################################################################
 
 class AbstractCleaningAlgorithm(object):
@@ -59,6 +61,55 @@ class AbstractCleaningAlgorithm(object):
     def __call__(self, *pargs, **kargs):
         return self.clean_image(*pargs, **kargs)
 
+    def clean_images(self, input_img_stack, output_data_dict_list=None, **cleaning_function_params):
+        """Clean a stack of images taken by the same camera.
+
+        This default implementation calls `clean_image()` on each image;
+        algorithms that can process several images at once should override
+        it with a vectorized implementation (the Python overhead of one
+        `clean_image()` call is often greater than the cleaning itself for
+        small images).
+
+        Parameters
+        ----------
+        input_img_stack : array_like
+            The images to clean (a 3D array: image index, y, x). It is not
+            modified.
+        output_data_dict_list : list
+            If not `None`, the `output_data_dict` of each image (passed to
+            `clean_image()`).
+        cleaning_function_params
+            The parameters of `clean_image()` (the same for all images).
+
+        Returns
+        -------
+        array_like
+            The stack of cleaned images (same shape than `input_img_stack`).
+        """
+
+        input_img_stack = np.asarray(input_img_stack)
+
+        if input_img_stack.ndim != 3:
+            raise ValueError("The image stack should be a 3D array (got a {}D array)".format(input_img_stack.ndim))
+
+        if len(input_img_stack) == 0:
+            return input_img_stack.copy()
+
+        cleaned_img_list = []
+
+        for img_index, input_img in enumerate(input_img_stack):
+            # Copy the image (otherwise some cleaning functions like Tailcut may change it)
+            input_img = input_img.copy()
+
+            if output_data_dict_list is not None:
+                cleaned_img = self.clean_image(input_img, output_data_dict=output_data_dict_list[img_index], **cleaning_function_params)
+            else:
+                cleaned_img = self.clean_image(input_img, **cleaning_function_params)
+
+            cleaned_img_list.append(cleaned_img)
+
+        return np.array(cleaned_img_list)
+
     # STR #####################################################################
 
     def __str__(self):
@@ -72,251 +123,533 @@ class AbstractCleaningAlgorithm(object):
             plot=False,
             saveplot=None,
             ref_img_as_input=False,      # This option is a hack to easily produce CSV files...
-            max_num_img=None):
+            max_num_img=None,
+            num_workers=None,
+            parallel_backend="concurrent.futures",
+            output_format="json",
+            resume=False,
+            ref_features_cache_dir=None,
+            prefetch_depth=0,
+            prefetch_max_bytes=None,
+            output_column_list=None,
+            result_cache_dir=None,
+            result_cache_max_bytes=None):
+        """Clean and assess all images in `input_file_or_dir_path_list`.
+
+        Images are processed sequentially unless `num_workers` is greater
+        than 1, in which case they are dispatched to a pool of `num_workers`
+        processes (see `datapipe.utils.parallel.parallel_map`). In both cases
+        results are collected in the input order and the `io` list of the
+        output is the same.
+
+        Parameters
+        ----------
+        num_workers : int
+            The number of worker processes (`None` or 1: no pool, 0: one
+            worker per CPU).
+        parallel_backend : str
+            The process pool implementation: "concurrent.futures" or
+            "multiprocessing".
+        output_format : str
+            "json" to write all results at once at the end of the run (the
+            returned dictionary contains the whole "io" list) or "jsonl" to
+            stream one record per image to `output_file_path` as soon as it
+            is processed (see `datapipe.io.json_lines`); in the latter case
+            results are not kept in memory and the returned dictionary only
+            contains the experiment metadata.
+        resume : bool
+            Resume an interrupted "jsonl" run: images already recorded in
+            `output_file_path` are skipped and new records are appended to
+            this file (a record truncated by the interruption is removed
+            first). The same `input_file_or_dir_path_list` should be given
+            as for the interrupted run since images are identified by their
+            input file path. If `max_num_img` is set, it counts the images
+            already recorded.
+        ref_features_cache_dir : str
+            If not `None`, the features of reference images ("img_ref_*"
+            items) are read from (and saved in) this directory instead of
+            being computed for each run (see
+            `datapipe.benchmark.reference_features`).
+        prefetch_depth : int
+            If greater than 0, the next `prefetch_depth` FITS files are read
+            by a background thread while the current image is being cleaned
+            (see `datapipe.utils.prefetch`). This option can't be used with
+            several workers (each worker reads its own files).
+        prefetch_max_bytes : int
+            The maximum memory size of the images read in advance (no limit
+            if `None`).
+
+        output_column_list : list
+            The image features to compute (e.g. `["img_ref_hillas_2_psi",
+            "img_cleaned_hillas_2_psi"]` for an optimization of the "delta
+            psi" score); other features are not computed, which makes runs
+            much faster. If `None`, all features are computed (see
+            `datapipe.benchmark.features.get_column_names()`). The image
+            metadata and the execution times are always included.
+        result_cache_dir : str
+            If not `None`, cleaned images are read from (and saved in) this
+            directory instead of being computed again when the same image is
+            cleaned with the same parameters (see
+            `datapipe.denoising.result_cache`).
+        result_cache_max_bytes : int
+            The maximum size of the result cache directory (no limit if
+            `None`).
+
+        The execution time of each stage (directory scan, FITS decoding,
+        reference features, cleaning, assessment, Hillas parameters, ...) is
+        recorded for each image ("stage_execution_time_sec" item) and
+        aggregated in the "stage_timing_report" item of the output (see
+        `datapipe.utils.timing.StageTimer.get_report()`); the report is also
+        printed at the end of the run. With several workers, the stages of
+        different images overlap thus the sum of stage shares can exceed
+        100%.
+        """
 
-        image_counter = 0
         launch_time = time.perf_counter()
 
+        stage_timer = StageTimer()
+
+        if plot and (num_workers is not None) and (num_workers != 1):
+            raise ValueError("The 'plot' option cannot be used with several workers (use 'saveplot' instead)")
+
+        if (prefetch_depth > 0) and (num_workers is not None) and (num_workers != 1):
+            raise ValueError("The 'prefetch_depth' option cannot be used with several workers")
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unknown output format: {} (should be one of {})".format(output_format, ", ".join(OUTPUT_FORMATS)))
+
+        if output_column_list is not None:
+            unknown_column_list = sorted(set(output_column_list) - set(get_column_names()))
+            if len(unknown_column_list) > 0:
+                raise ValueError("Unknown output columns: {}".format(", ".join(unknown_column_list)))
+
+        if resume and ((benchmark_method is None) or (output_format != "jsonl")):
+            raise ValueError("The 'resume' option can only be used with the 'jsonl' output format and a benchmark method")
+
+        stream_output = (benchmark_method is not None) and (output_format == "jsonl")
+
+        # GET THE IMAGES ALREADY PROCESSED BY AN INTERRUPTED RUN ##############
+
+        resume_output = resume and os.path.isfile(output_file_path) and (os.path.getsize(output_file_path) > 0)
+
+        done_file_path_set = set()
+        num_done_aborted_images = 0
+
+        if resume_output:
+            json_lines.remove_truncated_record(output_file_path)
+
+            for record_type, record_dict in json_lines.iter_json_lines_file(output_file_path):
+                if record_type == json_lines.IMAGE_RECORD:
+                    done_file_path_set.add(record_dict["input_file_path"])
+                    if "error" in record_dict:
+                        num_done_aborted_images += 1
+
+            if max_num_img is not None:
+                max_num_img = max(max_num_img - len(done_file_path_set), 0)
+
+            print("Resume {}: {} images already processed".format(output_file_path, len(done_file_path_set)))
+
+        with stage_timer.stage("directory_scan"):
+            input_file_path_list = self._get_input_file_path_list(input_file_or_dir_path_list,
+                                                                  max_num_img,
+                                                                  excluded_file_path_set=done_file_path_set)
+
+        if result_cache_dir is not None:
+            # Created once per run (and once per worker process when it is
+            # unpickled, see `CleaningResultCache`)
+            result_cache = CleaningResultCache(result_cache_dir, max_bytes=result_cache_max_bytes)
+        else:
+            result_cache = None
+
+        process_image = functools.partial(self.process_image,
+                                          cleaning_function_params=cleaning_function_params,
+                                          benchmark_method=benchmark_method,
+                                          plot=plot,
+                                          saveplot=saveplot,
+                                          saveplot_per_image=(len(input_file_or_dir_path_list) > 1),
+                                          ref_img_as_input=ref_img_as_input,
+                                          ref_features_cache_dir=ref_features_cache_dir,
+                                          output_column_list=output_column_list,
+                                          result_cache=result_cache)
+
+        io_list = []
+        num_aborted_images = num_done_aborted_images
+
+        if stream_output:
+            output_dict = self._get_experiment_metadata(cleaning_function_params, benchmark_method)
+            json_lines_writer = JsonLinesWriter(output_file_path, append=resume_output)
+            if not resume_output:
+                json_lines_writer.write_header(output_dict)
+
+        try:
+            if prefetch_depth > 0:
+                preloaded_images_iterator = prefetch_map(preload_benchmark_images,
+                                                         input_file_path_list,
+                                                         depth=prefetch_depth,
+                                                         max_bytes=prefetch_max_bytes)
+                image_dict_iterator = (process_image(input_file_path, preloaded_images=preloaded_images)
+                                       for input_file_path, preloaded_images in zip(input_file_path_list, preloaded_images_iterator))
+            else:
+                image_dict_iterator = parallel_map(process_image,
+                                                   input_file_path_list,
+                                                   num_workers=num_workers,
+                                                   backend=parallel_backend)
+
+            for image_counter, image_dict in enumerate(image_dict_iterator, 1):
+
+                if self.verbose:
+                    print("* {}: PROCESSED IMAGE NUMBER {} (TEL{}_EV{})".format(self.label,
+                                                                               image_counter,
+                                                                               image_dict.get("tel_id"),
+                                                                               image_dict.get("event_id")))
+
+                if benchmark_method is not None:
+                    stage_timer.add_durations(image_dict.get("stage_execution_time_sec", {}))
+
+                    if "error" in image_dict:
+                        num_aborted_images += 1
+
+                    if stream_output:
+                        with stage_timer.stage("json_serialization"):
+                            json_lines_writer.write_image(image_dict)
+                    else:
+                        io_list.append(image_dict)
+
+            if stream_output:
+                wall_time_sec = time.perf_counter() - launch_time
+
+                footer_dict = {}
+                footer_dict["benchmark_execution_time_sec"] = str(wall_time_sec)
+                footer_dict["num_images"] = len(done_file_path_set) + len(input_file_path_list)
+                footer_dict["num_aborted_images"] = num_aborted_images
+                footer_dict["stage_timing_report"] = stage_timer.get_report(wall_time_sec)
+
+                json_lines_writer.write_footer(footer_dict)
+                output_dict.update(footer_dict)
+        finally:
+            if stream_output:
+                json_lines_writer.close()
+
         if benchmark_method is not None:
-            io_list = []
+            print("{} images aborted".format(num_aborted_images))
+
+            if not stream_output:
+                # GENERAL EXPERIMENT METADATA
+                output_dict = self._get_experiment_metadata(cleaning_function_params, benchmark_method)
+                wall_time_sec = time.perf_counter() - launch_time
+                output_dict["benchmark_execution_time_sec"] = str(wall_time_sec)
+                output_dict["stage_timing_report"] = stage_timer.get_report(wall_time_sec)
+                output_dict["io"] = io_list
+
+                with stage_timer.stage("json_serialization"):
+                    with open(output_file_path, "w") as fd:
+                        json.dump(output_dict, fd, sort_keys=True, indent=4)  # pretty print format
+
+            # Unlike the report written in the "json" output file (which is
+            # made before the file is written), the printed report includes
+            # the "json_serialization" stage
+            print(format_timing_report(stage_timer.get_report(time.perf_counter() - launch_time)))
+
+            return output_dict
+
+
+    def _get_experiment_metadata(self, cleaning_function_params, benchmark_method):
+        """Return the general experiment metadata written in output files."""
+
+        output_dict = {}
+        output_dict["date_time"] = str(datetime.datetime.now())
+        output_dict["class_name"] = self.__class__.__name__
+        output_dict["algo_code_ref"] = str(self.__class__.clean_image.__code__)
+        output_dict["label"] = self.label
+        output_dict["cmd"] = " ".join(sys.argv)
+        output_dict["algo_params"] = dict(cleaning_function_params)   # Copy the dict as some items are removed below
+
+        if "noise_distribution" in output_dict["algo_params"]:
+            del output_dict["algo_params"]["noise_distribution"]  # not JSON serializable...
+
+        output_dict["benchmark_method"] = benchmark_method
+        output_dict["system"] = " ".join(os.uname())
+
+        try:
+            del output_dict["algo_params"]["geom"]   # The geom object use by Tailcut is not JSON serializable
+        except:
+            pass
+
+        if "plane_cache" in output_dict["algo_params"]:
+            del output_dict["algo_params"]["plane_cache"]  # not JSON serializable...
+
+        return output_dict
+
+
+    def _get_input_file_path_list(self, input_file_or_dir_path_list, max_num_img=None, excluded_file_path_set=None):
+        """Return the list of FITS files to process.
+
+        Directories in `input_file_or_dir_path_list` are replaced by the FITS
+        files they contain. Files in `excluded_file_path_set` are ignored. If
+        `max_num_img` is not `None`, at most `max_num_img` files are randomly
+        picked among the remaining ones.
+        """
+
+        if excluded_file_path_set is None:
+            excluded_file_path_set = set()
+
+        input_file_path_list = []
 
         for input_file_or_dir_path in input_file_or_dir_path_list:
 
             if os.path.isdir(input_file_or_dir_path):
-                input_file_path_list = []
+                dir_file_path_list = []
                 for dir_item in os.listdir(input_file_or_dir_path):
                     dir_item_path = os.path.join(input_file_or_dir_path, dir_item)
                     if dir_item_path.lower().endswith('.fits') and os.path.isfile(dir_item_path):
-                        input_file_path_list.append(dir_item_path)
+                        dir_file_path_list.append(dir_item_path)
             else:
-                input_file_path_list = [input_file_or_dir_path]
+                dir_file_path_list = [input_file_or_dir_path]
+
+            dir_file_path_list = [file_path for file_path in dir_file_path_list if file_path not in excluded_file_path_set]
 
             if max_num_img is not None:
-                if max_num_img < len(input_file_path_list):
-                    input_file_path_list = random.sample(input_file_path_list, max_num_img)
+                if max_num_img < len(dir_file_path_list):
+                    dir_file_path_list = random.sample(dir_file_path_list, max_num_img)
                     max_num_img = 0                              # For next loops
                 else:
-                    max_num_img -= len(input_file_path_list)     # For next loops
+                    max_num_img -= len(dir_file_path_list)       # For next loops
+
+            input_file_path_list.extend(dir_file_path_list)
+
+        return input_file_path_list
+
+
+    def process_image(self,
+                      input_file_path,
+                      cleaning_function_params,
+                      benchmark_method,
+                      plot=False,
+                      saveplot=None,
+                      saveplot_per_image=False,
+                      ref_img_as_input=False,
+                      ref_features_cache_dir=None,
+                      preloaded_images=None,
+                      reference_features=None,
+                      output_column_list=None,
+                      result_cache=None):
+        """Load, clean and assess one FITS image.
+
+        This is the unit of work of `run()`; it is executed in the worker
+        processes when `run()` is called with several workers.
+
+        If `preloaded_images` is not `None`, it contains the content of
+        `input_file_path` already read by `preload_benchmark_images()`
+        (the file is not read again). Likewise, if `reference_features` is
+        not `None`, it contains the features of the reference image already
+        computed by
+        `datapipe.benchmark.reference_features.compute_reference_features()`.
+
+        If `output_column_list` is not `None`, only these image features
+        (and the ones they depend on) are computed (see
+        `datapipe.benchmark.features`); otherwise all registered features
+        are computed.
+
+        If `result_cache` (a
+        `datapipe.denoising.result_cache.CleaningResultCache`) is not `None`,
+        the cleaned image is read from this cache when it contains the same
+        image cleaned with the same parameters.
+
+        Returns
+        -------
+        dict
+            The image metadata and assessment results (the "io" item of the
+            `run()` output). Errors are reported in its "error" item instead of
+            being raised.
+        """
+
+        # CLEAN ONE IMAGE #####################################################
+
+        image_dict = {"input_file_path": input_file_path}
+
+        # Copy the parameters (the output_data_dict item is specific to each image)
+        cleaning_function_params = dict(cleaning_function_params)
+
+        stage_timer = StageTimer()
+
+        if output_column_list is None:
+            column_list = get_column_names()
+        else:
+            column_list = output_column_list
+
+        try:
+            # READ THE INPUT FILE #############################################
+
+            if preloaded_images is None:
+                initial_time = time.perf_counter()
+                fits_images_dict, fits_metadata_dict = images.load_benchmark_images(input_file_path)
+                load_input_image_time_sec = time.perf_counter() - initial_time
+            elif isinstance(preloaded_images, Exception):
+                raise preloaded_images
+            else:
+                fits_images_dict, fits_metadata_dict, load_input_image_time_sec = preloaded_images
 
-            for input_file_path in input_file_path_list:
+            stage_timer.add("fits_decode", load_input_image_time_sec)
 
-                image_counter += 1
-                if self.verbose:
-                    print("* {}: PROCESS IMAGE NUMBER {}".format(self.label, image_counter), end="")
+            reference_img = fits_images_dict["reference_image"]
+            pixels_position = fits_images_dict["pixels_position"]
 
-                # CLEAN ONE IMAGE #############################################
+            if ref_img_as_input:
+                input_img = copy.deepcopy(reference_img)    # This option is a hack to easily produce CSV files with the "null_ref" "cleaning" module...
+            else:
+                input_img = fits_images_dict["input_image"]
 
-                image_dict = {"input_file_path": input_file_path}
+            image_dict.update(fits_metadata_dict)
 
-                try:
-                    # READ THE INPUT FILE #####################################
+            if benchmark_method is not None:
 
-                    initial_time = time.perf_counter()
-                    fits_images_dict, fits_metadata_dict = images.load_benchmark_images(input_file_path)
-                    load_input_image_time_sec = time.perf_counter() - initial_time
+                # FETCH ADDITIONAL IMAGE METADATA #############################
 
-                    if self.verbose:
-                        print(" (TEL{}_EV{})".format(fits_metadata_dict["tel_id"], fits_metadata_dict["event_id"]))
+                feature_context = FeatureContext(input_img=input_img,
+                                                 reference_img=reference_img,
+                                                 pixels_position=pixels_position,
+                                                 benchmark_method=benchmark_method)
 
-                    reference_img = fits_images_dict["reference_image"]
-                    pixels_position = fits_images_dict["pixels_position"]
+                with stage_timer.stage("reference_features"):
+                    ref_column_list = [column_name for column_name in column_list if column_name.startswith("img_ref_")]
 
-                    if ref_img_as_input:
-                        input_img = copy.deepcopy(reference_img)    # This option is a hack to easily produce CSV files with the "null_ref" "cleaning" module...
-                    else:
-                        input_img = fits_images_dict["input_image"]
-
-                    image_dict.update(fits_metadata_dict)
-
-                    if benchmark_method is not None:
-
-                        # FETCH ADDITIONAL IMAGE METADATA #####################
-
-                        image_dict["img_ref_signal_to_border"] = signal_to_border(reference_img)                   # TODO: NaN
-                        image_dict["img_ref_signal_to_border_distance"] = signal_to_border_distance(reference_img) # TODO: NaN
-                        image_dict["img_ref_pemax_on_border"] = pemax_on_border(reference_img)                     # TODO: NaN
-
-                        delta_pe, delta_abs_pe, delta_num_pixels = kill_isolated_pixels_stats(reference_img)       # TODO: NaN
-                        num_islands = number_of_islands(reference_img)                                             # TODO: NaN
+                    if len(ref_column_list) > 0:
+                        if (reference_features is None) and (ref_features_cache_dir is not None):
+                            ref_features_cache = ReferenceFeatureCache(ref_features_cache_dir)
+                            reference_features = ref_features_cache.get_features(reference_img, pixels_position)
 
-                        image_dict["img_ref_islands_delta_pe"] = delta_pe
-                        image_dict["img_ref_islands_delta_abs_pe"] = delta_abs_pe
-                        image_dict["img_ref_islands_delta_num_pixels"] = delta_num_pixels
-                        image_dict["img_ref_num_islands"] = num_islands
-
-                        image_dict["img_ref_sum_pe"] = float(np.nansum(reference_img))
-                        image_dict["img_ref_min_pe"] = float(np.nanmin(reference_img))
-                        image_dict["img_ref_max_pe"] = float(np.nanmax(reference_img))
-                        image_dict["img_ref_num_pix"] = int( (reference_img[np.isfinite(reference_img)] > 0).sum() )
-
-                        image_dict["img_in_sum_pe"] = float(np.nansum(input_img))
-                        image_dict["img_in_min_pe"] = float(np.nanmin(input_img))
-                        image_dict["img_in_max_pe"] = float(np.nanmax(input_img))
-                        image_dict["img_in_num_pix"] = int( (input_img[np.isfinite(input_img)] > 0).sum() )
-
-                        hillas_params_2_ref_img = get_hillas_parameters(reference_img, 2, pixels_position)
-
-                        image_dict["img_ref_hillas_2_size"] =     float(hillas_params_2_ref_img.size)
-                        image_dict["img_ref_hillas_2_cen_x"] =    hillas_params_2_ref_img.cen_x.value
-                        image_dict["img_ref_hillas_2_cen_y"] =    hillas_params_2_ref_img.cen_y.value
-                        image_dict["img_ref_hillas_2_length"] =   hillas_params_2_ref_img.length.value
-                        image_dict["img_ref_hillas_2_width"] =    hillas_params_2_ref_img.width.value
-                        image_dict["img_ref_hillas_2_r"] =        hillas_params_2_ref_img.r.value
-                        image_dict["img_ref_hillas_2_phi"] =      hillas_params_2_ref_img.phi.to(u.rad).value
-                        image_dict["img_ref_hillas_2_psi"] =      hillas_params_2_ref_img.psi.to(u.rad).value
-                        try:
-                            image_dict["img_ref_hillas_2_miss"] = float(hillas_params_2_ref_img.miss.value)
-                        except:
-                            image_dict["img_ref_hillas_2_miss"] = None
-                        image_dict["img_ref_hillas_2_kurtosis"] = hillas_params_2_ref_img.kurtosis
-                        image_dict["img_ref_hillas_2_skewness"] = hillas_params_2_ref_img.skewness
+                        if reference_features is not None:
+                            image_dict.update({column_name: reference_features[column_name] for column_name in ref_column_list})
+                        else:
+                            image_dict.update(compute_features(ref_column_list, feature_context))
 
-                    # CLEAN THE INPUT IMAGE ###################################
-
-                    # Copy the image (otherwise some cleaning functions like Tailcut may change it)
-                    #input_img_copy = copy.deepcopy(input_img)
-                    input_img_copy = input_img.astype('float64', copy=True)
-
-                    cleaning_function_params["output_data_dict"] = {}
-
-                    initial_time = time.perf_counter()
-                    cleaned_img = self.clean_image(input_img_copy, **cleaning_function_params)   # TODO: NaN
-                    full_clean_execution_time_sec = time.perf_counter() - initial_time
-
-                    if benchmark_method is not None:
-                        image_dict.update(cleaning_function_params["output_data_dict"])
-                        del cleaning_function_params["output_data_dict"]
+                with stage_timer.stage("input_features"):
+                    in_column_list = [column_name for column_name in column_list if column_name.startswith("img_in_")]
+                    image_dict.update(compute_features(in_column_list, feature_context))
 
-                    # ASSESS OR PRINT THE CLEANED IMAGE #######################
-
-                    if benchmark_method is not None:
-
-                        # ASSESS THE CLEANING #################################
-
-                        score_tuple, score_name_tuple = assess.assess_image_cleaning(input_img,
-                                                                                     cleaned_img,
-                                                                                     reference_img,
-                                                                                     pixels_position,
-                                                                                     benchmark_method)    # TODO: NaN
-
-                        image_dict["img_cleaned_signal_to_border"] = signal_to_border(cleaned_img)
-                        image_dict["img_cleaned_signal_to_border_distance"] = signal_to_border_distance(cleaned_img)
-                        image_dict["img_cleaned_pemax_on_border"] = pemax_on_border(cleaned_img)
-
-                        image_dict["score"] = score_tuple
-                        image_dict["score_name"] = score_name_tuple
-                        image_dict["full_clean_execution_time_sec"] = full_clean_execution_time_sec
-                        image_dict["load_input_image_time_sec"] = load_input_image_time_sec
-
-                        image_dict["img_cleaned_sum_pe"] = float(np.nansum(cleaned_img))
-                        image_dict["img_cleaned_min_pe"] = float(np.nanmin(cleaned_img))
-                        image_dict["img_cleaned_max_pe"] = float(np.nanmax(cleaned_img))
-                        image_dict["img_cleaned_num_pix"] = int( (cleaned_img[np.isfinite(cleaned_img)] > 0).sum() )
-
-                        hillas_params_2_cleaned_img = get_hillas_parameters(cleaned_img, 2, pixels_position)
-
-                        image_dict["img_cleaned_hillas_2_size"] =     float(hillas_params_2_cleaned_img.size)
-                        image_dict["img_cleaned_hillas_2_cen_x"] =    hillas_params_2_cleaned_img.cen_x.value
-                        image_dict["img_cleaned_hillas_2_cen_y"] =    hillas_params_2_cleaned_img.cen_y.value
-                        image_dict["img_cleaned_hillas_2_length"] =   hillas_params_2_cleaned_img.length.value
-                        image_dict["img_cleaned_hillas_2_width"] =    hillas_params_2_cleaned_img.width.value
-                        image_dict["img_cleaned_hillas_2_r"] =        hillas_params_2_cleaned_img.r.value
-                        image_dict["img_cleaned_hillas_2_phi"] =      hillas_params_2_cleaned_img.phi.to(u.rad).value
-                        image_dict["img_cleaned_hillas_2_psi"] =      hillas_params_2_cleaned_img.psi.to(u.rad).value
-                        try:
-                            image_dict["img_cleaned_hillas_2_miss"] = float(hillas_params_2_cleaned_img.miss.value)
-                        except:
-                            image_dict["img_cleaned_hillas_2_miss"] = None
-                        image_dict["img_cleaned_hillas_2_kurtosis"] = hillas_params_2_cleaned_img.kurtosis
-                        image_dict["img_cleaned_hillas_2_skewness"] = hillas_params_2_cleaned_img.skewness
-
-                    # PLOT IMAGES #########################################################
-
-                    if plot or (saveplot is not None):
-                        image_list = [input_img, reference_img, cleaned_img] 
-                        title_list = ["Input image", "Reference image", "Cleaned image"] 
-
-                        if plot:
-                            images.plot_list(image_list, title_list, fits_metadata_dict)
-
-                        if saveplot is not None:
-                            if len(input_file_or_dir_path_list) > 1:
-                                basename, extension = os.path.splitext(saveplot)
-                                plot_file_path = "{}_E{}_T{}{}".format(basename, fits_metadata_dict["event_id"], fits_metadata_dict["tel_id"], extension)
-                            else:
-                                plot_file_path = saveplot
-
-                            print("Saving {}".format(plot_file_path))
-                            images.mpl_save_list(image_list, plot_file_path, title_list, fits_metadata_dict)
-
-                except Exception as e:
-                    print("Abort image {}: {} ({})".format(input_file_path, e, type(e)))
-
-                    # DEBUG: uncomment the following line to have the full trackback
-                    #traceback.print_tb(e.__traceback__, file=sys.stdout)
-
-                    if benchmark_method is not None:
-
-                        # http://docs.python.org/2/library/sys.html#sys.exc_info
-                        exc_type, exc_value, exc_traceback = sys.exc_info() # most recent (if any) by default
-
-                        '''
-                        Reason this _can_ be bad: If an (unhandled) exception happens AFTER this,
-                        or if we do not delete the labels on (not much) older versions of Py, the
-                        reference we created can linger.
-
-                        traceback.format_exc/print_exc do this very thing, BUT note this creates a
-                        temp scope within the function.
-                        '''
+            # CLEAN THE INPUT IMAGE ###########################################
 
-                        error_dict = {
-                                      'filename': exc_traceback.tb_frame.f_code.co_filename,
-                                      'lineno'  : exc_traceback.tb_lineno,
-                                      'name'    : exc_traceback.tb_frame.f_code.co_name,
-                                      'type'    : exc_type.__name__,
-                                      #'message' : exc_value.message
-                                      'message' : str(e)
-                                     }
+            # Copy the image (otherwise some cleaning functions like Tailcut may change it)
+            #input_img_copy = copy.deepcopy(input_img)
+            input_img_copy = input_img.astype('float64', copy=True)
 
-                        del(exc_type, exc_value, exc_traceback) # So we don't leave our local labels/objects dangling
-                        # This still isn't "completely safe", though!
-
-                        #error_dict = {"type": str(type(e)),
-                        #              "message": str(e)}
-
-                        image_dict["error"] = error_dict
+            cleaning_function_params["output_data_dict"] = {}
 
-                finally:
-                    if benchmark_method is not None:
-                        io_list.append(image_dict)
+            initial_time = time.perf_counter()
+            if result_cache is not None:
+                cleaned_img = result_cache.clean_image(self, input_img_copy, **cleaning_function_params)   # TODO: NaN
+            else:
+                cleaned_img = self.clean_image(input_img_copy, **cleaning_function_params)   # TODO: NaN
+            full_clean_execution_time_sec = time.perf_counter() - initial_time
+
+            stage_timer.add("clean", full_clean_execution_time_sec)
+
+            if benchmark_method is not None:
+                image_dict.update(cleaning_function_params["output_data_dict"])
+
+            # ASSESS OR PRINT THE CLEANED IMAGE ###############################
+
+            if benchmark_method is not None:
+
+                # ASSESS THE CLEANING #########################################
+
+                feature_context["cleaned_img"] = cleaned_img
+
+                with stage_timer.stage("assess"):
+                    assess_column_list = [column_name for column_name in column_list if column_name in ("score", "score_name")]
+                    image_dict.update(compute_features(assess_column_list, feature_context))
+
+                with stage_timer.stage("cleaned_image_features"):
+                    cleaned_column_list = [column_name for column_name in column_list if column_name.startswith("img_cleaned_") and not column_name.startswith("img_cleaned_hillas_")]
+                    image_dict.update(compute_features(cleaned_column_list, feature_context))
+
+                image_dict["full_clean_execution_time_sec"] = full_clean_execution_time_sec
+                image_dict["load_input_image_time_sec"] = load_input_image_time_sec
+
+                with stage_timer.stage("hillas"):
+                    hillas_column_list = [column_name for column_name in column_list if column_name.startswith("img_cleaned_hillas_")]
+                    image_dict.update(compute_features(hillas_column_list, feature_context))
+
+            # PLOT IMAGES #####################################################
+
+            if plot or (saveplot is not None):
+                with stage_timer.stage("plot"):
+                    image_list = [input_img, reference_img, cleaned_img] 
+                    title_list = ["Input image", "Reference image", "Cleaned image"] 
+
+                    if plot:
+                        images.plot_list(image_list, title_list, fits_metadata_dict)
+
+                    if saveplot is not None:
+                        if saveplot_per_image:
+                            basename, extension = os.path.splitext(saveplot)
+                            plot_file_path = "{}_E{}_T{}{}".format(basename, fits_metadata_dict["event_id"], fits_metadata_dict["tel_id"], extension)
+                        else:
+                            plot_file_path = saveplot
+
+                        print("Saving {}".format(plot_file_path))
+                        images.mpl_save_list(image_list, plot_file_path, title_list, fits_metadata_dict)
+
+        except Exception as e:
+            print("Abort image {}: {} ({})".format(input_file_path, e, type(e)))
+
+            # DEBUG: uncomment the following line to have the full trackback
+            #traceback.print_tb(e.__traceback__, file=sys.stdout)
+
+            if benchmark_method is not None:
+
+                # http://docs.python.org/2/library/sys.html#sys.exc_info
+                exc_type, exc_value, exc_traceback = sys.exc_info() # most recent (if any) by default
+
+                '''
+                Reason this _can_ be bad: If an (unhandled) exception happens AFTER this,
+                or if we do not delete the labels on (not much) older versions of Py, the
+                reference we created can linger.
+
+                traceback.format_exc/print_exc do this very thing, BUT note this creates a
+                temp scope within the function.
+                '''
+
+                error_dict = {
+                              'filename': exc_traceback.tb_frame.f_code.co_filename,
+                              'lineno'  : exc_traceback.tb_lineno,
+                              'name'    : exc_traceback.tb_frame.f_code.co_name,
+                              'type'    : exc_type.__name__,
+                              #'message' : exc_value.message
+                              'message' : str(e)
+                             }
+
+                del(exc_type, exc_value, exc_traceback) # So we don't leave our local labels/objects dangling
+                # This still isn't "completely safe", though!
+
+                #error_dict = {"type": str(type(e)),
+                #              "message": str(e)}
+
+                image_dict["error"] = error_dict
 
         if benchmark_method is not None:
-            error_list = [image_dict["error"] for image_dict in io_list if "error" in image_dict]
-            print("{} images aborted".format(len(error_list)))
-
-            # GENERAL EXPERIMENT METADATA
-            output_dict = {}
-            output_dict["benchmark_execution_time_sec"] = str(time.perf_counter() - launch_time)
-            output_dict["date_time"] = str(datetime.datetime.now())
-            output_dict["class_name"] = self.__class__.__name__
-            output_dict["algo_code_ref"] = str(self.__class__.clean_image.__code__)
-            output_dict["label"] = self.label
-            output_dict["cmd"] = " ".join(sys.argv)
-            output_dict["algo_params"] = cleaning_function_params
-
-            if "noise_distribution" in output_dict["algo_params"]:
-                del output_dict["algo_params"]["noise_distribution"]  # not JSON serializable...
-
-            output_dict["benchmark_method"] = benchmark_method
-            output_dict["system"] = " ".join(os.uname())
-            output_dict["io"] = io_list
-
-            try:
-                del output_dict["algo_params"]["geom"]   # The geom object use by Tailcut is not JSON serializable
-            except:
-                pass
-
-            with open(output_file_path, "w") as fd:
-                json.dump(output_dict, fd, sort_keys=True, indent=4)  # pretty print format
+            image_dict["stage_execution_time_sec"] = stage_timer.get_total_durations()
 
-            return output_dict
+        return image_dict
+
+
+def preload_benchmark_images(input_file_path):
+    """Read `input_file_path` for `AbstractCleaningAlgorithm.process_image()`.
+
+    Returns a `(fits_images_dict, fits_metadata_dict, load_time_sec)` tuple
+    or the raised exception (so that it is reported by `process_image()` as
+    if the file had been read there).
+    """
+
+    try:
+        initial_time = time.perf_counter()
+        fits_images_dict, fits_metadata_dict = images.load_benchmark_images(input_file_path)
+
+        # Make sure the image data is actually read here (i.e. in the prefetch thread)
+        fits_images_dict = {name: np.array(img) for name, img in fits_images_dict.items()}
+
+        load_time_sec = time.perf_counter() - initial_time
+    except Exception as e:
+        return e
+
+    return fits_images_dict, fits_metadata_dict, load_time_sec
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Build the empirical noise CDF files of `datapipe.denoising.cdf` from
+benchmark FITS files or simtel files.
+
+Noise values (the input image minus the reference image) of all images are
+accumulated in a fixed-bin histogram per camera so that the memory used
+does not depend on the size of the dataset. Input files are distributed to
+a pool of worker processes; each worker returns the histograms of its
+files and these partial histograms are merged as they arrive.
+
+For each camera, a CDF JSON file (readable by
+`datapipe.denoising.inverse_transform_sampling.EmpiricalDistribution`) and
+its inverse CDF lookup table are written.
+
+Example usages:
+  ./cdf_builder.py -h
+  ./cdf_builder.py --num-workers 0 -o ./cdf ~/data/gamma/fits/
+"""
+
+__all__ = ['NoiseHistogram',
+           'build_noise_histograms',
+           'save_cdf_file']
+
+import argparse
+import functools
+import json
+import numpy as np
+import os
+
+from datapipe.denoising.inverse_transform_sampling import save_inverse_cdf_table
+from datapipe.io import images
+from datapipe.utils.parallel import parallel_map, PARALLEL_BACKENDS
+
+DEFAULT_NUM_BINS = 2000
+DEFAULT_HIST_RANGE = (-10., 40.)   # In photoelectrons
+
+# HISTOGRAM ###################################################################
+
+class NoiseHistogram:
+    """A fixed-bin histogram of noise values.
+
+    Values outside `hist_range` are counted in `num_underflow` and
+    `num_overflow` but are not part of the CDF.
+
+    Parameters
+    ----------
+    num_bins : int
+        The number of bins.
+    hist_range : tuple
+        The lower and upper edges of the histogram.
+    """
+
+    def __init__(self, num_bins=DEFAULT_NUM_BINS, hist_range=DEFAULT_HIST_RANGE):
+        if num_bins < 1:
+            raise ValueError("num_bins should be a positive integer")
+        if hist_range[1] <= hist_range[0]:
+            raise ValueError("Wrong histogram range: {}".format(hist_range))
+
+        self.num_bins = int(num_bins)
+        self.hist_range = (float(hist_range[0]), float(hist_range[1]))
+
+        self.counts = np.zeros(self.num_bins, dtype=np.int64)
+        self.num_underflow = 0
+        self.num_overflow = 0
+        self.num_images = 0
+
+    @property
+    def bin_edges(self):
+        return np.linspace(self.hist_range[0], self.hist_range[1], self.num_bins + 1)
+
+    @property
+    def num_samples(self):
+        return int(self.counts.sum())
+
+    def fill(self, values):
+        """Add `values` (NaN are ignored) to the histogram."""
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+
+        # Bins are regular thus the bin index is computed directly (this is
+        # much faster than np.histogram and doesn't need any sort)
+        bin_width = (self.hist_range[1] - self.hist_range[0]) / self.num_bins
+        bin_index = np.floor((values - self.hist_range[0]) / bin_width).astype(np.int64)
+        bin_index[values == self.hist_range[1]] = self.num_bins - 1   # The last bin includes its upper edge
+
+        underflow_mask = bin_index < 0
+        overflow_mask = bin_index >= self.num_bins
+        self.num_underflow += int(np.count_nonzero(underflow_mask))
+        self.num_overflow += int(np.count_nonzero(overflow_mask))
+
+        in_range_index = bin_index[~(underflow_mask | overflow_mask)]
+        self.counts += np.bincount(in_range_index, minlength=self.num_bins)
+
+    def merge(self, other):
+        """Add the counts of the `other` histogram (which must have the same
+        bins) to this histogram."""
+
+        if (other.num_bins != self.num_bins) or (other.hist_range != self.hist_range):
+            raise ValueError("Histograms with different bins cannot be merged")
+
+        self.counts += other.counts
+        self.num_underflow += other.num_underflow
+        self.num_overflow += other.num_overflow
+        self.num_images += other.num_images
+
+    def get_cdf(self):
+        """Return the CDF of the histogram as a tuple `(cdf_x, cdf_y)`.
+
+        `cdf_x` contains the bin edges and `cdf_y` the fraction of (in range)
+        samples lower than each edge.
+        """
+
+        num_samples = self.num_samples
+
+        if num_samples == 0:
+            raise ValueError("The histogram is empty")
+
+        cdf_y = np.zeros(self.num_bins + 1)
+        cdf_y[1:] = np.cumsum(self.counts) / num_samples
+
+        return self.bin_edges, cdf_y
+
+
+def _noise_histograms_of_file(file_path, num_bins, hist_range, tel_filter_list, ev_filter_list, cam_filter_list):
+    """Return the noise histograms (one per camera) of the images in `file_path`."""
+
+    histogram_dict = {}
+
+    for image_dict, metadata_dict in images.image_generator([file_path],
+                                                            tel_filter_list=tel_filter_list,
+                                                            ev_filter_list=ev_filter_list,
+                                                            cam_filter_list=cam_filter_list):
+        cam_id = metadata_dict['cam_id']
+
+        if cam_id not in histogram_dict:
+            histogram_dict[cam_id] = NoiseHistogram(num_bins, hist_range)
+
+        noise_img = image_dict["input_image"].astype(np.float64) - image_dict["reference_image"]
+
+        histogram_dict[cam_id].fill(noise_img)
+        histogram_dict[cam_id].num_images += 1
+
+    return histogram_dict
+
+
+def build_noise_histograms(path_list,
+                           num_bins=DEFAULT_NUM_BINS,
+                           hist_range=DEFAULT_HIST_RANGE,
+                           tel_filter_list=None,
+                           ev_filter_list=None,
+                           cam_filter_list=None,
+                           max_num_files=None,
+                           num_workers=None,
+                           backend="concurrent.futures"):
+    """Accumulate the noise histogram of each camera for all images in
+    `path_list`.
+
+    Parameters
+    ----------
+    path_list : list of str
+        FITS/Simtel files and directories (see `datapipe.io.images.image_generator()`).
+    num_bins : int
+        The number of bins of the histograms.
+    hist_range : tuple
+        The lower and upper edges of the histograms.
+    tel_filter_list, ev_filter_list, cam_filter_list : list
+        Only use images of these telescopes, events and cameras (all images
+        are used if `None`).
+    max_num_files : int
+        The maximum number of files to read.
+    num_workers : int
+        The number of worker processes (see `datapipe.utils.parallel.parallel_map()`).
+        Each worker processes whole files.
+    backend : str
+        The process pool implementation to use.
+
+    Returns
+    -------
+    dict
+        A `NoiseHistogram` per camera ID.
+    """
+
+    function = functools.partial(_noise_histograms_of_file,
+                                 num_bins=num_bins,
+                                 hist_range=hist_range,
+                                 tel_filter_list=tel_filter_list,
+                                 ev_filter_list=ev_filter_list,
+                                 cam_filter_list=cam_filter_list)
+
+    file_path_iterable = images.image_files_in_paths(path_list, max_num_files)
+
+    histogram_dict = {}
+
+    for partial_histogram_dict in parallel_map(function, file_path_iterable, num_workers, backend):
+        for cam_id, histogram in partial_histogram_dict.items():
+            if cam_id in histogram_dict:
+                histogram_dict[cam_id].merge(histogram)
+            else:
+                histogram_dict[cam_id] = histogram
+
+    return histogram_dict
+
+
+# CDF FILES ###################################################################
+
+def save_cdf_file(histogram, output_file_path, metadata_dict=None, save_table=True):
+    """Write the CDF of `histogram` in a JSON file (in the format of the
+    files of `datapipe.denoising.cdf`).
+
+    If `save_table` is True, the inverse CDF lookup table is also written
+    next to the JSON file.
+    """
+
+    cdf_x, cdf_y = histogram.get_cdf()
+
+    json_dict = {} if metadata_dict is None else dict(metadata_dict)
+    json_dict["cdf_x"] = cdf_x.tolist()
+    json_dict["cdf_y"] = cdf_y.tolist()
+    json_dict["num_samples"] = histogram.num_samples
+    json_dict["num_images"] = histogram.num_images
+    json_dict["num_underflow"] = histogram.num_underflow
+    json_dict["num_overflow"] = histogram.num_overflow
+    json_dict["hist_range"] = list(histogram.hist_range)
+
+    with open(output_file_path, "w") as fd:
+        json.dump(json_dict, fd, sort_keys=True, indent=4)
+
+    if save_table:
+        save_inverse_cdf_table(output_file_path)
+
+
+def main():
+
+    # PARSE OPTIONS ###########################################################
+
+    parser = argparse.ArgumentParser(description="Build the empirical noise CDF of each camera from FITS or simtel files.")
+
+    parser.add_argument("--output-dir", "-o", default=".", metavar="DIRECTORY",
+                        help="The directory where CDF files are written (one '<cam_id>_cdf.json' file per camera). Default='.'.")
+
+    parser.add_argument("--num-bins", type=int, default=DEFAULT_NUM_BINS, metavar="INTEGER",
+                        help="The number of bins of the noise histograms. Default={}.".format(DEFAULT_NUM_BINS))
+
+    parser.add_argument("--range", type=float, nargs=2, default=DEFAULT_HIST_RANGE, metavar="FLOAT",
+                        help="The lower and upper edges of the noise histograms (in photoelectrons). Default={} {}.".format(*DEFAULT_HIST_RANGE))
+
+    parser.add_argument("--telescope", "-t", type=int, nargs="*", default=None, metavar="INTEGER",
+                        help="Only use images of these telescopes.")
+
+    parser.add_argument("--camid", "-c", nargs="*", default=None, metavar="STRING",
+                        help="Only use images of these cameras.")
+
+    parser.add_argument("--max-num-files", type=int, default=None, metavar="INTEGER",
+                        help="The maximum number of files to read.")
+
+    parser.add_argument("--num-workers", type=int, default=None, metavar="INTEGER",
+                        help="The number of worker processes used to read files in parallel (0: one per CPU). Default: no parallelism.")
+
+    parser.add_argument("--parallel-backend", default="concurrent.futures",
+                        help="The process pool implementation used when --num-workers is set ('concurrent.futures' or 'multiprocessing'). Default='concurrent.futures'.")
+
+    parser.add_argument("fileargs", nargs="+", metavar="FILE",
+                        help="The files to process (FITS or simtel)."
+                             "If fileargs is a directory,"
+                             "all FITS and simtel files it contains are processed.")
+
+    args = parser.parse_args()
+
+    if args.parallel_backend not in PARALLEL_BACKENDS:
+        parser.error("Unknown parallel backend: {}".format(args.parallel_backend))
+
+    histogram_dict = build_noise_histograms(args.fileargs,
+                                            num_bins=args.num_bins,
+                                            hist_range=tuple(args.range),
+                                            tel_filter_list=args.telescope,
+                                            cam_filter_list=args.camid,
+                                            max_num_files=args.max_num_files,
+                                            num_workers=args.num_workers,
+                                            backend=args.parallel_backend)
+
+    for cam_id, histogram in sorted(histogram_dict.items()):
+        output_file_path = os.path.join(args.output_dir, "{}_cdf.json".format(cam_id.lower()))
+
+        metadata_dict = {"inst": cam_id,
+                         "input_paths": args.fileargs}
+        if args.telescope is not None:
+            metadata_dict["tel_id_filter_list"] = args.telescope
+
+        save_cdf_file(histogram, output_file_path, metadata_dict)
+
+        print("{}: {} samples from {} images -> {}".format(cam_id, histogram.num_samples, histogram.num_images, output_file_path))
+
+
+if __name__ == "__main__":
+    main()
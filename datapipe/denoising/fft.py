@@ -109,6 +109,49 @@ class FFT(AbstractCleaningAlgorithm):
 
         return cleaned_img
 
+    def clean_images(self, input_img_stack, output_data_dict_list=None,
+                     shift=False, threshold=0., **cleaning_function_params):
+        """Clean a stack of images (see
+        `AbstractCleaningAlgorithm.clean_images()`) in one vectorized pass
+        (all transforms are applied on the last two axes)."""
+
+        if self.verbose:
+            # Plot Fourier coefficients image by image
+            return super(FFT, self).clean_images(input_img_stack,
+                                                 output_data_dict_list=output_data_dict_list,
+                                                 shift=shift,
+                                                 threshold=threshold,
+                                                 **cleaning_function_params)
+
+        input_img_stack = np.asarray(input_img_stack)
+
+        if input_img_stack.ndim != 3:
+            raise ValueError("The image stack should be a 3D array (got a {}D array)".format(input_img_stack.ndim))
+
+        axes = (-2, -1)
+
+        transformed_img_stack = np.fft.fft2(input_img_stack, axes=axes)
+
+        if shift:
+            transformed_img_stack = np.fft.fftshift(transformed_img_stack, axes=axes)
+
+        # Apply a threshold on each transformed image (relatively to its own maximum)
+
+        abs_transformed_img_stack = abs(transformed_img_stack)
+        max_value_stack = np.max(abs_transformed_img_stack, axis=axes, keepdims=True)
+
+        img_mask_stack = abs_transformed_img_stack > (max_value_stack * threshold)
+        filtered_transformed_img_stack = transformed_img_stack * img_mask_stack
+
+        # Do the reverse transform
+
+        if shift:
+            filtered_transformed_img_stack = np.fft.ifftshift(filtered_transformed_img_stack, axes=axes)
+
+        cleaned_img_stack = abs(np.fft.ifft2(filtered_transformed_img_stack, axes=axes))
+
+        return cleaned_img_stack
+
 
 def main():
 
@@ -41,66 +41,243 @@ Mon implémentation:
 * Fonction rvs qui génère un echantillon: interpolate.splev(y, self._tck)
 """
 
-__all__ = ['EmpiricalDistribution']
+__all__ = ['EmpiricalDistribution',
+           'build_inverse_cdf_table',
+           'get_inverse_cdf_table',
+           'get_table_file_path',
+           'save_inverse_cdf_table']
 
 # See the "simtel_signal_and_noise_histograms_plus_save_cdf_plus_test_inverse_transform_sampling" notebook
 
 import numpy as np
 import scipy.interpolate
+import hashlib
 import json
+import os
+import tempfile
+import threading
 
 INTERPOLATION_METH = 'spline1'
 
+# The number of points of the inverse CDF lookup tables
+INVERSE_CDF_TABLE_SIZE = 8192
+
+# LOOKUP TABLE ################################################################
+
+def _get_table_grid(table_size):
+    """Return the CDF values of the lookup table points.
+
+    Points are regularly spaced in `t` with `y = (1 - cos(pi t)) / 2` thus
+    they are much denser in the tails of the distribution (where empirical
+    CDFs have their steepest inverse) than in its core.
+    """
+    return (1. - np.cos(np.pi * np.linspace(0., 1., table_size))) / 2.
+
+
+def build_inverse_cdf_table(cdf_x, cdf_y, table_size=INVERSE_CDF_TABLE_SIZE):
+    """Tabulate the inverse of an empirical CDF on `table_size` points in
+    [0, 1] (see `_get_table_grid()`).
+
+    The inverse CDF is interpolated as in the original implementation (a
+    degree 1 spline on the points where the CDF is strictly increasing).
+    """
+
+    cdf_x = np.asarray(cdf_x, dtype=np.float64)
+    cdf_y = np.asarray(cdf_y, dtype=np.float64)
+
+    # "Clean" data to have an actual inverse CDF (i.e. lets the CDF be *strictly* increasing)
+    increasing_mask = cdf_y[1:] > cdf_y[:-1]
+
+    filtered_x_array = cdf_x[:-1][increasing_mask]
+    filtered_y_array = cdf_y[:-1][increasing_mask]
+
+    # Interpolate CDF^{-1}
+
+    if INTERPOLATION_METH == 'spline1':
+        # Spline interpolation
+        spl = scipy.interpolate.splrep(filtered_y_array, filtered_x_array,
+                                       xb=0., xe=1.,   # The interval to fit
+                                       #s=0.,          # A smoothing factor
+                                       k=1)            # The degree fo the spline fit
+        inv_cdf = lambda y: scipy.interpolate.splev(y, spl)
+    elif INTERPOLATION_METH in ('linear', 'slinear'):
+        # Linear interpolation with extrapolation
+        inv_cdf = scipy.interpolate.interp1d(filtered_y_array, filtered_x_array,
+                                             kind=INTERPOLATION_METH,
+                                             fill_value="extrapolate")
+    else:
+        raise Exception("Unknown interpolation method", INTERPOLATION_METH)
+
+    return np.asarray(inv_cdf(_get_table_grid(table_size)), dtype=np.float64)
+
+
+def get_table_file_path(cdf_json_file_path):
+    """Return the path of the lookup table (`.npz`) of a CDF JSON file."""
+    return os.path.splitext(cdf_json_file_path)[0] + "_inv_cdf.npz"
+
+
+def _read_cdf_json_file(cdf_json_file_path):
+    """Return the CDF of `cdf_json_file_path` and the SHA-1 checksum of this
+    file."""
+
+    with open(cdf_json_file_path, "rb") as fd:
+        json_bytes = fd.read()
+
+    return json.loads(json_bytes.decode("utf-8")), hashlib.sha1(json_bytes).hexdigest()
+
+
+def save_inverse_cdf_table(cdf_json_file_path, table_size=INVERSE_CDF_TABLE_SIZE):
+    """Compute the inverse CDF lookup table of `cdf_json_file_path` and save
+    it next to this file (see `get_table_file_path()`).
+
+    The checksum of the JSON file is saved with the table (the table is
+    ignored by `get_inverse_cdf_table()` if the JSON file has changed).
+    """
+
+    cdf, json_sha1 = _read_cdf_json_file(cdf_json_file_path)
+
+    table = build_inverse_cdf_table(cdf['cdf_x'], cdf['cdf_y'], table_size)
+
+    table_file_path = get_table_file_path(cdf_json_file_path)
+
+    # Write a temporary file then rename it so that concurrent readers
+    # never see a partially written table
+    fd, tmp_file_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(table_file_path)), prefix=".tmp_", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as tmp_fd:
+            np.savez(tmp_fd, inv_cdf_table=table, json_sha1=np.array(json_sha1))
+        os.replace(tmp_file_path, table_file_path)
+    except:
+        os.remove(tmp_file_path)
+        raise
+
+    return table_file_path
+
+
+def _load_inverse_cdf_table(table_file_path, json_sha1):
+    """Return the table saved in `table_file_path` or `None` if this file
+    doesn't exist or has not been computed from a JSON file with the
+    `json_sha1` checksum."""
+
+    try:
+        with np.load(table_file_path, allow_pickle=False) as npz_file:
+            if str(npz_file["json_sha1"]) != json_sha1:
+                return None
+            return npz_file["inv_cdf_table"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_table_dict = {}        # (path, JSON file checksum) -> table
+_stat_table_dict = {}   # (path, JSON file mtime, JSON file size) -> table
+_table_lock = threading.Lock()
+
+def get_inverse_cdf_table(cdf_json_file_path):
+    """Return the inverse CDF lookup table of `cdf_json_file_path`.
+
+    Tables are read once per process: the JSON file is only read (and
+    hashed) again if its modification time or its size have changed. The
+    `.npz` table stored next to the JSON file is used if it has been
+    computed from the current content of the JSON file (its checksum is
+    saved with the table); otherwise the table is computed from the JSON
+    file.
+    """
+
+    cdf_json_file_path = os.path.abspath(cdf_json_file_path)
+    stat = os.stat(cdf_json_file_path)
+    stat_key = (cdf_json_file_path, stat.st_mtime_ns, stat.st_size)
+
+    with _table_lock:
+        if stat_key in _stat_table_dict:
+            return _stat_table_dict[stat_key]
+
+    cdf, json_sha1 = _read_cdf_json_file(cdf_json_file_path)
+    cache_key = (cdf_json_file_path, json_sha1)
+
+    with _table_lock:
+        if cache_key not in _table_dict:
+            table = _load_inverse_cdf_table(get_table_file_path(cdf_json_file_path), json_sha1)
+
+            if table is None:
+                table = build_inverse_cdf_table(cdf['cdf_x'], cdf['cdf_y'])
+
+            table.setflags(write=False)
+            _table_dict[cache_key] = table
+
+        _stat_table_dict[stat_key] = _table_dict[cache_key]
+
+        return _table_dict[cache_key]
+
+# DISTRIBUTION ################################################################
+
 class EmpiricalDistribution:
-    def __init__(self, cdf_json_file_path):
-        with open(cdf_json_file_path, "r") as fd:
-            cdf = json.load(fd)
-            
-        # Get the CDF
-
-        self.cdf_x = np.array(cdf['cdf_x'])
-        self.cdf_y = np.array(cdf['cdf_y'])
-
-        # "Clean" data to have an actual inverse CDF (i.e. lets the CDF be *strictly* increasing)
-        
-        filtered_x_list = []
-        filtered_y_list = []
-        for i, (yip, yi) in enumerate(zip(self.cdf_y[0:-1], self.cdf_y[1:])):
-            if yi > yip:
-                filtered_x_list.append(self.cdf_x[i])
-                filtered_y_list.append(self.cdf_y[i])
-
-        filtered_x_array = np.array(filtered_x_list)
-        filtered_y_array = np.array(filtered_y_list)
-        
-        # Interpolate CDF^{-1}
-
-        if INTERPOLATION_METH == 'spline1':
-            # Spline interpolation
-            self.spl = scipy.interpolate.splrep(filtered_y_array, filtered_x_array,
-                                                xb=0., xe=1.,   # The interval to fit
-                                                #s=0.,          # A smoothing factor
-                                                k=1)            # The degree fo the spline fit
-        elif INTERPOLATION_METH == 'linear':
-            # Linear interpolation with extrapolation
-            self.inv_cdf = scipy.interpolate.interp1d(filtered_y_array, filtered_x_array,
-                                                      kind='linear',
-                                                      fill_value="extrapolate")
-        elif INTERPOLATION_METH == 'slinear':
-            # Spline linear interpolation with extrapolation (should be the same than spline1...)
-            self.inv_cdf = scipy.interpolate.interp1d(filtered_y_array, filtered_x_array,
-                                                      kind='slinear',
-                                                      fill_value="extrapolate")
-        else:
-            raise Exception("Unknown interpolation method", INTERPOLATION_METH)
-
-    def rvs(self, size):
-        x = np.random.random(size)
-        
-        if INTERPOLATION_METH == 'spline1':
-            return scipy.interpolate.splev(x, self.spl)
-        elif INTERPOLATION_METH in ('linear', 'slinear'):
-            return self.inv_cdf(x)
-        else:
-            raise Exception("Unknown interpolation method", INTERPOLATION_METH)
+    """Draw samples from an empirical distribution defined by a CDF JSON file
+    (see `datapipe.denoising.cdf`).
+
+    Samples are drawn by linear interpolation in the inverse CDF lookup table
+    of the file (see `get_inverse_cdf_table()`).
+
+    Parameters
+    ----------
+    cdf_json_file_path : str
+        The CDF JSON file.
+    random_generator : numpy.random.Generator or int
+        The random generator used by `rvs()` (or its seed). A new generator
+        initialized with fresh entropy is used if `None`.
+    """
+
+    def __init__(self, cdf_json_file_path, random_generator=None):
+        self.cdf_json_file_path = os.path.abspath(cdf_json_file_path)
+        self.inv_cdf_table = get_inverse_cdf_table(cdf_json_file_path)
+        self.random_generator = np.random.default_rng(random_generator)
+
+        self._inv_cdf_table_sha1 = None
+
+    def get_canonical_state(self):
+        """Return the items identifying this distribution: the CDF file
+        path and the checksum of its lookup table (the random generator is
+        ignored).
+
+        This is the representation of the distribution in the keys of
+        `datapipe.denoising.result_cache`.
+        """
+
+        if self._inv_cdf_table_sha1 is None:
+            self._inv_cdf_table_sha1 = hashlib.sha1(np.ascontiguousarray(self.inv_cdf_table).tobytes()).hexdigest()
+
+        return {"cdf_json_file_path": self.cdf_json_file_path,
+                "inv_cdf_table_sha1": self._inv_cdf_table_sha1}
+
+    def ppf(self, y):
+        """The inverse CDF (Percent Point Function) interpolated in the
+        lookup table."""
+
+        # Invert the table grid transform (see _get_table_grid())
+        table = self.inv_cdf_table
+        y = np.asarray(y, dtype=np.float64)
+        index = np.clip(1. - 2. * y.reshape(-1), -1., 1.)
+        np.arccos(index, out=index)
+        index *= (len(table) - 1) / np.pi
+
+        lower_index = index.astype(np.intp)
+        np.minimum(lower_index, len(table) - 2, out=lower_index)
+        index -= lower_index        # The interpolation weight
+
+        samples = table[lower_index]
+        samples += index * (table[lower_index + 1] - samples)
+
+        return samples.reshape(y.shape) if y.ndim > 0 else samples[0]
+
+    def rvs(self, size, random_generator=None):
+        """Draw `size` samples.
+
+        `random_generator` (a `numpy.random.Generator`) can be given to use
+        a generator specific to the caller (e.g. one per thread); the
+        generator of the distribution is used otherwise.
+        """
+
+        if random_generator is None:
+            random_generator = self.random_generator
+
+        return self.ppf(random_generator.random(size))
 
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Run the mr_filter program (CEA/CosmoStat) efficiently.
+
+mr_filter only reads and writes FITS files. This module manages its
+invocations:
+
+- mr_filter is executed with `subprocess` (without shell) and killed if it
+  doesn't complete before a given timeout;
+- temporary FITS files are written in a per-process directory, by default
+  in the `/dev/shm` RAM disk (when it exists) rather than in the current
+  directory, and they are always removed;
+- a `MrFilterEngine` limits the number of concurrent mr_filter processes and
+  provides a thread pool to clean several images at once (the threads
+  mostly wait for their mr_filter process thus the GIL is not an issue);
+- several small images can be packed in one mosaic image, separated by
+  guard bands, to pay the mr_filter start-up and FITS overhead once for all
+  of them (see `MrFilterEngine.filter_images()`).
+
+This module requires the mr_filter program
+(http://www.cosmostat.org/software/isap/).
+"""
+
+__all__ = ['MrFilterEngine',
+           'MrFilterError',
+           'MrFilterExecutionError',
+           'MrFilterTimeoutError',
+           'get_default_engine',
+           'get_default_tmp_files_directory',
+           'get_guard_band_width',
+           'pack_mosaic',
+           'unpack_mosaic']
+
+import atexit
+import concurrent.futures
+import itertools
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from datapipe.io import images
+
+RAM_DISK_DIRECTORY = "/dev/shm"
+
+# EXCEPTIONS #################################################################
+
+class MrFilterError(Exception):
+    pass
+
+class MrFilterExecutionError(MrFilterError):
+    """Exception raised when mr_filter fails (i.e. returns a non-zero exit
+    status)."""
+
+    def __init__(self, cmd, return_code, stderr):
+        super(MrFilterExecutionError, self).__init__("mr_filter failed with exit status {}: {} ({})".format(return_code, " ".join(cmd), stderr.strip()))
+        self.cmd = cmd
+        self.return_code = return_code
+        self.stderr = stderr
+
+
+class MrFilterTimeoutError(MrFilterError):
+    """Exception raised when mr_filter doesn't complete before the timeout
+    (the process is killed)."""
+
+    def __init__(self, cmd, timeout_sec):
+        super(MrFilterTimeoutError, self).__init__("mr_filter killed after {} seconds: {}".format(timeout_sec, " ".join(cmd)))
+        self.cmd = cmd
+        self.timeout_sec = timeout_sec
+
+# TEMPORARY FILES ############################################################
+
+_tmp_files_directory_dict = {}     # pid -> directory
+
+def get_default_tmp_files_directory():
+    """Return the directory where the current process writes its temporary
+    FITS files.
+
+    It is a private directory created in `/dev/shm` (or in the default
+    temporary directory if `/dev/shm` doesn't exist) the first time this
+    function is called by the process; it is removed when the process
+    exits.
+    """
+
+    pid = os.getpid()
+
+    if pid not in _tmp_files_directory_dict:
+        if os.path.isdir(RAM_DISK_DIRECTORY) and os.access(RAM_DISK_DIRECTORY, os.W_OK):
+            parent_directory = RAM_DISK_DIRECTORY
+        else:
+            parent_directory = None    # The default temporary directory
+
+        tmp_files_directory = tempfile.mkdtemp(prefix=".datapipe_mrfilter_{}_".format(pid), dir=parent_directory)
+        _tmp_files_directory_dict[pid] = tmp_files_directory
+
+        atexit.register(_remove_tmp_files_directory, pid, tmp_files_directory)
+
+    return _tmp_files_directory_dict[pid]
+
+
+def _remove_tmp_files_directory(pid, tmp_files_directory):
+    if os.getpid() == pid:    # Forked processes inherit atexit handlers
+        shutil.rmtree(tmp_files_directory, ignore_errors=True)
+
+# MOSAIC #####################################################################
+
+def get_guard_band_width(number_of_scales=4, number_of_iterations=1):
+    """Return the width (in pixels) of the guard bands needed to isolate the
+    images of a mosaic filtered with the "à trous" wavelet transforms
+    (mr_filter's `-t1` and `-t2`).
+
+    The `j`-th scale of the transform is computed with a filter of radius
+    `2^(j+1)` thus a pixel of the filtered image only depends on the pixels
+    closer than `2 * (2^(number_of_scales - 1) - 1)` pixels. Iterative
+    filtering (`-f3`) extends this distance at each iteration.
+
+    Parameters
+    ----------
+    number_of_scales : int
+        The number of scales of the transform (mr_filter's `-n` option).
+    number_of_iterations : int
+        The number of iterations of the filtering (mr_filter's `-i` option
+        for iterative filtering, 1 otherwise).
+    """
+
+    if number_of_scales < 1:
+        raise ValueError("The number of scales should be greater than 0 (got {})".format(number_of_scales))
+
+    return 2 * (2**(number_of_scales - 1) - 1) * max(number_of_iterations, 1)
+
+
+def pack_mosaic(img_list, guard_band_width, fill_function=None):
+    """Pack 2D images in a single mosaic image.
+
+    Images are placed on a regular grid (as square as possible) and
+    separated (and surrounded) by `guard_band_width` pixels wide bands.
+
+    Parameters
+    ----------
+    img_list : list
+        The images (2D arrays) to pack.
+    guard_band_width : int
+        The width of guard bands (see `get_guard_band_width()`).
+    fill_function : callable
+        A function `fill_function(size)` returning the `size` values of the
+        pixels outside images (e.g. noise samples). These pixels are set to
+        0 if `None`.
+
+    Returns
+    -------
+    tuple
+        The mosaic image and the list of `(row_slice, column_slice)` of each
+        image in the mosaic (see `unpack_mosaic()`).
+    """
+
+    if len(img_list) == 0:
+        raise ValueError("At least one image is required")
+
+    for img in img_list:
+        if np.ndim(img) != 2:
+            raise ValueError("Mosaic images should be 2D arrays (got a {}D array)".format(np.ndim(img)))
+
+    cell_height = max(img.shape[0] for img in img_list) + guard_band_width
+    cell_width = max(img.shape[1] for img in img_list) + guard_band_width
+
+    num_columns = int(math.ceil(math.sqrt(len(img_list))))
+    num_rows = int(math.ceil(len(img_list) / num_columns))
+
+    mosaic_shape = (num_rows * cell_height + guard_band_width, num_columns * cell_width + guard_band_width)
+
+    if fill_function is None:
+        mosaic = np.zeros(mosaic_shape)
+    else:
+        mosaic = np.asarray(fill_function(size=mosaic_shape[0] * mosaic_shape[1]), dtype=np.float64).reshape(mosaic_shape)
+
+    slice_list = []
+
+    for img_index, img in enumerate(img_list):
+        row_index, column_index = divmod(img_index, num_columns)
+
+        row_start = guard_band_width + row_index * cell_height
+        column_start = guard_band_width + column_index * cell_width
+
+        img_slices = (slice(row_start, row_start + img.shape[0]),
+                      slice(column_start, column_start + img.shape[1]))
+
+        mosaic[img_slices] = img
+        slice_list.append(img_slices)
+
+    return mosaic, slice_list
+
+
+def unpack_mosaic(mosaic, slice_list):
+    """Return the list of images (copies) packed in `mosaic` by
+    `pack_mosaic()`."""
+    return [np.array(mosaic[img_slices], copy=True) for img_slices in slice_list]
+
+# ENGINE #####################################################################
+
+class MrFilterEngine(object):
+    """Execute mr_filter on images.
+
+    Parameters
+    ----------
+    max_processes : int
+        The maximum number of mr_filter processes running at the same time
+        (one per CPU if `None`).
+    timeout_sec : float
+        The default timeout of mr_filter invocations (no timeout if `None`).
+    tmp_files_directory : str
+        The default directory of temporary FITS files (see
+        `get_default_tmp_files_directory()` if `None`).
+    """
+
+    def __init__(self, max_processes=None, timeout_sec=None, tmp_files_directory=None):
+        if max_processes is None:
+            max_processes = os.cpu_count() or 1
+
+        self.max_processes = max_processes
+        self.timeout_sec = timeout_sec
+        self.tmp_files_directory = tmp_files_directory
+
+        self._process_semaphore = threading.BoundedSemaphore(max_processes)
+        self._file_counter = itertools.count()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def run_command(self, cmd, timeout_sec=None, verbose=False):
+        """Execute `cmd` (a list of arguments, no shell is used).
+
+        Raises
+        ------
+        MrFilterTimeoutError
+            If the command doesn't complete within `timeout_sec` seconds
+            (the process is killed).
+        MrFilterExecutionError
+            If the command returns a non-zero exit status.
+        """
+
+        if timeout_sec is None:
+            timeout_sec = self.timeout_sec
+
+        with self._process_semaphore:
+            try:
+                completed_process = subprocess.run(cmd,
+                                                   stdout=None if verbose else subprocess.DEVNULL,
+                                                   stderr=subprocess.PIPE,
+                                                   universal_newlines=True,
+                                                   timeout=timeout_sec)    # subprocess.run() kills the process on timeout
+            except subprocess.TimeoutExpired:
+                raise MrFilterTimeoutError(cmd, timeout_sec)
+
+        if completed_process.returncode != 0:
+            raise MrFilterExecutionError(cmd, completed_process.returncode, completed_process.stderr)
+
+    def filter_image(self,
+                     input_img,
+                     option_list,
+                     mrfilter_directory=None,
+                     tmp_files_directory=None,
+                     timeout_sec=None,
+                     verbose=False,
+                     output_data_dict=None):
+        """Filter `input_img` with mr_filter.
+
+        Parameters
+        ----------
+        input_img : array_like
+            The image to filter (2D array).
+        option_list : list
+            The mr_filter options (e.g. `["-K", "-k", "-s3"]`).
+        mrfilter_directory : str
+            The directory containing the mr_filter executable (`None` to
+            search it in the PATH).
+        tmp_files_directory : str
+            The directory where temporary FITS files are written (the engine
+            default if `None`).
+        timeout_sec : float
+            The mr_filter timeout (the engine default if `None`).
+        output_data_dict : dict
+            If not `None`, the temporary file paths and the execution time of
+            each step are recorded in this dictionary.
+
+        Returns
+        -------
+        array_like
+            The filtered image.
+        """
+
+        if tmp_files_directory is None:
+            tmp_files_directory = self.tmp_files_directory
+
+        if tmp_files_directory is None:
+            tmp_files_directory = get_default_tmp_files_directory()
+
+        # File names are unique for each process and each call (even in concurrent threads)
+        file_id = "{}_{}".format(os.getpid(), next(self._file_counter))
+        input_file_path = os.path.join(tmp_files_directory, ".tmp_{}_in.fits".format(file_id))
+        mr_output_file_path = os.path.join(tmp_files_directory, ".tmp_{}_out.fits".format(file_id))
+
+        if output_data_dict is not None:
+            output_data_dict["mr_input_tmp_file_path"] = input_file_path
+            output_data_dict["mr_output_tmp_file_path"] = mr_output_file_path
+
+        if mrfilter_directory is None:
+            cmd = ["mr_filter"]
+        else:
+            cmd = [os.path.join(mrfilter_directory, "mr_filter")]
+
+        cmd += list(option_list)
+        cmd += [input_file_path, mr_output_file_path]
+
+        if verbose:
+            print()
+            print(" ".join(cmd))
+
+        try:
+            # WRITE THE INPUT FILE (FITS) ##########################
+
+            try:
+                initial_time = time.perf_counter()
+                images.save(input_img, input_file_path)
+                exec_time_sec = time.perf_counter() - initial_time
+                if output_data_dict is not None:
+                    output_data_dict["save_tmp_file_time_sec"] = exec_time_sec
+            except:
+                print("Error on input FITS file:", input_file_path)
+                raise
+
+            # EXECUTE MR_FILTER ####################################
+
+            initial_time = time.perf_counter()
+            self.run_command(cmd, timeout_sec=timeout_sec, verbose=verbose)
+            exec_time_sec = time.perf_counter() - initial_time
+            if output_data_dict is not None:
+                output_data_dict["mrfilter_cmd_exec_time_sec"] = exec_time_sec
+
+            # READ THE MR_FILTER OUTPUT FILE #######################
+
+            try:
+                initial_time = time.perf_counter()
+                cleaned_img = images.load(mr_output_file_path, 0)
+                exec_time_sec = time.perf_counter() - initial_time
+                if output_data_dict is not None:
+                    output_data_dict["load_tmp_file_time_sec"] = exec_time_sec
+            except:
+                print("Error on output FITS file:", mr_output_file_path)
+                raise
+
+        finally:
+            # REMOVE FITS FILES ####################################
+
+            for file_path in (input_file_path, mr_output_file_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+        return cleaned_img
+
+    def filter_images(self,
+                      input_img_list,
+                      option_list,
+                      guard_band_width,
+                      fill_function=None,
+                      mrfilter_directory=None,
+                      tmp_files_directory=None,
+                      timeout_sec=None,
+                      verbose=False,
+                      output_data_dict=None):
+        """Filter several images with a single mr_filter invocation.
+
+        Images are packed in a mosaic (see `pack_mosaic()`) which is
+        filtered by `filter_image()` then split back. Images are independent
+        as long as guard bands are wide enough (see `get_guard_band_width()`)
+        except that mr_filter estimates the noise level on the whole mosaic;
+        `fill_function` can be used to fill guard bands with noise so that
+        this estimation is not biased by blank bands.
+
+        Parameters are the same as `filter_image()` plus `guard_band_width`
+        and `fill_function` (see `pack_mosaic()`).
+
+        Returns
+        -------
+        list
+            The filtered images.
+        """
+
+        mosaic, slice_list = pack_mosaic(input_img_list, guard_band_width, fill_function=fill_function)
+
+        if output_data_dict is not None:
+            output_data_dict["mr_mosaic_num_images"] = len(input_img_list)
+            output_data_dict["mr_mosaic_shape"] = mosaic.shape
+
+        cleaned_mosaic = self.filter_image(mosaic,
+                                           option_list,
+                                           mrfilter_directory=mrfilter_directory,
+                                           tmp_files_directory=tmp_files_directory,
+                                           timeout_sec=timeout_sec,
+                                           verbose=verbose,
+                                           output_data_dict=output_data_dict)
+
+        if cleaned_mosaic.shape != mosaic.shape:
+            raise MrFilterError("Unexpected error: the output mosaic shape {} differs from the input one {}".format(cleaned_mosaic.shape, mosaic.shape))
+
+        return unpack_mosaic(cleaned_mosaic, slice_list)
+
+    def map(self, function, iterable):
+        """Apply `function` to each item of `iterable` with the engine thread
+        pool (`max_processes` threads) and return the list of results (in
+        input order)."""
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_processes)
+
+        return list(self._executor.map(function, iterable))
+
+
+_default_engine_dict = {}     # pid -> engine
+_default_engine_lock = threading.Lock()
+
+def get_default_engine():
+    """Return the `MrFilterEngine` of the current process (created the first
+    time this function is called by the process)."""
+
+    pid = os.getpid()
+
+    with _default_engine_lock:
+        if pid not in _default_engine_dict:
+            _default_engine_dict[pid] = MrFilterEngine()
+
+    return _default_engine_dict[pid]
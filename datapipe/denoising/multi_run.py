@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmark several cleaning algorithms (or parameter sets) in a single pass.
+
+`AbstractCleaningAlgorithm.run()` has to be called once per configuration
+(i.e. per cleaning algorithm and parameter set) and each call reads every
+FITS file and computes the features of every reference image again.
+`run_configurations()` reads each image and computes its reference features
+only once, then applies all configurations to it.
+
+Example:
+
+    from datapipe.denoising.multi_run import run_configurations
+    from datapipe.denoising.null import Null
+    from datapipe.denoising.tailcut_jd import Tailcut
+
+    configuration_list = [(Tailcut(), {"high_threshold": 10, "low_threshold": 5}),
+                          (Tailcut(), {"high_threshold": 8, "low_threshold": 4}),
+                          (Null(), {})]
+
+    run_configurations(configuration_list,
+                       ["./testset/gamma/astri/"],
+                       "delta_psi",
+                       ["score_tc_10_5.json", "score_tc_8_4.json", "score_null.json"])
+"""
+
+__all__ = ['run_configurations']
+
+import functools
+import json
+import time
+
+from datapipe.benchmark.features import FeatureContext
+from datapipe.benchmark.features import compute_features
+from datapipe.benchmark.features import get_column_names
+from datapipe.benchmark.reference_features import ReferenceFeatureCache
+from datapipe.denoising.abstract_cleaning_algorithm import OUTPUT_FORMATS
+from datapipe.denoising.abstract_cleaning_algorithm import preload_benchmark_images
+from datapipe.io.json_lines import JsonLinesWriter
+from datapipe.utils.parallel import parallel_map
+from datapipe.utils.timing import StageTimer
+from datapipe.utils.timing import format_timing_report
+
+###############################################################################
+
+def run_configurations(configuration_list,
+                       input_file_or_dir_path_list,
+                       benchmark_method,
+                       output_file_path_list,
+                       ref_img_as_input=False,
+                       max_num_img=None,
+                       num_workers=None,
+                       parallel_backend="concurrent.futures",
+                       output_format="json",
+                       ref_features_cache_dir=None,
+                       output_column_list=None):
+    """Clean and assess all images in `input_file_or_dir_path_list` with each
+    configuration of `configuration_list`.
+
+    Each image is read once and its reference features are computed once.
+    The results of each configuration are written in their own output file,
+    with the same content than the output of `AbstractCleaningAlgorithm.run()`
+    for this configuration (except for the execution times).
+
+    The "stage_timing_report" of each configuration includes the stages
+    shared by all configurations (directory scan, FITS decoding and
+    reference features): their durations are counted in the report of every
+    configuration, as if it had been run alone.
+
+    Parameters
+    ----------
+    configuration_list : list
+        A list of `(cleaning_algorithm, cleaning_function_params)` tuples
+        where `cleaning_algorithm` is an `AbstractCleaningAlgorithm` instance.
+    input_file_or_dir_path_list : list
+        The FITS files (or directories of FITS files) to process.
+    benchmark_method : str
+        The benchmark method (see `datapipe.benchmark.assess`).
+    output_file_path_list : list
+        The output file of each configuration (in the same order than
+        `configuration_list`).
+    ref_img_as_input, max_num_img, num_workers, parallel_backend, output_format, ref_features_cache_dir, output_column_list
+        See `AbstractCleaningAlgorithm.run()`.
+
+    Returns
+    -------
+    list
+        The output dictionary of each configuration (with the "io" list only
+        if `output_format` is "json").
+
+    Raises
+    ------
+    ValueError
+        If `configuration_list` and `output_file_path_list` don't have the
+        same length, if `output_format` is unknown or if
+        `output_column_list` contains unknown columns.
+    """
+
+    launch_time = time.perf_counter()
+
+    if len(configuration_list) != len(output_file_path_list):
+        raise ValueError("configuration_list and output_file_path_list should have the same length")
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format: {} (should be one of {})".format(output_format, ", ".join(OUTPUT_FORMATS)))
+
+    if output_column_list is not None:
+        unknown_column_list = sorted(set(output_column_list) - set(get_column_names()))
+        if len(unknown_column_list) > 0:
+            raise ValueError("Unknown output columns: {}".format(", ".join(unknown_column_list)))
+
+    stream_output = (output_format == "jsonl")
+
+    stage_timer_list = [StageTimer() for configuration in configuration_list]
+
+    # The input file list is built by the first algorithm (it doesn't depend on the algorithm)
+    directory_scan_start_time = time.perf_counter()
+    first_cleaning_algorithm = configuration_list[0][0]
+    input_file_path_list = first_cleaning_algorithm._get_input_file_path_list(input_file_or_dir_path_list, max_num_img)
+    directory_scan_time_sec = time.perf_counter() - directory_scan_start_time
+
+    for stage_timer in stage_timer_list:
+        stage_timer.add("directory_scan", directory_scan_time_sec)
+
+    process_image = functools.partial(_process_image_configurations,
+                                      configuration_list=configuration_list,
+                                      benchmark_method=benchmark_method,
+                                      saveplot_per_image=(len(input_file_or_dir_path_list) > 1),
+                                      ref_img_as_input=ref_img_as_input,
+                                      ref_features_cache_dir=ref_features_cache_dir,
+                                      output_column_list=output_column_list)
+
+    output_dict_list = []
+    for cleaning_algorithm, cleaning_function_params in configuration_list:
+        output_dict_list.append(cleaning_algorithm._get_experiment_metadata(cleaning_function_params, benchmark_method))
+
+    io_list_list = [[] for configuration in configuration_list]
+    num_aborted_images_list = [0 for configuration in configuration_list]
+    json_lines_writer_list = []
+
+    try:
+        if stream_output:
+            for output_dict, output_file_path in zip(output_dict_list, output_file_path_list):
+                json_lines_writer = JsonLinesWriter(output_file_path)
+                json_lines_writer_list.append(json_lines_writer)
+                json_lines_writer.write_header(output_dict)
+
+        image_dict_list_iterator = parallel_map(process_image,
+                                                input_file_path_list,
+                                                num_workers=num_workers,
+                                                backend=parallel_backend)
+
+        for image_dict_list in image_dict_list_iterator:
+            for configuration_index, image_dict in enumerate(image_dict_list):
+                stage_timer = stage_timer_list[configuration_index]
+                stage_timer.add_durations(image_dict.get("stage_execution_time_sec", {}))
+
+                if "error" in image_dict:
+                    num_aborted_images_list[configuration_index] += 1
+
+                if stream_output:
+                    with stage_timer.stage("json_serialization"):
+                        json_lines_writer_list[configuration_index].write_image(image_dict)
+                else:
+                    io_list_list[configuration_index].append(image_dict)
+
+        wall_time_sec = time.perf_counter() - launch_time
+
+        for configuration_index, output_dict in enumerate(output_dict_list):
+            stage_timer = stage_timer_list[configuration_index]
+
+            print("{}: {} images aborted".format(output_dict["label"], num_aborted_images_list[configuration_index]))
+
+            if stream_output:
+                footer_dict = {}
+                footer_dict["benchmark_execution_time_sec"] = str(wall_time_sec)
+                footer_dict["num_images"] = len(input_file_path_list)
+                footer_dict["num_aborted_images"] = num_aborted_images_list[configuration_index]
+                footer_dict["stage_timing_report"] = stage_timer.get_report(wall_time_sec)
+
+                json_lines_writer_list[configuration_index].write_footer(footer_dict)
+                output_dict.update(footer_dict)
+            else:
+                output_dict["benchmark_execution_time_sec"] = str(wall_time_sec)
+                output_dict["stage_timing_report"] = stage_timer.get_report(wall_time_sec)
+                output_dict["io"] = io_list_list[configuration_index]
+
+                with stage_timer.stage("json_serialization"):
+                    with open(output_file_path_list[configuration_index], "w") as fd:
+                        json.dump(output_dict, fd, sort_keys=True, indent=4)  # pretty print format
+
+            # As in AbstractCleaningAlgorithm.run(), the printed report
+            # includes the "json_serialization" stage
+            print(format_timing_report(stage_timer.get_report(time.perf_counter() - launch_time)))
+    finally:
+        for json_lines_writer in json_lines_writer_list:
+            json_lines_writer.close()
+
+    return output_dict_list
+
+
+def _process_image_configurations(input_file_path,
+                                  configuration_list,
+                                  benchmark_method,
+                                  saveplot_per_image=False,
+                                  ref_img_as_input=False,
+                                  ref_features_cache_dir=None,
+                                  output_column_list=None):
+    """Read one FITS image, compute its reference features and process it
+    with each configuration of `configuration_list`.
+
+    As in `AbstractCleaningAlgorithm.process_image()`, only the reference
+    features of `output_column_list` are computed (all features if it is
+    `None`); their computation time is counted in the "reference_features"
+    stage of each configuration.
+
+    Returns the list of image dictionaries (one per configuration).
+    """
+
+    preloaded_images = preload_benchmark_images(input_file_path)
+
+    reference_features = None
+    reference_features_time_sec = 0.
+
+    if output_column_list is None:
+        column_list = get_column_names()
+    else:
+        column_list = output_column_list
+
+    ref_column_list = [column_name for column_name in column_list if column_name.startswith("img_ref_")]
+
+    if (len(ref_column_list) > 0) and not isinstance(preloaded_images, Exception):
+        fits_images_dict = preloaded_images[0]
+        reference_img = fits_images_dict["reference_image"]
+        pixels_position = fits_images_dict["pixels_position"]
+
+        initial_time = time.perf_counter()
+
+        try:
+            if ref_features_cache_dir is not None:
+                ref_features_cache = ReferenceFeatureCache(ref_features_cache_dir)
+                reference_features = ref_features_cache.get_features(reference_img, pixels_position)
+            else:
+                feature_context = FeatureContext(reference_img=reference_img,
+                                                 pixels_position=pixels_position)
+                reference_features = compute_features(ref_column_list, feature_context)
+        except Exception:
+            # Let process_image() compute them again and report the error
+            reference_features = None
+
+        reference_features_time_sec = time.perf_counter() - initial_time
+
+    image_dict_list = []
+
+    for cleaning_algorithm, cleaning_function_params in configuration_list:
+        image_dict = cleaning_algorithm.process_image(input_file_path,
+                                                      cleaning_function_params,
+                                                      benchmark_method,
+                                                      saveplot_per_image=saveplot_per_image,
+                                                      ref_img_as_input=ref_img_as_input,
+                                                      preloaded_images=preloaded_images,
+                                                      reference_features=reference_features,
+                                                      output_column_list=output_column_list)
+
+        stage_duration_dict = image_dict.get("stage_execution_time_sec")
+        if stage_duration_dict is not None:
+            stage_duration_dict["reference_features"] = stage_duration_dict.get("reference_features", 0.) + reference_features_time_sec
+
+        image_dict_list.append(image_dict)
+
+    return image_dict_list
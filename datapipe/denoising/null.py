@@ -47,6 +47,14 @@ class Null(AbstractCleaningAlgorithm):
     def clean_image(self, img, output_data_dict=None):
         return copy.deepcopy(img)
 
+    def clean_images(self, input_img_stack, output_data_dict_list=None, **cleaning_function_params):
+        input_img_stack = np.array(input_img_stack, copy=True)
+
+        if input_img_stack.ndim != 3:
+            raise ValueError("The image stack should be a 3D array (got a {}D array)".format(input_img_stack.ndim))
+
+        return input_img_stack
+
 
 def main():
 
@@ -67,6 +75,27 @@ def main():
                         metavar="FILE",
                         help="The output file path (JSON)")
 
+    parser.add_argument("--num-workers", type=int, default=None, metavar="INTEGER",
+                        help="The number of worker processes used to process images in parallel (0: one per CPU). Default: no parallelism.")
+
+    parser.add_argument("--parallel-backend", default="concurrent.futures",
+                        help="The process pool implementation used when --num-workers is set ('concurrent.futures' or 'multiprocessing'). Default='concurrent.futures'.")
+
+    parser.add_argument("--output-format", default="json",
+                        help="The output file format: 'json' (written at the end of the run) or 'jsonl' (one JSON record per image, written as soon as it is processed). Default='json'.")
+
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted 'jsonl' run: skip the images already recorded in the output file and append the new ones to it.")
+
+    parser.add_argument("--ref-features-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where the features of reference images are cached (they are computed for each run if this option is not set).")
+
+    parser.add_argument("--prefetch-depth", type=int, default=0, metavar="INTEGER",
+                        help="The number of FITS files read in advance by a background thread while the current image is cleaned (0 to disable prefetching). Default=0.")
+
+    parser.add_argument("--prefetch-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum memory size (in MB) of the images read in advance. Default: no limit.")
+
     parser.add_argument("fileargs", nargs="+", metavar="FILE",
                         help="The files image to process (FITS)."
                              "If fileargs is a directory,"
@@ -77,6 +106,14 @@ def main():
 
     benchmark_method = args.benchmark
     label = args.label
+    num_workers = args.num_workers
+    parallel_backend = args.parallel_backend
+    output_format = args.output_format
+    resume = args.resume
+    ref_features_cache_dir = args.ref_features_cache
+    prefetch_depth = args.prefetch_depth
+    prefetch_max_bytes = None if args.prefetch_max_mb is None else int(args.prefetch_max_mb * 1e6)
+
     input_file_or_dir_path_list = args.fileargs
 
     if args.output is None:
@@ -94,7 +131,14 @@ def main():
     cleaning_algorithm.run(cleaning_function_params,
                            input_file_or_dir_path_list,
                            benchmark_method,
-                           output_file_path)
+                           output_file_path,
+                           num_workers=num_workers,
+                           parallel_backend=parallel_backend,
+                           output_format=output_format,
+                           resume=resume,
+                           ref_features_cache_dir=ref_features_cache_dir,
+                           prefetch_depth=prefetch_depth,
+                           prefetch_max_bytes=prefetch_max_bytes)
 
 
 if __name__ == "__main__":
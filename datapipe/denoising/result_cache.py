@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Cache the results of cleaning algorithms.
+
+Optimizers (`datapipe.optimization`) often evaluate the same parameters
+several times on the same images (e.g. `saes` and `differential_evolution`
+re-evaluate identical candidates and runs are frequently restarted). This
+module stores each cleaned image on disk, identified by a hash of the input
+image, of the cleaning algorithm class and of its (canonicalized)
+parameters, so that a repeated (image, parameters) pair is read from the
+cache instead of running Tailcut or mr_filter again.
+
+Remark: algorithms injecting random noise in blank pixels (the
+`noise_distribution` parameter) are not deterministic; cached results
+always use the noise drawn by the first call.
+"""
+
+__all__ = ['CleaningResultCache',
+           'canonicalize_params',
+           'get_process_result_cache']
+
+import hashlib
+import json
+import numbers
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+# These parameters don't change the cleaned image
+EXCLUDED_PARAMS = ("output_data_dict",
+                   "verbose",
+                   "plane_cache",
+                   "tmp_files_directory",
+                   "mrfilter_directory",
+                   "mrfilter_timeout_sec")
+
+# Objects are canonicalized from their attributes up to this depth
+MAX_OBJECT_DEPTH = 4
+
+# Increment this number when the canonicalization or the entry format change
+# (this invalidates all cache entries).
+CACHE_VERSION = 2
+
+# When the cache exceeds its size limit, the least recently used entries are
+# removed until it is lower than this fraction of the limit (so that the
+# cache directory is not walked again at the next saves)
+EVICTION_TARGET_RATIO = 0.8
+
+# The cache instances of this process (see `get_process_result_cache()`)
+_process_cache_dict = {}
+_process_cache_lock = threading.Lock()
+
+###############################################################################
+
+def _canonicalize(value, depth=0):
+    """Return a JSON serializable representation of `value` which only
+    depends on its content.
+
+    Objects are represented by the result of their `get_canonical_state()`
+    method if they have one, by their attributes otherwise.
+    """
+
+    if (value is None) or isinstance(value, (bool, str)):
+        return value
+    elif isinstance(value, numbers.Number) and not isinstance(value, np.ndarray):
+        value = float(value)
+        return value if np.isfinite(value) else repr(value)
+    elif isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        hash_object = hashlib.sha1(array.tobytes())
+        return {"ndarray": [array.dtype.str, list(array.shape), hash_object.hexdigest(), str(getattr(value, "unit", ""))]}
+    elif isinstance(value, dict):
+        return {str(key): _canonicalize(item, depth) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+    elif isinstance(value, (list, tuple)):
+        return [_canonicalize(item, depth) for item in value]
+    elif hasattr(value, "get_canonical_state"):
+        # Objects defining their own canonical state (e.g. the noise
+        # distributions, whose random generator doesn't identify them)
+        return {"object": type(value).__module__ + "." + type(value).__qualname__,
+                "state": _canonicalize(value.get_canonical_state(), depth + 1)}
+    elif hasattr(value, "__dict__") and (depth < MAX_OBJECT_DEPTH):
+        return {"object": type(value).__module__ + "." + type(value).__qualname__,
+                "state": _canonicalize(vars(value), depth + 1)}
+    else:
+        return repr(value)
+
+
+def _json_default(value):
+    """Convert the Numpy items of `output_data_dict` to JSON."""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return str(value)
+
+
+def canonicalize_params(params):
+    """Return a canonical JSON string of cleaning parameters.
+
+    Parameters which don't change the result (e.g. "verbose" or
+    "output_data_dict", see `EXCLUDED_PARAMS`) are ignored, numbers are
+    converted to floats (thus `3` and `3.0` are the same parameter) and
+    arrays or objects (e.g. a camera geometry or a noise distribution) are
+    represented by their content.
+    """
+
+    params = {name: value for name, value in params.items() if name not in EXCLUDED_PARAMS}
+
+    return json.dumps(_canonicalize(params), sort_keys=True)
+
+
+def get_process_result_cache(cache_dir, max_bytes=None):
+    """Return the `CleaningResultCache` of `cache_dir` used by this process.
+
+    The instance is created at the first call and then reused, so that the
+    cache directory is only walked once per process.
+    """
+
+    key = (os.path.abspath(cache_dir), max_bytes)
+
+    with _process_cache_lock:
+        if key not in _process_cache_dict:
+            _process_cache_dict[key] = CleaningResultCache(cache_dir, max_bytes=max_bytes)
+        return _process_cache_dict[key]
+
+
+class CleaningResultCache(object):
+    """A persistent cache of cleaned images.
+
+    Each entry is a `.npz` file stored in `cache_dir` containing the cleaned
+    image and the `output_data_dict` items written by the cleaning
+    algorithm. Entries are written atomically so the same cache directory
+    can be used concurrently by several processes.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The cache directory.
+    max_bytes : int
+        The maximum size (in bytes) of the cache directory (`None` for no
+        limit). When it is exceeded, the least recently used entries are
+        removed (see `EVICTION_TARGET_RATIO`).
+
+    Notes
+    -----
+    The size of the cache directory is only read at the first save; then
+    it is a running total of the entries saved by this instance (entries
+    saved by other processes are counted at the next eviction).
+
+    A cache sent to worker processes (e.g. with the `functools.partial`
+    given to `datapipe.utils.parallel.parallel_map()`) is unpickled as the
+    single instance of each worker returned by `get_process_result_cache()`,
+    thus the running total is kept between the images of a worker.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self.num_bytes = None       # The running size total (None until the first save)
+
+    def __reduce__(self):
+        return (get_process_result_cache, (self.cache_dir, self.max_bytes))
+
+    def get_key(self, input_img, cleaning_algorithm, params):
+        """Return the key of the entry of `input_img` cleaned by
+        `cleaning_algorithm` with `params`."""
+
+        input_img = np.ascontiguousarray(input_img)
+
+        # Wrappers (e.g. RoiCleaning) are also identified by the algorithm
+        # they wrap (their "cleaning_algorithm" attribute)
+        algorithm_name_list = []
+        while cleaning_algorithm is not None:
+            algorithm_class = type(cleaning_algorithm)
+            algorithm_name_list.append("{}.{}".format(algorithm_class.__module__, algorithm_class.__qualname__))
+            cleaning_algorithm = getattr(cleaning_algorithm, "cleaning_algorithm", None)
+
+        hash_object = hashlib.sha1()
+        hash_object.update("v{};{};{};{}".format(CACHE_VERSION,
+                                                 "/".join(algorithm_name_list),
+                                                 input_img.shape,
+                                                 input_img.dtype.str).encode())
+        hash_object.update(input_img.tobytes())
+        hash_object.update(canonicalize_params(params).encode())
+
+        return hash_object.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npz")
+
+    def load(self, key):
+        """Return the `(cleaned_img, output_data_dict)` saved with `key` or
+        `None` if there is no (valid) entry for `key`."""
+
+        entry_path = self.get_entry_path(key)
+
+        try:
+            with np.load(entry_path, allow_pickle=False) as npz_file:
+                cleaned_img = npz_file["cleaned_img"]
+                output_data_dict = json.loads(str(npz_file["output_data_json"]))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Mark the entry as recently used (for the eviction)
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return cleaned_img, output_data_dict
+
+    def save(self, key, cleaned_img, output_data_dict=None):
+        """Save `cleaned_img` and `output_data_dict` with `key`."""
+
+        if output_data_dict is None:
+            output_data_dict = {}
+
+        entry_path = self.get_entry_path(key)
+        entry_dir = os.path.dirname(entry_path)
+
+        os.makedirs(entry_dir, exist_ok=True)
+
+        try:
+            replaced_entry_size = os.path.getsize(entry_path)
+        except OSError:
+            replaced_entry_size = 0
+
+        # Write a temporary file then rename it so that concurrent readers
+        # never see a partially written entry
+        fd, tmp_file_path = tempfile.mkstemp(dir=entry_dir, prefix=".tmp_", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as tmp_fd:
+                np.savez(tmp_fd,
+                         cleaned_img=np.asarray(cleaned_img),
+                         output_data_json=np.array(json.dumps(output_data_dict, default=_json_default)))
+            os.replace(tmp_file_path, entry_path)
+        except:
+            os.remove(tmp_file_path)
+            raise
+
+        if self.max_bytes is not None:
+            if self.num_bytes is None:
+                self.num_bytes = sum(size for mtime, size, path in self._scan_entries())
+            else:
+                self.num_bytes += os.path.getsize(entry_path) - replaced_entry_size
+
+            if self.num_bytes > self.max_bytes:
+                self.evict(int(self.max_bytes * EVICTION_TARGET_RATIO))
+
+    def _scan_entries(self):
+        """Return the `(mtime, size, path)` tuple of each cache entry."""
+
+        entry_list = []
+
+        for sub_dir_entry in os.scandir(self.cache_dir):
+            if not sub_dir_entry.is_dir():
+                continue
+            for dir_entry in os.scandir(sub_dir_entry.path):
+                if dir_entry.name.endswith(".npz") and not dir_entry.name.startswith(".tmp_"):
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue    # Removed by another process
+                    entry_list.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+        return entry_list
+
+    def evict(self, target_bytes=None):
+        """Remove the least recently used entries until the cache size is
+        lower than `target_bytes` (default: `max_bytes`)."""
+
+        if target_bytes is None:
+            target_bytes = self.max_bytes
+
+        entry_list = sorted(self._scan_entries())
+        num_bytes = sum(size for mtime, size, entry_path in entry_list)
+
+        for mtime, size, entry_path in entry_list:
+            if num_bytes <= target_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass        # Already removed by another process
+            num_bytes -= size
+
+        self.num_bytes = num_bytes
+
+    def clean_image(self, cleaning_algorithm, input_img, output_data_dict=None, **params):
+        """Return `cleaning_algorithm.clean_image(input_img, **params)`; the
+        cleaned image is only computed (and saved) if it is not already in
+        the cache.
+
+        The `output_data_dict` items written by the cleaning algorithm are
+        saved with the cleaned image and restored on cache hits.
+        """
+
+        key = self.get_key(input_img, cleaning_algorithm, params)
+
+        entry = self.load(key)
+
+        if entry is not None:
+            cleaned_img, cached_output_data_dict = entry
+            if output_data_dict is not None:
+                output_data_dict.update(cached_output_data_dict)
+            return cleaned_img
+
+        algorithm_output_data_dict = {}
+
+        cleaned_img = cleaning_algorithm.clean_image(input_img, output_data_dict=algorithm_output_data_dict, **params)
+
+        self.save(key, cleaned_img, algorithm_output_data_dict)
+
+        if output_data_dict is not None:
+            output_data_dict.update(algorithm_output_data_dict)
+
+        return cleaned_img
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Clean only the region of interest (ROI) of images.
+
+Most pixels of a gamma image are pure noise far from the shower. The
+`RoiCleaning` wrapper detects a coarse ROI (the bounding box of the pixels
+above a low threshold, extended by the support radius of the wavelet
+transform), runs the wrapped cleaning algorithm on this sub-array only and
+pastes its result in an image of zeros.
+
+Example:
+
+    from datapipe.denoising.roi_cleaning import RoiCleaning
+    from datapipe.denoising.wavelets_mrfilter import WaveletTransform
+
+    cleaning_algorithm = RoiCleaning(WaveletTransform())
+    cleaned_img = cleaning_algorithm.clean_image(input_img,
+                                                 roi_k_sigma=3.,
+                                                 type_of_filtering=1,
+                                                 number_of_scales=4)
+
+The result only approximates the cleaning of the whole image: the wrapped
+algorithm sees the borders of the ROI instead of the borders of the image
+and estimates the noise level on less pixels.
+"""
+
+__all__ = ['RoiCleaning',
+           'get_roi_slices']
+
+import numpy as np
+import time
+
+from datapipe.denoising.abstract_cleaning_algorithm import AbstractCleaningAlgorithm
+from datapipe.denoising.mrfilter_engine import get_guard_band_width
+from datapipe.image.kill_isolated_pixels import get_islands
+
+DEFAULT_NUMBER_OF_SCALES = 4
+
+###############################################################################
+
+def get_roi_slices(input_img, threshold=None, k_sigma=3., min_island_size=2, margin=None):
+    """Return the region of interest of `input_img`.
+
+    Parameters
+    ----------
+    input_img : array_like
+        The image (2D array, may contain NaN pixels).
+    threshold : float
+        The detection threshold. If `None`, it is `k_sigma` times the noise
+        standard deviation above the median of the image (the noise is
+        estimated with the median absolute deviation of the image, which is
+        dominated by noise pixels).
+    k_sigma : float
+        See `threshold`.
+    min_island_size : int
+        Islands of pixels above the threshold smaller than this number of
+        pixels are considered as noise and ignored.
+    margin : int
+        The number of pixels added on each side of the bounding box of the
+        detected pixels. If `None`, the support radius of a 4 scales wavelet
+        transform is used (see
+        `datapipe.denoising.mrfilter_engine.get_guard_band_width()`).
+
+    Returns
+    -------
+    tuple
+        The `(row_slice, column_slice)` of the ROI or `None` if no signal is
+        detected.
+    """
+
+    input_img = np.asarray(input_img, dtype=np.float64)
+
+    if input_img.ndim != 2:
+        raise ValueError("The input image should be a 2D array (got a {}D array)".format(input_img.ndim))
+
+    if margin is None:
+        margin = get_guard_band_width(DEFAULT_NUMBER_OF_SCALES)
+
+    if threshold is None:
+        finite_pixels = input_img[np.isfinite(input_img)]
+
+        if len(finite_pixels) == 0:
+            return None
+
+        median = np.median(finite_pixels)
+        sigma = 1.4826 * np.median(np.abs(finite_pixels - median))
+        threshold = median + k_sigma * sigma
+
+    filtered_img, label_array, num_labels = get_islands(input_img, threshold)
+
+    # Ignore small islands (label 0 is the "sea")
+    island_size_array = np.bincount(label_array.ravel(), minlength=num_labels + 1)
+    island_mask = island_size_array >= min_island_size
+    island_mask[0] = False
+
+    signal_mask = island_mask[label_array]
+
+    if not np.any(signal_mask):
+        return None
+
+    row_index_array = np.flatnonzero(np.any(signal_mask, axis=1))
+    column_index_array = np.flatnonzero(np.any(signal_mask, axis=0))
+
+    row_slice = slice(max(row_index_array[0] - margin, 0),
+                      min(row_index_array[-1] + margin + 1, input_img.shape[0]))
+    column_slice = slice(max(column_index_array[0] - margin, 0),
+                         min(column_index_array[-1] + margin + 1, input_img.shape[1]))
+
+    return row_slice, column_slice
+
+
+class RoiCleaning(AbstractCleaningAlgorithm):
+    """Run `cleaning_algorithm` on the region of interest of images only.
+
+    Parameters
+    ----------
+    cleaning_algorithm : AbstractCleaningAlgorithm
+        The wrapped cleaning algorithm.
+    """
+
+    def __init__(self, cleaning_algorithm):
+        super().__init__()
+        self.cleaning_algorithm = cleaning_algorithm
+        self.label = "{} (ROI)".format(cleaning_algorithm.label)  # Name to show in plots
+
+    def clean_image(self,
+                    input_img,
+                    roi_threshold=None,
+                    roi_k_sigma=3.,
+                    roi_min_island_size=2,
+                    roi_margin=None,
+                    measure_roi_speedup=False,
+                    output_data_dict=None,
+                    **cleaning_function_params):
+        """Clean the region of interest of `input_img` with the wrapped
+        algorithm.
+
+        Pixels outside the ROI are set to 0 (NaN pixels are kept NaN). If no
+        signal is detected, the whole cleaned image is 0.
+
+        Parameters
+        ----------
+        input_img : array_like
+            The image to clean.
+        roi_threshold, roi_k_sigma, roi_min_island_size
+            See the `threshold`, `k_sigma` and `min_island_size` parameters
+            of `get_roi_slices()`.
+        roi_margin : int
+            See the `margin` parameter of `get_roi_slices()`. If `None`, the
+            support radius of the wavelet transform defined by the
+            `number_of_scales` parameter of the wrapped algorithm is used.
+        measure_roi_speedup : bool
+            If True and `output_data_dict` is not `None`, the whole image is
+            also cleaned (its result is not used) to measure the actual
+            speedup ("roi_speedup" item of `output_data_dict`). This is only
+            useful for benchmarks.
+        output_data_dict : dict
+            If not `None`, the ROI shape ("roi_shape"), the fraction of the
+            image pixels it contains ("roi_pixel_fraction") and the cleaning
+            time of the ROI ("roi_clean_time_sec") are written in it, plus
+            the items written by the wrapped algorithm.
+        cleaning_function_params
+            The parameters of the wrapped algorithm.
+        """
+
+        input_img = np.asarray(input_img, dtype=np.float64)
+
+        if roi_margin is None:
+            number_of_scales = cleaning_function_params.get("number_of_scales", None)
+            if number_of_scales is None:
+                number_of_scales = DEFAULT_NUMBER_OF_SCALES
+            roi_margin = get_guard_band_width(number_of_scales)
+
+        roi_slices = get_roi_slices(input_img,
+                                    threshold=roi_threshold,
+                                    k_sigma=roi_k_sigma,
+                                    min_island_size=roi_min_island_size,
+                                    margin=roi_margin)
+
+        if output_data_dict is not None:
+            cleaning_function_params["output_data_dict"] = output_data_dict
+
+        cleaned_img = np.zeros(input_img.shape)
+
+        initial_time = time.perf_counter()
+
+        if roi_slices is not None:
+            roi_img = input_img[roi_slices].copy()
+            cleaned_img[roi_slices] = self.cleaning_algorithm.clean_image(roi_img, **cleaning_function_params)
+            roi_shape = roi_img.shape
+        else:
+            roi_shape = (0, 0)
+
+        roi_clean_time_sec = time.perf_counter() - initial_time
+
+        cleaned_img[np.isnan(input_img)] = np.nan
+
+        if output_data_dict is not None:
+            output_data_dict["roi_shape"] = list(roi_shape)
+            output_data_dict["roi_pixel_fraction"] = float(roi_shape[0] * roi_shape[1]) / input_img.size
+            output_data_dict["roi_clean_time_sec"] = roi_clean_time_sec
+
+        if measure_roi_speedup and (output_data_dict is not None):
+            # Don't let the full image cleaning overwrite the ROI outputs
+            cleaning_function_params["output_data_dict"] = {}
+
+            initial_time = time.perf_counter()
+            self.cleaning_algorithm.clean_image(input_img.copy(), **cleaning_function_params)
+            full_clean_time_sec = time.perf_counter() - initial_time
+
+            output_data_dict["roi_full_clean_time_sec"] = full_clean_time_sec
+            output_data_dict["roi_speedup"] = full_clean_time_sec / max(roi_clean_time_sec, 1e-9)
+
+        return cleaned_img
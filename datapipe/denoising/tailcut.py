@@ -43,7 +43,9 @@ import datapipe.denoising
 from datapipe.denoising.abstract_cleaning_algorithm import AbstractCleaningAlgorithm
 from datapipe.benchmark import assess
 from datapipe.io import images
-from datapipe.io import geometry_converter
+from datapipe.denoising.tailcut_engine import get_tailcut_engine
+from datapipe.io import geometry_cache
+from datapipe.io.geometry_registry import get_geometry_mapping
 
 from datapipe.image.kill_isolated_pixels import kill_isolated_pixels as scipy_kill_isolated_pixels
 from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stats
@@ -65,25 +67,68 @@ class Tailcut(AbstractCleaningAlgorithm):
                     kill_isolated_pixels=False,
                     verbose=False,
                     geom=None,
+                    boundary_dilation_rounds=1,
+                    tailcut_engine="csr",
                     output_data_dict=None):
         """
         vim ./ctapipe/reco/cleaning.py ./ctapipe/reco/tests/test_cleaning.py ./ctapipe/tools/camdemo.py ./examples/read_hessio_single_tel.py
+
+        `tailcut_engine` is either "csr" (the native implementation of
+        `datapipe.denoising.tailcut_engine`, which works directly on 2D
+        images, the default) or "ctapipe" (ctapipe's `tailcuts_clean()` on
+        1D images). Both engines give the same images: NaN (blank) pixels
+        have the value 0 for the thresholds (thus they are picture or
+        boundary pixels when thresholds are lower than or equal to 0) and
+        are set back to NaN in the cleaned image.
+        `boundary_dilation_rounds` is only supported by the "csr" engine.
         """
 
         if geom is None:
             raise Exception("Geom have to be defined")    # TODO
 
+        if tailcut_engine == "csr":
+            cleaned_img = get_tailcut_engine(geom).clean(input_img,
+                                                         high_threshold=high_threshold,
+                                                         low_threshold=low_threshold,
+                                                         boundary_dilation_rounds=boundary_dilation_rounds)
+        elif tailcut_engine == "ctapipe":
+            if boundary_dilation_rounds != 1:
+                raise ValueError("The ctapipe tailcut engine doesn't support boundary_dilation_rounds")
+            cleaned_img = self._ctapipe_tailcut(input_img, high_threshold, low_threshold, geom)
+        else:
+            raise ValueError("Unknown tailcut engine: {}".format(tailcut_engine))
+
+        # KILL ISOLATED PIXELS #################################
+
+        img_cleaned_islands_delta_pe, img_cleaned_islands_delta_abs_pe, img_cleaned_islands_delta_num_pixels = kill_isolated_pixels_stats(cleaned_img)
+        img_cleaned_num_islands = number_of_islands(cleaned_img)
+
+        if output_data_dict is not None:
+            output_data_dict["img_cleaned_islands_delta_pe"] = img_cleaned_islands_delta_pe
+            output_data_dict["img_cleaned_islands_delta_abs_pe"] = img_cleaned_islands_delta_abs_pe
+            output_data_dict["img_cleaned_islands_delta_num_pixels"] = img_cleaned_islands_delta_num_pixels
+            output_data_dict["img_cleaned_num_islands"] = img_cleaned_num_islands
+
+        if kill_isolated_pixels:
+            if verbose:
+                print("Kill isolated pixels")
+            cleaned_img = scipy_kill_isolated_pixels(cleaned_img)
+
+        return cleaned_img
+
+    def _ctapipe_tailcut(self, input_img, high_threshold, low_threshold, geom):
+        """Apply ctapipe's tailcut cleaning on the 1D version of `input_img`."""
+
         # 2D ARRAY (FITS IMAGE) TO CTAPIPE IMAGE ###############
 
-        if geom.cam_id.lower() in ("astri", "astricam"):
-            img_1d = geometry_converter.array_2d_to_astri(input_img)
-        elif geom.cam_id.lower() in ("astri_cropped", "digicam2d", "flashcam2d", "nectarcam2d", "lstcam2d"):
-            img_1d = input_img.flatten()
-            img_1d[np.isnan(img_1d)] = 0
-        elif geom.cam_id.lower() in ("gct", "gate", "chec"):
-            img_1d = geometry_converter.array_2d_to_gct(input_img)
-        else:
-            raise Exception("Unknown cam_id")    # TODO
+        mapping = get_geometry_mapping(geom.cam_id)
+
+        if hasattr(geom, "to_ctapipe"):
+            # Compiled geometry (see datapipe.io.geometry_cache)
+            geom = geom.to_ctapipe()
+
+        img_1d = mapping.to_1d(input_img)
+        img_1d[np.isnan(img_1d)] = 0
 
         # APPLY TAILCUT CLEANING ##############################
 
@@ -103,39 +148,8 @@ class Tailcut(AbstractCleaningAlgorithm):
 
         # CTAPIPE IMAGE TO 2D ARRAY (FITS IMAGE) ###############
 
-        if geom.cam_id.lower() in ("astri", "astricam"):
-            cleaned_img = geometry_converter.astri_to_2d_array(img_1d, crop=False)
-        elif geom.cam_id.lower() in ("astri_cropped"):
-            cleaned_img = img_1d.reshape(40, 40)
-        elif geom.cam_id.lower() in ("gct", "gate", "chec"):
-            cleaned_img = geometry_converter.gct_to_2d_array(img_1d)
-        elif geom.cam_id.lower() in ("digicam2d"):
-            cleaned_img = img_1d.reshape(48, 48)
-            cleaned_img[np.isnan(input_img)] = np.nan
-        elif geom.cam_id.lower() in ("flashcam2d"):
-            cleaned_img = img_1d.reshape(56, 56)
-            cleaned_img[np.isnan(input_img)] = np.nan
-        elif geom.cam_id.lower() in ("nectarcam2d", "lstcam2d"):
-            cleaned_img = img_1d.reshape(55, 55)
-            cleaned_img[np.isnan(input_img)] = np.nan
-        else:
-            raise Exception("Unknown cam_id")    # TODO
-
-        # KILL ISOLATED PIXELS #################################
-
-        img_cleaned_islands_delta_pe, img_cleaned_islands_delta_abs_pe, img_cleaned_islands_delta_num_pixels = kill_isolated_pixels_stats(cleaned_img)
-        img_cleaned_num_islands = number_of_islands(cleaned_img)
-
-        if output_data_dict is not None:
-            output_data_dict["img_cleaned_islands_delta_pe"] = img_cleaned_islands_delta_pe
-            output_data_dict["img_cleaned_islands_delta_abs_pe"] = img_cleaned_islands_delta_abs_pe
-            output_data_dict["img_cleaned_islands_delta_num_pixels"] = img_cleaned_islands_delta_num_pixels
-            output_data_dict["img_cleaned_num_islands"] = img_cleaned_num_islands
-
-        if kill_isolated_pixels:
-            if verbose:
-                print("Kill isolated pixels")
-            cleaned_img = scipy_kill_isolated_pixels(cleaned_img)
+        cleaned_img = mapping.to_2d(img_1d)
+        cleaned_img[np.isnan(input_img)] = np.nan
 
         return cleaned_img
 
@@ -152,6 +166,12 @@ def main():
     parser.add_argument("--low_threshold", "-t", type=float, default=0, metavar="FLOAT", 
                         help="The 'low' threshold value")
 
+    parser.add_argument("--boundary-dilation-rounds", type=int, default=1, metavar="INTEGER",
+                        help="The number of rounds adding boundary pixels next to the cleaning mask (default: 1, i.e. the usual tailcut)")
+
+    parser.add_argument("--tailcut-engine", default="csr",
+                        help="The tailcut implementation: 'csr' (native, on 2D images) or 'ctapipe'. Default='csr'.")
+
     parser.add_argument("--kill-isolated-pixels", action="store_true",
                         help="Suppress isolated pixels in the support (scipy implementation)")
 
@@ -182,6 +202,33 @@ def main():
                         metavar="FILE",
                         help="The path of the file that defines the geometry of the telescope (GEOM.JSON)")
 
+    parser.add_argument("--num-workers", type=int, default=None, metavar="INTEGER",
+                        help="The number of worker processes used to process images in parallel (0: one per CPU). Default: no parallelism.")
+
+    parser.add_argument("--parallel-backend", default="concurrent.futures",
+                        help="The process pool implementation used when --num-workers is set ('concurrent.futures' or 'multiprocessing'). Default='concurrent.futures'.")
+
+    parser.add_argument("--output-format", default="json",
+                        help="The output file format: 'json' (written at the end of the run) or 'jsonl' (one JSON record per image, written as soon as it is processed). Default='json'.")
+
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted 'jsonl' run: skip the images already recorded in the output file and append the new ones to it.")
+
+    parser.add_argument("--ref-features-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where the features of reference images are cached (they are computed for each run if this option is not set).")
+
+    parser.add_argument("--result-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where cleaned images are cached (an image cleaned with the same parameters is read from this cache instead of being cleaned again). Default: no cache.")
+
+    parser.add_argument("--result-cache-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum size (in MB) of the result cache directory (the least recently used images are removed). Default: no limit.")
+
+    parser.add_argument("--prefetch-depth", type=int, default=0, metavar="INTEGER",
+                        help="The number of FITS files read in advance by a background thread while the current image is cleaned (0 to disable prefetching). Default=0.")
+
+    parser.add_argument("--prefetch-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum memory size (in MB) of the images read in advance. Default: no limit.")
+
     parser.add_argument("fileargs", nargs="+", metavar="FILE",
                         help="The files image to process (FITS)."
                              "If fileargs is a directory,"
@@ -192,6 +239,8 @@ def main():
     high_threshold = args.high_threshold
     low_threshold = args.low_threshold
     kill_isolated_pixels = args.kill_isolated_pixels
+    boundary_dilation_rounds = args.boundary_dilation_rounds
+    tailcut_engine = args.tailcut_engine
     geom_path = args.geom
     verbose = args.verbose
 
@@ -200,6 +249,16 @@ def main():
     plot = args.plot
     saveplot = args.saveplot
 
+    num_workers = args.num_workers
+    parallel_backend = args.parallel_backend
+    output_format = args.output_format
+    resume = args.resume
+    ref_features_cache_dir = args.ref_features_cache
+    result_cache_dir = args.result_cache
+    result_cache_max_bytes = None if args.result_cache_max_mb is None else int(args.result_cache_max_mb * 1e6)
+    prefetch_depth = args.prefetch_depth
+    prefetch_max_bytes = None if args.prefetch_max_mb is None else int(args.prefetch_max_mb * 1e6)
+
     input_file_or_dir_path_list = args.fileargs
 
     if args.output is None:
@@ -207,14 +266,16 @@ def main():
     else:
         output_file_path = args.output
 
-    geom = geometry_converter.json_file_to_geom(geom_path)
+    geom = geometry_cache.load_geometry(geom_path)
 
     cleaning_function_params = {
                 "high_threshold": high_threshold,
                 "low_threshold": low_threshold,
                 "kill_isolated_pixels": kill_isolated_pixels,
                 "verbose": verbose,
-                "geom": geom
+                "geom": geom,
+                "boundary_dilation_rounds": boundary_dilation_rounds,
+                "tailcut_engine": tailcut_engine
             }
 
     cleaning_algorithm = Tailcut()
@@ -227,7 +288,16 @@ def main():
                                          benchmark_method,
                                          output_file_path,
                                          plot=plot,
-                                         saveplot=saveplot)
+                                         saveplot=saveplot,
+                                         num_workers=num_workers,
+                                         parallel_backend=parallel_backend,
+                                         output_format=output_format,
+                                         resume=resume,
+                                         ref_features_cache_dir=ref_features_cache_dir,
+                                         prefetch_depth=prefetch_depth,
+                                         prefetch_max_bytes=prefetch_max_bytes,
+                                         result_cache_dir=result_cache_dir,
+                                         result_cache_max_bytes=result_cache_max_bytes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+A native implementation of the tailcut cleaning based on a sparse pixel
+adjacency matrix.
+
+The neighbor lists of a camera geometry (the "neighbors" item of
+`datapipe/io/geom/*.geom.json` files) are converted once into a CSR
+adjacency matrix expressed in the pixel space of the 2D images used by the
+benchmarks. Then, counting the picture (or boundary) neighbors of every
+pixel is a single sparse matrix-vector product on the flattened 2D image:
+there is no conversion to ctapipe 1D images and no geometry dispatch per
+image.
+
+Example:
+
+    from datapipe.denoising.tailcut_engine import get_tailcut_engine
+    from datapipe.io import geometry_cache
+
+    geom = geometry_cache.load_geometry("lstcam2d.geom.json")
+    engine = get_tailcut_engine(geom)
+    cleaned_img = engine.clean(input_img, high_threshold=10., low_threshold=5.)
+"""
+
+__all__ = ['TailcutEngine',
+           'get_neighbor_matrix',
+           'get_tailcut_engine']
+
+import numpy as np
+import scipy.sparse
+import threading
+
+from datapipe.io.geometry_cache import load_geometry
+from datapipe.io.geometry_registry import get_geometry_mapping
+
+###############################################################################
+
+def get_neighbor_matrix(neighbors, num_pixels=None, pixel_index_array=None, image_size=None):
+    """Return the adjacency matrix of a camera geometry as a CSR matrix.
+
+    Parameters
+    ----------
+    neighbors : list of lists or scipy.sparse matrix
+        The neighbors of each pixel (the "neighbors" item of geometry files)
+        or the adjacency matrix of the pixels.
+    num_pixels : int
+        The number of pixels of the camera (`len(neighbors)` if `None`).
+    pixel_index_array : array_like
+        If not `None`, the index of each camera pixel in another pixel space
+        (e.g. the flattened 2D image) of `image_size` pixels. The matrix is
+        expressed in this pixel space.
+    image_size : int
+        The number of pixels of the `pixel_index_array` space.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        An `int8` matrix where `M[i, j]` is 1 if pixels `i` and `j` are
+        neighbors.
+    """
+
+    if scipy.sparse.issparse(neighbors):
+        neighbors = neighbors.tocoo()
+        num_pixels = neighbors.shape[0]
+        row_array = neighbors.row.astype(np.int64)
+        column_array = neighbors.col.astype(np.int64)
+    else:
+        if num_pixels is None:
+            num_pixels = len(neighbors)
+
+        row_array = np.repeat(np.arange(num_pixels), [len(pixel_neighbors) for pixel_neighbors in neighbors])
+        column_array = np.fromiter((neighbor for pixel_neighbors in neighbors for neighbor in pixel_neighbors),
+                                   dtype=np.int64,
+                                   count=len(row_array))
+
+    if pixel_index_array is not None:
+        pixel_index_array = np.asarray(pixel_index_array)
+        row_array = pixel_index_array[row_array]
+        column_array = pixel_index_array[column_array]
+        num_pixels = image_size
+
+    data_array = np.ones(len(row_array), dtype=np.int8)
+
+    neighbor_matrix = scipy.sparse.csr_matrix((data_array, (row_array, column_array)),
+                                              shape=(num_pixels, num_pixels))
+
+    # Duplicate neighbors are summed by the constructor
+    neighbor_matrix.data[:] = 1
+
+    return neighbor_matrix
+
+
+def _get_pixel_index_array(cam_id, num_pixels):
+    """Return the index of each camera pixel in the flattened 2D images of
+    `cam_id` and the shape of these images."""
+
+    mapping = get_geometry_mapping(cam_id)
+
+    if mapping.num_pixels != num_pixels:
+        raise ValueError("Unexpected number of pixels for {}: {}".format(cam_id, num_pixels))
+
+    return mapping.inverse_index_map, mapping.image_shape
+
+
+def _nan_to_zero(img):
+    """Return `img` with NaN pixels set to 0 (a copy if there are NaN
+    pixels)."""
+
+    nan_mask = np.isnan(img)
+
+    if np.any(nan_mask):
+        img = np.where(nan_mask, 0., img)
+
+    return img
+
+
+class TailcutEngine(object):
+    """Tailcut cleaning of the 2D images of a camera.
+
+    Parameters
+    ----------
+    neighbors : list of lists
+        The neighbors of each camera pixel.
+    pixel_index_array : array_like
+        The index of each camera pixel in the flattened 2D images.
+    image_shape : tuple
+        The shape of the 2D images.
+    """
+
+    def __init__(self, neighbors, pixel_index_array, image_shape):
+        self.image_shape = tuple(image_shape)
+        self.neighbor_matrix = get_neighbor_matrix(neighbors,
+                                                   pixel_index_array=pixel_index_array,
+                                                   image_size=int(np.prod(self.image_shape)))
+
+    @classmethod
+    def from_geom(cls, geom):
+        """Make the engine of a ctapipe `CameraGeometry` (or any object with
+        `cam_id`, `pix_id` and `neighbors` attributes)."""
+
+        num_pixels = len(geom.pix_id)
+        pixel_index_array, image_shape = _get_pixel_index_array(geom.cam_id, num_pixels)
+
+        # Compiled geometries (see datapipe.io.geometry_cache) directly
+        # provide the adjacency matrix
+        neighbors = getattr(geom, "neighbor_matrix_sparse", None)
+        if neighbors is None:
+            neighbors = geom.neighbors
+
+        return cls(neighbors, pixel_index_array, image_shape)
+
+    @classmethod
+    def from_json_file(cls, geom_json_file_path):
+        """Make the engine of a geometry JSON file (see `datapipe.io.geom`)."""
+
+        return cls.from_geom(load_geometry(geom_json_file_path))
+
+    def get_mask(self,
+                 input_img,
+                 high_threshold=10.,
+                 low_threshold=8.,
+                 keep_isolated_pixels=False,
+                 min_number_picture_neighbors=0,
+                 boundary_dilation_rounds=1):
+        """Return the mask of the pixels kept by the tailcut cleaning.
+
+        The first round is the ctapipe `tailcuts_clean()` algorithm: picture
+        pixels (above `high_threshold`) are kept if they have a boundary
+        neighbor (unless `keep_isolated_pixels`) and boundary pixels (above
+        `low_threshold`) are kept if they have a picture neighbor. Each
+        additional round adds the boundary pixels next to the mask.
+
+        NaN (blank) pixels have the value 0 as in the "ctapipe" engine of
+        `datapipe.denoising.tailcut.Tailcut` (which sets them to 0 before
+        calling `tailcuts_clean()`): they are picture or boundary pixels
+        when the thresholds are lower than or equal to 0.
+
+        Parameters
+        ----------
+        input_img : array_like
+            The 2D image.
+        high_threshold, low_threshold : float
+            The picture and boundary thresholds.
+        keep_isolated_pixels : bool
+            If True, picture pixels are kept even if they have no boundary
+            neighbor.
+        min_number_picture_neighbors : int
+            If greater than 0 (and `keep_isolated_pixels` is False), picture
+            pixels need at least this number of picture neighbors.
+        boundary_dilation_rounds : int
+            The number of boundary rounds (at least 1).
+
+        Returns
+        -------
+        array_like
+            The boolean mask (same shape than `input_img`).
+        """
+
+        if boundary_dilation_rounds < 1:
+            raise ValueError("boundary_dilation_rounds should be greater than 0 (got {})".format(boundary_dilation_rounds))
+
+        input_img = np.asarray(input_img)
+
+        if input_img.shape != self.image_shape:
+            raise ValueError("Wrong image shape: {} (expected {})".format(input_img.shape, self.image_shape))
+
+        img_1d = _nan_to_zero(input_img.ravel())
+
+        pixels_above_picture = img_1d >= high_threshold
+        pixels_above_boundary = img_1d >= low_threshold
+
+        mask = self._merge_masks(pixels_above_picture,
+                                 pixels_above_boundary,
+                                 keep_isolated_pixels,
+                                 min_number_picture_neighbors,
+                                 boundary_dilation_rounds)
+
+        return mask.reshape(self.image_shape)
+
+    def get_mask_grid(self,
+                      input_img_stack,
+                      high_threshold_array,
+                      low_threshold_array,
+                      keep_isolated_pixels=False,
+                      min_number_picture_neighbors=0,
+                      boundary_dilation_rounds=1):
+        """Return the tailcut masks of a stack of images for several pairs
+        of thresholds.
+
+        All images and threshold pairs are processed together: the neighbor
+        counts of the `N * T` masks are computed by a single sparse matrix
+        product per step. NaN pixels have the value 0 (see `get_mask()`).
+
+        Parameters
+        ----------
+        input_img_stack : array_like
+            The images (a 3D array of `N` images).
+        high_threshold_array, low_threshold_array : array_like
+            The `T` pairs of picture and boundary thresholds.
+        keep_isolated_pixels, min_number_picture_neighbors, boundary_dilation_rounds
+            See `get_mask()`.
+
+        Returns
+        -------
+        array_like
+            The boolean masks, a `(N, T, height, width)` array.
+        """
+
+        if boundary_dilation_rounds < 1:
+            raise ValueError("boundary_dilation_rounds should be greater than 0 (got {})".format(boundary_dilation_rounds))
+
+        input_img_stack = np.asarray(input_img_stack)
+        high_threshold_array = np.asarray(high_threshold_array, dtype=np.float64).ravel()
+        low_threshold_array = np.asarray(low_threshold_array, dtype=np.float64).ravel()
+
+        if input_img_stack.shape[1:] != self.image_shape:
+            raise ValueError("Wrong image shape: {} (expected {})".format(input_img_stack.shape[1:], self.image_shape))
+
+        if high_threshold_array.shape != low_threshold_array.shape:
+            raise ValueError("high_threshold_array and low_threshold_array should have the same length")
+
+        num_images = input_img_stack.shape[0]
+        num_thresholds = len(high_threshold_array)
+        num_pixels = self.neighbor_matrix.shape[0]
+
+        # One column per (image, thresholds) pair
+        img_matrix = _nan_to_zero(input_img_stack.reshape(num_images, num_pixels).T)[:, :, np.newaxis]
+
+        pixels_above_picture = (img_matrix >= high_threshold_array).reshape(num_pixels, num_images * num_thresholds)
+        pixels_above_boundary = (img_matrix >= low_threshold_array).reshape(num_pixels, num_images * num_thresholds)
+
+        mask = self._merge_masks(pixels_above_picture,
+                                 pixels_above_boundary,
+                                 keep_isolated_pixels,
+                                 min_number_picture_neighbors,
+                                 boundary_dilation_rounds)
+
+        mask = mask.reshape(num_pixels, num_images, num_thresholds).transpose(1, 2, 0)
+
+        return mask.reshape((num_images, num_thresholds) + self.image_shape)
+
+    def _merge_masks(self,
+                     pixels_above_picture,
+                     pixels_above_boundary,
+                     keep_isolated_pixels,
+                     min_number_picture_neighbors,
+                     boundary_dilation_rounds):
+        """Return the tailcut mask(s) from the threshold masks (flat masks or
+        one mask per column)."""
+
+        if keep_isolated_pixels or (min_number_picture_neighbors == 0):
+            pixels_in_picture = pixels_above_picture
+        else:
+            num_picture_neighbors = self._count_neighbors(pixels_above_picture)
+            pixels_in_picture = pixels_above_picture & (num_picture_neighbors >= min_number_picture_neighbors)
+
+        pixels_with_picture_neighbors = self._count_neighbors(pixels_in_picture) > 0
+
+        if keep_isolated_pixels:
+            mask = (pixels_above_boundary & pixels_with_picture_neighbors) | pixels_in_picture
+        else:
+            pixels_with_boundary_neighbors = self._count_neighbors(pixels_above_boundary) > 0
+            mask = (pixels_above_boundary & pixels_with_picture_neighbors) | (pixels_in_picture & pixels_with_boundary_neighbors)
+
+        for dilation_round in range(boundary_dilation_rounds - 1):
+            mask |= pixels_above_boundary & (self._count_neighbors(mask) > 0)
+
+        return mask
+
+    def _count_neighbors(self, mask):
+        """Return the number of neighbors in `mask` of each pixel."""
+        return self.neighbor_matrix.dot(np.ascontiguousarray(mask).view(np.int8))
+
+    def clean(self, input_img, **kwargs):
+        """Return `input_img` with the pixels out of the tailcut mask set to
+        0 (NaN pixels are kept NaN).
+
+        `kwargs` are the parameters of `get_mask()`.
+        """
+
+        input_img = np.asarray(input_img, dtype=np.float64)
+        mask = self.get_mask(input_img, **kwargs)
+
+        cleaned_img = np.where(mask, input_img, 0.)
+        cleaned_img[np.isnan(input_img)] = np.nan
+
+        return cleaned_img
+
+
+_engine_dict = {}       # (cam_id, number of pixels) -> TailcutEngine
+_engine_lock = threading.Lock()
+
+def get_tailcut_engine(geom):
+    """Return the `TailcutEngine` of `geom`.
+
+    Engines are built once per process and camera (geometries are identified
+    by their `cam_id` and their number of pixels).
+    """
+
+    engine_key = (geom.cam_id.lower(), len(geom.pix_id))
+
+    with _engine_lock:
+        if engine_key not in _engine_dict:
+            _engine_dict[engine_key] = TailcutEngine.from_geom(geom)
+
+        return _engine_dict[engine_key]
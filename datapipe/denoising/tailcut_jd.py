@@ -139,53 +139,102 @@ def debug_plot(img, high_mask, final_mask, title=""):
     plt.close('all')
 
 
-# TAILCUT #####################################################################
+# TAILCUT MASK ################################################################
 
-class Tailcut(AbstractCleaningAlgorithm):
+def tailcut_mask(img, high_threshold=10., low_threshold=5.):
+    """Return the tailcut mask of `img`.
 
-    def __init__(self):
-        super(Tailcut, self).__init__()
-        self.label = "Tailcut (JD)"  # Name to show in plots
+    `img` can be a single image (2D array) or a stack of images (3D array:
+    image index, y, x); in the latter case each image is processed
+    independently.
+    """
 
-    def clean_image(self, img, high_threshold=10., low_threshold=5.,
-                    base_file_path="tailcut_jd", output_data_dict=None):
+    # COMPUTE MASKS #######################################
+
+    high_mask = (img >= high_threshold)
+    low_mask =  (img >= low_threshold)
+
+#    images.plot(high_mask, title="High mask")
+#    images.plot(low_mask, title="Low mask")
 
-        # COMPUTE MASKS #######################################
+    # MERGE MASKS #########################################
 
-        high_mask = (img >= high_threshold)
-        low_mask =  (img >= low_threshold)
+    # Dilate the high_mask to create a mask of neighbors.
+    # For instance, if high_mask is equals to:
+    #    [[0, 0, 0, 0, 0, 0, 0, 0, 0],
+    #     [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    #     [0, 0, 1, 0, 0, 0, 1, 0, 0],
+    #     [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    #     [0, 0, 0, 0, 0, 0, 0, 0, 0]]
+    # the dilated version of high_mask is equals to:
+    #    [[0, 0, 0, 0, 0, 0, 0, 0, 0],
+    #     [0, 1, 1, 1, 0, 1, 1, 1, 0],
+    #     [0, 1, 1, 1, 0, 1, 1, 1, 0],
+    #     [0, 1, 1, 1, 0, 1, 1, 1, 0],
+    #     [0, 0, 0, 0, 0, 0, 0, 0, 0]]
 
-    #    images.plot(high_mask, title="High mask")
-    #    images.plot(low_mask, title="Low mask")
+    high_mask_dilated = np.zeros(high_mask.shape, dtype=bool)
+    high_mask_dilated[:] = high_mask
 
-        # MERGE MASKS #########################################
+    high_mask_dilated[...,:-1,:] |= high_mask[...,1:,:]    # shift up
+    high_mask_dilated[...,1:,:]  |= high_mask[...,:-1,:]   # shift down
 
-        # Dilate the high_mask to create a mask of neighbors.
-        # For instance, if high_mask is equals to:
-        #    [[0, 0, 0, 0, 0, 0, 0, 0, 0],
-        #     [0, 0, 0, 0, 0, 0, 0, 0, 0],
-        #     [0, 0, 1, 0, 0, 0, 1, 0, 0],
-        #     [0, 0, 0, 0, 0, 0, 0, 0, 0],
-        #     [0, 0, 0, 0, 0, 0, 0, 0, 0]]
-        # the dilated version of high_mask is equals to:
-        #    [[0, 0, 0, 0, 0, 0, 0, 0, 0],
-        #     [0, 1, 1, 1, 0, 1, 1, 1, 0],
-        #     [0, 1, 1, 1, 0, 1, 1, 1, 0],
-        #     [0, 1, 1, 1, 0, 1, 1, 1, 0],
-        #     [0, 0, 0, 0, 0, 0, 0, 0, 0]]
+    high_mask_dilated[...,:,:-1] |= high_mask_dilated[...,:,1:]   # shift left
+    high_mask_dilated[...,:,1:]  |= high_mask_dilated[...,:,:-1]  # shift right
 
-        high_mask_dilated = np.zeros(high_mask.shape, dtype=np.bool)
-        high_mask_dilated[:] = high_mask
+    # Merge high_mask_dilated and low_mask (using a logical AND)
 
-        high_mask_dilated[:-1,:] |= high_mask[1:,:]    # shift up
-        high_mask_dilated[1:,:]  |= high_mask[:-1,:]   # shift down
+    final_mask = high_mask_dilated & low_mask
 
-        high_mask_dilated[:,:-1] |= high_mask_dilated[:,1:]   # shift left
-        high_mask_dilated[:,1:]  |= high_mask_dilated[:,:-1]  # shift right
+    return final_mask
 
-        # Merge high_mask_dilated and low_mask (using a logical AND)
 
-        final_mask = high_mask_dilated & low_mask
+def tailcut_mask_grid(img_stack, high_threshold_array, low_threshold_array):
+    """Return the tailcut masks of a stack of images for several pairs of
+    thresholds.
+
+    Parameters
+    ----------
+    img_stack : array_like
+        The images (a 3D array of `N` images).
+    high_threshold_array, low_threshold_array : array_like
+        The `T` pairs of thresholds.
+
+    Returns
+    -------
+    array_like
+        The masks, a `(N, T, height, width)` array: thresholds are broadcast
+        against the image stack and all masks are computed in one call of
+        `tailcut_mask()`.
+    """
+
+    img_stack = np.asarray(img_stack)
+    high_threshold_array = np.asarray(high_threshold_array, dtype=np.float64).ravel()
+    low_threshold_array = np.asarray(low_threshold_array, dtype=np.float64).ravel()
+
+    if img_stack.ndim != 3:
+        raise ValueError("The image stack should be a 3D array (got a {}D array)".format(img_stack.ndim))
+
+    if high_threshold_array.shape != low_threshold_array.shape:
+        raise ValueError("high_threshold_array and low_threshold_array should have the same length")
+
+    return tailcut_mask(img_stack[:, np.newaxis, :, :],
+                        high_threshold_array[:, np.newaxis, np.newaxis],
+                        low_threshold_array[:, np.newaxis, np.newaxis])
+
+
+# TAILCUT #####################################################################
+
+class Tailcut(AbstractCleaningAlgorithm):
+
+    def __init__(self):
+        super(Tailcut, self).__init__()
+        self.label = "Tailcut (JD)"  # Name to show in plots
+
+    def clean_image(self, img, high_threshold=10., low_threshold=5.,
+                    base_file_path="tailcut_jd", output_data_dict=None):
+
+        final_mask = tailcut_mask(img, high_threshold, low_threshold)
 
         # PLOT MASK ###########################################
 
@@ -203,6 +252,28 @@ class Tailcut(AbstractCleaningAlgorithm):
 
         return cleaned_img
 
+    def clean_images(self, input_img_stack, output_data_dict_list=None,
+                     high_threshold=10., low_threshold=5., **cleaning_function_params):
+        """Clean a stack of images (see
+        `AbstractCleaningAlgorithm.clean_images()`) in one vectorized pass."""
+
+        if self.verbose:
+            # Plot masks image by image
+            return super(Tailcut, self).clean_images(input_img_stack,
+                                                     output_data_dict_list=output_data_dict_list,
+                                                     high_threshold=high_threshold,
+                                                     low_threshold=low_threshold,
+                                                     **cleaning_function_params)
+
+        input_img_stack = np.asarray(input_img_stack)
+
+        if input_img_stack.ndim != 3:
+            raise ValueError("The image stack should be a 3D array (got a {}D array)".format(input_img_stack.ndim))
+
+        final_mask = tailcut_mask(input_img_stack, high_threshold, low_threshold)
+
+        return input_img_stack * final_mask
+
 
 def main():
 
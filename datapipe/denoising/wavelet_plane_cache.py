@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Cache the multiresolution planes of images.
+
+Parameter sweeps on the k-sigma thresholds (e.g. the `bruteforce`, `saes`
+and `differential_evolution` optimizers) clean the same images many times
+with the same transform: only the thresholding of the wavelet planes
+changes. This module keeps the planes of each (image, transform,
+number_of_scales) in memory so that each evaluation only re-thresholds and
+sums them.
+
+The memory used by the cache can be bounded: the least recently used planes
+are then evicted and, if a spill directory is given, written in a `.npy`
+file which is memory-mapped when these planes are requested again.
+"""
+
+__all__ = ['WaveletPlaneCache']
+
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+###############################################################################
+
+class WaveletPlaneCache(object):
+    """A LRU cache of multiresolution planes.
+
+    Planes returned by the cache are read-only arrays shared by all callers.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum size (in bytes) of the planes kept in memory (`None`
+        for no limit).
+    spill_directory : str
+        The directory where evicted planes are saved (`None` to drop
+        evicted planes).
+    """
+
+    def __init__(self, max_bytes=None, spill_directory=None):
+        if (max_bytes is not None) and (max_bytes < 0):
+            raise ValueError("max_bytes should be a positive number (got {})".format(max_bytes))
+
+        self.max_bytes = max_bytes
+        self.spill_directory = spill_directory
+
+        self._plane_dict = collections.OrderedDict()    # key -> planes (least recently used first)
+        self._lock = threading.Lock()
+
+        self.num_bytes = 0
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_spilled = 0
+
+        if spill_directory is not None:
+            os.makedirs(spill_directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._plane_dict)
+
+    @staticmethod
+    def get_key(input_img, transform_name, number_of_scales):
+        """Return the key of the planes of `input_img` (an image or a stack
+        of images) computed with the `transform_name` transform."""
+
+        input_img = np.ascontiguousarray(input_img)
+
+        hash_object = hashlib.sha1()
+        hash_object.update("{};{};{};{}".format(transform_name, number_of_scales, input_img.shape, input_img.dtype.str).encode())
+        hash_object.update(input_img.tobytes())
+
+        return hash_object.hexdigest()
+
+    def get_spill_path(self, key):
+        return os.path.join(self.spill_directory, key + ".npy")
+
+    def get(self, key):
+        """Return the planes saved with `key` or `None` if they are not in
+        the cache."""
+
+        with self._lock:
+            if key in self._plane_dict:
+                self._plane_dict.move_to_end(key)
+                self.num_hits += 1
+                return self._plane_dict[key]
+
+        if self.spill_directory is not None:
+            try:
+                planes = np.load(self.get_spill_path(key), mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+            else:
+                with self._lock:
+                    self.num_hits += 1
+                return planes
+
+        with self._lock:
+            self.num_misses += 1
+
+        return None
+
+    def put(self, key, planes):
+        """Save `planes` with `key` and return the (read-only) saved
+        planes.
+
+        Raises a `ValueError` if `planes` alone exceeds `max_bytes` and
+        there is no spill directory (it would be dropped at once and
+        computed again on every request).
+        """
+
+        planes_nbytes = np.asarray(planes).nbytes
+        if (self.max_bytes is not None) and (self.spill_directory is None) and (planes_nbytes > self.max_bytes):
+            raise ValueError("Planes of {} bytes can't be kept in a cache bounded to {} bytes".format(planes_nbytes, self.max_bytes))
+
+        planes = np.array(planes, copy=True)
+        planes.setflags(write=False)
+
+        spill_list = []
+
+        with self._lock:
+            if key in self._plane_dict:
+                self.num_bytes -= self._plane_dict.pop(key).nbytes
+
+            self._plane_dict[key] = planes
+            self.num_bytes += planes.nbytes
+
+            # Evict the least recently used planes
+            if self.max_bytes is not None:
+                while self.num_bytes > self.max_bytes:
+                    evicted_key, evicted_planes = self._plane_dict.popitem(last=False)
+                    self.num_bytes -= evicted_planes.nbytes
+                    spill_list.append((evicted_key, evicted_planes))
+
+        for evicted_key, evicted_planes in spill_list:
+            self._spill(evicted_key, evicted_planes)
+
+        return planes
+
+    def _spill(self, key, planes):
+        """Save evicted planes in the spill directory (if any)."""
+
+        if self.spill_directory is None:
+            return
+
+        spill_path = self.get_spill_path(key)
+
+        if os.path.isfile(spill_path):
+            return
+
+        # Write a temporary file then rename it so that concurrent readers
+        # never see a partially written file
+        fd, tmp_file_path = tempfile.mkstemp(dir=self.spill_directory, prefix=".tmp_", suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as tmp_fd:
+                np.save(tmp_fd, planes)
+            os.replace(tmp_file_path, spill_path)
+        except:
+            os.remove(tmp_file_path)
+            raise
+
+        with self._lock:
+            self.num_spilled += 1
+
+    def get_planes(self, input_img, transform_function, transform_name, number_of_scales, key=None):
+        """Return the planes of `input_img`; they are computed with
+        `transform_function(input_img, number_of_scales)` (and saved) only if
+        they are not already in the cache.
+
+        `key` can be given to avoid hashing `input_img` again (see
+        `get_key()`).
+        """
+
+        if key is None:
+            key = self.get_key(input_img, transform_name, number_of_scales)
+
+        planes = self.get(key)
+
+        if planes is None:
+            planes = self.put(key, transform_function(input_img, number_of_scales))
+
+        return planes
+
+    def clear(self):
+        """Remove all planes kept in memory (spilled planes are kept)."""
+
+        with self._lock:
+            self._plane_dict.clear()
+            self.num_bytes = 0
@@ -38,13 +38,18 @@ This script requires the mr_filter program
 __all__ = ['wavelet_transform']
 
 import argparse
+import inspect
 import numpy as np
 import os
+import shlex
 import time
 
 import datapipe.denoising
 from datapipe.denoising.abstract_cleaning_algorithm import AbstractCleaningAlgorithm
 from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution
+from datapipe.denoising.mrfilter_engine import MrFilterError
+from datapipe.denoising.mrfilter_engine import get_default_engine
+from datapipe.denoising.mrfilter_engine import get_guard_band_width
 from datapipe.io import images
 
 
@@ -54,9 +59,6 @@ from datapipe.image.kill_isolated_pixels import number_of_islands
 
 # EXCEPTIONS #################################################################
 
-class MrFilterError(Exception):
-    pass
-
 class WrongDimensionError(MrFilterError):
     """Exception raised when trying to save a FITS with more than 3 dimensions
     or less than 2 dimensions.
@@ -71,6 +73,60 @@ class WrongDimensionError(MrFilterError):
 
 ##############################################################################
 
+def get_option_list(type_of_multiresolution_transform=None,
+                    type_of_filters=None,
+                    type_of_non_orthog_filters=None,
+                    number_of_scales=None,
+                    suppress_last_scale=False,
+                    suppress_isolated_pixels=False,
+                    coef_detection_method=None,
+                    k_sigma_noise_threshold=None,
+                    noise_model=None,
+                    detect_only_positive_structure=False,
+                    suppress_positivity_constraint=False,
+                    type_of_filtering=None,
+                    first_detection_scale=None,
+                    number_of_iterations=None,
+                    epsilon=None,
+                    support_file_name=None,
+                    precision=None,
+                    mask_file_path=None,
+                    verbose=False,
+                    raw_option_string=None):
+    """Return the mr_filter command line options (a list of arguments) for
+    the given `WaveletTransform.clean_image()` parameters."""
+
+    option_list = []
+
+    if raw_option_string is None:
+        option_list += ['-t{}'.format(type_of_multiresolution_transform)] if type_of_multiresolution_transform is not None else []
+        option_list += ['-T{}'.format(type_of_filters)] if type_of_filters is not None else []
+        option_list += ['-U{}'.format(type_of_non_orthog_filters)] if type_of_non_orthog_filters is not None else []
+        option_list += ['-n{}'.format(number_of_scales)] if number_of_scales is not None else []
+        option_list += ['-K'] if suppress_last_scale else []
+        option_list += ['-k'] if suppress_isolated_pixels else []      # You should use scipy implementation instead (datapipe/denoising/kill_isolated_pixels.py); it's much more efficient
+        option_list += ['-C{}'.format(coef_detection_method)] if coef_detection_method is not None else []
+        option_list += ['-s{}'.format(k_sigma_noise_threshold)] if k_sigma_noise_threshold is not None else []
+        option_list += ['-m{}'.format(noise_model)] if noise_model is not None else []
+        option_list += ['-p'] if detect_only_positive_structure else []
+        option_list += ['-P'] if suppress_positivity_constraint else []
+        option_list += ['-f{}'.format(type_of_filtering)] if type_of_filtering is not None else []
+        option_list += ['-F{}'.format(first_detection_scale)] if first_detection_scale is not None else []
+        option_list += ['-i{}'.format(number_of_iterations)] if number_of_iterations is not None else []
+        option_list += ['-e{}'.format(epsilon)] if epsilon is not None else []
+        option_list += ['-w{}'.format(support_file_name)] if support_file_name is not None else []
+        option_list += ['-E{}'.format(precision)] if precision is not None else []
+        option_list += ['-I', mask_file_path] if mask_file_path is not None else []
+
+        option_list += ['-v'] if verbose else []
+    else:
+        option_list += shlex.split(raw_option_string)
+
+    return option_list
+
+
+# CLEANING ALGORITHM #########################################################
+
 class WaveletTransform(AbstractCleaningAlgorithm):
 
     def __init__(self):
@@ -104,32 +160,100 @@ class WaveletTransform(AbstractCleaningAlgorithm):
                     noise_distribution=None,
                     verbose=False,
                     raw_option_string=None,
-                    tmp_files_directory=".",       # "/Volumes/ramdisk"
+                    tmp_files_directory=None,      # "/Volumes/ramdisk"
                     mrfilter_directory=None,       # "/Volumes/ramdisk"
+                    mrfilter_timeout_sec=None,
                     output_data_dict=None):
         """
         Do the wavelet transform.
 
+        mr_filter is executed by the process default `MrFilterEngine` (see
+        `datapipe.denoising.mrfilter_engine`). If `tmp_files_directory` is
+        `None`, temporary FITS files are written in a per-process directory
+        in `/dev/shm`. If `mrfilter_timeout_sec` is not `None`, mr_filter is
+        killed if it doesn't complete within this delay (and a
+        `MrFilterTimeoutError` is raised).
+
         Raises
         ------
         WrongDimensionError
             If `cleaned_img` is not a 2D array.
         """
 
-        input_img = input_img.copy()
+        if (output_data_dict is not None) and (mask_file_path is not None):
+            output_data_dict["mr_mask_file_path"] = mask_file_path
 
-        if input_img.ndim != 2:
+        input_img, nan_mask = self._preprocess_image(input_img,
+                                                     noise_distribution=noise_distribution,
+                                                     offset_after_calibration=offset_after_calibration,
+                                                     input_image_scale=input_image_scale,
+                                                     verbose=verbose)
+
+        # EXECUTE MR_FILTER ####################################
+
+        option_list = get_option_list(type_of_multiresolution_transform=type_of_multiresolution_transform,
+                                      type_of_filters=type_of_filters,
+                                      type_of_non_orthog_filters=type_of_non_orthog_filters,
+                                      number_of_scales=number_of_scales,
+                                      suppress_last_scale=suppress_last_scale,
+                                      suppress_isolated_pixels=suppress_isolated_pixels,
+                                      coef_detection_method=coef_detection_method,
+                                      k_sigma_noise_threshold=k_sigma_noise_threshold,
+                                      noise_model=noise_model,
+                                      detect_only_positive_structure=detect_only_positive_structure,
+                                      suppress_positivity_constraint=suppress_positivity_constraint,
+                                      type_of_filtering=type_of_filtering,
+                                      first_detection_scale=first_detection_scale,
+                                      number_of_iterations=number_of_iterations,
+                                      epsilon=epsilon,
+                                      support_file_name=support_file_name,
+                                      precision=precision,
+                                      mask_file_path=mask_file_path,
+                                      verbose=verbose,
+                                      raw_option_string=raw_option_string)
+
+        #option_list = ['-K', '-k', '-C1', '-s3', '-m3', '-n{}'.format(number_of_scales)]
+        #option_list = ['-K', '-k', '-C1', '-s3', '-m2', '-p', '-P', '-n{}'.format(number_of_scales)]
+
+        cleaned_img = get_default_engine().filter_image(input_img,
+                                                        option_list,
+                                                        mrfilter_directory=mrfilter_directory,
+                                                        tmp_files_directory=tmp_files_directory,
+                                                        timeout_sec=mrfilter_timeout_sec,
+                                                        verbose=verbose,
+                                                        output_data_dict=output_data_dict)
+
+        # CHECK RESULT #########################################
+
+        if cleaned_img.ndim != 2:
             raise WrongDimensionError()
 
-        input_file_path = os.path.join(tmp_files_directory, ".tmp_{}_{}_in.fits".format(os.getpid(), time.time()))
-        mr_output_file_path = os.path.join(tmp_files_directory, ".tmp_{}_{}_out.fits".format(os.getpid(), time.time()))
+        return self._postprocess_image(cleaned_img,
+                                       nan_mask,
+                                       suppress_last_scale=suppress_last_scale,
+                                       kill_isolated_pixels=kill_isolated_pixels,
+                                       offset_after_calibration=offset_after_calibration,
+                                       correction_offset=correction_offset,
+                                       input_image_scale=input_image_scale,
+                                       verbose=verbose,
+                                       output_data_dict=output_data_dict)
+
+    def _preprocess_image(self,
+                          input_img,
+                          noise_distribution=None,
+                          offset_after_calibration=None,
+                          input_image_scale='linear',
+                          verbose=False):
+        """Prepare `input_img` for mr_filter (see `clean_image()`).
+
+        Returns the prepared image (a copy) and the mask of its blank (NaN)
+        pixels.
+        """
 
-        if output_data_dict is not None:
-            output_data_dict["mr_input_tmp_file_path"] = input_file_path
-            output_data_dict["mr_output_tmp_file_path"] = mr_output_file_path
+        input_img = input_img.copy()
 
-        if (output_data_dict is not None) and (mask_file_path is not None):
-            output_data_dict["mr_mask_file_path"] = mask_file_path
+        if input_img.ndim != 2:
+            raise WrongDimensionError()
 
         # INJECT NOISE IN NAN ##################################
 
@@ -171,93 +295,20 @@ class WaveletTransform(AbstractCleaningAlgorithm):
             input_img = np.sqrt(input_img)   # TODO: it creates NaN values where pixels < 0
             #images.plot(input_img)
 
-        # WRITE THE INPUT FILE (FITS) ##########################
-
-        try:
-            initial_time = time.perf_counter()
-            images.save(input_img, input_file_path)
-            exec_time_sec = time.perf_counter() - initial_time
-            if output_data_dict is not None:
-                output_data_dict["save_tmp_file_time_sec"] = exec_time_sec
-        except:
-            print("Error on input FITS file:", input_file_path)
-            raise
-
-        # EXECUTE MR_FILTER ####################################
-
-        # TODO: improve the following lines
-        if mrfilter_directory is None:
-            cmd = 'mr_filter'
-        else:
-            cmd = os.path.join(mrfilter_directory, 'mr_filter')
-
-        if raw_option_string is None:
-            cmd += ' -t{}'.format(type_of_multiresolution_transform) if type_of_multiresolution_transform is not None else ''
-            cmd += ' -T{}'.format(type_of_filters) if type_of_filters is not None else ''
-            cmd += ' -U{}'.format(type_of_non_orthog_filters) if type_of_non_orthog_filters is not None else ''
-            cmd += ' -n{}'.format(number_of_scales) if number_of_scales is not None else ''
-            cmd += ' -K' if suppress_last_scale else ''
-            cmd += ' -k' if suppress_isolated_pixels else ''      # You should use scipy implementation instead (datapipe/denoising/kill_isolated_pixels.py); it's much more efficient
-            cmd += ' -C{}'.format(coef_detection_method) if coef_detection_method is not None else ''
-            cmd += ' -s{}'.format(k_sigma_noise_threshold) if k_sigma_noise_threshold is not None else ''
-            cmd += ' -m{}'.format(noise_model) if noise_model is not None else ''
-            cmd += ' -p' if detect_only_positive_structure else ''
-            cmd += ' -P' if suppress_positivity_constraint else ''
-            cmd += ' -f{}'.format(type_of_filtering) if type_of_filtering is not None else ''
-            cmd += ' -F{}'.format(first_detection_scale) if first_detection_scale is not None else ''
-            cmd += ' -i{}'.format(number_of_iterations) if number_of_iterations is not None else ''
-            cmd += ' -e{}'.format(epsilon) if epsilon is not None else ''
-            cmd += ' -w{}'.format(support_file_name) if support_file_name is not None else ''
-            cmd += ' -E{}'.format(precision) if precision is not None else ''
-            cmd += ' -I {}'.format(mask_file_path) if mask_file_path is not None else ''
-
-            cmd += ' -v' if verbose else ''
-        else:
-            cmd += ' ' + raw_option_string
-
-        #self.label = "WT ({})".format(cmd)  # Name to show in plots
-        cmd += ' "{}" "{}"'.format(input_file_path, mr_output_file_path)
-
-        #cmd = 'mr_filter -K -k -C1 -s3 -m3 -n{} "{}" {}'.format(number_of_scales, input_file_path, mr_output_file_path)
-        #cmd = 'mr_filter -K -k -C1 -s3 -m2 -p -P -n{} "{}" {}'.format(number_of_scales, input_file_path, mr_output_file_path)
-
-        if verbose:
-            print()
-            print(cmd)
-        else:
-            cmd += ' > /dev/null'
-
-        try:
-            initial_time = time.perf_counter()
-            os.system(cmd)
-            exec_time_sec = time.perf_counter() - initial_time
-            if output_data_dict is not None:
-                output_data_dict["mrfilter_cmd_exec_time_sec"] = exec_time_sec
-        except:
-            print("Error on command:", cmd)
-            raise
-
-        # READ THE MR_FILTER OUTPUT FILE #######################
-
-        try:
-            initial_time = time.perf_counter()
-            cleaned_img = images.load(mr_output_file_path, 0)
-            exec_time_sec = time.perf_counter() - initial_time
-            if output_data_dict is not None:
-                output_data_dict["load_tmp_file_time_sec"] = exec_time_sec
-        except:
-            print("Error on output FITS file:", mr_output_file_path)
-            raise
-
-        # REMOVE FITS FILES ####################################
-
-        os.remove(input_file_path)
-        os.remove(mr_output_file_path)
-
-        # CHECK RESULT #########################################
-
-        if cleaned_img.ndim != 2:
-            raise WrongDimensionError()
+        return input_img, nan_mask
+
+    def _postprocess_image(self,
+                           cleaned_img,
+                           nan_mask,
+                           suppress_last_scale=False,
+                           kill_isolated_pixels=False,
+                           offset_after_calibration=None,
+                           correction_offset=False,
+                           input_image_scale='linear',
+                           verbose=False,
+                           output_data_dict=None):
+        """Invert the `_preprocess_image()` transformations on the mr_filter
+        output (see `clean_image()`)."""
 
         # INJECT NOISE IN NAN: PUT BACK NAN VALUES #############
 
@@ -313,6 +364,142 @@ class WaveletTransform(AbstractCleaningAlgorithm):
 
         return cleaned_img
 
+    def clean_images(self, input_img_stack, output_data_dict_list=None, images_per_mosaic=None, **cleaning_function_params):
+        """Clean a stack of images (see
+        `AbstractCleaningAlgorithm.clean_images()`).
+
+        Images are dispatched to the thread pool of the default
+        `MrFilterEngine` thus up to `max_processes` mr_filter processes run
+        concurrently.
+
+        If `images_per_mosaic` is not `None`, images are packed by groups of
+        `images_per_mosaic` images in mosaics separated by guard bands and
+        each mosaic is cleaned with a single mr_filter invocation (see
+        `_clean_mosaic()`).
+        """
+
+        input_img_stack = np.asarray(input_img_stack)
+
+        if input_img_stack.ndim != 3:
+            raise ValueError("The image stack should be a 3D array (got a {}D array)".format(input_img_stack.ndim))
+
+        if (images_per_mosaic is not None) and (images_per_mosaic < 1):
+            raise ValueError("images_per_mosaic should be greater than 0 (got {})".format(images_per_mosaic))
+
+        if output_data_dict_list is None:
+            output_data_dict_list = [None] * len(input_img_stack)
+
+        if images_per_mosaic is None:
+            def clean_image(img_index):
+                return [self.clean_image(input_img_stack[img_index],
+                                         output_data_dict=output_data_dict_list[img_index],
+                                         **cleaning_function_params)]
+
+            group_list = range(len(input_img_stack))
+        else:
+            def clean_image(img_index_list):
+                return self._clean_mosaic([input_img_stack[img_index] for img_index in img_index_list],
+                                          [output_data_dict_list[img_index] for img_index in img_index_list],
+                                          **cleaning_function_params)
+
+            group_list = [list(range(start, min(start + images_per_mosaic, len(input_img_stack))))
+                          for start in range(0, len(input_img_stack), images_per_mosaic)]
+
+        cleaned_img_list = [cleaned_img
+                            for cleaned_group in get_default_engine().map(clean_image, group_list)
+                            for cleaned_img in cleaned_group]
+
+        if len(cleaned_img_list) == 0:
+            return np.zeros(input_img_stack.shape)
+
+        return np.array(cleaned_img_list)
+
+    def _clean_mosaic(self, input_img_list, output_data_dict_list, **cleaning_function_params):
+        """Clean `input_img_list` with a single mr_filter invocation.
+
+        Each image is pre-processed and post-processed as in
+        `clean_image()`; images are packed in a mosaic separated by guard
+        bands wide enough for the "à trous" transforms (see
+        `mrfilter_engine.get_guard_band_width()`), filled with
+        `noise_distribution` samples (if any) so that the noise level
+        estimated by mr_filter is not biased by blank bands.
+
+        Raises
+        ------
+        ValueError
+            If the parameters can't be used with mosaics (a mask file or a
+            transform other than the "à trous" ones).
+        """
+
+        # Use clean_image() defaults for the missing parameters
+        params = inspect.signature(self.clean_image).bind(None, **cleaning_function_params)
+        params.apply_defaults()
+        params = params.arguments
+
+        if params["mask_file_path"] is not None:
+            raise ValueError("Mask files can't be used with mosaics")
+
+        if params["type_of_multiresolution_transform"] not in (None, 1, 2):
+            raise ValueError("Mosaics can only be used with the a trous wavelet transforms (-t1 or -t2)")
+
+        number_of_scales = 4 if params["number_of_scales"] is None else params["number_of_scales"]   # mr_filter default: 4
+
+        if params["type_of_filtering"] in (3, 4, 7, 8):     # Iterative filtering methods
+            number_of_iterations = 10 if params["number_of_iterations"] is None else params["number_of_iterations"]
+        else:
+            number_of_iterations = 1
+
+        guard_band_width = get_guard_band_width(number_of_scales, number_of_iterations)
+
+        if params["noise_distribution"] is not None:
+            fill_function = params["noise_distribution"].rvs
+        else:
+            fill_function = None
+
+        nan_mask_list = []
+        preprocessed_img_list = []
+
+        for input_img in input_img_list:
+            preprocessed_img, nan_mask = self._preprocess_image(input_img,
+                                                                noise_distribution=params["noise_distribution"],
+                                                                offset_after_calibration=params["offset_after_calibration"],
+                                                                input_image_scale=params["input_image_scale"],
+                                                                verbose=params["verbose"])
+            preprocessed_img_list.append(preprocessed_img)
+            nan_mask_list.append(nan_mask)
+
+        option_list = get_option_list(**{name: params[name] for name in inspect.signature(get_option_list).parameters})
+
+        mosaic_data_dict = {}
+
+        cleaned_img_list = get_default_engine().filter_images(preprocessed_img_list,
+                                                              option_list,
+                                                              guard_band_width,
+                                                              fill_function=fill_function,
+                                                              mrfilter_directory=params["mrfilter_directory"],
+                                                              tmp_files_directory=params["tmp_files_directory"],
+                                                              timeout_sec=params["mrfilter_timeout_sec"],
+                                                              verbose=params["verbose"],
+                                                              output_data_dict=mosaic_data_dict)
+
+        postprocessed_img_list = []
+
+        for cleaned_img, nan_mask, output_data_dict in zip(cleaned_img_list, nan_mask_list, output_data_dict_list):
+            if output_data_dict is not None:
+                output_data_dict.update(mosaic_data_dict)
+
+            postprocessed_img_list.append(self._postprocess_image(cleaned_img,
+                                                                  nan_mask,
+                                                                  suppress_last_scale=params["suppress_last_scale"],
+                                                                  kill_isolated_pixels=params["kill_isolated_pixels"],
+                                                                  offset_after_calibration=params["offset_after_calibration"],
+                                                                  correction_offset=params["correction_offset"],
+                                                                  input_image_scale=params["input_image_scale"],
+                                                                  verbose=params["verbose"],
+                                                                  output_data_dict=output_data_dict))
+
+        return postprocessed_img_list
+
 
 def main():
 
@@ -526,8 +713,11 @@ def main():
     parser.add_argument("--verbose", "-v", action="store_true",
                         help="Verbose mode")
 
-    parser.add_argument("--tmp-dir", default=".", metavar="DIRECTORY",
-                        help="The directory where temporary files are written.")
+    parser.add_argument("--tmp-dir", default=None, metavar="DIRECTORY",
+                        help="The directory where temporary files are written. Default: a directory of the current process in /dev/shm.")
+
+    parser.add_argument("--mrfilter-timeout", type=float, default=None, metavar="FLOAT",
+                        help="Kill mr_filter if it doesn't complete within this number of seconds (the image is then aborted). Default: no timeout.")
 
     # COMMON OPTIONS
 
@@ -548,6 +738,33 @@ def main():
     parser.add_argument("--output", "-o", metavar="FILE",
                         help="The output file path (JSON)")
 
+    parser.add_argument("--num-workers", type=int, default=None, metavar="INTEGER",
+                        help="The number of worker processes used to process images in parallel (0: one per CPU). Default: no parallelism.")
+
+    parser.add_argument("--parallel-backend", default="concurrent.futures",
+                        help="The process pool implementation used when --num-workers is set ('concurrent.futures' or 'multiprocessing'). Default='concurrent.futures'.")
+
+    parser.add_argument("--output-format", default="json",
+                        help="The output file format: 'json' (written at the end of the run) or 'jsonl' (one JSON record per image, written as soon as it is processed). Default='json'.")
+
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted 'jsonl' run: skip the images already recorded in the output file and append the new ones to it.")
+
+    parser.add_argument("--ref-features-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where the features of reference images are cached (they are computed for each run if this option is not set).")
+
+    parser.add_argument("--result-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where cleaned images are cached (an image cleaned with the same parameters is read from this cache instead of being cleaned again). Default: no cache.")
+
+    parser.add_argument("--result-cache-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum size (in MB) of the result cache directory (the least recently used images are removed). Default: no limit.")
+
+    parser.add_argument("--prefetch-depth", type=int, default=0, metavar="INTEGER",
+                        help="The number of FITS files read in advance by a background thread while the current image is cleaned (0 to disable prefetching). Default=0.")
+
+    parser.add_argument("--prefetch-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum memory size (in MB) of the images read in advance. Default: no limit.")
+
     parser.add_argument("fileargs", nargs="+", metavar="FILE",
                         help="The files image to process (FITS)."
                              "If fileargs is a directory,"
@@ -580,12 +797,23 @@ def main():
     noise_cdf_file = args.noise_cdf_file
     verbose = args.verbose
     tmp_dir = args.tmp_dir
+    mrfilter_timeout_sec = args.mrfilter_timeout
 
     benchmark_method = args.benchmark
     label = args.label
     plot = args.plot
     saveplot = args.saveplot
 
+    num_workers = args.num_workers
+    parallel_backend = args.parallel_backend
+    output_format = args.output_format
+    resume = args.resume
+    ref_features_cache_dir = args.ref_features_cache
+    result_cache_dir = args.result_cache
+    result_cache_max_bytes = None if args.result_cache_max_mb is None else int(args.result_cache_max_mb * 1e6)
+    prefetch_depth = args.prefetch_depth
+    prefetch_max_bytes = None if args.prefetch_max_mb is None else int(args.prefetch_max_mb * 1e6)
+
     input_file_or_dir_path_list = args.fileargs
 
     if args.output is None:
@@ -624,6 +852,7 @@ def main():
                 "noise_distribution": noise_distribution,
                 "verbose": verbose,
                 "tmp_files_directory": tmp_dir,
+                "mrfilter_timeout_sec": mrfilter_timeout_sec,
                 #"mrfilter_directory": "/Volumes/ramdisk"
             }
 
@@ -637,7 +866,16 @@ def main():
                                          benchmark_method,
                                          output_file_path,
                                          plot=plot,
-                                         saveplot=saveplot)
+                                         saveplot=saveplot,
+                                         num_workers=num_workers,
+                                         parallel_backend=parallel_backend,
+                                         output_format=output_format,
+                                         resume=resume,
+                                         ref_features_cache_dir=ref_features_cache_dir,
+                                         prefetch_depth=prefetch_depth,
+                                         prefetch_max_bytes=prefetch_max_bytes,
+                                         result_cache_dir=result_cache_dir,
+                                         result_cache_max_bytes=result_cache_max_bytes)
 
 
 if __name__ == "__main__":
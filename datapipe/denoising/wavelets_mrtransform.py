@@ -77,11 +77,22 @@ class WrongDimensionError(MrTransformError):
 def wavelet_transform(input_img,
                       number_of_scales=4,
                       tmp_files_directory=".",       # "/Volumes/ramdisk"
-                      noise_distribution=None):
+                      noise_distribution=None,
+                      plane_cache=None):
     """
     Do the wavelet transform.
+
+    If `plane_cache` (a `WaveletPlaneCache`) is given, mr_transform is only
+    executed if the planes of `input_img` are not already in this cache
+    (and the noise injected in blank pixels is the one of the first call).
     """
 
+    if plane_cache is not None:
+        return plane_cache.get_planes(input_img,
+                                      lambda img, num_scales: wavelet_transform(img, num_scales, tmp_files_directory, noise_distribution),
+                                      "mr_transform",
+                                      number_of_scales)
+
     input_img = input_img.copy()
 
     if input_img.ndim != 2:
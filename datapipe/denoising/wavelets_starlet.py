@@ -0,0 +1,937 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Denoise FITS images with the isotropic undecimated wavelet transform
+("starlet" or B3-spline "à trous" algorithm).
+
+This is an in-process implementation of the multiresolution hard k-sigma
+thresholding made by mr_filter with the default options (`-t2 -f1 -C1 -m1`)
+and of its iterative multiresolution thresholding (`-f3`), i.e. without any
+external program nor temporary FITS file.
+
+Example usages:
+  ./wavelets_starlet.py -h
+  ./wavelets_starlet.py -n4 -s3 -K -p ./test.fits
+  ipython3 -- ./wavelets_starlet.py -n4 ./test.fits
+
+This script requires Numpy and Scipy Python libraries.
+"""
+
+__all__ = ['B3_SPLINE_FILTER',
+           'GAUSSIAN_NOISE_SIGMA_PER_SCALE',
+           'starlet_transform',
+           'inverse_starlet_transform',
+           'estimate_noise_sigma',
+           'get_k_sigma_list',
+           'kill_isolated_support_pixels',
+           'get_multiresolution_support',
+           'hard_threshold_planes',
+           'hard_threshold_filter',
+           'iterative_threshold',
+           'StarletTransform']
+
+import argparse
+import inspect
+import numpy as np
+import scipy.ndimage
+import time
+
+from datapipe.denoising.abstract_cleaning_algorithm import AbstractCleaningAlgorithm
+from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution
+
+from datapipe.image.kill_isolated_pixels import kill_isolated_pixels as scipy_kill_isolated_pixels
+from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stats
+from datapipe.image.kill_isolated_pixels import number_of_islands
+
+
+# The 1D B3-spline scaling function filter (the 2D filter is separable)
+B3_SPLINE_FILTER = np.array([1., 4., 6., 4., 1.]) / 16.
+
+# The standard deviation of each wavelet plane of the B3-spline starlet
+# transform of a unit variance Gaussian white noise (Starck & Murtagh).
+# Planes beyond this table use the last value divided by 2 at each scale.
+GAUSSIAN_NOISE_SIGMA_PER_SCALE = (0.889, 0.200, 0.086, 0.041, 0.020, 0.010, 0.005)
+
+# The scipy.ndimage border mode equivalent to the mr_filter default (I_MIRROR)
+DEFAULT_BORDER_MODE = 'mirror'
+
+# Factor converting the Median Absolute Deviation to a Gaussian standard deviation
+MAD_TO_SIGMA = 1. / 0.6745
+
+
+# WAVELET TRANSFORM ##########################################################
+
+def starlet_transform(input_img, number_of_scales=4, border_mode=DEFAULT_BORDER_MODE):
+    """Compute the isotropic undecimated wavelet transform (B3-spline "à
+    trous" algorithm) of an image, i.e. the transform made by `mr_transform
+    -t2` and `mr_filter -t2`.
+
+    Convolutions are made along the last two axes only, thus `input_img` can
+    also be a stack of images (a N-dimensional array with N >= 2).
+
+    Parameters
+    ----------
+    input_img : array_like
+        The image to transform (2D array) or a stack of images of the same
+        shape (the last two axes are the image axes).
+    number_of_scales : int
+        The number of scales of the transform, including the last smooth
+        plane (as mr_filter's `-n` option).
+    border_mode : str
+        The `scipy.ndimage` boundary mode used for convolutions.
+
+    Returns
+    -------
+    array_like
+        The `number_of_scales` planes of the transform. The first
+        `number_of_scales - 1` planes are wavelet planes (from the finest
+        scale to the coarsest one) and the last one is the smooth residual.
+        Planes are stacked along the third last axis (e.g. the shape of the
+        result is `(number_of_scales, H, W)` for a `(H, W)` image and
+        `(N, number_of_scales, H, W)` for a `(N, H, W)` stack).
+        The input image is the sum of these planes.
+    """
+
+    input_img = np.asarray(input_img, dtype=np.float64)
+
+    if input_img.ndim < 2:
+        raise ValueError("The input image should have at least 2 dimensions (got {})".format(input_img.ndim))
+
+    if number_of_scales < 1:
+        raise ValueError("The number of scales should be greater than 0 (got {})".format(number_of_scales))
+
+    plane_list = []
+    smooth_img = input_img
+
+    for scale_index in range(number_of_scales - 1):
+
+        # The "à trous" filter: insert 2^scale_index - 1 zeros between taps
+        step = 2**scale_index
+        kernel = np.zeros(4 * step + 1)
+        kernel[::step] = B3_SPLINE_FILTER
+
+        next_smooth_img = scipy.ndimage.convolve1d(smooth_img, kernel, axis=-1, mode=border_mode)
+        next_smooth_img = scipy.ndimage.convolve1d(next_smooth_img, kernel, axis=-2, mode=border_mode)
+
+        plane_list.append(smooth_img - next_smooth_img)
+        smooth_img = next_smooth_img
+
+    plane_list.append(smooth_img)
+
+    return np.stack(plane_list, axis=-3)
+
+
+def inverse_starlet_transform(planes):
+    """Reconstruct an image from its starlet transform (see
+    `starlet_transform()`).
+
+    Parameters
+    ----------
+    planes : array_like
+        The planes returned by `starlet_transform()` (planes are stacked
+        along the third last axis).
+
+    Returns
+    -------
+    array_like
+        The reconstructed image (or stack of images).
+    """
+    return np.sum(planes, axis=-3)
+
+
+# THRESHOLDING ###############################################################
+
+def get_gaussian_noise_sigma_per_scale(number_of_wavelet_planes):
+    """Return the standard deviation of the first `number_of_wavelet_planes`
+    wavelet planes for a unit variance Gaussian white noise."""
+
+    sigma_list = list(GAUSSIAN_NOISE_SIGMA_PER_SCALE[:number_of_wavelet_planes])
+
+    while len(sigma_list) < number_of_wavelet_planes:
+        sigma_list.append(sigma_list[-1] / 2.)
+
+    return np.array(sigma_list)
+
+
+def estimate_noise_sigma(first_plane):
+    """Estimate the standard deviation of the (Gaussian) noise of an image
+    from the Median Absolute Deviation of its first wavelet plane.
+
+    Parameters
+    ----------
+    first_plane : array_like
+        The finest wavelet plane of the image (2D array) or of a stack of
+        images (the last two axes are the image axes).
+
+    Returns
+    -------
+    float or array_like
+        The noise standard deviation in the image (one value per image for a
+        stack of images).
+    """
+    first_plane = np.asarray(first_plane)
+    flat_plane = first_plane.reshape(first_plane.shape[:-2] + (-1,))
+
+    median = np.median(flat_plane, axis=-1, keepdims=True)
+    mad = np.median(np.abs(flat_plane - median), axis=-1)
+
+    return mad * MAD_TO_SIGMA / GAUSSIAN_NOISE_SIGMA_PER_SCALE[0]
+
+
+def get_k_sigma_list(k_sigma_noise_threshold, number_of_wavelet_planes):
+    """Return the detection level (in units of noise sigma) of each wavelet
+    plane.
+
+    Parameters
+    ----------
+    k_sigma_noise_threshold : float or str or list
+        A single value (as mr_filter, the first scale then uses `k + 1`), or
+        one value per scale given either as a list or as a comma separated
+        string (e.g. `"2,2,3,3"`, the format of mr_filter's `-s` option).
+        A string containing a single value is a single value.
+        The last value is repeated if there are less values than wavelet
+        planes.
+    number_of_wavelet_planes : int
+        The number of wavelet planes (the number of scales minus one).
+
+    Returns
+    -------
+    array_like
+        The detection level of each wavelet plane.
+    """
+
+    if k_sigma_noise_threshold is None:
+        k_sigma_noise_threshold = 3.
+
+    if isinstance(k_sigma_noise_threshold, str):
+        k_sigma_noise_threshold = [float(value) for value in k_sigma_noise_threshold.split(",")]
+        if len(k_sigma_noise_threshold) == 1:
+            k_sigma_noise_threshold = k_sigma_noise_threshold[0]
+
+    if np.isscalar(k_sigma_noise_threshold):
+        k_sigma_list = [float(k_sigma_noise_threshold)] * number_of_wavelet_planes
+        if number_of_wavelet_planes > 0:
+            k_sigma_list[0] += 1.
+    else:
+        k_sigma_list = [float(value) for value in k_sigma_noise_threshold]
+
+        if len(k_sigma_list) == 0:
+            raise ValueError("At least one k-sigma value is required")
+
+        k_sigma_list = k_sigma_list[:number_of_wavelet_planes]
+        k_sigma_list += [k_sigma_list[-1]] * (number_of_wavelet_planes - len(k_sigma_list))
+
+    return np.array(k_sigma_list)
+
+
+def kill_isolated_support_pixels(support):
+    """Remove the isolated pixels of the wavelet planes of a multiresolution
+    support (mr_filter's `-k` option).
+
+    A pixel is isolated if none of its 4 direct neighbors is in the support
+    of the same plane. Pixels on the image border and the smooth residual
+    plane are left unchanged.
+
+    Parameters
+    ----------
+    support : array_like
+        A multiresolution support (see `get_multiresolution_support()`).
+
+    Returns
+    -------
+    array_like
+        The cleaned support (a new array).
+    """
+
+    support = np.array(support, dtype=bool, copy=True)
+
+    if support.ndim < 3:
+        raise ValueError("The support should have at least 3 dimensions (got {})".format(support.ndim))
+
+    wavelet_support = support[..., :-1, :, :]
+
+    has_neighbor = wavelet_support[..., :-2, 1:-1] | wavelet_support[..., 2:, 1:-1] | wavelet_support[..., 1:-1, :-2] | wavelet_support[..., 1:-1, 2:]
+    wavelet_support[..., 1:-1, 1:-1] &= has_neighbor
+
+    return support
+
+
+def get_multiresolution_support(planes,
+                                noise_sigma,
+                                k_sigma_noise_threshold=3.,
+                                detect_only_positive_structure=False,
+                                first_detection_scale=1,
+                                suppress_last_scale=False,
+                                suppress_isolated_pixels=False):
+    """Return the multiresolution support of a starlet transform, i.e. the
+    mask of the significant coefficients (mr_filter's `-C1` detection).
+
+    Parameters
+    ----------
+    planes : array_like
+        The planes returned by `starlet_transform()` (planes are stacked
+        along the third last axis).
+    noise_sigma : float or array_like
+        The standard deviation of the noise in the image (one value per
+        image for a stack of images).
+    k_sigma_noise_threshold : float or str or list
+        The detection level of each scale (see `get_k_sigma_list()`);
+        mr_filter's `-s` option.
+    detect_only_positive_structure : bool
+        Only keep positive coefficients (mr_filter's `-p` option).
+    first_detection_scale : int
+        The first scale (starting from 1) used for the detection; the finer
+        planes are not in the support (mr_filter's `-F` option).
+    suppress_last_scale : bool
+        Exclude the smooth residual plane from the support (mr_filter's `-K`
+        option); otherwise it is entirely in the support.
+    suppress_isolated_pixels : bool
+        Remove the isolated pixels of the support (mr_filter's `-k` option,
+        see `kill_isolated_support_pixels()`).
+
+    Returns
+    -------
+    array_like
+        A boolean array of the same shape as `planes`.
+    """
+
+    planes = np.asarray(planes, dtype=np.float64)
+
+    if planes.ndim < 3:
+        raise ValueError("The planes should have at least 3 dimensions (got {})".format(planes.ndim))
+
+    if first_detection_scale is None:
+        first_detection_scale = 1
+
+    if first_detection_scale < 1:
+        raise ValueError("The first detection scale should be greater than 0 (got {})".format(first_detection_scale))
+
+    number_of_wavelet_planes = planes.shape[-3] - 1
+
+    k_sigma_array = get_k_sigma_list(k_sigma_noise_threshold, number_of_wavelet_planes)
+    plane_sigma_array = get_gaussian_noise_sigma_per_scale(number_of_wavelet_planes)
+
+    # Broadcast (scale) x (image) to the planes shape
+    noise_sigma = np.asarray(noise_sigma, dtype=np.float64)[..., np.newaxis, np.newaxis, np.newaxis]
+    threshold_array = (k_sigma_array * plane_sigma_array)[:, np.newaxis, np.newaxis] * noise_sigma
+
+    support = np.empty(planes.shape, dtype=bool)
+    wavelet_planes = planes[..., :-1, :, :]
+
+    if detect_only_positive_structure:
+        support[..., :-1, :, :] = wavelet_planes > threshold_array
+    else:
+        support[..., :-1, :, :] = np.abs(wavelet_planes) > threshold_array
+
+    support[..., :first_detection_scale - 1, :, :] = False
+    support[..., -1, :, :] = not suppress_last_scale
+
+    if suppress_isolated_pixels:
+        support = kill_isolated_support_pixels(support)
+
+    return support
+
+
+def hard_threshold_planes(planes,
+                          noise_sigma,
+                          k_sigma_noise_threshold=3.,
+                          detect_only_positive_structure=False,
+                          first_detection_scale=1,
+                          suppress_last_scale=False,
+                          suppress_isolated_pixels=False):
+    """Apply a hard k-sigma threshold on each wavelet plane of a starlet
+    transform (mr_filter's `-f1 -C1` filtering).
+
+    Parameters are the same as `get_multiresolution_support()`.
+
+    Returns
+    -------
+    array_like
+        The thresholded planes (a new array).
+    """
+
+    support = get_multiresolution_support(planes,
+                                          noise_sigma,
+                                          k_sigma_noise_threshold=k_sigma_noise_threshold,
+                                          detect_only_positive_structure=detect_only_positive_structure,
+                                          first_detection_scale=first_detection_scale,
+                                          suppress_last_scale=suppress_last_scale,
+                                          suppress_isolated_pixels=suppress_isolated_pixels)
+
+    return np.where(support, planes, 0.)
+
+
+def hard_threshold_filter(planes,
+                          noise_sigma,
+                          k_sigma_noise_threshold=3.,
+                          detect_only_positive_structure=False,
+                          first_detection_scale=1,
+                          suppress_last_scale=False,
+                          suppress_isolated_pixels=False):
+    """Return the image(s) filtered by the multiresolution hard k-sigma
+    thresholding (mr_filter's `-f1 -C1` filtering), i.e. the inverse
+    transform of `hard_threshold_planes()`.
+
+    Parameters are the same as `get_multiresolution_support()`. No
+    positivity constraint is applied on the filtered image(s).
+
+    This is the `-f1` filtering step of `StarletTransform`; it is also used
+    on cached planes by the "starlet" engine of
+    `datapipe.optimization.objectivefunc.wavelets_mrfilter_delta_psi`.
+    """
+
+    return inverse_starlet_transform(hard_threshold_planes(planes,
+                                                           noise_sigma,
+                                                           k_sigma_noise_threshold=k_sigma_noise_threshold,
+                                                           detect_only_positive_structure=detect_only_positive_structure,
+                                                           first_detection_scale=first_detection_scale,
+                                                           suppress_last_scale=suppress_last_scale,
+                                                           suppress_isolated_pixels=suppress_isolated_pixels))
+
+
+def iterative_threshold(input_img,
+                        support,
+                        number_of_iterations=10,
+                        epsilon=1e-3,
+                        suppress_positivity_constraint=False,
+                        border_mode=DEFAULT_BORDER_MODE):
+    """Iterative multiresolution thresholding (mr_filter's `-f3` filtering).
+
+    The solution `S` is refined with the significant coefficients of the
+    residual `R = I - S`::
+
+        S <- S + W^-1(support * W(R))
+
+    (with `S` set to `max(S, 0)` after each iteration unless
+    `suppress_positivity_constraint` is `True`) until `number_of_iterations`
+    iterations have been made or the relative change of the residual
+    standard deviation falls below `epsilon`.
+
+    Parameters
+    ----------
+    input_img : array_like
+        The image to filter (2D array).
+    support : array_like
+        The multiresolution support of `input_img` (see
+        `get_multiresolution_support()`).
+    number_of_iterations : int
+        The maximum number of iterations (mr_filter's `-i` option).
+    epsilon : float
+        The convergence parameter (mr_filter's `-e` option).
+    suppress_positivity_constraint : bool
+        Don't clip negative values of the solution (mr_filter's `-P`
+        option).
+    border_mode : str
+        The `scipy.ndimage` boundary mode used for convolutions.
+
+    Returns
+    -------
+    tuple
+        The filtered image and the list of the residual standard deviation
+        after each iteration (its length is the number of iterations
+        actually made).
+    """
+
+    input_img = np.asarray(input_img, dtype=np.float64)
+    support = np.asarray(support, dtype=bool)
+
+    if number_of_iterations < 1:
+        raise ValueError("The number of iterations should be greater than 0 (got {})".format(number_of_iterations))
+
+    number_of_scales = support.shape[-3]
+
+    filtered_img = np.zeros(input_img.shape)
+    residual_img = input_img
+    residual_sigma_list = []
+
+    for iteration_index in range(number_of_iterations):
+        residual_planes = starlet_transform(residual_img, number_of_scales, border_mode=border_mode)
+        filtered_img = filtered_img + inverse_starlet_transform(np.where(support, residual_planes, 0.))
+
+        if not suppress_positivity_constraint:
+            filtered_img[filtered_img < 0.] = 0.
+
+        residual_img = input_img - filtered_img
+        residual_sigma = float(np.std(residual_img))
+
+        # Stop when the residual doesn't change anymore
+        if len(residual_sigma_list) > 0:
+            previous_residual_sigma = residual_sigma_list[-1]
+            residual_sigma_list.append(residual_sigma)
+
+            if (residual_sigma == 0.) or (abs(previous_residual_sigma - residual_sigma) / residual_sigma < epsilon):
+                break
+        else:
+            residual_sigma_list.append(residual_sigma)
+
+    return filtered_img, residual_sigma_list
+
+
+# CLEANING ALGORITHM #########################################################
+
+class StarletTransform(AbstractCleaningAlgorithm):
+    """The in-process counterpart of `wavelets_mrfilter.WaveletTransform`
+    for the B3-spline "à trous" transform (`-t2`) with multiresolution hard
+    k-sigma thresholding (`-f1`) or iterative multiresolution thresholding
+    (`-f3`)."""
+
+    def __init__(self):
+        super().__init__()
+        self.label = "WT (starlet)"  # Name to show in plots
+
+    def clean_image(self,
+                    input_img,
+                    number_of_scales=4,
+                    k_sigma_noise_threshold=3.,
+                    suppress_last_scale=False,
+                    suppress_isolated_pixels=False,
+                    detect_only_positive_structure=False,
+                    first_detection_scale=1,
+                    type_of_filtering=None,
+                    number_of_iterations=None,
+                    epsilon=None,
+                    suppress_positivity_constraint=False,
+                    noise_sigma=None,
+                    kill_isolated_pixels=False,
+                    noise_distribution=None,
+                    border_mode=DEFAULT_BORDER_MODE,
+                    plane_cache=None,
+                    verbose=False,
+                    output_data_dict=None):
+        """Clean an image with the B3-spline starlet transform.
+
+        Parameters are named after `wavelets_mrfilter.WaveletTransform`
+        ones so that the same parameter dictionary can be used with both
+        implementations.
+
+        Blank pixels (NaN) are filled with `noise_distribution` samples if
+        it is given, or with zeros otherwise; they are set back to NaN in
+        the cleaned image.
+
+        If `noise_sigma` is `None`, the noise standard deviation is
+        estimated from the first wavelet plane of the image (see
+        `estimate_noise_sigma()`).
+
+        `type_of_filtering` is either 1 (or `None`) for the multiresolution
+        hard k-sigma thresholding or 3 for the iterative multiresolution
+        thresholding (see `iterative_threshold()`; `number_of_iterations`
+        defaults to 10 and `epsilon` to 1e-3). In the latter case, the
+        number of iterations actually made and the standard deviation of
+        the residual after each iteration are recorded in
+        `output_data_dict`.
+
+        If `plane_cache` (a `WaveletPlaneCache`) is given, the planes of
+        `input_img` are only computed if they are not already in this cache
+        (and the noise injected in blank pixels is the one of the first
+        call).
+
+        Raises
+        ------
+        ValueError
+            If `input_img` is not a 2D array or if `type_of_filtering` is
+            not supported.
+        """
+
+        if type_of_filtering not in (None, 1, 3):
+            raise ValueError("Unsupported type of filtering: {} (should be 1 or 3)".format(type_of_filtering))
+
+        input_img = np.array(input_img, dtype=np.float64, copy=True)
+
+        if input_img.ndim != 2:
+            raise ValueError("The input image should be a 2D array (got a {}D array)".format(input_img.ndim))
+
+        if plane_cache is not None:
+            plane_cache_key = plane_cache.get_key(input_img, "starlet_" + border_mode, number_of_scales)
+
+        # INJECT NOISE IN NAN ##################################
+
+        nan_mask = np.isnan(input_img)
+
+        if noise_distribution is not None:
+            nan_noise_size = np.count_nonzero(nan_mask)
+            input_img[nan_mask] = noise_distribution.rvs(size=nan_noise_size)
+        else:
+            input_img[nan_mask] = 0.
+
+        # WAVELET TRANSFORM ####################################
+
+        initial_time = time.perf_counter()
+
+        if plane_cache is not None:
+            planes = plane_cache.get_planes(input_img,
+                                            lambda img, num_scales: starlet_transform(img, num_scales, border_mode=border_mode),
+                                            "starlet_" + border_mode,
+                                            number_of_scales,
+                                            key=plane_cache_key)
+        else:
+            planes = starlet_transform(input_img, number_of_scales, border_mode=border_mode)
+
+        if noise_sigma is None:
+            noise_sigma = estimate_noise_sigma(planes[0])
+
+        if verbose:
+            print("Noise sigma:", noise_sigma)
+
+        if type_of_filtering == 3:
+            support = get_multiresolution_support(planes,
+                                                  noise_sigma,
+                                                  k_sigma_noise_threshold=k_sigma_noise_threshold,
+                                                  detect_only_positive_structure=detect_only_positive_structure,
+                                                  first_detection_scale=first_detection_scale,
+                                                  suppress_last_scale=suppress_last_scale,
+                                                  suppress_isolated_pixels=suppress_isolated_pixels)
+
+            cleaned_img, residual_sigma_list = iterative_threshold(input_img,
+                                                                   support,
+                                                                   number_of_iterations=10 if number_of_iterations is None else number_of_iterations,
+                                                                   epsilon=1e-3 if epsilon is None else epsilon,
+                                                                   suppress_positivity_constraint=suppress_positivity_constraint,
+                                                                   border_mode=border_mode)
+
+            if verbose:
+                print("Iterations:", len(residual_sigma_list))
+
+            if output_data_dict is not None:
+                output_data_dict["starlet_num_iterations"] = len(residual_sigma_list)
+                output_data_dict["starlet_residual_sigma_history"] = residual_sigma_list
+        else:
+            cleaned_img = hard_threshold_filter(planes,
+                                                noise_sigma,
+                                                k_sigma_noise_threshold=k_sigma_noise_threshold,
+                                                detect_only_positive_structure=detect_only_positive_structure,
+                                                first_detection_scale=first_detection_scale,
+                                                suppress_last_scale=suppress_last_scale,
+                                                suppress_isolated_pixels=suppress_isolated_pixels)
+
+        exec_time_sec = time.perf_counter() - initial_time
+
+        if output_data_dict is not None:
+            output_data_dict["starlet_noise_sigma"] = float(noise_sigma)
+            output_data_dict["starlet_exec_time_sec"] = exec_time_sec
+
+        # INJECT NOISE IN NAN: PUT BACK NAN VALUES #############
+
+        cleaned_img[nan_mask] = np.nan
+
+        return self._kill_isolated_pixels(cleaned_img,
+                                          kill_isolated_pixels=kill_isolated_pixels,
+                                          verbose=verbose,
+                                          output_data_dict=output_data_dict)
+
+    def clean_images(self, input_img_stack, output_data_dict_list=None, **cleaning_function_params):
+        """Clean a stack of images (see
+        `AbstractCleaningAlgorithm.clean_images()`).
+
+        The multiresolution hard k-sigma thresholding is vectorized: the
+        whole stack is transformed and thresholded at once (the noise
+        standard deviation is still estimated image by image). The iterative
+        filtering (`type_of_filtering=3`), plane caches and the verbose
+        mode are processed image by image with `clean_image()`.
+        """
+
+        # Use clean_image() defaults for the missing parameters
+        params = inspect.signature(self.clean_image).bind(None, **cleaning_function_params)
+        params.apply_defaults()
+        params = params.arguments
+
+        if (params["type_of_filtering"] == 3) or (params["plane_cache"] is not None) or params["verbose"]:
+            return super().clean_images(input_img_stack,
+                                        output_data_dict_list=output_data_dict_list,
+                                        **cleaning_function_params)
+
+        if params["type_of_filtering"] not in (None, 1):
+            raise ValueError("Unsupported type of filtering: {} (should be 1 or 3)".format(params["type_of_filtering"]))
+
+        input_img_stack = np.array(input_img_stack, dtype=np.float64, copy=True)
+
+        if input_img_stack.ndim != 3:
+            raise ValueError("The image stack should be a 3D array (got a {}D array)".format(input_img_stack.ndim))
+
+        if len(input_img_stack) == 0:
+            return input_img_stack
+
+        if output_data_dict_list is None:
+            output_data_dict_list = [None] * len(input_img_stack)
+
+        # INJECT NOISE IN NAN ##################################
+
+        nan_mask_stack = np.isnan(input_img_stack)
+
+        if params["noise_distribution"] is not None:
+            nan_noise_size = np.count_nonzero(nan_mask_stack)
+            input_img_stack[nan_mask_stack] = params["noise_distribution"].rvs(size=nan_noise_size)
+        else:
+            input_img_stack[nan_mask_stack] = 0.
+
+        # WAVELET TRANSFORM ####################################
+
+        initial_time = time.perf_counter()
+
+        planes = starlet_transform(input_img_stack, params["number_of_scales"], border_mode=params["border_mode"])
+
+        if params["noise_sigma"] is None:
+            noise_sigma_array = estimate_noise_sigma(planes[:, 0])
+        else:
+            noise_sigma_array = np.full(len(input_img_stack), params["noise_sigma"], dtype=np.float64)
+
+        cleaned_img_stack = hard_threshold_filter(planes,
+                                                  noise_sigma_array,
+                                                  k_sigma_noise_threshold=params["k_sigma_noise_threshold"],
+                                                  detect_only_positive_structure=params["detect_only_positive_structure"],
+                                                  first_detection_scale=params["first_detection_scale"],
+                                                  suppress_last_scale=params["suppress_last_scale"],
+                                                  suppress_isolated_pixels=params["suppress_isolated_pixels"])
+
+        exec_time_sec = (time.perf_counter() - initial_time) / len(input_img_stack)   # Per image
+
+        # INJECT NOISE IN NAN: PUT BACK NAN VALUES #############
+
+        cleaned_img_stack[nan_mask_stack] = np.nan
+
+        for img_index, output_data_dict in enumerate(output_data_dict_list):
+            if output_data_dict is not None:
+                output_data_dict["starlet_noise_sigma"] = float(noise_sigma_array[img_index])
+                output_data_dict["starlet_exec_time_sec"] = exec_time_sec
+
+            cleaned_img_stack[img_index] = self._kill_isolated_pixels(cleaned_img_stack[img_index],
+                                                                      kill_isolated_pixels=params["kill_isolated_pixels"],
+                                                                      verbose=False,
+                                                                      output_data_dict=output_data_dict)
+
+        return cleaned_img_stack
+
+    def _kill_isolated_pixels(self, cleaned_img, kill_isolated_pixels=False, verbose=False, output_data_dict=None):
+        """Record the islands statistics of `cleaned_img` in
+        `output_data_dict` and remove its isolated pixels if
+        `kill_isolated_pixels` is `True`."""
+
+        # KILL ISOLATED PIXELS #################################
+
+        img_cleaned_islands_delta_pe, img_cleaned_islands_delta_abs_pe, img_cleaned_islands_delta_num_pixels = kill_isolated_pixels_stats(cleaned_img)
+        img_cleaned_num_islands = number_of_islands(cleaned_img)
+
+        if output_data_dict is not None:
+            output_data_dict["img_cleaned_islands_delta_pe"] = img_cleaned_islands_delta_pe
+            output_data_dict["img_cleaned_islands_delta_abs_pe"] = img_cleaned_islands_delta_abs_pe
+            output_data_dict["img_cleaned_islands_delta_num_pixels"] = img_cleaned_islands_delta_num_pixels
+            output_data_dict["img_cleaned_num_islands"] = img_cleaned_num_islands
+
+        if kill_isolated_pixels:
+            if verbose:
+                print("Kill isolated pixels")
+            initial_time = time.perf_counter()
+            cleaned_img = scipy_kill_isolated_pixels(cleaned_img)
+            exec_time_sec = time.perf_counter() - initial_time
+            if output_data_dict is not None:
+                output_data_dict["scipy_kill_isolated_pixels_time_sec"] = exec_time_sec
+
+        return cleaned_img
+
+
+def main():
+
+    # PARSE OPTIONS ###########################################################
+
+    parser = argparse.ArgumentParser(description="Denoise FITS images with the starlet (B3-spline à trous) Wavelet Transform.")
+
+    parser.add_argument("--number-of-scales", "-n", type=int, default=4, metavar="INTEGER",
+                        help="Number of scales used in the multiresolution transform (including the smooth plane). Default=4.")
+
+    parser.add_argument("--k-sigma-noise-threshold", "-s", default="3", metavar="FLOAT",
+                        help="Thresholding at nsigma * SigmaNoise (a single value or a comma separated list of values, one per scale). Default=3.")
+
+    parser.add_argument("--noise-sigma", type=float, default=None, metavar="FLOAT",
+                        help="The standard deviation of the noise in images. Default: estimated for each image.")
+
+    parser.add_argument("--suppress-last-scale", "-K", action="store_true",
+                        help="Suppress the last scale (to have background pixels = 0)")
+
+    parser.add_argument("--suppress-isolated-pixels", "-k", action="store_true",
+                        help="Suppress isolated pixels in the support")
+
+    parser.add_argument("--detect-only-positive-structure", "-p", action="store_true",
+                        help="Detect only positive structure")
+
+    parser.add_argument("--first-detection-scale", "-F", type=int, default=1, metavar="INTEGER",
+                        help="First scale used for the detection. Default=1.")
+
+    parser.add_argument("--type-of-filtering", "-f", type=int, default=1, metavar="INTEGER",
+                        help="""Type of filtering:
+                            1: Multiresolution Hard K-Sigma Thresholding
+                            3: Iterative Multiresolution Thresholding.
+                            Default=1.""")
+
+    parser.add_argument("--number-of-iterations", "-i", type=int, default=10, metavar="INTEGER",
+                        help="Maximum number of iterations of the iterative filtering. Default=10.")
+
+    parser.add_argument("--epsilon", "-e", type=float, default=1e-3, metavar="FLOAT",
+                        help="Convergence parameter of the iterative filtering (relative change of the residual). Default=1e-3.")
+
+    parser.add_argument("--suppress-positivity-constraint", "-P", action="store_true",
+                        help="Suppress the positivity constraint of the iterative filtering")
+
+    parser.add_argument("--kill-isolated-pixels", action="store_true",
+                        help="Suppress isolated pixels in the support (scipy implementation)")
+
+    parser.add_argument("--noise-cdf-file", metavar="FILE",
+                        help="The JSON file containing the Cumulated Distribution Function of the noise model used to inject artificial noise in blank pixels (those with a NaN value). Default=None.")
+
+    parser.add_argument("--verbose", "-v", action="store_true",
+                        help="Verbose mode")
+
+    # COMMON OPTIONS
+
+    parser.add_argument("--benchmark", "-b", metavar="STRING",
+                        help="The benchmark method to use to assess the algorithm for the"
+                             "given images")
+
+    parser.add_argument("--label", "-l", default=None,
+                        metavar="STRING",
+                        help="The label attached to the produced results")
+
+    parser.add_argument("--plot", action="store_true",
+                        help="Plot images")
+
+    parser.add_argument("--saveplot", metavar="FILE",
+                        help="The output file where to save plotted images")
+
+    parser.add_argument("--output", "-o", metavar="FILE",
+                        help="The output file path (JSON)")
+
+    parser.add_argument("--num-workers", type=int, default=None, metavar="INTEGER",
+                        help="The number of worker processes used to process images in parallel (0: one per CPU). Default: no parallelism.")
+
+    parser.add_argument("--parallel-backend", default="concurrent.futures",
+                        help="The process pool implementation used when --num-workers is set ('concurrent.futures' or 'multiprocessing'). Default='concurrent.futures'.")
+
+    parser.add_argument("--output-format", default="json",
+                        help="The output file format: 'json' (written at the end of the run) or 'jsonl' (one JSON record per image, written as soon as it is processed). Default='json'.")
+
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted 'jsonl' run: skip the images already recorded in the output file and append the new ones to it.")
+
+    parser.add_argument("--ref-features-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where the features of reference images are cached (they are computed for each run if this option is not set).")
+
+    parser.add_argument("--result-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where cleaned images are cached (an image cleaned with the same parameters is read from this cache instead of being cleaned again). Default: no cache.")
+
+    parser.add_argument("--result-cache-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum size (in MB) of the result cache directory (the least recently used images are removed). Default: no limit.")
+
+    parser.add_argument("--prefetch-depth", type=int, default=0, metavar="INTEGER",
+                        help="The number of FITS files read in advance by a background thread while the current image is cleaned (0 to disable prefetching). Default=0.")
+
+    parser.add_argument("--prefetch-max-mb", type=float, default=None, metavar="FLOAT",
+                        help="The maximum memory size (in MB) of the images read in advance. Default: no limit.")
+
+    parser.add_argument("fileargs", nargs="+", metavar="FILE",
+                        help="The files image to process (FITS)."
+                             "If fileargs is a directory,"
+                             "all FITS files it contains are processed.")
+
+    args = parser.parse_args()
+
+    number_of_scales = args.number_of_scales
+    k_sigma_noise_threshold = args.k_sigma_noise_threshold
+    noise_sigma = args.noise_sigma
+    suppress_last_scale = args.suppress_last_scale
+    suppress_isolated_pixels = args.suppress_isolated_pixels
+    detect_only_positive_structure = args.detect_only_positive_structure
+    first_detection_scale = args.first_detection_scale
+    type_of_filtering = args.type_of_filtering
+    number_of_iterations = args.number_of_iterations
+    epsilon = args.epsilon
+    suppress_positivity_constraint = args.suppress_positivity_constraint
+    kill_isolated_pixels = args.kill_isolated_pixels
+    noise_cdf_file = args.noise_cdf_file
+    verbose = args.verbose
+
+    benchmark_method = args.benchmark
+    label = args.label
+    plot = args.plot
+    saveplot = args.saveplot
+
+    num_workers = args.num_workers
+    parallel_backend = args.parallel_backend
+    output_format = args.output_format
+    resume = args.resume
+    ref_features_cache_dir = args.ref_features_cache
+    result_cache_dir = args.result_cache
+    result_cache_max_bytes = None if args.result_cache_max_mb is None else int(args.result_cache_max_mb * 1e6)
+    prefetch_depth = args.prefetch_depth
+    prefetch_max_bytes = None if args.prefetch_max_mb is None else int(args.prefetch_max_mb * 1e6)
+
+    input_file_or_dir_path_list = args.fileargs
+
+    if args.output is None:
+        output_file_path = "score_wavelets_starlet_benchmark_{}.json".format(benchmark_method)
+    else:
+        output_file_path = args.output
+
+    if noise_cdf_file is not None:
+        noise_distribution = EmpiricalDistribution(noise_cdf_file)
+    else:
+        noise_distribution = None
+
+    cleaning_function_params = {
+                "number_of_scales": number_of_scales,
+                "k_sigma_noise_threshold": k_sigma_noise_threshold,
+                "noise_sigma": noise_sigma,
+                "suppress_last_scale": suppress_last_scale,
+                "suppress_isolated_pixels": suppress_isolated_pixels,
+                "detect_only_positive_structure": detect_only_positive_structure,
+                "first_detection_scale": first_detection_scale,
+                "type_of_filtering": type_of_filtering,
+                "number_of_iterations": number_of_iterations,
+                "epsilon": epsilon,
+                "suppress_positivity_constraint": suppress_positivity_constraint,
+                "kill_isolated_pixels": kill_isolated_pixels,
+                "noise_distribution": noise_distribution,
+                "verbose": verbose
+            }
+
+    cleaning_algorithm = StarletTransform()
+
+    if label is not None:
+        cleaning_algorithm.label = label
+
+    output_dict = cleaning_algorithm.run(cleaning_function_params,
+                                         input_file_or_dir_path_list,
+                                         benchmark_method,
+                                         output_file_path,
+                                         plot=plot,
+                                         saveplot=saveplot,
+                                         num_workers=num_workers,
+                                         parallel_backend=parallel_backend,
+                                         output_format=output_format,
+                                         resume=resume,
+                                         ref_features_cache_dir=ref_features_cache_dir,
+                                         prefetch_depth=prefetch_depth,
+                                         prefetch_max_bytes=prefetch_max_bytes,
+                                         result_cache_dir=result_cache_dir,
+                                         result_cache_max_bytes=result_cache_max_bytes)
+
+
+if __name__ == "__main__":
+    main()
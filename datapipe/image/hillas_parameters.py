@@ -20,7 +20,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-__all__ = ['get_hillas_parameters']
+__all__ = ['get_hillas_parameters',
+           'get_hillas_psi']
 
 from ctapipe.image.hillas import hillas_parameters_1
 from ctapipe.image.hillas import hillas_parameters_2
@@ -97,3 +98,54 @@ def get_hillas_parameters(image, implementation=4, pixels_position=None):
         raise ValueError("Wrong Hillas implementation ID.")
 
     return params
+
+
+def get_hillas_psi(image, pixels_position=None):
+    r"""Return the orientation angle ``psi`` (in radians) of the major axis of
+    the Hillas ellipse of the given ``image`` or stack of images.
+
+    This is a vectorized version of ``get_hillas_parameters(image, 2,
+    pixels_position).psi`` for (stacks of) images: the angle is computed
+    from the second order moments of the images in a few array operations.
+    Angles are defined modulo pi (as the ellipse orientation).
+
+    Parameters
+    ----------
+    image : Numpy array
+        The image(s) to parametrize (the last two axes are the image axes,
+        the other ones index images). NaN pixels are ignored.
+    pixels_position : tuple of Numpy arrays
+        The `x` and `y` position of pixels (broadcastable to ``image``).
+        Pixels indices are used if `None`.
+
+    Returns
+    -------
+    Numpy array
+        The angle of each image (NaN for images without signal).
+    """
+
+    image = np.asarray(image, dtype=np.float64)
+
+    if pixels_position is not None:
+        xx = np.asarray(pixels_position[0], dtype=np.float64)
+        yy = np.asarray(pixels_position[1], dtype=np.float64)
+    else:
+        yy, xx = np.indices(image.shape[-2:], dtype=np.float64)
+
+    weights = np.where(np.isfinite(image) & np.isfinite(xx) & np.isfinite(yy), image, 0.)
+    xx = np.nan_to_num(xx)
+    yy = np.nan_to_num(yy)
+
+    axes = (-2, -1)
+    size = weights.sum(axis=axes)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = (weights * xx).sum(axis=axes) / size
+        mean_y = (weights * yy).sum(axis=axes) / size
+        var_x = (weights * xx * xx).sum(axis=axes) / size - mean_x * mean_x
+        var_y = (weights * yy * yy).sum(axis=axes) / size - mean_y * mean_y
+        cov_xy = (weights * xx * yy).sum(axis=axes) / size - mean_x * mean_y
+
+    psi = np.where(size > 0., 0.5 * np.arctan2(2. * cov_xy, var_x - var_y), np.nan)
+
+    return psi if psi.ndim > 0 else float(psi)
@@ -22,6 +22,7 @@
 
 __all__ = ['get_islands',
            'kill_isolated_pixels',
+           'kill_isolated_pixels_stack',
            'kill_isolated_pixels_stats',
            'number_of_islands']
 
@@ -119,6 +120,64 @@ def kill_isolated_pixels(array, threshold=0.2):
     return filtered_array
 
 
+def kill_isolated_pixels_stack(array, threshold=0.2):
+    """
+    Apply `kill_isolated_pixels()` on each image of a stack of images.
+
+    Parameters
+    ----------
+    array : Numpy array
+        The images to clean (the last two axes are the image axes, the other
+        ones index images).
+    threshold : float
+        The "level of the sea" before island cleaning.
+
+    Returns
+    -------
+    Numpy array
+        The images with all islands except the biggest one (the one with the
+        highest sum of pixel values) of each image removed.
+    """
+
+    array = np.asarray(array, dtype='float64')
+    filtered_array = np.copy(array)
+
+    # Put NaN pixels to 0 (temporary, see get_islands())
+    filtered_array[np.isnan(filtered_array)] = 0.
+
+    if threshold is not None:
+        filtered_array[filtered_array < threshold] = 0.
+
+    # Detect islands of all images at once: pixels are only connected along
+    # the image axes thus islands never spread over several images
+    structure = np.zeros((3,) * array.ndim, dtype=bool)
+    structure[(1,) * (array.ndim - 2)] = ndimage.generate_binary_structure(2, 1)
+    label_array, num_labels = ndimage.label(filtered_array > 0, structure=structure)
+
+    island_sum_array = np.bincount(label_array.ravel(), weights=filtered_array.ravel(), minlength=num_labels + 1)
+
+    # The image of each island
+    image_index_array = np.broadcast_to(np.arange(int(np.prod(array.shape[:-2]))).reshape(array.shape[:-2] + (1, 1)),
+                                        array.shape)
+    island_image_array = np.zeros(num_labels + 1, dtype=np.int64)
+    island_image_array[label_array.ravel()] = image_index_array.ravel()
+
+    # The sum of the biggest island of each image
+    max_island_sum_array = np.zeros(int(np.prod(array.shape[:-2])))
+    np.maximum.at(max_island_sum_array, island_image_array[1:], island_sum_array[1:])
+
+    # Only keep the biggest island(s) of each image
+    keep_island_array = island_sum_array >= max_island_sum_array[island_image_array]
+    keep_island_array[0] = False
+
+    filtered_array[~keep_island_array[label_array]] = 0.
+
+    # Put back NaN
+    filtered_array[np.isnan(array)] = np.nan
+
+    return filtered_array
+
+
 def kill_isolated_pixels_stats(array, threshold=0.2):
 
     array = array.astype('float64', copy=True)
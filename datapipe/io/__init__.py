@@ -20,9 +20,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-__all__ = ['geometry_converter',
+__all__ = ['geometry_cache',
+           'geometry_converter',
+           'geometry_registry',
+           'hex_resampler',
            'geom',
            'images',
+           'json_lines',
            'montecarlo_calibration_astri',
            'montecarlo_calibration_gct',
            'simtel']
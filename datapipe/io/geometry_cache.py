@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Compiled camera geometries.
+
+Parsing a geometry JSON file (see `datapipe.io.geom`) and building a ctapipe
+`CameraGeometry` is slow, mostly because of the "neighbors" list of lists
+and of astropy units. This module compiles each JSON file once into a
+directory stored next to it (e.g. `astri.geom.compiled/`) which contains one
+`.npy` file per array (neighbors are stored in CSR format: `indptr` and
+`indices` arrays) and a `header.json` file (the camera name, the pixel type
+and the SHA-1 checksum of the JSON file). Arrays are memory mapped, thus the
+processes using the same geometry (e.g. the workers of a pool) share its
+pages.
+
+Geometries are loaded as `LightCameraGeometry` objects which have the
+attributes used by datapipe (`cam_id`, `pix_id`, `pix_x`, `pix_y`,
+`pix_area`, `pix_type`, `neighbors`) and do not require ctapipe; they can be
+converted to ctapipe geometries with `LightCameraGeometry.to_ctapipe()`.
+
+Example:
+
+    from datapipe.io import geometry_cache
+
+    geom = geometry_cache.load_geometry("./datapipe/io/geom/astri.geom.json")
+"""
+
+__all__ = ['LightCameraGeometry',
+           'compile_geometry_file',
+           'get_compiled_dir_path',
+           'load_compiled_geometry',
+           'load_geometry']
+
+import hashlib
+import json
+import numpy as np
+import os
+import scipy.sparse
+import shutil
+import tempfile
+import weakref
+
+###############################################################################
+
+# LightCameraGeometry -> ctapipe CameraGeometry (see LightCameraGeometry.to_ctapipe())
+_ctapipe_geom_dict = weakref.WeakKeyDictionary()
+
+class LightCameraGeometry(object):
+    """
+    The geometry of a camera (a lightweight alternative to ctapipe's
+    `CameraGeometry`).
+
+    Positions are in meters and areas in square meters (plain numpy arrays,
+    not astropy quantities).
+
+    Parameters
+    ----------
+    cam_id : str
+        The camera name.
+    pix_id, pix_x, pix_y, pix_area : array_like
+        The identifier, the position and the area of each pixel.
+    pix_type : str
+        The pixel shape ("rectangular" or "hexagonal").
+    neighbor_indptr, neighbor_indices : array_like
+        The neighbors of each pixel in CSR format: the neighbors of pixel `i`
+        are `neighbor_indices[neighbor_indptr[i]:neighbor_indptr[i+1]]`.
+    """
+
+    def __init__(self, cam_id, pix_id, pix_x, pix_y, pix_area, pix_type, neighbor_indptr, neighbor_indices):
+        self.cam_id = cam_id
+        self.pix_id = pix_id
+        self.pix_x = pix_x
+        self.pix_y = pix_y
+        self.pix_area = pix_area
+        self.pix_type = pix_type
+        self.neighbor_indptr = neighbor_indptr
+        self.neighbor_indices = neighbor_indices
+
+        if len(neighbor_indptr) != len(pix_id) + 1:
+            raise ValueError("Wrong neighbor_indptr size for {}: {} (expected {})".format(cam_id, len(neighbor_indptr), len(pix_id) + 1))
+
+    @classmethod
+    def from_json_dict(cls, json_dict):
+        """Make the geometry of a geometry JSON dictionary (see
+        `geometry_converter.geom_to_json_dict()`)."""
+
+        neighbors = json_dict['neighbors']
+
+        neighbor_indptr = np.zeros(len(neighbors) + 1, dtype=np.int32)
+        neighbor_indptr[1:] = np.cumsum([len(pixel_neighbors) for pixel_neighbors in neighbors])
+        neighbor_indices = np.fromiter((neighbor for pixel_neighbors in neighbors for neighbor in pixel_neighbors),
+                                       dtype=np.int32,
+                                       count=neighbor_indptr[-1])
+
+        return cls(json_dict['cam_id'],
+                   np.array(json_dict['pix_id']),
+                   np.array(json_dict['pix_x'], dtype=np.float64),
+                   np.array(json_dict['pix_y'], dtype=np.float64),
+                   np.array(json_dict['pix_area'], dtype=np.float64),
+                   json_dict['pix_type'],
+                   neighbor_indptr,
+                   neighbor_indices)
+
+    @property
+    def neighbors(self):
+        """The neighbors of each pixel (a list of lists)."""
+        neighbor_list = self.neighbor_indices.tolist()
+        return [neighbor_list[start:stop] for start, stop in zip(self.neighbor_indptr[:-1], self.neighbor_indptr[1:])]
+
+    @property
+    def neighbor_matrix_sparse(self):
+        """The adjacency matrix of the pixels (a boolean CSR matrix)."""
+        num_pixels = len(self.pix_id)
+        return scipy.sparse.csr_matrix((np.ones(len(self.neighbor_indices), dtype=bool),
+                                        np.asarray(self.neighbor_indices),
+                                        np.asarray(self.neighbor_indptr)),
+                                       shape=(num_pixels, num_pixels))
+
+    def to_ctapipe(self):
+        """Return the ctapipe `CameraGeometry` of this geometry (built once
+        per object)."""
+
+        if self not in _ctapipe_geom_dict:
+            # Imported here as ctapipe is slow to import
+            from astropy import units as u
+            from ctapipe.instrument import camera
+
+            _ctapipe_geom_dict[self] = camera.CameraGeometry(self.cam_id,
+                                                             np.array(self.pix_id),
+                                                             np.array(self.pix_x) * u.meter,
+                                                             np.array(self.pix_y) * u.meter,
+                                                             np.array(self.pix_area) * (u.meter ** 2),
+                                                             self.pix_type,
+                                                             neighbors=self.neighbors)
+
+        return _ctapipe_geom_dict[self]
+
+# COMPILED FILES ##############################################################
+
+# The arrays of compiled geometries (one `.npy` file each)
+COMPILED_ARRAY_NAMES = ("pix_id",
+                        "pix_x",
+                        "pix_y",
+                        "pix_area",
+                        "neighbor_indptr",
+                        "neighbor_indices")
+
+def get_compiled_dir_path(geom_json_file_path):
+    """Return the path of the compiled directory of a geometry JSON file."""
+    return os.path.splitext(geom_json_file_path)[0] + ".compiled"
+
+
+def _read_geom_json_file(geom_json_file_path):
+    """Return the (unparsed) content of `geom_json_file_path` and the SHA-1
+    checksum of this file."""
+
+    with open(geom_json_file_path, "rb") as fd:
+        json_bytes = fd.read()
+
+    return json_bytes, hashlib.sha1(json_bytes).hexdigest()
+
+
+def _parse_geom_json(json_bytes):
+    return LightCameraGeometry.from_json_dict(json.loads(json_bytes.decode("utf-8")))
+
+
+def compile_geometry_file(geom_json_file_path, compiled_dir_path=None):
+    """Compile `geom_json_file_path` into `compiled_dir_path` (next to the
+    JSON file by default, see `get_compiled_dir_path()`).
+
+    The directory is written in a temporary directory then renamed, so that
+    concurrent readers never see a partially written geometry.
+    """
+
+    if compiled_dir_path is None:
+        compiled_dir_path = get_compiled_dir_path(geom_json_file_path)
+
+    json_bytes, geom_json_sha1 = _read_geom_json_file(geom_json_file_path)
+    geom = _parse_geom_json(json_bytes)
+
+    parent_dir_path = os.path.dirname(os.path.abspath(compiled_dir_path))
+    tmp_dir_path = tempfile.mkdtemp(dir=parent_dir_path, prefix=".tmp_")
+    old_dir_path = None
+
+    try:
+        os.chmod(tmp_dir_path, 0o755)       # mkdtemp() makes a private directory
+
+        for name in COMPILED_ARRAY_NAMES:
+            np.save(os.path.join(tmp_dir_path, name + ".npy"), getattr(geom, name))
+
+        header_dict = {"cam_id": geom.cam_id,
+                       "pix_type": geom.pix_type,
+                       "geom_json_sha1": geom_json_sha1}
+
+        with open(os.path.join(tmp_dir_path, "header.json"), "w") as fd:
+            json.dump(header_dict, fd, sort_keys=True, indent=4)
+
+        # Directories can't be replaced by os.replace(): the previous
+        # directory (if any) is moved away first
+        if os.path.isdir(compiled_dir_path):
+            old_dir_path = tempfile.mkdtemp(dir=parent_dir_path, prefix=".tmp_")
+            os.replace(compiled_dir_path, os.path.join(old_dir_path, "compiled"))
+
+        os.replace(tmp_dir_path, compiled_dir_path)
+    except:
+        shutil.rmtree(tmp_dir_path, ignore_errors=True)
+        raise
+    finally:
+        if old_dir_path is not None:
+            shutil.rmtree(old_dir_path, ignore_errors=True)
+
+    return compiled_dir_path
+
+
+def _read_compiled_header(compiled_dir_path):
+    """Return the header of a compiled geometry or `None` if there is no
+    (valid) compiled geometry in `compiled_dir_path`."""
+
+    try:
+        with open(os.path.join(compiled_dir_path, "header.json"), "r") as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return None
+
+
+def load_compiled_geometry(compiled_dir_path):
+    """Load a geometry compiled with `compile_geometry_file()`.
+
+    Arrays are memory mapped (read-only).
+    """
+
+    with open(os.path.join(compiled_dir_path, "header.json"), "r") as fd:
+        header_dict = json.load(fd)
+
+    array_dict = {name: np.load(os.path.join(compiled_dir_path, name + ".npy"), mmap_mode='r', allow_pickle=False)
+                  for name in COMPILED_ARRAY_NAMES}
+
+    return LightCameraGeometry(header_dict["cam_id"],
+                               array_dict["pix_id"],
+                               array_dict["pix_x"],
+                               array_dict["pix_y"],
+                               array_dict["pix_area"],
+                               header_dict["pix_type"],
+                               array_dict["neighbor_indptr"],
+                               array_dict["neighbor_indices"])
+
+
+def load_geometry(geom_json_file_path):
+    """
+    Load a geometry JSON file.
+
+    The compiled directory stored next to the JSON file is used if it has
+    been compiled from the current content of the JSON file (its header
+    contains the checksum of the JSON file); otherwise the JSON file is
+    compiled first.
+
+    Unlike `datapipe.io.geometry_converter.json_file_to_geom()`, this
+    function does not return a ctapipe `CameraGeometry` (see
+    `LightCameraGeometry.to_ctapipe()`).
+
+    Parameters
+    ----------
+    geom_json_file_path : str
+        The geometry JSON file (see `datapipe.io.geom`).
+
+    Returns
+    -------
+    LightCameraGeometry
+        The geometry.
+    """
+
+    compiled_dir_path = get_compiled_dir_path(geom_json_file_path)
+
+    json_bytes, geom_json_sha1 = _read_geom_json_file(geom_json_file_path)
+    header_dict = _read_compiled_header(compiled_dir_path)
+
+    if (header_dict is None) or (header_dict.get("geom_json_sha1") != geom_json_sha1):
+        try:
+            compile_geometry_file(geom_json_file_path, compiled_dir_path)
+        except OSError:
+            # E.g. read-only installation
+            return _parse_geom_json(json_bytes)
+
+    try:
+        return load_compiled_geometry(compiled_dir_path)
+    except (OSError, ValueError, KeyError):
+        # E.g. the directory is being replaced by another process
+        return _parse_geom_json(json_bytes)
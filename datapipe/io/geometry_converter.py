@@ -28,14 +28,21 @@ __all__ = ['geom_to_json_dict',
            'geom_to_json_file',
            'json_dict_to_geom',
            'json_file_to_geom',
+           'get_astri_index_map',
+           'get_astri_inverse_index_map',
+           'get_gct_index_map',
+           'get_gct_inverse_index_map',
            'astri_to_2d_array',
            'astri_to_3d_array',
-           '2d_array_to_astri',
+           'astri_pixel_mask',
+           'array_2d_to_astri',
            'gct_to_2d_array',
            'gct_to_3d_array',
-           'gct_pixel_mask']
+           'gct_pixel_mask',
+           'array_2d_to_gct']
 
 from astropy import units as u
+import functools
 import json
 import numpy as np
 
@@ -47,6 +54,8 @@ import ctapipe
 # New version
 from ctapipe.instrument import camera
 
+from datapipe.io.geometry_registry import GeometryMapping
+
 ###############################################################################
 
 def geom_to_json_dict(geom):
@@ -95,154 +104,160 @@ def json_file_to_geom(json_file_path):
 
     return geom
 
-###############################################################################
+# INDEX MAPS ##################################################################
 
-def astri_to_2d_array(input_img, crop=False):
-    if crop:
-        return astri_to_2d_array_crop(input_img)
-    else:
-        return astri_to_2d_array_no_crop(input_img)
+# The ASTRI camera is made of 37 modules of 8x8 pixels laid out on a 7x7 grid
+# (-1 for empty positions). Module `k` holds pixels `k*64` to `k*64 + 63`.
+ASTRI_MODULE_GRID = ((-1, -1, 34, 35, 36, -1, -1),
+                     (-1, 29, 30, 31, 32, 33, -1),
+                     (22, 23, 24, 25, 26, 27, 28),
+                     (15, 16, 17, 18, 19, 20, 21),
+                     ( 8,  9, 10, 11, 12, 13, 14),
+                     (-1,  3,  4,  5,  6,  7, -1),
+                     (-1, -1,  0,  1,  2, -1, -1))
 
+ASTRI_NUM_PIXELS = 37 * 64
+GCT_NUM_PIXELS = 2048
 
-def astri_to_2d_array_no_crop(input_img):
+
+@functools.lru_cache(maxsize=None)
+def get_astri_index_map(crop=False):
     """
-    Convert images comming form "ASTRI" telescopes in order to get regular 2D "rectangular"
-    images directly usable with most image processing tools.
+    Return the index map of the ASTRI 1D to 2D conversion.
+
+    The 2D image of a 1D ctapipe image `img_1d` is `img_1d[index_map]`;
+    blank pixels (the corners of the camera) are marked with -1 in the map.
 
     Parameters
     ----------
-    input_img : numpy.array
-        The image to convert
+    crop : bool
+        If `True`, return the map of the 40x40 image made of the 25 central
+        modules (this map has no blank pixel) instead of the full 56x56
+        image.
 
     Returns
     -------
-    A numpy.array containing the cropped image.
+    A read-only 2D numpy.array of indices (computed once per process).
     """
 
-    # Check the image
-    if len(input_img) != (37*64):
-        raise ValueError("The input image is not a valide ASTRI telescope image.")
+    module_grid = np.array(ASTRI_MODULE_GRID)
+    module_map = np.arange(64).reshape([8,8])[::-1,:]
 
-    # Copy the input flat ctapipe image and add one element with the NaN value in the end
+    # index_map[r*8+i, c*8+j] = module_grid[r, c] * 64 + module_map[i, j]
+    index_map = module_grid[:, None, :, None] * 64 + module_map[None, :, None, :]
+    index_map[np.broadcast_to(module_grid[:, None, :, None] < 0, index_map.shape)] = -1
+    index_map = index_map.reshape([8*7, 8*7])
 
-    input_img_ext = np.zeros(input_img.shape[0] + 1)
-    input_img_ext[:-1] = input_img[:]
-    input_img_ext[-1] = np.nan
+    if crop:
+        index_map = np.ascontiguousarray(index_map[8:-8, 8:-8])
 
-    # Make the transformation map #############################################
+    index_map.setflags(write=False)
+    return index_map
 
-    img_map = np.zeros([8*7, 8*7], dtype=int)
 
-    # By default, pixels maps to the last element of input_img_ext (i.e. NaN)
-    img_map[:] = -1
+@functools.lru_cache(maxsize=None)
+def get_gct_index_map():
+    """
+    Return the index map of the GCT 1D to 2D conversion.
 
-    # Map values
-    img_map[0*8:1*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 34 * 64
-    img_map[0*8:1*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 35 * 64
-    img_map[0*8:1*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 36 * 64
+    The 2D image of a 1D ctapipe image `img_1d` is `img_1d[index_map]`;
+    blank pixels (the corners of the camera) are marked with -1 in the map.
 
-    img_map[1*8:2*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 29 * 64
-    img_map[1*8:2*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 30 * 64
-    img_map[1*8:2*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 31 * 64
-    img_map[1*8:2*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 32 * 64
-    img_map[1*8:2*8, 5*8:6*8] = np.arange(64).reshape([8,8])[::-1,:] + 33 * 64
+    Returns
+    -------
+    A read-only 48x48 numpy.array of indices (computed once per process).
+    """
 
-    img_map[2*8:3*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] + 22 * 64
-    img_map[2*8:3*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 23 * 64
-    img_map[2*8:3*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 24 * 64
-    img_map[2*8:3*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 25 * 64
-    img_map[2*8:3*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 26 * 64
-    img_map[2*8:3*8, 5*8:6*8] = np.arange(64).reshape([8,8])[::-1,:] + 27 * 64
-    img_map[2*8:3*8, 6*8:7*8] = np.arange(64).reshape([8,8])[::-1,:] + 28 * 64
+    index_map = np.full([8*6, 8*6], -1, dtype=int)
 
-    img_map[3*8:4*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] + 15 * 64
-    img_map[3*8:4*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 16 * 64
-    img_map[3*8:4*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 17 * 64
-    img_map[3*8:4*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 18 * 64
-    img_map[3*8:4*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 19 * 64
-    img_map[3*8:4*8, 5*8:6*8] = np.arange(64).reshape([8,8])[::-1,:] + 20 * 64
-    img_map[3*8:4*8, 6*8:7*8] = np.arange(64).reshape([8,8])[::-1,:] + 21 * 64
+    index_map[:8,8:-8] = np.arange(8*8*4).reshape([8,8*4])
+    index_map[8:40,:] = np.arange(32*48).reshape([32,48]) + 256
+    index_map[-8:,8:-8] = np.arange(8*8*4).reshape([8,8*4]) + 1792
 
-    img_map[4*8:5*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] +  8 * 64
-    img_map[4*8:5*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] +  9 * 64
-    img_map[4*8:5*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 10 * 64
-    img_map[4*8:5*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 11 * 64
-    img_map[4*8:5*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 12 * 64
-    img_map[4*8:5*8, 5*8:6*8] = np.arange(64).reshape([8,8])[::-1,:] + 13 * 64
-    img_map[4*8:5*8, 6*8:7*8] = np.arange(64).reshape([8,8])[::-1,:] + 14 * 64
+    index_map.setflags(write=False)
+    return index_map
 
-    img_map[5*8:6*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] +  3 * 64
-    img_map[5*8:6*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] +  4 * 64
-    img_map[5*8:6*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] +  5 * 64
-    img_map[5*8:6*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] +  6 * 64
-    img_map[5*8:6*8, 5*8:6*8] = np.arange(64).reshape([8,8])[::-1,:] +  7 * 64
 
-    img_map[6*8:7*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] +  0 * 64
-    img_map[6*8:7*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] +  1 * 64
-    img_map[6*8:7*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] +  2 * 64
+@functools.lru_cache(maxsize=None)
+def _get_astri_mapping(crop=False):
+    return GeometryMapping(get_astri_index_map(crop), ASTRI_NUM_PIXELS, name="ASTRI")
 
-    # Make the output image
-    img_2d = input_img_ext[[img_map.ravel()]].reshape([8*7, 8*7])
 
-    return img_2d
+@functools.lru_cache(maxsize=None)
+def _get_gct_mapping():
+    return GeometryMapping(get_gct_index_map(), GCT_NUM_PIXELS, name="GCT")
 
 
-def astri_to_2d_array_crop(input_img):
+def get_astri_inverse_index_map():
     """
-    Crop images comming form "ASTRI" telescopes in order to get regular 2D "rectangular"
-    images directly usable with most image processing tools.
+    Return the index map of the ASTRI 2D (56x56) to 1D conversion.
 
-    Parameters
-    ----------
-    input_img : numpy.array
-        The image to crop
+    The 1D ctapipe image of a 2D image `img_2d` is
+    `img_2d.ravel()[inverse_index_map]`.
 
     Returns
     -------
-    A numpy.array containing the cropped image.
+    A read-only 1D numpy.array of indices (computed once per process).
     """
+    return _get_astri_mapping(crop=False).inverse_index_map
 
-    # Check the image
-    if len(input_img) != (37*64):
-        raise ValueError("The input image is not a valide ASTRI telescope image.")
 
-    # Make the transformation map
-    img_map = np.zeros([8*5, 8*5], dtype=int)
+def get_gct_inverse_index_map():
+    """
+    Return the index map of the GCT 2D (48x48) to 1D conversion.
 
-    img_map[0*8:1*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] + 29 * 64
-    img_map[0*8:1*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 30 * 64
-    img_map[0*8:1*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 31 * 64
-    img_map[0*8:1*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 32 * 64
-    img_map[0*8:1*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 33 * 64
+    The 1D ctapipe image of a 2D image `img_2d` is
+    `img_2d.ravel()[inverse_index_map]`.
 
-    img_map[1*8:2*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] + 23 * 64
-    img_map[1*8:2*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 24 * 64
-    img_map[1*8:2*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 25 * 64
-    img_map[1*8:2*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 26 * 64
-    img_map[1*8:2*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 27 * 64
+    Returns
+    -------
+    A read-only 1D numpy.array of indices (computed once per process).
+    """
+    return _get_gct_mapping().inverse_index_map
+
+# ASTRI #######################################################################
+
+def astri_to_2d_array(input_img, crop=False):
+    if crop:
+        return astri_to_2d_array_crop(input_img)
+    else:
+        return astri_to_2d_array_no_crop(input_img)
+
+
+def astri_to_2d_array_no_crop(input_img):
+    """
+    Convert images comming form "ASTRI" telescopes in order to get regular 2D "rectangular"
+    images directly usable with most image processing tools.
+
+    Parameters
+    ----------
+    input_img : numpy.array
+        The image to convert. Batches of images (e.g. channels or events)
+        can be given as arrays of shape (..., 2368).
 
-    img_map[2*8:3*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] + 16 * 64
-    img_map[2*8:3*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 17 * 64
-    img_map[2*8:3*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 18 * 64
-    img_map[2*8:3*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 19 * 64
-    img_map[2*8:3*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 20 * 64
+    Returns
+    -------
+    A numpy.array containing the converted image (of shape (..., 56, 56)).
+    """
+    return _get_astri_mapping(crop=False).to_2d(input_img)
 
-    img_map[3*8:4*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] +  9 * 64
-    img_map[3*8:4*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] + 10 * 64
-    img_map[3*8:4*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] + 11 * 64
-    img_map[3*8:4*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] + 12 * 64
-    img_map[3*8:4*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] + 13 * 64
 
-    img_map[4*8:5*8, 0*8:1*8] = np.arange(64).reshape([8,8])[::-1,:] +  3 * 64
-    img_map[4*8:5*8, 1*8:2*8] = np.arange(64).reshape([8,8])[::-1,:] +  4 * 64
-    img_map[4*8:5*8, 2*8:3*8] = np.arange(64).reshape([8,8])[::-1,:] +  5 * 64
-    img_map[4*8:5*8, 3*8:4*8] = np.arange(64).reshape([8,8])[::-1,:] +  6 * 64
-    img_map[4*8:5*8, 4*8:5*8] = np.arange(64).reshape([8,8])[::-1,:] +  7 * 64
+def astri_to_2d_array_crop(input_img):
+    """
+    Crop images comming form "ASTRI" telescopes in order to get regular 2D "rectangular"
+    images directly usable with most image processing tools.
 
-    # Make the output image
-    cropped_img = input_img[[img_map.ravel()]].reshape([8*5, 8*5])
+    Parameters
+    ----------
+    input_img : numpy.array
+        The image to crop. Batches of images (e.g. channels or events)
+        can be given as arrays of shape (..., 2368).
 
-    return cropped_img
+    Returns
+    -------
+    A numpy.array containing the cropped image (of shape (..., 40, 40)).
+    """
+    return _get_astri_mapping(crop=True).to_2d(input_img)
 
 
 def astri_to_3d_array(input_img, crop=False):
@@ -253,7 +268,8 @@ def astri_to_3d_array(input_img, crop=False):
     Parameters
     ----------
     input_img : numpy.array
-        The image to crop
+        The images to crop (one per channel), i.e. an array of shape
+        (channels, 2368).
 
     Returns
     -------
@@ -261,123 +277,37 @@ def astri_to_3d_array(input_img, crop=False):
     """
 
     # Check the image
-    if input_img.shape[1] != (37*64):
+    if np.ndim(input_img) != 2:
         raise ValueError("The input image is not a valide ASTRI telescope image.")
 
-    img_list = []
-
-    for img_2d in input_img:
-        img_list.append(astri_to_2d_array(img_2d, crop))
-
-    return np.array(img_list)
+    return astri_to_2d_array(input_img, crop)
 
 
 def astri_pixel_mask(crop=False):
     """
+    Return the mask of the 2D ASTRI images: 1 for pixels with actual data, 0
+    for virtual (blank) pixels.
     """
-
-    if crop:
-        img_mask = np.ones([8*5, 8*5], dtype=int)
-    else:
-        img_mask = np.zeros([8*7, 8*7], dtype=int)
-
-        img_mask[0*8:1*8, 2*8:3*8] = 1
-        img_mask[0*8:1*8, 3*8:4*8] = 1
-        img_mask[0*8:1*8, 4*8:5*8] = 1
-
-        img_mask[1*8:2*8, 1*8:2*8] = 1
-        img_mask[1*8:2*8, 2*8:3*8] = 1
-        img_mask[1*8:2*8, 3*8:4*8] = 1
-        img_mask[1*8:2*8, 4*8:5*8] = 1
-        img_mask[1*8:2*8, 5*8:6*8] = 1
-
-        img_mask[2*8:3*8, 0*8:1*8] = 1
-        img_mask[2*8:3*8, 1*8:2*8] = 1
-        img_mask[2*8:3*8, 2*8:3*8] = 1
-        img_mask[2*8:3*8, 3*8:4*8] = 1
-        img_mask[2*8:3*8, 4*8:5*8] = 1
-        img_mask[2*8:3*8, 5*8:6*8] = 1
-        img_mask[2*8:3*8, 6*8:7*8] = 1
-
-        img_mask[3*8:4*8, 0*8:1*8] = 1
-        img_mask[3*8:4*8, 1*8:2*8] = 1
-        img_mask[3*8:4*8, 2*8:3*8] = 1
-        img_mask[3*8:4*8, 3*8:4*8] = 1
-        img_mask[3*8:4*8, 4*8:5*8] = 1
-        img_mask[3*8:4*8, 5*8:6*8] = 1
-        img_mask[3*8:4*8, 6*8:7*8] = 1
-
-        img_mask[4*8:5*8, 0*8:1*8] = 1
-        img_mask[4*8:5*8, 1*8:2*8] = 1
-        img_mask[4*8:5*8, 2*8:3*8] = 1
-        img_mask[4*8:5*8, 3*8:4*8] = 1
-        img_mask[4*8:5*8, 4*8:5*8] = 1
-        img_mask[4*8:5*8, 5*8:6*8] = 1
-        img_mask[4*8:5*8, 6*8:7*8] = 1
-
-        img_mask[5*8:6*8, 1*8:2*8] = 1
-        img_mask[5*8:6*8, 2*8:3*8] = 1
-        img_mask[5*8:6*8, 3*8:4*8] = 1
-        img_mask[5*8:6*8, 4*8:5*8] = 1
-        img_mask[5*8:6*8, 5*8:6*8] = 1
-
-        img_mask[6*8:7*8, 2*8:3*8] = 1
-        img_mask[6*8:7*8, 3*8:4*8] = 1
-        img_mask[6*8:7*8, 4*8:5*8] = 1
-
-    return img_mask
+    return (get_astri_index_map(crop) >= 0).astype(int)
 
 
 def array_2d_to_astri(img_2d):
+    """
+    Convert 2D (56x56) ASTRI images back to 1D ctapipe images.
+
+    Parameters
+    ----------
+    img_2d : numpy.array
+        The image to convert. Batches of images can be given as arrays of
+        shape (..., 56, 56).
 
-    img_1d = np.concatenate([
-        img_2d[6*8:7*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[6*8:7*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[6*8:7*8, 4*8:5*8][::-1,:].ravel(),
-        #
-        img_2d[5*8:6*8, 1*8:2*8][::-1,:].ravel(),
-        img_2d[5*8:6*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[5*8:6*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[5*8:6*8, 4*8:5*8][::-1,:].ravel(),
-        img_2d[5*8:6*8, 5*8:6*8][::-1,:].ravel(),
-        #
-        img_2d[4*8:5*8, 0*8:1*8][::-1,:].ravel(),
-        img_2d[4*8:5*8, 1*8:2*8][::-1,:].ravel(),
-        img_2d[4*8:5*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[4*8:5*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[4*8:5*8, 4*8:5*8][::-1,:].ravel(),
-        img_2d[4*8:5*8, 5*8:6*8][::-1,:].ravel(),
-        img_2d[4*8:5*8, 6*8:7*8][::-1,:].ravel(),
-        #
-        img_2d[3*8:4*8, 0*8:1*8][::-1,:].ravel(),
-        img_2d[3*8:4*8, 1*8:2*8][::-1,:].ravel(),
-        img_2d[3*8:4*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[3*8:4*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[3*8:4*8, 4*8:5*8][::-1,:].ravel(),
-        img_2d[3*8:4*8, 5*8:6*8][::-1,:].ravel(),
-        img_2d[3*8:4*8, 6*8:7*8][::-1,:].ravel(),
-        #
-        img_2d[2*8:3*8, 0*8:1*8][::-1,:].ravel(),
-        img_2d[2*8:3*8, 1*8:2*8][::-1,:].ravel(),
-        img_2d[2*8:3*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[2*8:3*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[2*8:3*8, 4*8:5*8][::-1,:].ravel(),
-        img_2d[2*8:3*8, 5*8:6*8][::-1,:].ravel(),
-        img_2d[2*8:3*8, 6*8:7*8][::-1,:].ravel(),
-        #
-        img_2d[1*8:2*8, 1*8:2*8][::-1,:].ravel(),
-        img_2d[1*8:2*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[1*8:2*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[1*8:2*8, 4*8:5*8][::-1,:].ravel(),
-        img_2d[1*8:2*8, 5*8:6*8][::-1,:].ravel(),
-        #
-        img_2d[0*8:1*8, 2*8:3*8][::-1,:].ravel(),
-        img_2d[0*8:1*8, 3*8:4*8][::-1,:].ravel(),
-        img_2d[0*8:1*8, 4*8:5*8][::-1,:].ravel()
-        ])
-
-    return img_1d
+    Returns
+    -------
+    A numpy.array containing the 1D image (of shape (..., 2368)).
+    """
+    return _get_astri_mapping(crop=False).to_1d(img_2d)
 
+# GCT #########################################################################
 
 def gct_to_2d_array(input_img):
     """
@@ -387,39 +317,14 @@ def gct_to_2d_array(input_img):
     Parameters
     ----------
     input_img : numpy.array
-        The image to convert
+        The image to convert. Batches of images (e.g. channels or events)
+        can be given as arrays of shape (..., 2048).
 
     Returns
     -------
-    A numpy.array containing the cropped image.
+    A numpy.array containing the converted image (of shape (..., 48, 48)).
     """
-
-    # Check the image
-    if len(input_img) != 2048:
-        raise ValueError("The input image is not a valide GCT telescope image.")
-
-    # Copy the input flat ctapipe image and add one element with the NaN value in the end
-
-    input_img_ext = np.zeros(input_img.shape[0] + 1)
-    input_img_ext[:-1] = input_img[:]
-    input_img_ext[-1] = np.nan
-
-    # Make the transformation map #############################################
-
-    img_map = np.zeros([8*6, 8*6], dtype=int)
-
-    # By default, pixels maps to the last element of input_img_ext (i.e. NaN)
-    img_map[:] = -1
-
-    # Map values
-    img_map[:8,8:-8] = np.arange(8*8*4).reshape([8,8*4])
-    img_map[8:40,:] = np.arange(32*48).reshape([32,48]) + 256
-    img_map[-8:,8:-8] = np.arange(8*8*4).reshape([8,8*4]) + 1792
-
-    # Make the output image
-    img_2d = input_img_ext[[img_map.ravel()]].reshape([8*6, 8*6])
-
-    return img_2d
+    return _get_gct_mapping().to_2d(input_img)
 
 
 def gct_to_3d_array(input_img):
@@ -430,7 +335,8 @@ def gct_to_3d_array(input_img):
     Parameters
     ----------
     input_img : numpy.array
-        The image to crop
+        The images to crop (one per channel), i.e. an array of shape
+        (channels, 2048).
 
     Returns
     -------
@@ -438,34 +344,32 @@ def gct_to_3d_array(input_img):
     """
 
     # Check the image
-    if input_img.shape[1] != 2048:
+    if np.ndim(input_img) != 2:
         raise ValueError("The input image is not a valide GCT telescope image.")
 
-    img_list = []
-
-    for img_2d in input_img:
-        img_list.append(gct_to_2d_array(img_2d))
-
-    return np.array(img_list)
+    return gct_to_2d_array(input_img)
 
 
 def gct_pixel_mask():
     """
+    Return the mask of the 2D GCT images: 1 for pixels with actual data, 0
+    for virtual (blank) pixels.
     """
-
-    img_mask = np.zeros([8*6, 8*6], dtype=int)
-
-    img_mask[:8,8:-8] = 1
-    img_mask[8:40,:] = 1
-    img_mask[-8:,8:-8] = 1
-
-    return img_mask
+    return (get_gct_index_map() >= 0).astype(int)
 
 
 def array_2d_to_gct(img_2d):
+    """
+    Convert 2D (48x48) GCT images back to 1D ctapipe images.
 
-    # Flatten image and remove NaN values
-    img_1d = img_2d[np.isfinite(img_2d)]
-
-    return img_1d
+    Parameters
+    ----------
+    img_2d : numpy.array
+        The image to convert. Batches of images can be given as arrays of
+        shape (..., 48, 48).
 
+    Returns
+    -------
+    A numpy.array containing the 1D image (of shape (..., 2048)).
+    """
+    return _get_gct_mapping().to_1d(img_2d)
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+The 1D <-> 2D image conversions of the cameras described by the
+`datapipe/io/geom/*.geom.json` files.
+
+For each camera, the index map of the 1D (ctapipe) to 2D (FITS) conversion,
+its inverse, the pixel mask and the 2D pixel positions are derived once from
+the pixel positions of the geometry JSON file (pixels are put on the grid
+made of the distinct `pix_x` and `pix_y` values) and cached in a compact
+binary file (`.map.npz`) next to the JSON file. Then every conversion is a
+single gather (`numpy.take`) on the last axis of the images.
+
+This module does not require ctapipe.
+
+Example:
+
+    from datapipe.io.geometry_registry import get_geometry_mapping
+
+    mapping = get_geometry_mapping("lstcam2d")
+    img_2d = mapping.to_2d(img_1d)    # img_1d can be a batch (..., pixels)
+    img_1d = mapping.to_1d(img_2d)
+"""
+
+__all__ = ['GeometryMapping',
+           'build_geometry_mapping',
+           'get_geom_file_path',
+           'get_geometry_mapping',
+           'get_mapping_file_path',
+           'load_geometry_mapping',
+           'save_geometry_mapping']
+
+import hashlib
+import json
+import numpy as np
+import os
+import tempfile
+import threading
+
+from datapipe.io import geom as geom_files
+
+# The geometry file of each cam_id (lower case)
+CAM_ID_GEOM_FILES = {
+    "astri": geom_files.ASTRI_GEOM_FILE,
+    "astricam": geom_files.ASTRI_GEOM_FILE,
+    "astri_cropped": geom_files.ASTRI_CROPPED_GEOM_FILE,
+    "gct": geom_files.GCT_GEOM_FILE,
+    "gate": geom_files.GCT_GEOM_FILE,
+    "chec": geom_files.GCT_GEOM_FILE,
+    "digicam2d": geom_files.DIGICAM_GEOM_FILE,
+    "flashcam2d": geom_files.FLASHCAM_GEOM_FILE,
+    "nectarcam2d": geom_files.NECTARCAM_GEOM_FILE,
+    "lstcam2d": geom_files.LSTCAM_GEOM_FILE
+}
+
+# Geometry files whose 2D images have their first row at the top of the
+# camera (highest y); the first row of the other images is at the bottom
+FLIPPED_ROWS_GEOM_FILES = (geom_files.ASTRI_GEOM_FILE,)
+
+# MAPPING #####################################################################
+
+class GeometryMapping(object):
+    """
+    The 1D <-> 2D image conversion of a camera.
+
+    Parameters
+    ----------
+    index_map : array_like
+        The 2D array of the 1D pixel index of each 2D pixel (-1 for blank
+        pixels): the 2D image of `img_1d` is `img_1d[index_map]`.
+    num_pixels : int
+        The number of pixels of the 1D images.
+    pixel_pos_2d : array_like
+        The (x, y) position of each 2D pixel, i.e. an array of shape
+        (2, rows, columns) (optional).
+    name : str
+        The camera name used in error messages.
+    """
+
+    def __init__(self, index_map, num_pixels, pixel_pos_2d=None, name="camera"):
+        self.index_map = np.array(index_map, dtype=np.intp)
+        self.num_pixels = int(num_pixels)
+        self.name = name
+
+        if self.index_map.ndim != 2 or self.index_map.max() >= self.num_pixels:
+            raise ValueError("Wrong index map for {} images".format(name))
+
+        self.image_shape = self.index_map.shape
+        self.pixel_mask = self.index_map >= 0
+
+        # The position of each 1D pixel in the flattened 2D images (-1 for
+        # pixels missing in the 2D images)
+        flat_index_map = self.index_map.ravel()
+        flat_index_array = np.flatnonzero(flat_index_map >= 0)
+        self.inverse_index_map = np.full(self.num_pixels, -1, dtype=np.intp)
+        self.inverse_index_map[flat_index_map[flat_index_array]] = flat_index_array
+
+        if pixel_pos_2d is None:
+            self.pixel_pos_2d = None
+        else:
+            self.pixel_pos_2d = np.array(pixel_pos_2d, dtype=np.float64)
+            self.pixel_pos_2d.setflags(write=False)
+
+        # Mappings are shared (see get_geometry_mapping())
+        for array in (self.index_map, self.pixel_mask, self.inverse_index_map):
+            array.setflags(write=False)
+
+        self._has_blank_pixels = not self.pixel_mask.all()
+        self._has_missing_pixels = (self.inverse_index_map < 0).any()
+
+    def to_2d(self, img_1d):
+        """
+        Convert 1D images to 2D images (blank pixels are set to NaN).
+
+        Parameters
+        ----------
+        img_1d : array_like
+            The image to convert. Batches of images (e.g. channels or events)
+            can be given as arrays of shape (..., `num_pixels`).
+
+        Returns
+        -------
+        A numpy.array of shape (..., rows, columns).
+        """
+
+        img_1d = np.asarray(img_1d)
+
+        # Check the image
+        if img_1d.ndim == 0 or img_1d.shape[-1] != self.num_pixels:
+            raise ValueError("The input image is not a valide {} telescope image.".format(self.name))
+
+        return np.take(_append_nan(img_1d) if self._has_blank_pixels else img_1d,
+                       self.index_map,
+                       axis=-1)
+
+    def to_1d(self, img_2d):
+        """
+        Convert 2D images to 1D images (pixels missing in 2D images are set
+        to NaN).
+
+        Parameters
+        ----------
+        img_2d : array_like
+            The image to convert. Batches of images can be given as arrays of
+            shape (..., rows, columns).
+
+        Returns
+        -------
+        A numpy.array of shape (..., `num_pixels`).
+        """
+
+        img_2d = np.asarray(img_2d)
+
+        # Check the image
+        if img_2d.shape[-2:] != self.image_shape:
+            raise ValueError("The input image is not a valide {} 2D image.".format(self.name))
+
+        img_2d = img_2d.reshape(img_2d.shape[:-2] + (-1,))
+
+        return np.take(_append_nan(img_2d) if self._has_missing_pixels else img_2d,
+                       self.inverse_index_map,
+                       axis=-1)
+
+
+def _append_nan(img):
+    """Return a copy of `img` with one NaN element appended to its last axis
+    (-1 indices of a map refer to this element)."""
+
+    img_ext = np.empty(img.shape[:-1] + (img.shape[-1] + 1,))
+    img_ext[..., :-1] = img
+    img_ext[..., -1] = np.nan
+
+    return img_ext
+
+# BUILD #######################################################################
+
+def _get_grid_indices(coordinate_array, pitch):
+    """Return the grid index (the rank of the distinct value) of each
+    coordinate and the mean coordinate of each grid line.
+
+    Coordinates closer than half a pixel are considered equal.
+    """
+
+    sort_index_array = np.argsort(coordinate_array, kind="stable")
+    sorted_coordinate_array = coordinate_array[sort_index_array]
+
+    sorted_grid_index_array = np.concatenate([[0], np.cumsum(np.diff(sorted_coordinate_array) > pitch / 2.)])
+
+    grid_index_array = np.empty(len(coordinate_array), dtype=np.intp)
+    grid_index_array[sort_index_array] = sorted_grid_index_array
+
+    num_lines = sorted_grid_index_array[-1] + 1
+    line_coordinate_array = np.bincount(grid_index_array, weights=coordinate_array, minlength=num_lines) \
+                          / np.bincount(grid_index_array, minlength=num_lines)
+
+    return grid_index_array, line_coordinate_array
+
+
+def build_geometry_mapping(json_dict, flip_rows=False):
+    """
+    Derive the 1D <-> 2D conversion of a camera from its geometry.
+
+    Parameters
+    ----------
+    json_dict : dict
+        The geometry (see `geometry_converter.geom_to_json_dict()`); its
+        pixels should be laid out on a (possibly incomplete) square grid.
+    flip_rows : bool
+        If `True`, the first row of the 2D images is the top of the camera
+        (highest y) instead of the bottom.
+
+    Returns
+    -------
+    GeometryMapping
+        The mapping of the camera.
+    """
+
+    pix_x = np.asarray(json_dict["pix_x"], dtype=np.float64)
+    pix_y = np.asarray(json_dict["pix_y"], dtype=np.float64)
+    pitch = np.sqrt(np.min(json_dict["pix_area"]))
+    num_pixels = len(pix_x)
+
+    column_array, column_x_array = _get_grid_indices(pix_x, pitch)
+    row_array, row_y_array = _get_grid_indices(pix_y, pitch)
+
+    if flip_rows:
+        row_array = len(row_y_array) - 1 - row_array
+        row_y_array = row_y_array[::-1]
+
+    image_shape = (len(row_y_array), len(column_x_array))
+    flat_index_array = np.ravel_multi_index((row_array, column_array), image_shape)
+
+    if len(np.unique(flat_index_array)) != num_pixels:
+        raise ValueError("The pixels of {} are not laid out on a square grid".format(json_dict["cam_id"]))
+
+    index_map = np.full(image_shape, -1, dtype=np.intp)
+    index_map.ravel()[flat_index_array] = np.arange(num_pixels)
+
+    pixel_pos_2d = np.array(np.meshgrid(column_x_array, row_y_array))
+
+    return GeometryMapping(index_map, num_pixels, pixel_pos_2d, name=json_dict["cam_id"])
+
+# CACHE #######################################################################
+
+def get_geom_file_path(cam_id):
+    """Return the geometry JSON file of `cam_id` (see `datapipe.io.geom`)."""
+
+    try:
+        return CAM_ID_GEOM_FILES[cam_id.lower()]
+    except KeyError:
+        raise ValueError("Unknown cam_id: {}".format(cam_id))
+
+
+def get_mapping_file_path(geom_json_file_path):
+    """Return the path of the mapping file (`.map.npz`) of a geometry JSON
+    file."""
+    return os.path.splitext(geom_json_file_path)[0] + ".map.npz"
+
+
+def save_geometry_mapping(mapping, mapping_file_path, geom_json_sha1=""):
+    """Save `mapping` in `mapping_file_path` (a `.npz` file).
+
+    `geom_json_sha1` is the SHA-1 checksum of the geometry JSON file the
+    mapping is built from (see `_get_json_file_mapping()`).
+    """
+
+    # Write a temporary file then rename it so that concurrent readers
+    # never see a partially written file
+    fd, tmp_file_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(mapping_file_path)), prefix=".tmp_", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as tmp_fd:
+            # Indices fit in 32 bits integers
+            np.savez_compressed(tmp_fd,
+                                index_map=mapping.index_map.astype(np.int32),
+                                num_pixels=mapping.num_pixels,
+                                pixel_pos_2d=mapping.pixel_pos_2d,
+                                name=mapping.name,
+                                geom_json_sha1=geom_json_sha1)
+        os.replace(tmp_file_path, mapping_file_path)
+    except:
+        os.remove(tmp_file_path)
+        raise
+
+
+def load_geometry_mapping(mapping_file_path):
+    """Load a mapping saved with `save_geometry_mapping()`."""
+
+    with np.load(mapping_file_path) as npz_file:
+        return GeometryMapping(npz_file["index_map"],
+                               npz_file["num_pixels"],
+                               npz_file["pixel_pos_2d"],
+                               name=str(npz_file["name"]))
+
+
+def _get_json_file_mapping(geom_json_file_path):
+    """Return the mapping of `geom_json_file_path`.
+
+    The mapping file stored next to the JSON file is used if it has been
+    built from the current content of the JSON file (the checksum of the
+    JSON file is saved in the mapping file); otherwise the mapping is built
+    from the JSON file and saved.
+    """
+
+    mapping_file_path = get_mapping_file_path(geom_json_file_path)
+
+    with open(geom_json_file_path, "rb") as fd:
+        json_bytes = fd.read()
+
+    geom_json_sha1 = hashlib.sha1(json_bytes).hexdigest()
+
+    try:
+        with np.load(mapping_file_path) as npz_file:
+            is_up_to_date = ("geom_json_sha1" in npz_file.files) and (str(npz_file["geom_json_sha1"]) == geom_json_sha1)
+    except (OSError, ValueError):
+        is_up_to_date = False
+
+    if is_up_to_date:
+        return load_geometry_mapping(mapping_file_path)
+
+    json_dict = json.loads(json_bytes.decode("utf-8"))
+
+    mapping = build_geometry_mapping(json_dict, flip_rows=geom_json_file_path in FLIPPED_ROWS_GEOM_FILES)
+
+    try:
+        save_geometry_mapping(mapping, mapping_file_path, geom_json_sha1)
+    except OSError:
+        pass        # E.g. read-only installation: the mapping is built by each process
+
+    return mapping
+
+
+_mapping_dict = {}          # geometry JSON file path -> mapping
+_mapping_lock = threading.Lock()
+
+def get_geometry_mapping(cam_id):
+    """
+    Return the 1D <-> 2D conversion of `cam_id`.
+
+    Mappings are loaded once per process from the mapping file of the
+    geometry JSON file of `cam_id` (see `get_geom_file_path()`).
+
+    Returns
+    -------
+    GeometryMapping
+        The (shared, read-only) mapping of the camera.
+    """
+
+    geom_json_file_path = get_geom_file_path(cam_id)
+
+    with _mapping_lock:
+        if geom_json_file_path not in _mapping_dict:
+            _mapping_dict[geom_json_file_path] = _get_json_file_mapping(geom_json_file_path)
+
+        return _mapping_dict[geom_json_file_path]
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Resampling of the images of hexagonal cameras (DigiCam, FlashCam, NectarCam,
+LSTCam) on square 2D grids.
+
+This is the algorithm of ctapipe's `convert_geometry_1d_to_2d()` (Tino
+Michael's converter): pixel positions are rotated and sheared so that the
+axial coordinates of the hexagonal grid become orthogonal, then each pixel
+is put in a bin of a regular 2D histogram. The histogram (i.e. the
+`GeometryMapping` of the camera) is computed once per camera; converting the
+images of an event (all channels, pedestals, gains, ...) is then a single
+gather per array.
+
+This module does not require ctapipe.
+
+Example:
+
+    from datapipe.io.hex_resampler import get_hex_geometry_mapping
+
+    mapping = get_hex_geometry_mapping(geom)     # a ctapipe CameraGeometry
+    uncalibrated_image_2d = mapping.to_2d(uncalibrated_image)   # (channels, rows, columns)
+    pixel_pos_2d = mapping.pixel_pos_2d
+"""
+
+__all__ = ['build_hex_geometry_mapping',
+           'get_hex_geometry_mapping']
+
+import numpy as np
+import threading
+
+from datapipe.io.geometry_registry import GeometryMapping
+
+# The angle between the axes of the hexagonal grids (degrees)
+HEX_BASE_ANGLE = 60.
+
+###############################################################################
+
+def _get_unskew_matrix(rotation_angle):
+    """Return the matrix that rotates pixel positions by `rotation_angle`
+    (degrees) then shears them along the y axis to make the hexagonal grid
+    orthogonal."""
+
+    tan_angle = np.tan(np.radians(HEX_BASE_ANGLE))
+    sin_angle = np.sin(np.radians(rotation_angle))
+    cos_angle = np.cos(np.radians(rotation_angle))
+
+    # (x') = (   1    0) * (cos -sin) * (x)
+    # (y')   (-1/tan  1)   (sin  cos)   (y)
+    return np.array([[cos_angle, -sin_angle],
+                     [sin_angle - cos_angle / tan_angle, sin_angle / tan_angle + cos_angle]])
+
+
+def _get_grid_edges(unskewed_pos):
+    """Return the bin edges of the orthogonal grid and the scale applied on
+    x coordinates to make square bins.
+
+    The size of the bins is the distance between the first pixel and its
+    closest horizontal and vertical neighbors.
+    """
+
+    distance = np.abs(unskewed_pos - unskewed_pos[:, :1])
+    horizontal_mask = distance[1] < distance[0]
+    vertical_mask = distance[1] > distance[0]
+
+    d_x = distance[0, horizontal_mask].min()
+    d_y = distance[1, vertical_mask].min()
+
+    x_scale = d_y / d_x
+    pix_x = unskewed_pos[0] * x_scale
+    pix_y = unskewed_pos[1]
+
+    num_x_edges = int(np.around((pix_x.max() - pix_x.min()) / d_y)) + 2
+    num_y_edges = int(np.around((pix_y.max() - pix_y.min()) / d_y)) + 2
+
+    x_edges = np.linspace(pix_x.min(), pix_x.max(), num_x_edges)
+    y_edges = np.linspace(pix_y.min(), pix_y.max(), num_y_edges)
+
+    return x_edges, y_edges, x_scale
+
+
+def _get_bin_indices(values, edges):
+    """Return the bin of each value (as `numpy.histogramdd()`: bins are
+    half-open except the last one)."""
+
+    bin_indices = np.searchsorted(edges, values, side="right") - 1
+    bin_indices[values == edges[-1]] = len(edges) - 2
+
+    return bin_indices
+
+
+def build_hex_geometry_mapping(pix_x, pix_y, pix_rotation=0., add_rot=0, name="camera"):
+    """
+    Compute the resampling of a hexagonal camera on a square 2D grid.
+
+    Parameters
+    ----------
+    pix_x, pix_y : array_like
+        The position of the pixels of the camera.
+    pix_rotation : float
+        The rotation angle of the pixels (degrees), i.e. the `pix_rotation`
+        attribute of ctapipe geometries.
+    add_rot : int
+        An additional rotation of the grid of `add_rot` times 60 degrees.
+    name : str
+        The camera name used in error messages.
+
+    Returns
+    -------
+    GeometryMapping
+        The mapping of the camera. The positions of the 2D pixels
+        (`pixel_pos_2d`) are expressed in the frame of `pix_x` and `pix_y`:
+        actual pixels keep their position and blank pixels are the centers
+        of the bins sheared back into this frame.
+    """
+
+    pixel_pos = np.array([pix_x, pix_y], dtype=np.float64)
+    num_pixels = pixel_pos.shape[1]
+
+    # Rotate the grid so that hexagons have a flat top then make it orthogonal
+    rotation_angle = add_rot * HEX_BASE_ANGLE - (pix_rotation - 30.)
+    unskew_matrix = _get_unskew_matrix(rotation_angle)
+    unskewed_pos = np.dot(unskew_matrix, pixel_pos)
+
+    x_edges, y_edges, x_scale = _get_grid_edges(unskewed_pos)
+
+    # Put each pixel in its bin
+    row_array = _get_bin_indices(unskewed_pos[1], y_edges)
+    column_array = _get_bin_indices(unskewed_pos[0] * x_scale, x_edges)
+
+    image_shape = (len(y_edges) - 1, len(x_edges) - 1)
+    flat_index_array = np.ravel_multi_index((row_array, column_array), image_shape)
+
+    # Bins shared by several pixels (not expected with regular hexagonal
+    # grids) keep the last one
+    index_map = np.full(image_shape, -1, dtype=np.intp)
+    index_map.ravel()[flat_index_array] = np.arange(num_pixels)
+
+    # Position of the 2D pixels
+    grid_pos = np.array(np.meshgrid((x_edges[:-1] + x_edges[1:]) / 2. / x_scale,
+                                    (y_edges[:-1] + y_edges[1:]) / 2.))
+    pixel_pos_2d = np.tensordot(np.linalg.inv(unskew_matrix), grid_pos, axes=1)
+    pixel_pos_2d[:, index_map >= 0] = pixel_pos[:, index_map[index_map >= 0]]
+
+    return GeometryMapping(index_map, num_pixels, pixel_pos_2d, name=name)
+
+
+def _quantity_value(quantity, unit):
+    """Return the value of an astropy quantity in `unit` (plain numbers are
+    assumed to be in this unit)."""
+
+    if hasattr(quantity, "to"):
+        return quantity.to(unit).value
+    return quantity
+
+
+_mapping_dict = {}      # (cam_id, number of pixels, add_rot) -> GeometryMapping
+_mapping_lock = threading.Lock()
+
+def get_hex_geometry_mapping(geom, add_rot=0):
+    """
+    Return the square 2D resampling of the hexagonal camera `geom`.
+
+    Mappings are built once per process and camera (geometries are
+    identified by their `cam_id` and their number of pixels).
+
+    Parameters
+    ----------
+    geom : ctapipe.instrument.CameraGeometry
+        The geometry of the camera (or any object with `cam_id`, `pix_x`,
+        `pix_y` and `pix_rotation` attributes).
+    add_rot : int
+        An additional rotation of the grid of `add_rot` times 60 degrees.
+
+    Returns
+    -------
+    GeometryMapping
+        The (shared, read-only) mapping of the camera.
+    """
+
+    mapping_key = (geom.cam_id.lower(), len(geom.pix_x), add_rot)
+
+    with _mapping_lock:
+        if mapping_key not in _mapping_dict:
+            _mapping_dict[mapping_key] = build_hex_geometry_mapping(_quantity_value(geom.pix_x, "m"),
+                                                                    _quantity_value(geom.pix_y, "m"),
+                                                                    float(_quantity_value(geom.pix_rotation, "deg")),
+                                                                    add_rot,
+                                                                    name=geom.cam_id)
+
+        return _mapping_dict[mapping_key]
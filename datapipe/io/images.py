@@ -40,7 +40,7 @@ import ctapipe
 from ctapipe.io.hessio import hessio_event_source
 
 from datapipe.io import geometry_converter
-import ctapipe.image.geometry_converter as ctapipe_geom_converter
+from datapipe.io.hex_resampler import get_hex_geometry_mapping
 from ctapipe.instrument import CameraGeometry
 
 # calibrator
@@ -308,38 +308,28 @@ def simtel_images_generator(file_path, tel_filter_list=None, ev_filter_list=None
                         gains_2d = geometry_converter.gct_to_3d_array(gain)
                         pixel_pos_2d = geometry_converter.gct_to_3d_array(pixel_pos)
 
-                    elif geom.cam_id in ("DigiCam", "FlashCam"):
+                    elif geom.cam_id in ("DigiCam", "FlashCam", "NectarCam", "LSTCam"):
 
-                        buffer_id_str = geom.cam_id + "0"
+                        # Hexagonal pixel layout -> resample on a square grid
+                        # (all channels of an array are converted at once)
+                        hex_mapping = get_hex_geometry_mapping(geom, add_rot=0)
 
-                        geom2d, pe_image_2d =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pe_image,              buffer_id_str, add_rot=0)
-                        geom2d, calibrated_image_2d =   ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, calibrated_image[0],   buffer_id_str, add_rot=0)
+                        if geom.cam_id in ("DigiCam", "FlashCam"):
+                            # Single channel instruments
+                            calibrated_image = calibrated_image[0]
+                            num_channels = 1
+                        else:
+                            num_channels = 2
 
-                        geom2d, uncalibrated_image_2d = ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, uncalibrated_image[0], buffer_id_str, add_rot=0)
-                        geom2d, pedestal_2d =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pedestal[0],           buffer_id_str, add_rot=0)
-                        geom2d, gains_2d =              ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, gain[0],               buffer_id_str, add_rot=0)
+                        pe_image_2d = hex_mapping.to_2d(pe_image)
+                        calibrated_image_2d = hex_mapping.to_2d(calibrated_image)
 
-                        # Make a mock pixel position array...
-                        pixel_pos_2d = np.array(np.meshgrid(np.linspace(pixel_pos[0].min(), pixel_pos[0].max(), pe_image_2d.shape[0]),
-                                                            np.linspace(pixel_pos[1].min(), pixel_pos[1].max(), pe_image_2d.shape[1])))
+                        # (channels, rows, columns) arrays
+                        uncalibrated_image_2d = hex_mapping.to_2d(uncalibrated_image[:num_channels])
+                        pedestal_2d =           hex_mapping.to_2d(pedestal[:num_channels])
+                        gains_2d =              hex_mapping.to_2d(gain[:num_channels])
 
-                    elif geom.cam_id in ("NectarCam", "LSTCam"):
-
-                        buffer_id_str = geom.cam_id + "0"
-
-                        geom2d, pe_image_2d =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pe_image,           buffer_id_str, add_rot=0)
-                        geom2d, calibrated_image_2d =   ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, calibrated_image,   buffer_id_str, add_rot=0)
-
-                        geom2d, uncalibrated_image_2d_ch0 = ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, uncalibrated_image[0], buffer_id_str, add_rot=0)
-                        geom2d, uncalibrated_image_2d_ch1 = ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, uncalibrated_image[1], buffer_id_str, add_rot=0)
-                        geom2d, pedestal_2d_ch0 =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pedestal[0],           buffer_id_str, add_rot=0)
-                        geom2d, pedestal_2d_ch1 =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pedestal[1],           buffer_id_str, add_rot=0)
-                        geom2d, gains_2d_ch0 =              ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, gain[0],               buffer_id_str, add_rot=0)
-                        geom2d, gains_2d_ch1 =              ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, gain[1],               buffer_id_str, add_rot=0)
-
-                        # Make a mock pixel position array...
-                        pixel_pos_2d = np.array(np.meshgrid(np.linspace(pixel_pos[0].min(), pixel_pos[0].max(), pe_image_2d.shape[0]),
-                                                            np.linspace(pixel_pos[1].min(), pixel_pos[1].max(), pe_image_2d.shape[1])))
+                        pixel_pos_2d = np.array(hex_mapping.pixel_pos_2d)
 
                     else:
                         continue    # Ignore this image...
@@ -351,17 +341,12 @@ def simtel_images_generator(file_path, tel_filter_list=None, ev_filter_list=None
                     # only and then takes and return a 2D array but datapipe
                     # fits files keep all channels and thus takes 3D arrays...
 
-                    if geom.cam_id in ("GATE", "CHEC", "DigiCam", "FlashCam"):
+                    if geom.cam_id in ("GATE", "CHEC"):
                         # Single channel instruments ##########################
                         uncalibrated_image_2d = np.array([uncalibrated_image_2d])
                         pedestal_2d =           np.array([pedestal_2d])
                         gains_2d =              np.array([gains_2d])
-                    elif geom.cam_id in ("NectarCam", "LSTCam"):
-                        # Double channel instruments (EXCEPT ASTRI) ###########
-                        uncalibrated_image_2d = np.array([uncalibrated_image_2d_ch0, uncalibrated_image_2d_ch1])
-                        pedestal_2d =           np.array([pedestal_2d_ch0, pedestal_2d_ch1 ])
-                        gains_2d =              np.array([gains_2d_ch0, gains_2d_ch1])
-                    else:
+                    elif geom.cam_id not in ("DigiCam", "FlashCam", "NectarCam", "LSTCam"):
                         continue    # Ignore this image...
                         #raise NotImplementedError(geom.cam_id)
 
@@ -370,8 +355,8 @@ def simtel_images_generator(file_path, tel_filter_list=None, ev_filter_list=None
                     # 1 for pixels with actual data, 0 for virtual (blank) pixels
 
                     if geom.cam_id in ("DigiCam", "NectarCam", "FlashCam", "LSTCam"):
-                        # Instruments with square pixel layout -> use Tino's converter
-                        pixel_mask = geom2d.mask.astype(int)
+                        # Instruments with hexagonal pixel layout
+                        pixel_mask = hex_mapping.pixel_mask.astype(int)
                     elif geom.cam_id in ("ASTRICam", "ASTRI"):
                         pixel_mask = geometry_converter.astri_pixel_mask(False)
                     elif geom.cam_id in ("GATE", "CHEC"):
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Read and write benchmark results in the JSON Lines format.
+
+Unlike the classic JSON output of `AbstractCleaningAlgorithm.run()` (one big
+dictionary written once at the end of the run), a JSON Lines benchmark file
+is written incrementally and contains one compact JSON object per line:
+
+- one "header" record with the experiment metadata (written first);
+- one "image" record per processed image (i.e. one item of the classic "io"
+  list), appended as soon as the image is processed;
+- one "footer" record with the metadata only known at the end of the run
+  (e.g. the total execution time).
+
+The type of each record is given by its "record_type" item.
+"""
+
+__all__ = ['JsonLinesWriter',
+           'is_json_lines_file',
+           'iter_json_lines_file',
+           'load_json_lines_file',
+           'remove_truncated_record']
+
+import json
+import os
+
+RECORD_TYPE_KEY = "record_type"
+
+HEADER_RECORD = "header"
+IMAGE_RECORD = "image"
+FOOTER_RECORD = "footer"
+
+###############################################################################
+
+class JsonLinesWriter(object):
+    """Append benchmark records to a JSON Lines file.
+
+    Each record is flushed as soon as it is written so that an interrupted
+    run only loses the image being processed.
+    """
+
+    def __init__(self, output_file_path, append=False):
+        self.output_file_path = output_file_path
+        self._fd = open(output_file_path, "a" if append else "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def close(self):
+        self._fd.close()
+
+    def write_header(self, header_dict):
+        self._write_record(HEADER_RECORD, header_dict)
+
+    def write_image(self, image_dict):
+        self._write_record(IMAGE_RECORD, image_dict)
+
+    def write_footer(self, footer_dict):
+        self._write_record(FOOTER_RECORD, footer_dict)
+
+    def _write_record(self, record_type, record_dict):
+        record_dict = dict(record_dict)
+        record_dict[RECORD_TYPE_KEY] = record_type
+
+        self._fd.write(json.dumps(record_dict, sort_keys=True, separators=(',', ':')) + "\n")   # compact format
+        self._fd.flush()
+
+###############################################################################
+
+def is_json_lines_file(file_path):
+    """Return `True` if `file_path` is a JSON Lines benchmark file (i.e. if
+    its first line is a complete JSON record with a "record_type" item)."""
+
+    with open(file_path, "r") as fd:
+        first_line = fd.readline()
+
+    try:
+        record_dict = json.loads(first_line)
+    except ValueError:
+        return False
+
+    return isinstance(record_dict, dict) and (RECORD_TYPE_KEY in record_dict)
+
+
+def iter_json_lines_file(file_path):
+    """Read `file_path` incrementally and yield `(record_type, record_dict)`
+    tuples.
+
+    Lines that cannot be decoded (i.e. a record truncated by an interrupted
+    run) are ignored.
+    """
+
+    with open(file_path, "r") as fd:
+        for line in fd:
+            line = line.strip()
+
+            if len(line) == 0:
+                continue
+
+            try:
+                record_dict = json.loads(line)
+            except ValueError:
+                continue
+
+            record_type = record_dict.pop(RECORD_TYPE_KEY, IMAGE_RECORD)
+
+            yield record_type, record_dict
+
+
+def load_json_lines_file(file_path):
+    """Load a JSON Lines benchmark file in the same layout than the classic
+    JSON output (i.e. a dictionary with the experiment metadata and an "io"
+    list containing one dictionary per image)."""
+
+    json_dict = {}
+    io_list = []
+
+    for record_type, record_dict in iter_json_lines_file(file_path):
+        if record_type == IMAGE_RECORD:
+            io_list.append(record_dict)
+        else:
+            json_dict.update(record_dict)
+
+    json_dict["io"] = io_list
+
+    return json_dict
+
+
+def remove_truncated_record(file_path):
+    """Remove the last record of `file_path` if it has been truncated (i.e.
+    if the file doesn't end with a new line), so that new records can be
+    safely appended to a file written by an interrupted run.
+
+    Returns
+    -------
+    bool
+        `True` if a truncated record has been removed.
+    """
+
+    with open(file_path, "rb+") as fd:
+        fd.seek(0, os.SEEK_END)
+        file_size = fd.tell()
+
+        if (file_size == 0):
+            return False
+
+        fd.seek(-1, os.SEEK_END)
+        if fd.read(1) == b"\n":
+            return False
+
+        # Search the last new line character backward (block by block)
+        block_size = 4096
+        position = file_size
+        new_file_size = 0
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            fd.seek(position)
+            block = fd.read(read_size)
+            new_line_index = block.rfind(b"\n")
+            if new_line_index >= 0:
+                new_file_size = position + new_line_index + 1
+                break
+
+        fd.truncate(new_file_size)
+
+    return True
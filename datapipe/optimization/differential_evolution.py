@@ -22,6 +22,7 @@
 
 __all__ = []
 
+import argparse
 import json
 from scipy import optimize
 from datapipe.optimization.objectivefunc.wavelets_mrfilter_delta_psi import ObjectiveFunction
@@ -31,6 +32,18 @@ from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution
 
 def main():
 
+    # PARSE OPTIONS ###########################################################
+
+    parser = argparse.ArgumentParser(description="Optimize the wavelet cleaning parameters with the differential evolution method.")
+
+    parser.add_argument("--result-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where cleaned images are cached (an image cleaned with the same parameters is read from this cache instead of being cleaned again). As the noise injected in blank pixels is drawn once for each cached image, evaluations are then no longer independent draws. Default: no cache.")
+
+    parser.add_argument("--result-cache-max-mb", type=float, default=1000., metavar="FLOAT",
+                        help="The maximum size (in MB) of the result cache directory (the least recently used images are removed). Default=1000.")
+
+    args = parser.parse_args()
+
     instrument = "astri"
     #instrument = "astri_konrad"
     #instrument = "digicam"
@@ -38,6 +51,17 @@ def main():
     #instrument = "nectarcam"
     #instrument = "lstcam"
 
+    # The features of reference images are computed once and shared by all
+    # the evaluations of the objective function (None to disable the cache)
+    ref_features_cache_dir = "/dev/shm/.jd/ref_features_cache"
+
+    result_cache_dir = args.result_cache
+    result_cache_max_bytes = None if args.result_cache_max_mb is None else int(args.result_cache_max_mb * 1e6)
+
+    # The "starlet" engine only implements the mr_filter noise model 1 (-m1)
+    wavelet_engine = "mr_filter"    # "mr_filter" or "starlet"
+    wavelet_algo_params = {"noise_model": 1} if wavelet_engine == "starlet" else None
+
     if instrument == "astri":
 
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.ASTRI_CDF_FILE)
@@ -75,7 +99,12 @@ def main():
     func = ObjectiveFunction(input_files=input_files,
                              noise_distribution=noise_distribution,
                              max_num_img=None,
-                             aggregation_method="mean")  # "mean" or "median"
+                             aggregation_method="mean",  # "mean" or "median"
+                             ref_features_cache_dir=ref_features_cache_dir,
+                             result_cache_dir=result_cache_dir,
+                             result_cache_max_bytes=result_cache_max_bytes,
+                             wavelet_engine=wavelet_engine,
+                             algo_params=wavelet_algo_params)
 
     bounds = ((0.5, 6), (0.5, 6), (0.5, 6), (0.5, 6))
 
@@ -20,5 +20,6 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-__all__ = ['tailcut_delta_psi',
+__all__ = ['image_stacks',
+           'tailcut_delta_psi',
            'wavelets_mrfilter_delta_psi']
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Read the benchmark images used by the objective functions.
+
+Objective functions evaluate many parameter sets on the same images: the
+images and the Hillas psi angle of their reference image are read and
+computed once, then cleaned in stacks (one stack per image shape).
+"""
+
+__all__ = ['load_image_stacks']
+
+import numpy as np
+
+from datapipe.denoising.abstract_cleaning_algorithm import preload_benchmark_images
+from datapipe.benchmark.features import FeatureContext
+from datapipe.benchmark.features import compute_features
+
+
+def load_image_stacks(input_file_path_list):
+    """Read the input images of `input_file_path_list` and compute the
+    Hillas psi angle of their reference image.
+
+    Images are grouped by shape in stacks. Files that can't be read (or
+    whose reference image has no Hillas parameters) are counted and skipped.
+
+    Parameters
+    ----------
+    input_file_path_list : list
+        The benchmark FITS files to read.
+
+    Returns
+    -------
+    tuple
+        The list of stacks and the number of files that couldn't be read.
+        Each stack is a dictionary with the following items:
+
+        - "input_img_stack": the input images (a `(N, H, W)` float64 array);
+        - "pixels_position": the pixels position of each image (a
+          `(N, 2, H, W)` float64 array);
+        - "reference_psi_rad": the Hillas psi angle of each reference image
+          (a `(N,)` array).
+    """
+
+    image_list_per_shape = {}      # shape -> list of (input_img, pixels_position, reference psi)
+    num_failed_images = 0
+
+    for input_file_path in input_file_path_list:
+        preloaded_images = preload_benchmark_images(input_file_path)
+
+        try:
+            if isinstance(preloaded_images, Exception):
+                raise preloaded_images
+
+            fits_images_dict = preloaded_images[0]
+            input_img = fits_images_dict["input_image"].astype('float64', copy=True)
+            pixels_position = fits_images_dict["pixels_position"]
+
+            feature_context = FeatureContext(reference_img=fits_images_dict["reference_image"],
+                                             pixels_position=pixels_position)
+            reference_psi_rad = compute_features(["img_ref_hillas_2_psi"], feature_context)["img_ref_hillas_2_psi"]
+        except Exception as e:
+            print(input_file_path, e)
+            num_failed_images += 1
+            continue
+
+        image_list_per_shape.setdefault(input_img.shape, []).append((input_img, pixels_position, reference_psi_rad))
+
+    image_stack_list = []
+
+    for image_list in image_list_per_shape.values():
+        image_stack_list.append({"input_img_stack": np.array([image_tuple[0] for image_tuple in image_list]),
+                                 "pixels_position": np.array([image_tuple[1] for image_tuple in image_list], dtype=np.float64),
+                                 "reference_psi_rad": np.array([image_tuple[2] for image_tuple in image_list])})
+
+    return image_stack_list, num_failed_images
@@ -25,7 +25,19 @@ __all__ = ['ObjectiveFunction']
 import numpy as np
 
 from datapipe.denoising.tailcut import Tailcut
+from datapipe.denoising.tailcut_engine import get_tailcut_engine
 from datapipe.benchmark import assess
+from datapipe.image.hillas_parameters import get_hillas_psi
+from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stack
+from datapipe.optimization.objectivefunc.image_stacks import load_image_stacks
+
+
+# Only the features used to compute the score are computed by the benchmark
+OUTPUT_COLUMN_LIST = ["img_ref_hillas_2_psi", "img_cleaned_hillas_2_psi"]
+
+# The maximum number of pixels (images x threshold pairs x pixels) cleaned at
+# once by ObjectiveFunction.evaluate_grid()
+GRID_CHUNK_NUM_PIXELS = 2**22
 
 
 def norm_angle_diff(angle_in_degrees):
@@ -40,7 +52,7 @@ def norm_angle_diff(angle_in_degrees):
 
 class ObjectiveFunction:
 
-    def __init__(self, input_files, geom=None, max_num_img=None, aggregation_method="mean"):
+    def __init__(self, input_files, geom=None, max_num_img=None, aggregation_method="mean", ref_features_cache_dir=None, result_cache_dir=None, result_cache_max_bytes=None):
         self.call_number = 0
 
         # Init the wavelet class
@@ -54,6 +66,17 @@ class ObjectiveFunction:
 
         self.aggregation_method = aggregation_method  # "mean" or "median"
 
+        # The features of reference images are the same for all calls
+        self.ref_features_cache_dir = ref_features_cache_dir
+
+        # Images already cleaned with the same parameters are not cleaned again
+        self.result_cache_dir = result_cache_dir
+        self.result_cache_max_bytes = result_cache_max_bytes
+
+        # The images used by evaluate_grid() (read at its first call)
+        self.image_stack_list = None
+        self.num_failed_images = 0
+
         print("aggregation method:", self.aggregation_method)
 
         # PRE PROCESSING FILTERING ############################################
@@ -70,9 +93,10 @@ class ObjectiveFunction:
             high_threshold = float(threshold_list[0])
             low_threshold = float(threshold_list[1])
 
-            if low_threshold > high_threshold:
+            if not (low_threshold <= high_threshold):
                 # To avoid useless computation, reject solutions where low threshold is greater than high threshold
                 # (these solutions have the same result than the solution `low_threshold == high_threshold`)
+                # and solutions with NaN thresholds
                 return float('nan')
 
             #low_threshold = min(low_threshold, high_threshold)  # low threshold should not be greater than high threshold
@@ -89,10 +113,12 @@ class ObjectiveFunction:
 
             output_file_path = "score_tailcut_optim_{}.json".format(self.call_number)
 
+            # The same engine as evaluate_grid()
             algo_params = {
                         "kill_isolated_pixels": True,
                         "verbose": False,
-                        "geom": self.geom
+                        "geom": self.geom,
+                        "tailcut_engine": "csr"
                     }
 
             algo_params.update(algo_params_var)
@@ -104,7 +130,11 @@ class ObjectiveFunction:
                                                       input_file_or_dir_path_list=input_files,
                                                       benchmark_method=benchmark_method,
                                                       output_file_path=output_file_path,
-                                                      max_num_img=self.max_num_img)
+                                                      max_num_img=self.max_num_img,
+                                                      ref_features_cache_dir=self.ref_features_cache_dir,
+                                                      output_column_list=OUTPUT_COLUMN_LIST,
+                                                      result_cache_dir=self.result_cache_dir,
+                                                      result_cache_max_bytes=self.result_cache_max_bytes)
 
             score_list = []
 
@@ -155,12 +185,107 @@ class ObjectiveFunction:
         return float(aggregated_score)
 
 
+    def _load_image_stacks(self):
+        """Read the images and compute the Hillas psi angle of reference
+        images once for all calls of `evaluate_grid()` (see
+        `image_stacks.load_image_stacks()`)."""
+
+        input_file_path_list = self.cleaning_algorithm._get_input_file_path_list(self.input_files, self.max_num_img)
+        self.image_stack_list, self.num_failed_images = load_image_stacks(input_file_path_list)
+
+
+    def evaluate_grid(self, threshold_list_array):
+        """Compute the score of several threshold pairs at once.
+
+        This is equivalent to calling the objective function on each pair
+        but all images are read once and each chunk of images is cleaned
+        with all pairs in a few array operations
+        (`TailcutEngine.get_mask_grid()`). Isolated pixels are killed and
+        the Hillas psi angle of cleaned images is computed with vectorized
+        functions too. As with the "ctapipe" tailcut engine, NaN pixels have
+        the value 0 for the thresholds (see `TailcutEngine.get_mask()`).
+
+        Parameters
+        ----------
+        threshold_list_array : array_like
+            The `(high_threshold, low_threshold)` pairs to evaluate (a
+            `(T, 2)` array).
+
+        Returns
+        -------
+        Numpy array
+            The `T` aggregated scores (NaN for pairs where the low threshold
+            is greater than the high threshold or a threshold is NaN).
+        """
+
+        threshold_list_array = np.asarray(threshold_list_array, dtype=np.float64).reshape(-1, 2)
+        high_threshold_array = threshold_list_array[:, 0]
+        low_threshold_array = threshold_list_array[:, 1]
+
+        # As in __call__(), pairs where low threshold is greater than high threshold (or NaN) are rejected
+        valid_mask = low_threshold_array <= high_threshold_array
+        high_threshold_array = high_threshold_array[valid_mask]
+        low_threshold_array = low_threshold_array[valid_mask]
+
+        aggregated_score_array = np.full(len(threshold_list_array), np.nan)
+
+        if not np.any(valid_mask):
+            return aggregated_score_array
+
+        if self.image_stack_list is None:
+            self._load_image_stacks()
+
+        engine = get_tailcut_engine(self.geom)
+        num_thresholds = len(high_threshold_array)
+
+        score_array_list = [np.full((self.num_failed_images, num_thresholds), 90.)]   # the worst score
+
+        for image_stack_dict in self.image_stack_list:
+            input_img_stack = image_stack_dict["input_img_stack"]
+
+            num_pixels = input_img_stack[0].size
+            chunk_size = max(1, GRID_CHUNK_NUM_PIXELS // (num_thresholds * num_pixels))
+
+            for chunk_start in range(0, len(input_img_stack), chunk_size):
+                chunk_slice = slice(chunk_start, chunk_start + chunk_size)
+                input_img_chunk = input_img_stack[chunk_slice]
+                pixels_position_chunk = image_stack_dict["pixels_position"][chunk_slice]
+
+                # (image, thresholds, y, x)
+                mask_stack = engine.get_mask_grid(input_img_chunk, high_threshold_array, low_threshold_array)
+
+                cleaned_img_stack = np.where(mask_stack, input_img_chunk[:, np.newaxis], 0.)
+                cleaned_img_stack[np.broadcast_to(np.isnan(input_img_chunk[:, np.newaxis]), cleaned_img_stack.shape)] = np.nan
+
+                cleaned_img_stack = kill_isolated_pixels_stack(cleaned_img_stack)
+
+                cleaned_psi_rad = get_hillas_psi(cleaned_img_stack,
+                                                 (pixels_position_chunk[:, np.newaxis, 0], pixels_position_chunk[:, np.newaxis, 1]))
+
+                delta_psi_rad = cleaned_psi_rad - image_stack_dict["reference_psi_rad"][chunk_slice, np.newaxis]
+                score_array = norm_angle_diff(np.degrees(delta_psi_rad))
+                score_array[np.isnan(score_array)] = 90.    # The cleaning algorithm failed to clean this image
+
+                score_array_list.append(score_array)
+
+        score_array = np.concatenate(score_array_list)
+
+        if self.aggregation_method == "mean":
+            aggregated_score_array[valid_mask] = score_array.mean(axis=0)
+        elif self.aggregation_method == "median":
+            aggregated_score_array[valid_mask] = np.median(score_array, axis=0)
+        else:
+            raise ValueError("Unknown value for aggregation_method: {}".format(self.aggregation_method))
+
+        return aggregated_score_array
+
+
 if __name__ == "__main__":
     # Test...
 
-    from datapipe.io import geometry_converter
+    from datapipe.io import geometry_cache
 
-    geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/digicam2d.geom.json")
+    geom = geometry_cache.load_geometry("./datapipe/io/geom/digicam2d.geom.json")
 
     #func = ObjectiveFunction(input_files=["./MISC/testset/gamma/digicam/"], geom=geom)
     func = ObjectiveFunction(input_files=["/dev/shm/.jd/digicam/gamma/"], geom=geom)
@@ -20,12 +20,99 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-__all__ = ['ObjectiveFunction']
+__all__ = ['ObjectiveFunction',
+           'get_starlet_params',
+           'make_plane_cache']
 
 import numpy as np
 
 from datapipe.denoising.wavelets_mrfilter import WaveletTransform
+from datapipe.denoising import wavelets_starlet
+from datapipe.denoising.wavelet_plane_cache import WaveletPlaneCache
 from datapipe.benchmark import assess
+from datapipe.benchmark.features import FeatureContext
+from datapipe.benchmark.features import compute_features
+from datapipe.image.kill_isolated_pixels import kill_isolated_pixels
+from datapipe.optimization.objectivefunc.image_stacks import load_image_stacks
+
+
+# Only the features used to compute the score are computed by the benchmark
+OUTPUT_COLUMN_LIST = ["img_ref_hillas_2_psi", "img_cleaned_hillas_2_psi"]
+
+# The number of scales of the wavelet transform
+NUMBER_OF_SCALES = 4
+
+# The parameters of WaveletTransform.clean_image() used to clean images
+# ("k_sigma_noise_threshold" and "noise_distribution" are set by each call)
+DEFAULT_ALGO_PARAMS = {
+            "coef_detection_method": 1,
+            "correction_offset": False,
+            "detect_only_positive_structure": False,
+            "epsilon": None,
+            "first_detection_scale": None,
+            "input_image_scale": "linear",
+            #"k_sigma_noise_threshold": "2,2,3,3",
+            "kill_isolated_pixels": True,
+            "mask_file_path": None,
+            #"mrfilter_directory": "/dev/shm/.jd",
+            "noise_model": 3,
+            "number_of_iterations": None,
+            "number_of_scales": NUMBER_OF_SCALES,
+            "offset_after_calibration": None,
+            "precision": None,
+            "support_file_name": None,
+            "suppress_isolated_pixels": True,
+            "suppress_last_scale": True,
+            "suppress_positivity_constraint": False,
+            "tmp_files_directory": None,    # A directory of the current process in /dev/shm
+            "type_of_filtering": None,
+            "type_of_filters": None,
+            "type_of_multiresolution_transform": None,
+            "type_of_non_orthog_filters": None,
+            "verbose": False
+        }
+
+# The mr_filter parameters reproduced by the "starlet" engine
+STARLET_PARAMS = ("detect_only_positive_structure",
+                  "first_detection_scale",
+                  "kill_isolated_pixels",
+                  "number_of_scales",
+                  "suppress_isolated_pixels",
+                  "suppress_last_scale")
+
+# The mr_filter parameters the "starlet" engine can only use with these
+# values (i.e. the mr_filter defaults: -t2 -f1 -C1 -m1)
+STARLET_RESTRICTED_PARAMS = {
+            "coef_detection_method": (None, 1),
+            "correction_offset": (None, False),
+            "input_image_scale": (None, "linear"),
+            "mask_file_path": (None,),
+            "noise_model": (None, 1),
+            "offset_after_calibration": (None, 0.),
+            "type_of_filtering": (None, 1),
+            "type_of_filters": (None,),
+            "type_of_multiresolution_transform": (None, 2),
+            "type_of_non_orthog_filters": (None,)
+        }
+
+# The mr_filter parameters which have no effect on the cleaned image with
+# the "starlet" engine (iterative filtering, files and logs)
+STARLET_IGNORED_PARAMS = ("epsilon",
+                          "mrfilter_directory",
+                          "number_of_iterations",
+                          "precision",
+                          "support_file_name",
+                          "suppress_positivity_constraint",
+                          "tmp_files_directory",
+                          "verbose")
+
+# The default size limit (in bytes) of the wavelet planes kept in memory by
+# the "starlet" engine
+DEFAULT_PLANE_CACHE_MAX_BYTES = 4 * 1024**3
+
+# The maximum number of images decomposed together and saved in a single
+# entry of the wavelet planes cache by the "starlet" engine
+PLANE_STACK_CHUNK_SIZE = 256
 
 
 def norm_angle_diff(angle_in_degrees):
@@ -36,11 +123,101 @@ def norm_angle_diff(angle_in_degrees):
     return np.abs(np.mod(angle_in_degrees + 90, 180) - 90.)
 
 
+def get_starlet_params(algo_params):
+    """Return the parameters of the "starlet" engine equivalent to the
+    mr_filter parameters `algo_params`.
+
+    Raises
+    ------
+    ValueError
+        If `algo_params` contains a parameter (or a parameter value) that
+        the "starlet" engine can't reproduce.
+    """
+
+    for param_name, param_value in algo_params.items():
+        if param_name in STARLET_RESTRICTED_PARAMS:
+            if param_value not in STARLET_RESTRICTED_PARAMS[param_name]:
+                raise ValueError('The "starlet" engine can\'t use {}={!r} (supported values: {})'.format(param_name, param_value, STARLET_RESTRICTED_PARAMS[param_name]))
+        elif (param_name not in STARLET_PARAMS) and (param_name not in STARLET_IGNORED_PARAMS):
+            raise ValueError('The "starlet" engine doesn\'t support the {} parameter'.format(param_name))
+
+    number_of_scales = algo_params.get("number_of_scales")
+    first_detection_scale = algo_params.get("first_detection_scale")
+
+    starlet_params = {
+                "number_of_scales": 4 if number_of_scales is None else number_of_scales,    # mr_filter default: 4
+                "first_detection_scale": 1 if first_detection_scale is None else first_detection_scale,
+                "detect_only_positive_structure": bool(algo_params.get("detect_only_positive_structure")),
+                "kill_isolated_pixels": bool(algo_params.get("kill_isolated_pixels")),
+                "suppress_isolated_pixels": bool(algo_params.get("suppress_isolated_pixels")),
+                "suppress_last_scale": bool(algo_params.get("suppress_last_scale"))
+            }
+
+    return starlet_params
+
+def make_plane_cache(wavelet_engine, max_bytes=DEFAULT_PLANE_CACHE_MAX_BYTES, spill_directory=None):
+    """Make the cache of wavelet planes used by the `wavelet_engine` engine.
+
+    Parameters
+    ----------
+    wavelet_engine : str
+        The wavelet engine of the objective function ("mr_filter" or
+        "starlet").
+    max_bytes : int
+        The maximum size (in bytes) of the planes kept in memory (`None` for
+        no limit).
+    spill_directory : str
+        The directory where evicted planes are saved (`None` to drop evicted
+        planes).
+
+    Returns
+    -------
+    WaveletPlaneCache
+        The cache of wavelet planes or `None` if `wavelet_engine` doesn't use
+        it (i.e. "mr_filter").
+    """
+
+    if wavelet_engine == "starlet":
+        return WaveletPlaneCache(max_bytes=max_bytes, spill_directory=spill_directory)
+    elif wavelet_engine == "mr_filter":
+        return None
+    else:
+        raise ValueError("Unknown value for wavelet_engine: {}".format(wavelet_engine))
+
+
 # OPTIMIZER ##################################################################
 
 class ObjectiveFunction:
 
-    def __init__(self, input_files, noise_distribution=None, max_num_img=None, aggregation_method="mean"):
+    def __init__(self, input_files, noise_distribution=None, max_num_img=None, aggregation_method="mean", ref_features_cache_dir=None, wavelet_engine="mr_filter", plane_cache=None, result_cache_dir=None, result_cache_max_bytes=None, algo_params=None):
+        """
+        Parameters
+        ----------
+        wavelet_engine : str
+            "mr_filter" to clean images with the mr_filter program, or
+            "starlet" to use the in-process starlet transform
+            (`datapipe.denoising.wavelets_starlet`). With "starlet", images
+            are read and decomposed once (by stacks of at most
+            `PLANE_STACK_CHUNK_SIZE` images of the same shape) at the first
+            call, then each call only thresholds and sums the wavelet
+            planes. The `max_num_img` images are thus picked once for all
+            calls.
+        plane_cache : WaveletPlaneCache
+            The cache of wavelet planes used with the "starlet" engine
+            (default: `make_plane_cache(wavelet_engine)`).
+        algo_params : dict
+            The cleaning parameters replacing the `DEFAULT_ALGO_PARAMS`
+            ones. The "starlet" engine uses the same parameters as
+            mr_filter (see `get_starlet_params()`); it only supports the
+            mr_filter Gaussian noise model, thus it requires
+            `{"noise_model": 1}` here.
+
+        Raises
+        ------
+        ValueError
+            If the "starlet" engine can't reproduce the mr_filter cleaning
+            defined by the parameters.
+        """
         self.call_number = 0
 
         # Init the wavelet class
@@ -54,6 +231,30 @@ class ObjectiveFunction:
 
         self.aggregation_method = aggregation_method  # "mean" or "median"
 
+        # The features of reference images are the same for all calls
+        self.ref_features_cache_dir = ref_features_cache_dir
+
+        # Images already cleaned with the same parameters are not cleaned again
+        self.result_cache_dir = result_cache_dir
+        self.result_cache_max_bytes = result_cache_max_bytes
+
+        if wavelet_engine not in ("mr_filter", "starlet"):
+            raise ValueError("Unknown value for wavelet_engine: {}".format(wavelet_engine))
+
+        self.algo_params = dict(DEFAULT_ALGO_PARAMS)
+        if algo_params is not None:
+            self.algo_params.update(algo_params)
+
+        self.wavelet_engine = wavelet_engine
+        self.plane_stack_list = None            # Lazily computed by _load_plane_stacks()
+
+        if wavelet_engine == "starlet":
+            self.starlet_params = get_starlet_params(self.algo_params)
+
+        if plane_cache is None:
+            plane_cache = make_plane_cache(wavelet_engine)
+        self.plane_cache = plane_cache
+
         print("aggregation method:", self.aggregation_method)
 
         # PRE PROCESSING FILTERING ############################################
@@ -64,6 +265,9 @@ class ObjectiveFunction:
     def __call__(self, sigma_list):
         self.call_number += 1
 
+        if self.wavelet_engine == "starlet":
+            return self._call_starlet(sigma_list)
+
         aggregated_score = np.inf
 
         try:
@@ -80,34 +284,8 @@ class ObjectiveFunction:
 
             output_file_path = "score_wavelets_optim_{}.json".format(self.call_number)
 
-            algo_params = {
-                        "coef_detection_method": 1,
-                        "correction_offset": False,
-                        "detect_only_positive_structure": False,
-                        "epsilon": None,
-                        "first_detection_scale": None,
-                        "input_image_scale": "linear",
-                        #"k_sigma_noise_threshold": "2,2,3,3",
-                        "kill_isolated_pixels": True,
-                        "mask_file_path": None,
-                        #"mrfilter_directory": "/dev/shm/.jd",
-                        "noise_distribution": self.noise_distribution,
-                        "noise_model": 3,
-                        "number_of_iterations": None,
-                        "number_of_scales": 4,
-                        "offset_after_calibration": None,
-                        "precision": None,
-                        "support_file_name": None,
-                        "suppress_isolated_pixels": True,
-                        "suppress_last_scale": True,
-                        "suppress_positivity_constraint": False,
-                        "tmp_files_directory": "/dev/shm/.jd",
-                        "type_of_filtering": None,
-                        "type_of_filters": None,
-                        "type_of_multiresolution_transform": None,
-                        "type_of_non_orthog_filters": None,
-                        "verbose": False
-                    }
+            algo_params = dict(self.algo_params)
+            algo_params["noise_distribution"] = self.noise_distribution
 
             algo_params.update(algo_params_var)
 
@@ -118,7 +296,11 @@ class ObjectiveFunction:
                                                       input_file_or_dir_path_list=input_files,
                                                       benchmark_method=benchmark_method,
                                                       output_file_path=output_file_path,
-                                                      max_num_img=self.max_num_img)
+                                                      max_num_img=self.max_num_img,
+                                                      ref_features_cache_dir=self.ref_features_cache_dir,
+                                                      output_column_list=OUTPUT_COLUMN_LIST,
+                                                      result_cache_dir=self.result_cache_dir,
+                                                      result_cache_max_bytes=self.result_cache_max_bytes)
 
             score_list = []
 
@@ -169,6 +351,125 @@ class ObjectiveFunction:
         return float(aggregated_score)
 
 
+    def _load_plane_stacks(self):
+        """Read the input images and compute their wavelet planes.
+
+        Images of the same shape are decomposed together by chunks of
+        `PLANE_STACK_CHUNK_SIZE` images with a single call to
+        `wavelets_starlet.starlet_transform()` per chunk. The planes of each
+        chunk are a distinct entry of `self.plane_cache` (they are computed
+        again by `_call_starlet()` if they have been evicted).
+        """
+
+        input_file_path_list = self.cleaning_algorithm._get_input_file_path_list(self.input_files, self.max_num_img)
+        image_stack_list, self.num_failed_images = load_image_stacks(input_file_path_list)
+
+        number_of_scales = self.starlet_params["number_of_scales"]
+        self.plane_stack_list = []
+
+        chunk_list = []
+        for image_stack_dict in image_stack_list:
+            for start in range(0, len(image_stack_dict["input_img_stack"]), PLANE_STACK_CHUNK_SIZE):
+                chunk_slice = slice(start, start + PLANE_STACK_CHUNK_SIZE)
+                chunk_list.append({key: value[chunk_slice] for key, value in image_stack_dict.items()})
+
+        for image_stack_dict in chunk_list:
+            input_img_stack = image_stack_dict["input_img_stack"]
+
+            # Inject noise in blank pixels (NaN)
+            nan_mask_stack = np.isnan(input_img_stack)
+            if self.noise_distribution is not None:
+                input_img_stack[nan_mask_stack] = self.noise_distribution.rvs(size=np.count_nonzero(nan_mask_stack))
+            else:
+                input_img_stack[nan_mask_stack] = 0.
+
+            plane_cache_key = self.plane_cache.get_key(input_img_stack, "starlet_" + wavelets_starlet.DEFAULT_BORDER_MODE, number_of_scales)
+            plane_stack = self.plane_cache.get_planes(input_img_stack,
+                                                      wavelets_starlet.starlet_transform,
+                                                      "starlet_" + wavelets_starlet.DEFAULT_BORDER_MODE,
+                                                      number_of_scales,
+                                                      key=plane_cache_key)
+            noise_sigma_array = wavelets_starlet.estimate_noise_sigma(plane_stack[:, 0])
+
+            self.plane_stack_list.append({"input_img_stack": input_img_stack,
+                                          "plane_cache_key": plane_cache_key,
+                                          "noise_sigma": noise_sigma_array,
+                                          "nan_mask": nan_mask_stack,
+                                          "pixels_position": image_stack_dict["pixels_position"],
+                                          "reference_psi_rad": image_stack_dict["reference_psi_rad"]})
+
+
+    def _call_starlet(self, sigma_list):
+        """Compute the score of `sigma_list` with the in-process starlet
+        transform (see `__init__()`).
+
+        Images are cleaned as mr_filter does with the parameters of
+        `self.algo_params` (see `get_starlet_params()`).
+        """
+
+        # Errors raised while reading and decomposing images (e.g. planes
+        # exceeding the cache size) are not a score of sigma_list
+        if self.plane_stack_list is None:
+            self._load_plane_stacks()
+
+        aggregated_score = np.inf
+
+        try:
+            # The same string as mr_filter's -s option (a single value is processed differently than a list)
+            k_sigma_noise_threshold = ",".join([str(sigma) for sigma in sigma_list])
+            starlet_params = self.starlet_params
+
+            score_list = [90.] * self.num_failed_images     # the worst score
+
+            for plane_stack_dict in self.plane_stack_list:
+                plane_stack = self.plane_cache.get_planes(plane_stack_dict["input_img_stack"],
+                                                          wavelets_starlet.starlet_transform,
+                                                          "starlet_" + wavelets_starlet.DEFAULT_BORDER_MODE,
+                                                          starlet_params["number_of_scales"],
+                                                          key=plane_stack_dict["plane_cache_key"])
+
+                # The same filtering as StarletTransform.clean_image()
+                cleaned_img_stack = wavelets_starlet.hard_threshold_filter(plane_stack,
+                                                                           plane_stack_dict["noise_sigma"],
+                                                                           k_sigma_noise_threshold=k_sigma_noise_threshold,
+                                                                           detect_only_positive_structure=starlet_params["detect_only_positive_structure"],
+                                                                           first_detection_scale=starlet_params["first_detection_scale"],
+                                                                           suppress_last_scale=starlet_params["suppress_last_scale"],
+                                                                           suppress_isolated_pixels=starlet_params["suppress_isolated_pixels"])
+
+                cleaned_img_stack[plane_stack_dict["nan_mask"]] = np.nan
+
+                for cleaned_img, pixels_position, reference_psi_rad in zip(cleaned_img_stack,
+                                                                           plane_stack_dict["pixels_position"],
+                                                                           plane_stack_dict["reference_psi_rad"]):
+                    try:
+                        if starlet_params["kill_isolated_pixels"]:
+                            cleaned_img = kill_isolated_pixels(cleaned_img)
+
+                        feature_context = FeatureContext(cleaned_img=cleaned_img,
+                                                         pixels_position=pixels_position)
+                        cleaned_psi_rad = compute_features(["img_cleaned_hillas_2_psi"], feature_context)["img_cleaned_hillas_2_psi"]
+
+                        delta_psi_rad = cleaned_psi_rad - reference_psi_rad
+                        score_list.append(norm_angle_diff(np.degrees(delta_psi_rad)))
+                    except Exception:
+                        # The cleaning algorithm failed to clean this image
+                        score_list.append(90.)  # the worst score
+
+            if self.aggregation_method == "mean":
+                aggregated_score = np.array([score_list]).mean()
+            elif self.aggregation_method == "median":
+                aggregated_score = np.median(score_list)
+            else:
+                raise ValueError("Unknown value for aggregation_method: {}".format(self.aggregation_method))
+
+            print({"k_sigma_noise_threshold": k_sigma_noise_threshold}, aggregated_score, self.aggregation_method)
+        except Exception as e:
+            print(e)
+
+        return float(aggregated_score)
+
+
 if __name__ == "__main__":
     # Test...
 
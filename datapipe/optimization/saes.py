@@ -22,6 +22,7 @@
 
 __all__ = []
 
+import argparse
 import math
 import numpy as np
 
@@ -34,10 +35,22 @@ import datapipe.denoising.cdf
 from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution
 
 # For tailcut
-from datapipe.io import geometry_converter
+from datapipe.io import geometry_cache
 
 def main():
 
+    # PARSE OPTIONS ###########################################################
+
+    parser = argparse.ArgumentParser(description="Optimize the cleaning parameters with a self-adaptive evolution strategy (SA-ES).")
+
+    parser.add_argument("--result-cache", default=None, metavar="DIRECTORY",
+                        help="The directory where cleaned images are cached (an image cleaned with the same parameters is read from this cache instead of being cleaned again). As the noise injected in blank pixels is drawn once for each cached image, evaluations are then no longer independent draws. Default: no cache.")
+
+    parser.add_argument("--result-cache-max-mb", type=float, default=1000., metavar="FLOAT",
+                        help="The maximum size (in MB) of the result cache directory (the least recently used images are removed). Default=1000.")
+
+    args = parser.parse_args()
+
     algo = "wavelet_mrfilter"
     #algo = "tailcut"
 
@@ -48,6 +61,17 @@ def main():
     #instrument = "nectarcam"
     #instrument = "lstcam"
 
+    # The features of reference images are computed once and shared by all
+    # the evaluations of the objective function (None to disable the cache)
+    ref_features_cache_dir = "/dev/shm/.jd/ref_features_cache"
+
+    result_cache_dir = args.result_cache
+    result_cache_max_bytes = None if args.result_cache_max_mb is None else int(args.result_cache_max_mb * 1e6)
+
+    # The "starlet" engine only implements the mr_filter noise model 1 (-m1)
+    wavelet_engine = "mr_filter"    # "mr_filter" or "starlet"
+    wavelet_algo_params = {"noise_model": 1} if wavelet_engine == "starlet" else None
+
     print("algo:", algo)
     print("instrument:", instrument)
 
@@ -55,7 +79,7 @@ def main():
 
         input_files = ["/dev/shm/.jd/astri/gamma/"]
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.ASTRI_CDF_FILE)
-        geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/astri.geom.json")
+        geom = geometry_cache.load_geometry("./datapipe/io/geom/astri.geom.json")
 
         if algo == "wavelet_mrfilter":
             init_min_val = np.array([0., 0., 0., 0.])  # TODO
@@ -68,7 +92,7 @@ def main():
 
         input_files = ["/dev/shm/.jd/astri_konrad/gamma/"]
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.ASTRI_CDF_FILE)
-        geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/astri.geom.json")
+        geom = geometry_cache.load_geometry("./datapipe/io/geom/astri.geom.json")
 
         if algo == "wavelet_mrfilter":
             init_min_val = np.array([0., 0., 0., 0.])  # TODO
@@ -81,7 +105,7 @@ def main():
 
         input_files = ["/dev/shm/.jd/digicam/gamma/"]
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.DIGICAM_CDF_FILE)
-        geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/digicam2d.geom.json")
+        geom = geometry_cache.load_geometry("./datapipe/io/geom/digicam2d.geom.json")
 
         if algo == "wavelet_mrfilter":
             init_min_val = np.array([-3., -4., -3., 0.])
@@ -94,7 +118,7 @@ def main():
 
         input_files = ["/dev/shm/.jd/flashcam/gamma/"]
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.FLASHCAM_CDF_FILE)
-        geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/flashcam2d.geom.json")
+        geom = geometry_cache.load_geometry("./datapipe/io/geom/flashcam2d.geom.json")
 
         if algo == "wavelet_mrfilter":
             init_min_val = np.array([0., 0., 0., 0.])  # TODO
@@ -107,7 +131,7 @@ def main():
 
         input_files = ["/dev/shm/.jd/nectarcam/gamma/"]
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.NECTARCAM_CDF_FILE)
-        geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/nectarcam2d.geom.json")
+        geom = geometry_cache.load_geometry("./datapipe/io/geom/nectarcam2d.geom.json")
 
         if algo == "wavelet_mrfilter":
             init_min_val = np.array([-4., -4., -4., 0.])
@@ -120,7 +144,7 @@ def main():
 
         input_files = ["/dev/shm/.jd/lstcam/gamma/"]
         noise_distribution = EmpiricalDistribution(datapipe.denoising.cdf.LSTCAM_CDF_FILE)
-        geom = geometry_converter.json_file_to_geom("./datapipe/io/geom/lstcam2d.geom.json")
+        geom = geometry_cache.load_geometry("./datapipe/io/geom/lstcam2d.geom.json")
 
         if algo == "wavelet_mrfilter":
             init_min_val = np.array([-4., -5., -4., 0.])
@@ -138,14 +162,22 @@ def main():
         func = WaveletObjectiveFunction(input_files=input_files,
                                         noise_distribution=noise_distribution,
                                         max_num_img=None,
-                                        aggregation_method="mean")  # "mean" or "median"
+                                        aggregation_method="mean",  # "mean" or "median"
+                                        ref_features_cache_dir=ref_features_cache_dir,
+                                        result_cache_dir=result_cache_dir,
+                                        result_cache_max_bytes=result_cache_max_bytes,
+                                        wavelet_engine=wavelet_engine,
+                                        algo_params=wavelet_algo_params)
 
     elif algo == "tailcut":
 
         func = TailcutObjectiveFunction(input_files=input_files,
                                         geom=geom,
                                         max_num_img=None,
-                                        aggregation_method="mean")  # "mean" or "median"
+                                        aggregation_method="mean",  # "mean" or "median"
+                                        ref_features_cache_dir=ref_features_cache_dir,
+                                        result_cache_dir=result_cache_dir,
+                                        result_cache_max_bytes=result_cache_max_bytes)
 
     else:
 
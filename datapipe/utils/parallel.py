@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Apply a function to a sequence of items with a pool of worker processes.
+
+The results are always returned in the order of the input items so that
+parallel runs produce exactly the same outputs than sequential ones.
+"""
+
+__all__ = ['PARALLEL_BACKENDS',
+           'parallel_map']
+
+import concurrent.futures
+import multiprocessing
+import os
+
+PARALLEL_BACKENDS = ("concurrent.futures", "multiprocessing")
+
+###############################################################################
+
+def parallel_map(function, iterable, num_workers=None, backend="concurrent.futures", chunksize=1):
+    """Apply `function` to each item of `iterable` and yield the results in
+    input order.
+
+    Parameters
+    ----------
+    function : callable
+        The function to apply on each item. When `num_workers` is greater than
+        1, it has to be picklable (i.e. a module level function, a bound
+        method of a picklable object or a `functools.partial` of these).
+    iterable : iterable
+        The items to process.
+    num_workers : int
+        The number of worker processes. If `None` or 1, items are processed
+        sequentially in the current process and no pool is created. If 0,
+        one worker per CPU is used.
+    backend : str
+        The process pool implementation to use: "concurrent.futures" or
+        "multiprocessing".
+    chunksize : int
+        The number of items sent at once to each worker.
+
+    Returns
+    -------
+    iterator
+        The results of `function` in the same order than `iterable`.
+
+    Raises
+    ------
+    ValueError
+        If `backend` is not one of `PARALLEL_BACKENDS`.
+    """
+
+    if backend not in PARALLEL_BACKENDS:
+        raise ValueError("Unknown parallel backend: {} (should be one of {})".format(backend, ", ".join(PARALLEL_BACKENDS)))
+
+    if num_workers == 0:
+        num_workers = os.cpu_count()
+
+    return _parallel_map(function, iterable, num_workers, backend, chunksize)
+
+
+def _parallel_map(function, iterable, num_workers, backend, chunksize):
+
+    if (num_workers is None) or (num_workers <= 1):
+        yield from map(function, iterable)
+    elif backend == "concurrent.futures":
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+            yield from executor.map(function, iterable, chunksize=chunksize)
+    else:
+        with multiprocessing.Pool(processes=num_workers) as pool:
+            yield from pool.imap(function, iterable, chunksize=chunksize)
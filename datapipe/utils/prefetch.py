@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Overlap I/O and computation with a bounded prefetch queue.
+
+The next items of a sequence are loaded by a pool of background threads
+while the current one is being processed by the caller. This mainly helps
+when input files are on a slow (e.g. network) file system: reading and
+decoding files releases the GIL most of the time.
+"""
+
+__all__ = ['get_num_bytes',
+           'prefetch_map']
+
+import collections
+import concurrent.futures
+
+import numpy as np
+
+###############################################################################
+
+def get_num_bytes(obj):
+    """Return the number of bytes of the Numpy arrays contained in `obj`
+    (which can be an array or a (nested) dict, list or tuple of arrays).
+
+    Other objects are ignored.
+    """
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, dict):
+        return sum(get_num_bytes(value) for value in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sum(get_num_bytes(item) for item in obj)
+    else:
+        return 0
+
+
+def prefetch_map(function, iterable, depth=2, max_bytes=None, num_threads=1, size_function=get_num_bytes):
+    """Apply `function` to each item of `iterable` in background threads and
+    yield the results in input order.
+
+    Parameters
+    ----------
+    function : callable
+        The (I/O bound) function to apply on each item.
+    iterable : iterable
+        The items to process.
+    depth : int
+        The maximum number of items loaded in advance (i.e. submitted to the
+        threads but not yet consumed by the caller).
+    max_bytes : int
+        If not `None`, no more items are submitted while the results loaded
+        in advance take more than `max_bytes` bytes (as measured by
+        `size_function`). At least one item is always in progress so that
+        the iteration cannot stall.
+    num_threads : int
+        The number of loading threads.
+    size_function : callable
+        The function used to measure the size of results (in bytes).
+
+    Returns
+    -------
+    iterator
+        The results of `function` in the same order than `iterable`.
+        Exceptions raised by `function` are raised when the corresponding
+        result is reached.
+
+    Raises
+    ------
+    ValueError
+        If `depth` or `num_threads` is lower than 1.
+    """
+
+    if depth < 1:
+        raise ValueError("The prefetch depth should be greater than 0")
+
+    if num_threads < 1:
+        raise ValueError("The number of prefetch threads should be greater than 0")
+
+    return _prefetch_map(function, iterable, depth, max_bytes, num_threads, size_function)
+
+
+def _prefetch_map(function, iterable, depth, max_bytes, num_threads, size_function):
+
+    iterator = iter(iterable)
+    pending_futures = collections.deque()
+    result_size_dict = {}     # The size of the results already loaded (future -> num bytes)
+
+    def buffered_bytes():
+        for future in pending_futures:
+            if (future not in result_size_dict) and future.done() and (future.exception() is None):
+                result_size_dict[future] = size_function(future.result())
+        return sum(result_size_dict.values())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        is_exhausted = False
+
+        while True:
+
+            # Fill the queue
+            while (not is_exhausted) and (len(pending_futures) < depth):
+                if (max_bytes is not None) and (len(pending_futures) > 0) and (buffered_bytes() >= max_bytes):
+                    break
+
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    is_exhausted = True
+                    break
+
+                pending_futures.append(executor.submit(function, item))
+
+            if len(pending_futures) == 0:
+                break
+
+            future = pending_futures.popleft()
+            result_size_dict.pop(future, None)
+
+            yield future.result()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Measure the execution time of the stages of a processing pipeline.
+
+Example:
+
+    timer = StageTimer()
+
+    for img in img_list:
+        with timer.stage("clean"):
+            clean(img)
+        with timer.stage("assess"):
+            assess(img)
+
+    print(format_timing_report(timer.get_report()))
+"""
+
+__all__ = ['StageTimer',
+           'format_timing_report']
+
+import collections
+import contextlib
+import time
+
+import numpy as np
+
+###############################################################################
+
+class StageTimer(object):
+    """Collect the durations (in seconds) of named stages.
+
+    Each stage can be timed several times (e.g. once per image); all its
+    durations are kept to compute the report statistics.
+    """
+
+    def __init__(self):
+        self._duration_dict = collections.OrderedDict()   # stage name -> list of durations
+
+    @contextlib.contextmanager
+    def stage(self, stage_name):
+        """Time the execution of the enclosed block (a `with` statement)."""
+
+        initial_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage_name, time.perf_counter() - initial_time)
+
+    def add(self, stage_name, duration_sec):
+        """Record a duration measured elsewhere (e.g. in another process)."""
+        self._duration_dict.setdefault(stage_name, []).append(duration_sec)
+
+    def add_durations(self, duration_dict):
+        """Record the durations of a `{stage name: duration}` dictionary
+        (e.g. the output of `get_total_durations()` of another timer)."""
+        for stage_name, duration_sec in duration_dict.items():
+            self.add(stage_name, duration_sec)
+
+    def get_total_durations(self):
+        """Return the total duration of each stage (a `{stage name: seconds}`
+        dictionary)."""
+        return collections.OrderedDict((stage_name, float(sum(duration_list)))
+                                       for stage_name, duration_list in self._duration_dict.items())
+
+    def get_report(self, wall_time_sec=None):
+        """Return the statistics of each stage.
+
+        Parameters
+        ----------
+        wall_time_sec : float
+            The total execution time of the pipeline used to compute the
+            share of each stage. If `None`, the sum of all stages is used.
+
+        Returns
+        -------
+        dict
+            A `{stage name: statistics}` dictionary where statistics are given
+            by the following items: "num_calls", "total_sec", "mean_sec",
+            "p50_sec", "p95_sec", "p99_sec" and "wall_time_share".
+        """
+
+        if wall_time_sec is None:
+            wall_time_sec = sum(sum(duration_list) for duration_list in self._duration_dict.values())
+
+        report_dict = collections.OrderedDict()
+
+        for stage_name, duration_list in self._duration_dict.items():
+            duration_array = np.array(duration_list)
+            total_sec = float(duration_array.sum())
+            p50, p95, p99 = np.percentile(duration_array, [50, 95, 99])
+
+            report_dict[stage_name] = {"num_calls": len(duration_list),
+                                       "total_sec": total_sec,
+                                       "mean_sec": float(duration_array.mean()),
+                                       "p50_sec": float(p50),
+                                       "p95_sec": float(p95),
+                                       "p99_sec": float(p99),
+                                       "wall_time_share": (total_sec / wall_time_sec) if wall_time_sec > 0 else float('nan')}
+
+        return report_dict
+
+
+def format_timing_report(report_dict):
+    """Return a printable table of a report made by `StageTimer.get_report()`."""
+
+    line_format = "{:<24} {:>8} {:>11} {:>11} {:>11} {:>11} {:>11} {:>7}"
+
+    line_list = [line_format.format("STAGE", "CALLS", "TOTAL (s)", "MEAN (s)", "P50 (s)", "P95 (s)", "P99 (s)", "SHARE")]
+
+    for stage_name, stage_dict in report_dict.items():
+        line_list.append(line_format.format(stage_name,
+                                            stage_dict["num_calls"],
+                                            "{:.6f}".format(stage_dict["total_sec"]),
+                                            "{:.6f}".format(stage_dict["mean_sec"]),
+                                            "{:.6f}".format(stage_dict["p50_sec"]),
+                                            "{:.6f}".format(stage_dict["p95_sec"]),
+                                            "{:.6f}".format(stage_dict["p99_sec"]),
+                                            "{:.1%}".format(stage_dict["wall_time_share"])))
+
+    return "\n".join(line_list)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "benchmark.features" module.
+"""
+
+from datapipe.benchmark import features
+
+import numpy as np
+
+import unittest
+
+class TestFeatures(unittest.TestCase):
+    """
+    Contains unit tests for the "benchmark.features" module.
+    """
+
+    def setUp(self):
+        self.img = np.array([[0., 1., np.nan],
+                             [2., -1., 3.]])
+
+    def tearDown(self):
+        features.FEATURE_REGISTRY.pop("test_a", None)
+        features.FEATURE_REGISTRY.pop("test_b", None)
+        features.INTERMEDIATE_REGISTRY.pop("test_intermediate", None)
+
+    def test_compute_features(self):
+        """Check that only the requested columns are computed."""
+
+        context = features.FeatureContext(input_img=self.img)
+        feature_dict = features.compute_features(["img_in_sum_pe", "img_in_num_pix"], context)
+
+        self.assertEqual(feature_dict, {"img_in_sum_pe": 5., "img_in_num_pix": 3})
+
+    def test_unknown_column(self):
+        """Check that unknown columns are rejected."""
+
+        context = features.FeatureContext(input_img=self.img)
+
+        with self.assertRaises(ValueError):
+            features.compute_features(["img_in_foo"], context)
+
+    def test_intermediate_computed_once(self):
+        """Check that intermediate results are shared by all the columns using them."""
+
+        call_list = []
+
+        def intermediate(context):
+            call_list.append(1)
+            return context["input_img"] * 2.
+
+        features.register_intermediate("test_intermediate", intermediate)
+        features.register_feature("test_a", lambda context: float(np.nansum(context["test_intermediate"])))
+        features.register_feature("test_b", lambda context: float(np.nanmax(context["test_intermediate"])))
+
+        context = features.FeatureContext(input_img=self.img)
+
+        self.assertEqual(features.compute_features(["test_a"], context), {"test_a": 10.})
+        self.assertEqual(features.compute_features(["test_b"], context), {"test_b": 6.})
+        self.assertEqual(len(call_list), 1)
+
+    def test_column_names(self):
+        """Check the registered column names."""
+
+        self.assertEqual(features.get_column_names("img_in_"), ["img_in_sum_pe", "img_in_min_pe", "img_in_max_pe", "img_in_num_pix"])
+        self.assertIn("img_cleaned_hillas_2_psi", features.get_column_names())
+        self.assertIn("score", features.get_column_names())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "benchmark.reference_features" module.
+"""
+
+from datapipe.benchmark.reference_features import ReferenceFeatureCache
+
+import numpy as np
+import shutil
+import tempfile
+
+import unittest
+
+class TestReferenceFeatureCache(unittest.TestCase):
+    """
+    Contains unit tests for the "benchmark.reference_features" module.
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ReferenceFeatureCache(self.cache_dir)
+
+        self.img = np.zeros([4, 4])
+        self.img[1, 1:3] = 5.
+        self.pixels_position = np.array(np.meshgrid(np.arange(4.), np.arange(4.)))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_key(self):
+        """Check that keys only depend on the image content."""
+
+        key = self.cache.get_key(self.img, self.pixels_position)
+
+        self.assertEqual(key, self.cache.get_key(self.img.copy(), self.pixels_position.copy()))
+
+        modified_img = self.img.copy()
+        modified_img[0, 0] = 1.
+
+        self.assertNotEqual(key, self.cache.get_key(modified_img, self.pixels_position))
+
+    def test_save_and_load(self):
+        """Check that saved features are loaded back and that missing entries return None."""
+
+        key = self.cache.get_key(self.img, self.pixels_position)
+
+        self.assertIsNone(self.cache.load(key))
+
+        feature_dict = {"img_ref_sum_pe": 10., "img_ref_hillas_2_miss": None}
+        self.cache.save(key, feature_dict)
+
+        self.assertEqual(self.cache.load(key), feature_dict)
+
+    def test_get_features_cache_hit(self):
+        """Check that cached features are not computed again."""
+
+        key = self.cache.get_key(self.img, self.pixels_position)
+        self.cache.save(key, {"img_ref_sum_pe": 10.})
+
+        self.assertEqual(self.cache.get_features(self.img, self.pixels_position), {"img_ref_sum_pe": 10.})
+
+
+if __name__ == '__main__':
+    unittest.main()
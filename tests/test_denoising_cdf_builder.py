@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module contains unit tests for the "denoising.cdf_builder" module.
+"""
+
+from datapipe.denoising import cdf_builder
+from datapipe.denoising.cdf_builder import NoiseHistogram
+from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution, get_table_file_path
+
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+
+import unittest
+from unittest import mock
+
+class TestNoiseHistogram(unittest.TestCase):
+    """
+    Contains unit tests for the "NoiseHistogram" class.
+    """
+
+    def test_fill(self):
+        """Check counts, underflow and overflow against np.histogram."""
+
+        values = np.random.default_rng(0).normal(scale=3., size=10000)
+        values[:10] = np.nan
+
+        histogram = NoiseHistogram(num_bins=50, hist_range=(-5., 5.))
+        histogram.fill(values[:5000])
+        histogram.fill(values[5000:])
+
+        expected_counts, _ = np.histogram(values[np.isfinite(values)], bins=50, range=(-5., 5.))
+
+        np.testing.assert_array_equal(histogram.counts, expected_counts)
+        self.assertEqual(histogram.num_underflow, np.count_nonzero(values < -5.))
+        self.assertEqual(histogram.num_overflow, np.count_nonzero(values > 5.))
+
+    def test_merge(self):
+        """Check that merged partial histograms equal the full histogram."""
+
+        values = np.random.default_rng(1).normal(size=1000)
+
+        histogram1 = NoiseHistogram(num_bins=20, hist_range=(-3., 3.))
+        histogram1.fill(values[:300])
+        histogram2 = NoiseHistogram(num_bins=20, hist_range=(-3., 3.))
+        histogram2.fill(values[300:])
+        histogram1.merge(histogram2)
+
+        full_histogram = NoiseHistogram(num_bins=20, hist_range=(-3., 3.))
+        full_histogram.fill(values)
+
+        np.testing.assert_array_equal(histogram1.counts, full_histogram.counts)
+        self.assertEqual(histogram1.num_underflow + histogram1.num_overflow,
+                         full_histogram.num_underflow + full_histogram.num_overflow)
+
+        with self.assertRaises(ValueError):
+            histogram1.merge(NoiseHistogram(num_bins=10, hist_range=(-3., 3.)))
+
+    def test_get_cdf(self):
+        """Check the CDF of a simple histogram."""
+
+        histogram = NoiseHistogram(num_bins=4, hist_range=(0., 4.))
+        histogram.fill([0.5, 1.5, 1.5, 3.5])
+
+        cdf_x, cdf_y = histogram.get_cdf()
+
+        np.testing.assert_array_equal(cdf_x, [0., 1., 2., 3., 4.])
+        np.testing.assert_array_equal(cdf_y, [0., 0.25, 0.75, 0.75, 1.])
+
+        with self.assertRaises(ValueError):
+            NoiseHistogram(num_bins=4, hist_range=(0., 4.)).get_cdf()
+
+
+class TestBuildNoiseHistograms(unittest.TestCase):
+    """
+    Contains unit tests for the "build_noise_histograms" and "save_cdf_file" functions.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_build_and_save(self):
+        """Check that noise histograms are accumulated per camera and written as CDF files."""
+
+        rng = np.random.default_rng(2)
+
+        def image_generator(path_list, **kwargs):
+            for path in path_list:
+                cam_id = "ASTRICam" if "astri" in path else "CHEC"
+                reference_img = np.zeros([8, 8])
+                reference_img[3:5, 3:5] = 100.
+                input_img = reference_img + rng.normal(size=[8, 8])
+                input_img[0, 0] = np.nan
+                yield {"input_image": input_img, "reference_image": reference_img}, {"cam_id": cam_id}
+
+        with mock.patch.object(cdf_builder.images, "image_files_in_paths", return_value=iter(["astri1.fits", "astri2.fits", "chec1.fits"])), \
+             mock.patch.object(cdf_builder.images, "image_generator", side_effect=image_generator):
+            histogram_dict = cdf_builder.build_noise_histograms(["dummy"], num_bins=100, hist_range=(-5., 5.))
+
+        self.assertEqual(sorted(histogram_dict.keys()), ["ASTRICam", "CHEC"])
+        self.assertEqual(histogram_dict["ASTRICam"].num_images, 2)
+        self.assertEqual(histogram_dict["ASTRICam"].num_samples + histogram_dict["ASTRICam"].num_underflow + histogram_dict["ASTRICam"].num_overflow, 2 * 63)
+
+        cdf_file_path = os.path.join(self.tmp_dir, "astricam_cdf.json")
+        cdf_builder.save_cdf_file(histogram_dict["ASTRICam"], cdf_file_path, {"inst": "ASTRICam"})
+
+        with open(cdf_file_path, "r") as fd:
+            json_dict = json.load(fd)
+
+        self.assertEqual(json_dict["inst"], "ASTRICam")
+        self.assertEqual(len(json_dict["cdf_x"]), 101)
+        self.assertTrue(os.path.isfile(get_table_file_path(cdf_file_path)))
+
+        samples = EmpiricalDistribution(cdf_file_path, random_generator=0).rvs(1000)
+
+        self.assertTrue(np.all(samples >= -5.) and np.all(samples <= 5.))
+        self.assertLess(abs(np.mean(samples)), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
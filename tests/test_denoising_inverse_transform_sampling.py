@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module contains unit tests for the "denoising.inverse_transform_sampling" module.
+"""
+
+import datapipe.denoising.cdf
+from datapipe.denoising import inverse_transform_sampling
+from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution
+
+import json
+import numpy as np
+import os
+import scipy.interpolate
+import shutil
+import tempfile
+
+import unittest
+
+class TestEmpiricalDistribution(unittest.TestCase):
+    """
+    Contains unit tests for the "EmpiricalDistribution" class.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cdf_file_path = os.path.join(self.tmp_dir, "test_cdf.json")
+        shutil.copy(datapipe.denoising.cdf.ASTRI_CDF_FILE, self.cdf_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_seed_same_samples(self):
+        """Check that samples are reproducible for a given seed."""
+
+        dist1 = EmpiricalDistribution(self.cdf_file_path, random_generator=42)
+        dist2 = EmpiricalDistribution(self.cdf_file_path, random_generator=42)
+
+        np.testing.assert_array_equal(dist1.rvs(1000), dist2.rvs(1000))
+
+        samples1 = dist1.rvs(1000, random_generator=np.random.default_rng(7))
+        samples2 = dist2.rvs(1000, random_generator=np.random.default_rng(7))
+
+        np.testing.assert_array_equal(samples1, samples2)
+
+    def test_ppf_matches_spline(self):
+        """Check the lookup table against the spline interpolation of the CDF."""
+
+        with open(self.cdf_file_path, "r") as fd:
+            cdf = json.load(fd)
+
+        cdf_x = np.array(cdf['cdf_x'])
+        cdf_y = np.array(cdf['cdf_y'])
+        increasing_mask = cdf_y[1:] > cdf_y[:-1]
+        spl = scipy.interpolate.splrep(cdf_y[:-1][increasing_mask],
+                                       cdf_x[:-1][increasing_mask],
+                                       xb=0., xe=1., k=1)
+
+        y = np.random.default_rng(0).random(10000)
+        dist = EmpiricalDistribution(self.cdf_file_path)
+
+        np.testing.assert_allclose(dist.ppf(y), scipy.interpolate.splev(y, spl), atol=0.05)
+
+        self.assertEqual(dist.ppf(0.5), dist.ppf(np.array([0.5]))[0])
+        self.assertEqual(dist.rvs((2, 3)).shape, (2, 3))
+
+    def test_table_loaded_once(self):
+        """Check that the lookup table is shared and read from the .npz file."""
+
+        table_file_path = inverse_transform_sampling.save_inverse_cdf_table(self.cdf_file_path, table_size=1024)
+
+        self.assertTrue(os.path.isfile(table_file_path))
+
+        # The table is used whatever the files modification time (e.g. after a checkout)
+        os.utime(table_file_path, (0, 0))
+
+        dist1 = EmpiricalDistribution(self.cdf_file_path)
+        dist2 = EmpiricalDistribution(self.cdf_file_path)
+
+        self.assertIs(dist1.inv_cdf_table, dist2.inv_cdf_table)
+        self.assertEqual(len(dist1.inv_cdf_table), 1024)
+        self.assertFalse(dist1.inv_cdf_table.flags.writeable)
+
+    def test_json_file_read_once(self):
+        """Check that the JSON file is only read again when it changes."""
+
+        read_cdf_json_file = inverse_transform_sampling._read_cdf_json_file
+        read_path_list = []
+
+        def counting_read_cdf_json_file(cdf_json_file_path):
+            read_path_list.append(cdf_json_file_path)
+            return read_cdf_json_file(cdf_json_file_path)
+
+        inverse_transform_sampling._read_cdf_json_file = counting_read_cdf_json_file
+        try:
+            dist1 = EmpiricalDistribution(self.cdf_file_path)
+            dist2 = EmpiricalDistribution(self.cdf_file_path)
+
+            self.assertEqual(len(read_path_list), 1)
+            self.assertIs(dist1.inv_cdf_table, dist2.inv_cdf_table)
+
+            # A new modification time
+            stat = os.stat(self.cdf_file_path)
+            os.utime(self.cdf_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            dist3 = EmpiricalDistribution(self.cdf_file_path)
+
+            self.assertEqual(len(read_path_list), 2)
+            self.assertIs(dist1.inv_cdf_table, dist3.inv_cdf_table)     # Same content
+        finally:
+            inverse_transform_sampling._read_cdf_json_file = read_cdf_json_file
+
+    def test_outdated_table_ignored(self):
+        """Check that a table computed from another JSON file is ignored."""
+
+        inverse_transform_sampling.save_inverse_cdf_table(self.cdf_file_path, table_size=1024)
+
+        with open(self.cdf_file_path, "r") as fd:
+            cdf = json.load(fd)
+        cdf['label'] = "modified"
+        with open(self.cdf_file_path, "w") as fd:
+            json.dump(cdf, fd)
+
+        dist = EmpiricalDistribution(self.cdf_file_path)
+
+        self.assertEqual(len(dist.inv_cdf_table), inverse_transform_sampling.INVERSE_CDF_TABLE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
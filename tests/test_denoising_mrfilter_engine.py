@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "denoising.mrfilter_engine" module.
+"""
+
+from datapipe.denoising import mrfilter_engine
+
+import numpy as np
+import os
+import sys
+import time
+
+import unittest
+
+class TestMrFilterEngine(unittest.TestCase):
+    """
+    Contains unit tests for the "denoising.mrfilter_engine" module.
+    """
+
+    def test_timeout(self):
+        """Check that hung processes are killed."""
+
+        engine = mrfilter_engine.MrFilterEngine(max_processes=1)
+
+        initial_time = time.perf_counter()
+
+        with self.assertRaises(mrfilter_engine.MrFilterTimeoutError):
+            engine.run_command([sys.executable, "-c", "import time; time.sleep(30)"], timeout_sec=0.5)
+
+        self.assertLess(time.perf_counter() - initial_time, 10.)
+
+    def test_execution_error(self):
+        """Check that a non-zero exit status raises an exception."""
+
+        engine = mrfilter_engine.MrFilterEngine(max_processes=1)
+
+        with self.assertRaises(mrfilter_engine.MrFilterExecutionError):
+            engine.run_command([sys.executable, "-c", "import sys; sys.exit(3)"])
+
+    def test_no_shell(self):
+        """Check that arguments are not interpreted by a shell."""
+
+        engine = mrfilter_engine.MrFilterEngine(max_processes=1)
+
+        # With a shell, "; exit 1" would be executed
+        engine.run_command([sys.executable, "-c", "import sys; sys.exit(len(sys.argv) != 2)", "; exit 1"])
+
+    def test_map(self):
+        """Check that the thread pool returns results in input order."""
+
+        engine = mrfilter_engine.MrFilterEngine(max_processes=3)
+
+        self.assertEqual(engine.map(lambda x: x * x, range(20)), [x * x for x in range(20)])
+
+    def test_default_tmp_files_directory(self):
+        """Check that the default temporary directory is private to the process."""
+
+        tmp_files_directory = mrfilter_engine.get_default_tmp_files_directory()
+
+        self.assertTrue(os.path.isdir(tmp_files_directory))
+        self.assertIn(str(os.getpid()), os.path.basename(tmp_files_directory))
+        self.assertEqual(tmp_files_directory, mrfilter_engine.get_default_tmp_files_directory())
+
+
+    def test_guard_band_width(self):
+        """Check the guard band width of the a trous transforms."""
+
+        self.assertEqual(mrfilter_engine.get_guard_band_width(1), 0)
+        self.assertEqual(mrfilter_engine.get_guard_band_width(4), 14)
+        self.assertEqual(mrfilter_engine.get_guard_band_width(4, number_of_iterations=3), 42)
+
+    def test_mosaic(self):
+        """Check that images are packed without overlap and unpacked unchanged."""
+
+        img_list = [np.full((5, 4), float(img_index + 1)) for img_index in range(5)]
+
+        mosaic, slice_list = mrfilter_engine.pack_mosaic(img_list, guard_band_width=2)
+
+        # 3x2 grid of 7x6 cells plus the outer guard band
+        self.assertEqual(mosaic.shape, (2 * 7 + 2, 3 * 6 + 2))
+        self.assertEqual(mosaic.sum(), sum(img.sum() for img in img_list))
+
+        # Guard bands between images
+        self.assertTrue(np.all(mosaic[:2, :] == 0.))
+        self.assertTrue(np.all(mosaic[:, 6:8] == 0.))
+
+        for img, unpacked_img in zip(img_list, mrfilter_engine.unpack_mosaic(mosaic, slice_list)):
+            np.testing.assert_array_equal(img, unpacked_img)
+
+    def test_mosaic_fill(self):
+        """Check that guard bands are filled by fill_function."""
+
+        mosaic, slice_list = mrfilter_engine.pack_mosaic([np.zeros((3, 3))], guard_band_width=1,
+                                                         fill_function=lambda size: np.ones(size))
+
+        self.assertEqual(mosaic.shape, (5, 5))
+        self.assertEqual(mosaic.sum(), 25 - 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
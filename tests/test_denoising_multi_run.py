@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "denoising.multi_run" module.
+"""
+
+from datapipe.denoising.multi_run import run_configurations
+from datapipe.denoising.null import Null
+from datapipe.denoising.tailcut import Tailcut
+from datapipe.io import geom
+from datapipe.io import images
+
+import json
+import numpy as np
+import os
+import tempfile
+import types
+
+import unittest
+
+# The items of image records which are execution times
+TIME_ITEMS = ("full_clean_execution_time_sec",
+              "load_input_image_time_sec",
+              "stage_execution_time_sec")
+
+
+def make_benchmark_file(file_path, event_id, random_state):
+    """Save a noisy elliptical shower image in `file_path`."""
+
+    yy, xx = np.mgrid[0:40, 0:40]
+    angle = random_state.uniform(0., np.pi)
+    center_x, center_y = random_state.uniform(12., 28., 2)
+    u = (xx - center_x) * np.cos(angle) + (yy - center_y) * np.sin(angle)
+    v = -(xx - center_x) * np.sin(angle) + (yy - center_y) * np.cos(angle)
+
+    reference_img = np.round(200. * np.exp(-(u**2 / 32. + v**2 / 4.)))
+    input_img = reference_img + random_state.normal(0., 2., reference_img.shape)
+    pixels_position = np.array(np.meshgrid(np.linspace(-0.14, 0.14, 40), np.linspace(-0.14, 0.14, 40)))
+
+    # Blank pixels
+    reference_img[0, :3] = np.nan
+    input_img[0, :3] = np.nan
+    pixels_position[:, 0, :3] = np.nan
+
+    metadata = {'version': 1, 'cam_id': 'ASTRI_CROPPED', 'tel_id': 1, 'event_id': event_id,
+                'simtel': 'test.simtel', 'tel_trig': 1, 'count': event_id, 'run_id': 1, 'tel_data': 1,
+                'energy': (1., 'TeV'), 'mc_az': (0., 'rad'), 'mc_alt': (1., 'rad'),
+                'mc_corex': (0., 'm'), 'mc_corey': (0., 'm'), 'mc_hfi': (1000., 'm'),
+                'foclen': (2.15, 'm'), 'tel_posx': (0., 'm'), 'tel_posy': (0., 'm'), 'tel_posz': (0., 'm')}
+
+    blank_plane_stack = np.zeros((2, 40, 40))
+
+    images.save_benchmark_images(input_img,
+                                 reference_img,
+                                 blank_plane_stack,
+                                 blank_plane_stack,
+                                 blank_plane_stack,
+                                 pixels_position,
+                                 np.ones((40, 40), dtype=int),
+                                 metadata,
+                                 file_path)
+
+
+def without_time_items(image_dict_list):
+    """Return the image records sorted by file, without execution times."""
+
+    image_dict_list = [{key: value for key, value in image_dict.items() if key not in TIME_ITEMS} for image_dict in image_dict_list]
+
+    return sorted(image_dict_list, key=lambda image_dict: image_dict["input_file_path"])
+
+
+class TestRunConfigurations(unittest.TestCase):
+    """
+    Contains unit tests for the "denoising.multi_run" module.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        input_dir = os.path.join(self.tmp_dir.name, "fits")
+        os.makedirs(input_dir)
+
+        random_state = np.random.RandomState(0)
+        for event_id in range(4):
+            make_benchmark_file(os.path.join(input_dir, "img_{}.fits".format(event_id)), event_id, random_state)
+
+        with open(geom.ASTRI_CROPPED_GEOM_FILE, "r") as fd:
+            geom_dict = json.load(fd)
+
+        self.geom = types.SimpleNamespace(cam_id=geom_dict["cam_id"],
+                                          pix_id=geom_dict["pix_id"],
+                                          neighbors=geom_dict["neighbors"])
+        self.input_files = [input_dir]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_output_file_path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_same_records_as_run(self):
+        """Check that each configuration gets the same records as a separate
+        run() call."""
+
+        configuration_list = [(Tailcut(), {"high_threshold": 10., "low_threshold": 5., "geom": self.geom}),
+                              (Tailcut(), {"high_threshold": 6., "low_threshold": 3., "geom": self.geom}),
+                              (Null(), {})]
+
+        for output_column_list in (None, ["img_ref_hillas_2_psi", "img_cleaned_hillas_2_psi"]):
+            output_file_path_list = [self.get_output_file_path("multi_{}.json".format(index)) for index in range(len(configuration_list))]
+
+            output_dict_list = run_configurations(configuration_list,
+                                                  self.input_files,
+                                                  "delta_psi",
+                                                  output_file_path_list,
+                                                  output_column_list=output_column_list)
+
+            for (cleaning_algorithm, cleaning_function_params), output_dict in zip(configuration_list, output_dict_list):
+                run_output_dict = cleaning_algorithm.run(cleaning_function_params,
+                                                         self.input_files,
+                                                         "delta_psi",
+                                                         self.get_output_file_path("run.json"),
+                                                         output_column_list=output_column_list)
+
+                self.assertEqual(len(output_dict["io"]), 4)
+                self.assertEqual(without_time_items(output_dict["io"]), without_time_items(run_output_dict["io"]))
+                self.assertEqual(sorted(output_dict.keys()), sorted(run_output_dict.keys()))
+                self.assertEqual(sorted(output_dict["stage_timing_report"].keys()), sorted(run_output_dict["stage_timing_report"].keys()))
+
+        # Only the requested reference features are written
+        self.assertNotIn("img_ref_sum_pe", output_dict_list[0]["io"][0])
+
+    def test_wrong_output_file_path_list(self):
+        """Check that each configuration should have an output file."""
+
+        configuration_list = [(Null(), {}), (Null(), {})]
+
+        with self.assertRaises(ValueError):
+            run_configurations(configuration_list, [], "delta_psi", ["out.json"])
+
+    def test_wrong_output_format(self):
+        """Check that unknown output formats are rejected."""
+
+        with self.assertRaises(ValueError):
+            run_configurations([(Null(), {})], [], "delta_psi", ["out.json"], output_format="csv")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "denoising.result_cache" module.
+"""
+
+import datapipe.denoising.cdf
+from datapipe.denoising.inverse_transform_sampling import EmpiricalDistribution
+from datapipe.denoising.result_cache import CleaningResultCache
+from datapipe.denoising.result_cache import canonicalize_params
+from datapipe.denoising.result_cache import get_process_result_cache
+
+import numpy as np
+import os
+import pickle
+import tempfile
+
+import unittest
+
+
+class CountingThreshold(object):
+    """A minimal cleaning algorithm counting its calls."""
+
+    def __init__(self):
+        self.num_calls = 0
+
+    def clean_image(self, input_img, threshold=0., output_data_dict=None, verbose=False):
+        self.num_calls += 1
+        if output_data_dict is not None:
+            output_data_dict["num_kept_pixels"] = np.int64(np.count_nonzero(input_img > threshold))
+        return np.where(input_img > threshold, input_img, 0.)
+
+
+class TestCleaningResultCache(unittest.TestCase):
+    """
+    Contains unit tests for the "denoising.result_cache" module.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.img = np.arange(16.).reshape(4, 4)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_canonicalize_params(self):
+        """Check that equivalent parameters have the same representation."""
+
+        self.assertEqual(canonicalize_params({"a": 3, "b": "x", "verbose": True}),
+                         canonicalize_params({"b": "x", "a": 3.0, "output_data_dict": {}}))
+        self.assertNotEqual(canonicalize_params({"a": np.zeros(3)}),
+                            canonicalize_params({"a": np.ones(3)}))
+
+    def test_canonicalize_noise_distribution(self):
+        """Check that noise distributions are identified by their CDF file
+        and not by their random generator."""
+
+        cdf_file_path = datapipe.denoising.cdf.ASTRI_CDF_FILE
+
+        self.assertEqual(canonicalize_params({"noise_distribution": EmpiricalDistribution(cdf_file_path, random_generator=1)}),
+                         canonicalize_params({"noise_distribution": EmpiricalDistribution(cdf_file_path, random_generator=2)}))
+        self.assertNotIn("0x", canonicalize_params({"noise_distribution": EmpiricalDistribution(cdf_file_path)}))
+        self.assertNotEqual(canonicalize_params({"noise_distribution": EmpiricalDistribution(cdf_file_path)}),
+                            canonicalize_params({"noise_distribution": EmpiricalDistribution(datapipe.denoising.cdf.GCT_CDF_FILE)}))
+
+    def test_clean_image(self):
+        """Check that a repeated (image, parameters) pair is not cleaned again."""
+
+        cache = CleaningResultCache(self.tmp_dir.name)
+        algorithm = CountingThreshold()
+
+        output_data_dict1 = {}
+        cleaned_img1 = cache.clean_image(algorithm, self.img, output_data_dict=output_data_dict1, threshold=5)
+
+        output_data_dict2 = {}
+        cleaned_img2 = cache.clean_image(algorithm, self.img.copy(), output_data_dict=output_data_dict2, threshold=5.0, verbose=True)
+
+        self.assertEqual(algorithm.num_calls, 1)
+        np.testing.assert_array_equal(cleaned_img1, cleaned_img2)
+        self.assertEqual(output_data_dict2, {"num_kept_pixels": 10})
+
+        # Other parameters or images
+        cache.clean_image(algorithm, self.img, threshold=6)
+        cache.clean_image(algorithm, self.img + 1., threshold=5)
+
+        self.assertEqual(algorithm.num_calls, 3)
+
+    def test_eviction(self):
+        """Check that the least recently used entries are removed."""
+
+        cache = CleaningResultCache(self.tmp_dir.name)
+        algorithm = CountingThreshold()
+
+        for threshold in range(3):
+            cache.clean_image(algorithm, self.img, threshold=threshold)
+
+        entry_path_list = [cache.get_entry_path(cache.get_key(self.img, algorithm, {"threshold": threshold})) for threshold in range(3)]
+        entry_size = os.path.getsize(entry_path_list[0])
+
+        # Make the first entry the most recently used one
+        for entry_index, entry_path in enumerate(entry_path_list):
+            os.utime(entry_path, (entry_index, entry_index))
+        cache.load(cache.get_key(self.img, algorithm, {"threshold": 0}))
+
+        cache.max_bytes = 2 * entry_size
+        cache.evict()
+
+        self.assertEqual([os.path.exists(entry_path) for entry_path in entry_path_list], [True, False, True])
+
+    def test_batch_eviction(self):
+        """Check that the cache directory is only walked when the cache is
+        full and that enough entries are then removed for the next saves."""
+
+        cache = CleaningResultCache(self.tmp_dir.name)
+        algorithm = CountingThreshold()
+        cache.clean_image(algorithm, self.img, threshold=-1)
+        entry_size = os.path.getsize(cache.get_entry_path(cache.get_key(self.img, algorithm, {"threshold": -1})))
+
+        cache.num_bytes = entry_size
+        cache.max_bytes = 5 * entry_size
+        num_scans = []
+        scan_entries = cache._scan_entries
+        cache._scan_entries = lambda: num_scans.append(1) or scan_entries()
+
+        for threshold in range(5):
+            cache.clean_image(algorithm, self.img, threshold=threshold)
+
+        self.assertEqual(len(num_scans), 1)
+        self.assertLessEqual(cache.num_bytes, 0.8 * cache.max_bytes)
+        self.assertEqual(cache.num_bytes, sum(size for mtime, size, path in scan_entries()))
+
+    def test_process_cache(self):
+        """Check that a cache sent to a worker process is unpickled as the
+        single instance of this process (which keeps its running total)."""
+
+        cache = CleaningResultCache(self.tmp_dir.name, max_bytes=10**6)
+
+        unpickled_cache1 = pickle.loads(pickle.dumps(cache))
+        unpickled_cache2 = pickle.loads(pickle.dumps(cache))
+
+        self.assertIs(unpickled_cache1, unpickled_cache2)
+        self.assertIs(unpickled_cache1, get_process_result_cache(self.tmp_dir.name, max_bytes=10**6))
+        self.assertEqual(unpickled_cache1.max_bytes, 10**6)
+
+    def test_wrapped_algorithm_key(self):
+        """Check that wrappers of different algorithms have different keys."""
+
+        class Wrapper(object):
+            def __init__(self, cleaning_algorithm):
+                self.cleaning_algorithm = cleaning_algorithm
+
+        class OtherThreshold(CountingThreshold):
+            pass
+
+        cache = CleaningResultCache(self.tmp_dir.name)
+
+        self.assertNotEqual(cache.get_key(self.img, Wrapper(CountingThreshold()), {}),
+                            cache.get_key(self.img, Wrapper(OtherThreshold()), {}))
+        self.assertEqual(cache.get_key(self.img, Wrapper(CountingThreshold()), {}),
+                         cache.get_key(self.img, Wrapper(CountingThreshold()), {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module contains unit tests for the "denoising.roi_cleaning" module.
+"""
+
+from datapipe.denoising.abstract_cleaning_algorithm import AbstractCleaningAlgorithm
+from datapipe.denoising.roi_cleaning import RoiCleaning, get_roi_slices
+
+import numpy as np
+
+import unittest
+
+class Identity(AbstractCleaningAlgorithm):
+    """A "cleaning" algorithm that records the shape of the images it gets."""
+
+    def __init__(self):
+        super().__init__()
+        self.label = "Identity"
+        self.shape_list = []
+
+    def clean_image(self, input_img, offset=0., output_data_dict=None):
+        self.shape_list.append(input_img.shape)
+        if output_data_dict is not None:
+            output_data_dict["identity"] = True
+        return input_img + offset
+
+
+def make_image(seed=0):
+    rng = np.random.default_rng(seed)
+    img = rng.normal(size=[56, 56])
+    img[30:34, 20:23] = 50.
+    return img
+
+
+class TestGetRoiSlices(unittest.TestCase):
+    """
+    Contains unit tests for the "get_roi_slices" function.
+    """
+
+    def test_bounding_box(self):
+        """Check the ROI of a single shower."""
+
+        roi_slices = get_roi_slices(make_image(), margin=3)
+
+        self.assertEqual(roi_slices, (slice(27, 37), slice(17, 26)))
+
+    def test_clipped_margin(self):
+        """Check that the ROI doesn't exceed the image."""
+
+        img = np.zeros([20, 20])
+        img[0:2, 18:20] = 10.
+
+        roi_slices = get_roi_slices(img, threshold=1., margin=5)
+
+        self.assertEqual(roi_slices, (slice(0, 7), slice(13, 20)))
+
+    def test_isolated_pixels_ignored(self):
+        """Check that isolated pixels above the threshold are ignored."""
+
+        img = np.zeros([20, 20])
+        img[5, 5] = 10.
+
+        self.assertIsNone(get_roi_slices(img, threshold=1., margin=2))
+        self.assertEqual(get_roi_slices(img, threshold=1., min_island_size=1, margin=2),
+                         (slice(3, 8), slice(3, 8)))
+
+    def test_wrong_dimension(self):
+        with self.assertRaises(ValueError):
+            get_roi_slices(np.zeros(10))
+
+
+class TestRoiCleaning(unittest.TestCase):
+    """
+    Contains unit tests for the "RoiCleaning" class.
+    """
+
+    def test_clean_image(self):
+        """Check that only the ROI is cleaned and the rest is zero."""
+
+        input_img = make_image()
+        input_img[0, 0] = np.nan
+
+        identity = Identity()
+        cleaning_algorithm = RoiCleaning(identity)
+
+        output_data_dict = {}
+        cleaned_img = cleaning_algorithm.clean_image(input_img,
+                                                     roi_margin=3,
+                                                     offset=1.,
+                                                     output_data_dict=output_data_dict)
+
+        self.assertEqual(identity.shape_list, [(10, 9)])
+        np.testing.assert_array_equal(cleaned_img[27:37, 17:26], input_img[27:37, 17:26] + 1.)
+        self.assertTrue(np.isnan(cleaned_img[0, 0]))
+        self.assertEqual(np.count_nonzero(np.nan_to_num(cleaned_img[:27, :])), 0)
+
+        self.assertEqual(output_data_dict["roi_shape"], [10, 9])
+        self.assertAlmostEqual(output_data_dict["roi_pixel_fraction"], 90. / 56**2)
+        self.assertTrue(output_data_dict["identity"])
+        self.assertNotIn("roi_speedup", output_data_dict)
+
+    def test_no_signal(self):
+        """Check that images without signal are not cleaned."""
+
+        identity = Identity()
+        cleaning_algorithm = RoiCleaning(identity)
+
+        output_data_dict = {}
+        cleaned_img = cleaning_algorithm.clean_image(np.zeros([10, 10]), roi_threshold=1., output_data_dict=output_data_dict)
+
+        np.testing.assert_array_equal(cleaned_img, np.zeros([10, 10]))
+        self.assertEqual(identity.shape_list, [])
+        self.assertEqual(output_data_dict["roi_shape"], [0, 0])
+
+    def test_measure_speedup(self):
+        """Check that the whole image is cleaned too when the speedup is measured."""
+
+        identity = Identity()
+        cleaning_algorithm = RoiCleaning(identity)
+
+        output_data_dict = {}
+        cleaning_algorithm.clean_image(make_image(), roi_margin=3, measure_roi_speedup=True, output_data_dict=output_data_dict)
+
+        self.assertEqual(identity.shape_list, [(10, 9), (56, 56)])
+        self.assertIn("roi_speedup", output_data_dict)
+        self.assertIn("roi_full_clean_time_sec", output_data_dict)
+
+
+if __name__ == '__main__':
+    unittest.main()
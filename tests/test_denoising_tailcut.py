@@ -25,6 +25,9 @@ This module contains unit tests for the "denoising.tailcut" module.
 """
 
 from datapipe.denoising.tailcut import Tailcut
+from datapipe.io import geom as geom_files
+from datapipe.io import geometry_cache
+from datapipe.io.geometry_registry import get_geometry_mapping
 
 import numpy as np
 
@@ -116,7 +119,34 @@ class TestTailcut(unittest.TestCase):
         expected_output_img[2, 5] = 192   # 0.75
 
         np.testing.assert_array_equal(output_img, expected_output_img)
-    
+
+    # Test the tailcut engines ################################################
+
+    def test_engines_match(self):
+        """Check that the "csr" engine gives the same images as ctapipe's
+        tailcuts_clean() on all bundled geometries (with NaN pixels and
+        thresholds lower than or equal to 0)."""
+
+        rng = np.random.default_rng(0)
+        tailcut = Tailcut()
+
+        for geom_file_path in [getattr(geom_files, name) for name in geom_files.__all__]:
+            geom = geometry_cache.load_geometry(geom_file_path)
+            mapping = get_geometry_mapping(geom.cam_id)
+
+            img_1d = rng.normal(loc=1., scale=3., size=len(geom.pix_id))
+            img_1d[rng.random(len(img_1d)) < 0.2] = np.nan
+            input_img = mapping.to_2d(img_1d)
+
+            for high_threshold, low_threshold in [(10., 5.), (3., 0.), (0., 0.), (0., -2.), (-1., -1.5)]:
+                cleaned_img_list = [tailcut.clean_image(input_img,
+                                                        high_threshold=high_threshold,
+                                                        low_threshold=low_threshold,
+                                                        geom=geom,
+                                                        tailcut_engine=tailcut_engine) for tailcut_engine in ("ctapipe", "csr")]
+
+                np.testing.assert_array_equal(cleaned_img_list[0], cleaned_img_list[1], err_msg=geom_file_path)
+
 
 if __name__ == '__main__':
     unittest.main()
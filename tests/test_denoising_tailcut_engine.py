@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module contains unit tests for the "denoising.tailcut_engine" module.
+"""
+
+from datapipe.denoising.tailcut_engine import TailcutEngine, get_neighbor_matrix, get_tailcut_engine
+from datapipe.io import geom as geom_files
+from datapipe.io.geometry_registry import get_geometry_mapping
+
+import json
+import numpy as np
+import types
+
+import unittest
+
+def reference_tailcut_mask(img_1d, neighbors, high_threshold, low_threshold):
+    """A pixel by pixel implementation of ctapipe's tailcuts_clean()."""
+
+    above_picture = img_1d >= high_threshold
+    above_boundary = img_1d >= low_threshold
+
+    mask = np.zeros(len(img_1d), dtype=bool)
+
+    for pixel_index, pixel_neighbors in enumerate(neighbors):
+        if above_boundary[pixel_index] and any(above_picture[neighbor] for neighbor in pixel_neighbors):
+            mask[pixel_index] = True
+        if above_picture[pixel_index] and any(above_boundary[neighbor] for neighbor in pixel_neighbors):
+            mask[pixel_index] = True
+
+    return mask
+
+
+class TestTailcutEngine(unittest.TestCase):
+    """
+    Contains unit tests for the "TailcutEngine" class.
+    """
+
+    def setUp(self):
+        with open(geom_files.LSTCAM_GEOM_FILE, "r") as fd:
+            json_dict = json.load(fd)
+
+        self.geom = types.SimpleNamespace(cam_id=json_dict["cam_id"],
+                                          pix_id=json_dict["pix_id"],
+                                          neighbors=json_dict["neighbors"])
+
+    def test_neighbor_matrix(self):
+        """Check the adjacency matrix of a small geometry."""
+
+        neighbor_matrix = get_neighbor_matrix([[1], [0, 2, 2], [1]])
+
+        np.testing.assert_array_equal(neighbor_matrix.toarray(), [[0, 1, 0], [1, 0, 1], [0, 1, 0]])
+
+        neighbor_matrix = get_neighbor_matrix([[1], [0]], pixel_index_array=[3, 0], image_size=4)
+
+        self.assertEqual(neighbor_matrix.shape, (4, 4))
+        self.assertEqual(neighbor_matrix[3, 0], 1)
+        self.assertEqual(neighbor_matrix[0, 3], 1)
+
+    def test_mask_matches_reference(self):
+        """Check the mask against a pixel by pixel implementation."""
+
+        engine = TailcutEngine.from_json_file(geom_files.LSTCAM_GEOM_FILE)
+
+        self.assertEqual(engine.image_shape, (55, 55))
+
+        rng = np.random.default_rng(0)
+
+        for trial in range(5):
+            input_img = rng.exponential(scale=3., size=engine.image_shape)
+
+            mask = engine.get_mask(input_img, high_threshold=10., low_threshold=5.)
+            expected_mask = reference_tailcut_mask(input_img.ravel(), self.geom.neighbors, 10., 5.)
+
+            np.testing.assert_array_equal(mask.ravel(), expected_mask)
+
+    def test_nan_pixels(self):
+        """Check that NaN pixels are processed as 0 (as the "ctapipe" engine
+        of Tailcut does) on all bundled geometries, including thresholds
+        lower than or equal to 0."""
+
+        rng = np.random.default_rng(2)
+        threshold_list = [(10., 5.), (3., 0.), (0., 0.), (0., -2.), (-1., -1.5)]
+
+        for geom_file_path in [getattr(geom_files, name) for name in geom_files.__all__]:
+            with open(geom_file_path, "r") as fd:
+                json_dict = json.load(fd)
+
+            engine = TailcutEngine.from_json_file(geom_file_path)
+            mapping = get_geometry_mapping(json_dict["cam_id"])
+
+            img_1d = rng.normal(loc=1., scale=3., size=len(json_dict["pix_id"]))
+            img_1d[rng.random(len(img_1d)) < 0.2] = np.nan
+            input_img = mapping.to_2d(img_1d)
+
+            mask_stack = engine.get_mask_grid(input_img[np.newaxis], *zip(*threshold_list))
+
+            for threshold_index, (high_threshold, low_threshold) in enumerate(threshold_list):
+                expected_mask = reference_tailcut_mask(np.where(np.isnan(img_1d), 0., img_1d), json_dict["neighbors"], high_threshold, low_threshold)
+                mask = engine.get_mask(input_img, high_threshold, low_threshold)
+
+                np.testing.assert_array_equal(mask.ravel()[mapping.inverse_index_map], expected_mask, err_msg=geom_file_path)
+                np.testing.assert_array_equal(mask_stack[0, threshold_index], mask)
+
+    def test_boundary_dilation_rounds(self):
+        """Check that each round adds the boundary pixels next to the mask."""
+
+        engine = get_tailcut_engine(self.geom)
+
+        input_img = np.zeros(engine.image_shape)
+        input_img[20, 20:26] = [12., 6., 6., 6., 6., 0.]
+        input_img[0, 0] = np.nan
+
+        cleaned_img = engine.clean(input_img, high_threshold=10., low_threshold=5.)
+        np.testing.assert_array_equal(cleaned_img[20, 20:26], [12., 6., 0., 0., 0., 0.])
+        self.assertTrue(np.isnan(cleaned_img[0, 0]))
+
+        cleaned_img = engine.clean(input_img, high_threshold=10., low_threshold=5., boundary_dilation_rounds=3)
+        np.testing.assert_array_equal(cleaned_img[20, 20:26], [12., 6., 6., 6., 0., 0.])
+
+        with self.assertRaises(ValueError):
+            engine.clean(input_img, boundary_dilation_rounds=0)
+
+    def test_engine_cache(self):
+        """Check that engines are built once per camera."""
+
+        self.assertIs(get_tailcut_engine(self.geom), get_tailcut_engine(self.geom))
+
+    def test_wrong_shape(self):
+        engine = get_tailcut_engine(self.geom)
+
+        with self.assertRaises(ValueError):
+            engine.get_mask(np.zeros([48, 48]))
+
+    def test_mask_grid(self):
+        """Check the masks of a threshold grid against one call per image and pair."""
+
+        engine = get_tailcut_engine(self.geom)
+
+        img_stack = np.random.default_rng(1).exponential(scale=3., size=(3,) + engine.image_shape)
+        img_stack[:, 0, 0] = np.nan
+        high_threshold_array = [10., 8., 6., 12.]
+        low_threshold_array = [5., 4., 6., 2.]
+
+        mask_stack = engine.get_mask_grid(img_stack, high_threshold_array, low_threshold_array, boundary_dilation_rounds=2)
+
+        self.assertEqual(mask_stack.shape, (3, 4) + engine.image_shape)
+
+        for img_index, img in enumerate(img_stack):
+            for threshold_index, (high_threshold, low_threshold) in enumerate(zip(high_threshold_array, low_threshold_array)):
+                np.testing.assert_array_equal(mask_stack[img_index, threshold_index],
+                                              engine.get_mask(img, high_threshold, low_threshold, boundary_dilation_rounds=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,7 +24,7 @@
 This module contains unit tests for the "denoising.tailcut" module.
 """
 
-from datapipe.denoising.tailcut_jd import Tailcut
+from datapipe.denoising.tailcut_jd import Tailcut, tailcut_mask, tailcut_mask_grid
 
 import numpy as np
 
@@ -118,6 +118,42 @@ class TestTailcut(unittest.TestCase):
         np.testing.assert_array_equal(output_img, expected_output_img)
     
 
+    # Test the "clean_images" method ##########################################
+
+    def test_clean_images(self):
+        """Check that the batched version gives the same output than clean_image on each image."""
+
+        rng = np.random.RandomState(0)
+        input_img_stack = rng.uniform(0., 1., size=(10, 8, 9))
+
+        tailcut = Tailcut()
+        output_img_stack = tailcut.clean_images(input_img_stack,
+                                                high_threshold=0.9,
+                                                low_threshold=0.5)
+
+        expected_output_img_stack = np.array([tailcut.clean_image(input_img,
+                                                                  high_threshold=0.9,
+                                                                  low_threshold=0.5) for input_img in input_img_stack])
+
+        np.testing.assert_array_equal(output_img_stack, expected_output_img_stack)
+
+    def test_tailcut_mask_grid(self):
+        """Check the masks of a threshold grid against one call per image and pair."""
+
+        img_stack = np.random.default_rng(0).exponential(scale=3., size=[4, 10, 12])
+        high_threshold_array = np.array([10., 8., 6.])
+        low_threshold_array = np.array([5., 4., 6.])
+
+        mask_stack = tailcut_mask_grid(img_stack, high_threshold_array, low_threshold_array)
+
+        self.assertEqual(mask_stack.shape, (4, 3, 10, 12))
+
+        for img_index, img in enumerate(img_stack):
+            for threshold_index, (high_threshold, low_threshold) in enumerate(zip(high_threshold_array, low_threshold_array)):
+                np.testing.assert_array_equal(mask_stack[img_index, threshold_index],
+                                              tailcut_mask(img, high_threshold, low_threshold))
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "denoising.wavelet_plane_cache" module.
+"""
+
+from datapipe.denoising.wavelet_plane_cache import WaveletPlaneCache
+from datapipe.denoising.wavelets_starlet import starlet_transform
+
+import numpy as np
+import os
+import tempfile
+
+import unittest
+
+class TestWaveletPlaneCache(unittest.TestCase):
+    """
+    Contains unit tests for the "denoising.wavelet_plane_cache" module.
+    """
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.img_list = [random_state.normal(size=(16, 16)) for i in range(3)]
+        self.num_calls = 0
+
+    def transform(self, input_img, number_of_scales):
+        self.num_calls += 1
+        return starlet_transform(input_img, number_of_scales)
+
+    def test_get_planes(self):
+        """Check that planes are computed only once."""
+
+        plane_cache = WaveletPlaneCache()
+
+        planes1 = plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 3)
+        planes2 = plane_cache.get_planes(self.img_list[0].copy(), self.transform, "starlet", 3)
+
+        self.assertEqual(self.num_calls, 1)
+        np.testing.assert_array_equal(planes1, starlet_transform(self.img_list[0], 3))
+        np.testing.assert_array_equal(planes1, planes2)
+        self.assertFalse(planes1.flags.writeable)
+
+        # Other parameters or images have their own entry
+        plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 4)
+        plane_cache.get_planes(self.img_list[1], self.transform, "starlet", 3)
+
+        self.assertEqual(self.num_calls, 3)
+        self.assertEqual((plane_cache.num_hits, plane_cache.num_misses), (1, 3))
+
+    def test_lru_eviction(self):
+        """Check that the least recently used planes are evicted."""
+
+        plane_nbytes = 3 * 16 * 16 * 8
+        plane_cache = WaveletPlaneCache(max_bytes=2 * plane_nbytes)
+
+        plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 3)
+        plane_cache.get_planes(self.img_list[1], self.transform, "starlet", 3)
+        plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 3)   # img 1 is now the least recently used
+        plane_cache.get_planes(self.img_list[2], self.transform, "starlet", 3)
+
+        self.assertEqual(len(plane_cache), 2)
+        self.assertEqual(plane_cache.num_bytes, 2 * plane_nbytes)
+        self.assertIsNotNone(plane_cache.get(plane_cache.get_key(self.img_list[0], "starlet", 3)))
+        self.assertIsNone(plane_cache.get(plane_cache.get_key(self.img_list[1], "starlet", 3)))
+
+    def test_oversized_planes(self):
+        """Check that planes larger than the cache raise an error."""
+
+        plane_nbytes = 3 * 16 * 16 * 8
+        plane_cache = WaveletPlaneCache(max_bytes=plane_nbytes - 1)
+
+        with self.assertRaises(ValueError):
+            plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 3)
+
+        self.assertEqual(len(plane_cache), 0)
+
+    def test_spill(self):
+        """Check that evicted planes are memory-mapped from the spill directory."""
+
+        with tempfile.TemporaryDirectory() as spill_directory:
+            plane_cache = WaveletPlaneCache(max_bytes=0, spill_directory=spill_directory)
+
+            planes = plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 3)
+            self.assertEqual(len(plane_cache), 0)
+            self.assertEqual(len(os.listdir(spill_directory)), 1)
+
+            spilled_planes = plane_cache.get_planes(self.img_list[0], self.transform, "starlet", 3)
+
+            self.assertEqual(self.num_calls, 1)
+            self.assertIsInstance(spilled_planes, np.memmap)
+            np.testing.assert_array_equal(spilled_planes, planes)
+
+            del spilled_planes
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "denoising.wavelets_starlet" module.
+"""
+
+from datapipe.denoising import wavelets_starlet
+
+import numpy as np
+
+import unittest
+
+class TestStarletTransform(unittest.TestCase):
+    """
+    Contains unit tests for the "denoising.wavelets_starlet" module.
+    """
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.noise_img = random_state.normal(0., 1., size=(56, 56))
+
+        y, x = np.mgrid[0:56, 0:56]
+        self.signal_img = 20. * np.exp(-((x - 28.)**2 + (y - 20.)**2 / 4.) / 8.)
+
+    # Transform ###############################################################
+
+    def test_reconstruction(self):
+        """Check that the sum of the planes is the input image."""
+
+        planes = wavelets_starlet.starlet_transform(self.noise_img, number_of_scales=4)
+
+        self.assertEqual(planes.shape, (4, 56, 56))
+        np.testing.assert_allclose(wavelets_starlet.inverse_starlet_transform(planes), self.noise_img, atol=1e-12)
+
+    def test_stack(self):
+        """Check that a stack of images is transformed image by image."""
+
+        img_stack = np.array([self.noise_img, self.signal_img])
+
+        plane_stack = wavelets_starlet.starlet_transform(img_stack, number_of_scales=3)
+
+        self.assertEqual(plane_stack.shape, (2, 3, 56, 56))
+        np.testing.assert_allclose(plane_stack[1], wavelets_starlet.starlet_transform(self.signal_img, number_of_scales=3))
+
+    def test_noise_sigma_per_scale(self):
+        """Check the noise level of each plane for a Gaussian white noise."""
+
+        img = np.random.RandomState(1).normal(0., 2., size=(256, 256))
+
+        planes = wavelets_starlet.starlet_transform(img, number_of_scales=4)
+
+        np.testing.assert_allclose(planes[:-1].std(axis=(1, 2)) / 2.,
+                                   wavelets_starlet.GAUSSIAN_NOISE_SIGMA_PER_SCALE[:3],
+                                   rtol=0.1)
+        self.assertAlmostEqual(wavelets_starlet.estimate_noise_sigma(planes[0]), 2., delta=0.1)
+
+    # Thresholding ############################################################
+
+    def test_k_sigma_list(self):
+        """Check the k-sigma values of each scale."""
+
+        np.testing.assert_array_equal(wavelets_starlet.get_k_sigma_list(3, 3), [4., 3., 3.])
+        np.testing.assert_array_equal(wavelets_starlet.get_k_sigma_list("3", 3), [4., 3., 3.])
+        np.testing.assert_array_equal(wavelets_starlet.get_k_sigma_list("2,2.5", 3), [2., 2.5, 2.5])
+        np.testing.assert_array_equal(wavelets_starlet.get_k_sigma_list([1, 2, 3, 4], 3), [1., 2., 3.])
+
+    def test_threshold_options(self):
+        """Check the -K, -p and -F options."""
+
+        planes = wavelets_starlet.starlet_transform(self.signal_img + self.noise_img, number_of_scales=4)
+
+        filtered_planes = wavelets_starlet.hard_threshold_planes(planes, 1., suppress_last_scale=True)
+        self.assertTrue(np.all(filtered_planes[-1] == 0.))
+
+        filtered_planes = wavelets_starlet.hard_threshold_planes(planes, 1., detect_only_positive_structure=True)
+        self.assertTrue(np.all(filtered_planes[:-1] >= 0.))
+
+        filtered_planes = wavelets_starlet.hard_threshold_planes(planes, 1., first_detection_scale=2)
+        self.assertTrue(np.all(filtered_planes[0] == 0.))
+        self.assertTrue(np.any(filtered_planes[1] != 0.))
+
+    def test_kill_isolated_support_pixels(self):
+        """Check the -k option."""
+
+        support = np.zeros((3, 6, 6), dtype=bool)
+        support[0, 2, 2] = True                 # isolated
+        support[0, 0, 0] = True                 # on the border (kept)
+        support[1, 2:4, 3] = True               # two neighbors (kept)
+        support[1, 4, 1] = True                 # diagonal neighbor only
+        support[1, 3, 2] = True
+        support[2] = True                       # smooth plane (kept)
+
+        cleaned_support = wavelets_starlet.kill_isolated_support_pixels(support)
+
+        self.assertFalse(cleaned_support[0, 2, 2])
+        self.assertTrue(cleaned_support[0, 0, 0])
+        self.assertTrue(np.all(cleaned_support[1, 2:4, 3]))
+        self.assertFalse(cleaned_support[1, 4, 1])
+        self.assertTrue(cleaned_support[1, 3, 2])
+        self.assertTrue(np.all(cleaned_support[2]))
+        self.assertTrue(support[0, 2, 2])       # the input is not modified
+
+    def test_iterative_threshold(self):
+        """Check the convergence of the iterative thresholding."""
+
+        input_img = self.signal_img + self.noise_img
+        planes = wavelets_starlet.starlet_transform(input_img, number_of_scales=4)
+        support = wavelets_starlet.get_multiresolution_support(planes, 1.)
+
+        # The first iteration is the hard thresholding (without positivity constraint)
+        filtered_img, residual_sigma_list = wavelets_starlet.iterative_threshold(input_img, support,
+                                                                                 number_of_iterations=1,
+                                                                                 suppress_positivity_constraint=True)
+        np.testing.assert_allclose(filtered_img, wavelets_starlet.inverse_starlet_transform(wavelets_starlet.hard_threshold_planes(planes, 1.)))
+        self.assertEqual(len(residual_sigma_list), 1)
+
+        # Early stopping
+        filtered_img, residual_sigma_list = wavelets_starlet.iterative_threshold(input_img, support,
+                                                                                 number_of_iterations=100,
+                                                                                 epsilon=1e-2)
+        self.assertLess(len(residual_sigma_list), 100)
+        self.assertTrue(np.all(filtered_img >= 0.))
+
+        last_change = abs(residual_sigma_list[-2] - residual_sigma_list[-1]) / residual_sigma_list[-1]
+        self.assertLess(last_change, 1e-2)
+
+    # Cleaning ################################################################
+
+    def test_clean_image(self):
+        """Check that the noise is removed and the signal is kept."""
+
+        cleaning_algorithm = wavelets_starlet.StarletTransform()
+
+        cleaned_img = cleaning_algorithm.clean_image(self.signal_img + self.noise_img,
+                                                     number_of_scales=4,
+                                                     k_sigma_noise_threshold=3,
+                                                     suppress_last_scale=True,
+                                                     detect_only_positive_structure=True)
+
+        self.assertEqual(cleaned_img.shape, self.signal_img.shape)
+        self.assertLess(np.abs(cleaned_img - self.signal_img).sum(), 0.5 * np.abs(self.noise_img).sum())
+
+        # Far from the signal, most pixels should be zero
+        self.assertGreater(np.count_nonzero(cleaned_img[:, :10] == 0.), 0.9 * cleaned_img[:, :10].size)
+
+    def test_clean_image_hard_threshold_filter(self):
+        """Check that the -f1 filtering of clean_image() is
+        hard_threshold_filter() (without positivity constraint)."""
+
+        input_img = self.signal_img + self.noise_img
+        planes = wavelets_starlet.starlet_transform(input_img, number_of_scales=4)
+
+        cleaning_algorithm = wavelets_starlet.StarletTransform()
+        cleaned_img = cleaning_algorithm.clean_image(input_img, noise_sigma=1., suppress_last_scale=True)
+        filtered_img = wavelets_starlet.hard_threshold_filter(planes, 1., suppress_last_scale=True)
+
+        np.testing.assert_allclose(cleaned_img, filtered_img)
+        self.assertTrue(np.any(filtered_img < 0.))
+
+    def test_clean_image_iterative(self):
+        """Check that the iterations are recorded in output_data_dict."""
+
+        cleaning_algorithm = wavelets_starlet.StarletTransform()
+        output_data_dict = {}
+
+        cleaned_img = cleaning_algorithm.clean_image(self.signal_img + self.noise_img,
+                                                     type_of_filtering=3,
+                                                     number_of_iterations=5,
+                                                     suppress_last_scale=True,
+                                                     output_data_dict=output_data_dict)
+
+        self.assertLess(np.abs(cleaned_img - self.signal_img).sum(), 0.5 * np.abs(self.noise_img).sum())
+        self.assertLessEqual(output_data_dict["starlet_num_iterations"], 5)
+        self.assertEqual(len(output_data_dict["starlet_residual_sigma_history"]), output_data_dict["starlet_num_iterations"])
+
+        with self.assertRaises(ValueError):
+            cleaning_algorithm.clean_image(self.signal_img, type_of_filtering=2)
+
+    def test_clean_image_nan(self):
+        """Check that blank pixels remain blank."""
+
+        input_img = self.signal_img + self.noise_img
+        input_img[0:8, 0:8] = np.nan
+
+        cleaning_algorithm = wavelets_starlet.StarletTransform()
+        cleaned_img = cleaning_algorithm.clean_image(input_img, suppress_last_scale=True)
+
+        self.assertTrue(np.all(np.isnan(cleaned_img[0:8, 0:8])))
+        self.assertFalse(np.any(np.isnan(cleaned_img[8:, 8:])))
+
+    def test_clean_images(self):
+        """Check that the vectorized stack cleaning gives the same images
+        than clean_image()."""
+
+        random_state = np.random.RandomState(1)
+        input_img_stack = self.signal_img + random_state.normal(0., 1., size=(3, 56, 56))
+        input_img_stack[1, 0:8, 0:8] = np.nan
+
+        cleaning_algorithm = wavelets_starlet.StarletTransform()
+        params = {"number_of_scales": 4,
+                  "k_sigma_noise_threshold": "3,2",
+                  "suppress_last_scale": True,
+                  "kill_isolated_pixels": True}
+
+        output_data_dict_list = [{} for input_img in input_img_stack]
+        cleaned_img_stack = cleaning_algorithm.clean_images(input_img_stack, output_data_dict_list=output_data_dict_list, **params)
+
+        for input_img, cleaned_img, output_data_dict in zip(input_img_stack, cleaned_img_stack, output_data_dict_list):
+            expected_output_data_dict = {}
+            expected_img = cleaning_algorithm.clean_image(input_img, output_data_dict=expected_output_data_dict, **params)
+
+            np.testing.assert_allclose(cleaned_img, expected_img, atol=1e-12)
+            self.assertAlmostEqual(output_data_dict["starlet_noise_sigma"], expected_output_data_dict["starlet_noise_sigma"])
+            self.assertEqual(output_data_dict["img_cleaned_num_islands"], expected_output_data_dict["img_cleaned_num_islands"])
+
+        with self.assertRaises(TypeError):
+            cleaning_algorithm.clean_images(input_img_stack, unknown_parameter=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,6 +25,7 @@ This module contains unit tests for the "image.hillas_parameters" module.
 """
 
 from datapipe.image.hillas_parameters import get_hillas_parameters
+from datapipe.image.hillas_parameters import get_hillas_psi
 
 import copy
 import numpy as np
@@ -255,6 +256,25 @@ class TestHillasParameters(unittest.TestCase):
         
             np.testing.assert_almost_equal(value, value_nan, decimal=10)
 
+    def test_get_hillas_psi(self):
+        """Check the vectorized psi angle of a stack of images."""
+
+        img_stack = np.zeros([3, 9, 9])
+        np.fill_diagonal(img_stack[0], 1.)              # 45 degrees
+        img_stack[1, 4, :] = 1.                         # 0 degree
+        img_stack[1, 3, 2] = np.nan                     # NaN pixels are ignored
+
+        psi_array = get_hillas_psi(img_stack)
+
+        np.testing.assert_almost_equal(np.degrees(psi_array[:2]), [45., 0.])
+        self.assertTrue(np.isnan(psi_array[2]))         # No signal
+
+        # Pixels positions
+        yy, xx = np.indices([9, 9], dtype=np.float64)
+        psi = get_hillas_psi(img_stack[0], (2. * xx, yy))
+
+        np.testing.assert_almost_equal(psi, np.arctan(0.5))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -25,6 +25,7 @@ This module contains unit tests for the "image.kill_isolated_pixels" module.
 """
 
 from datapipe.image.kill_isolated_pixels import kill_isolated_pixels
+from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stack
 from datapipe.image.kill_isolated_pixels import kill_isolated_pixels_stats
 
 import numpy as np
@@ -280,7 +281,21 @@ class TestKillIsolatedPixels(unittest.TestCase):
         self.assertEqual(delta_pe, expected_delta_pe)
         self.assertEqual(delta_abs_pe, expected_delta_abs_pe)
         self.assertEqual(delta_num_pixels, expected_delta_num_pixels)
-    
+
+    def test_kill_isolated_pixels_stack(self):
+        """Check kill_isolated_pixels_stack() against kill_isolated_pixels()
+        applied on each image."""
+
+        img_stack = np.random.default_rng(0).normal(size=[3, 2, 12, 12])
+        img_stack[img_stack < 0.5] = 0.
+        img_stack[0, 0, 0, :] = np.nan
+        img_stack[1, 1] = 0.    # An image without islands
+
+        filtered_img_stack = kill_isolated_pixels_stack(img_stack)
+
+        for index in np.ndindex(img_stack.shape[:2]):
+            np.testing.assert_array_equal(filtered_img_stack[index], kill_isolated_pixels(img_stack[index]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+This module contains unit tests for the "io.geometry_cache" module.
+"""
+
+from datapipe.denoising.result_cache import canonicalize_params
+from datapipe.denoising.tailcut_engine import get_neighbor_matrix
+from datapipe.io import geom as geom_files
+from datapipe.io import geometry_cache
+
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+
+import unittest
+
+class TestGeometryCache(unittest.TestCase):
+    """
+    Contains unit tests for the "io.geometry_cache" module.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        self.json_file_path = os.path.join(self.tmp_dir.name, "lstcam2d.geom.json")
+        shutil.copy(geom_files.LSTCAM_GEOM_FILE, self.json_file_path)
+
+        with open(self.json_file_path, "r") as fd:
+            self.json_dict = json.load(fd)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_geometry(self):
+        """Check the compiled geometry against the JSON file."""
+
+        geom = geometry_cache.load_geometry(self.json_file_path)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir.name, "lstcam2d.geom.compiled", "header.json")))
+
+        self.assertEqual(geom.cam_id, self.json_dict["cam_id"])
+        self.assertEqual(geom.pix_type, self.json_dict["pix_type"])
+        np.testing.assert_array_equal(geom.pix_id, self.json_dict["pix_id"])
+        np.testing.assert_array_equal(geom.pix_x, self.json_dict["pix_x"])
+        np.testing.assert_array_equal(geom.pix_y, self.json_dict["pix_y"])
+        np.testing.assert_array_equal(geom.pix_area, self.json_dict["pix_area"])
+        self.assertEqual(geom.neighbors, self.json_dict["neighbors"])
+
+        # Arrays are memory mapped
+        self.assertIsInstance(geom.neighbor_indices, np.memmap)
+        self.assertFalse(geom.pix_x.flags.writeable)
+
+    def test_outdated_compiled_file(self):
+        """The JSON file is compiled again when it is modified."""
+
+        geometry_cache.load_geometry(self.json_file_path)
+
+        self.json_dict["cam_id"] = "lstcam2d_v2"
+        with open(self.json_file_path, "w") as fd:
+            json.dump(self.json_dict, fd)
+
+        # Whatever the files modification time (e.g. after a checkout)
+        os.utime(self.json_file_path, (0, 0))
+
+        self.assertEqual(geometry_cache.load_geometry(self.json_file_path).cam_id, "lstcam2d_v2")
+
+        # No temporary directory is left
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ["lstcam2d.geom.compiled", "lstcam2d.geom.json"])
+
+    def test_up_to_date_compiled_file(self):
+        """The compiled geometry is used whatever its modification time."""
+
+        compiled_dir_path = geometry_cache.compile_geometry_file(self.json_file_path)
+
+        header_file_path = os.path.join(compiled_dir_path, "header.json")
+        with open(header_file_path, "r") as fd:
+            header_dict = json.load(fd)
+        header_dict["cam_id"] = "compiled"
+        with open(header_file_path, "w") as fd:
+            json.dump(header_dict, fd)
+
+        for file_name in os.listdir(compiled_dir_path):
+            os.utime(os.path.join(compiled_dir_path, file_name), (0, 0))
+
+        self.assertEqual(geometry_cache.load_geometry(self.json_file_path).cam_id, "compiled")
+
+    def test_neighbor_matrix(self):
+
+        geom = geometry_cache.load_geometry(self.json_file_path)
+
+        expected_matrix = get_neighbor_matrix(self.json_dict["neighbors"])
+
+        self.assertEqual((geom.neighbor_matrix_sparse != expected_matrix.astype(bool)).nnz, 0)
+        self.assertEqual((get_neighbor_matrix(geom.neighbor_matrix_sparse) != expected_matrix).nnz, 0)
+
+    def test_cache_key(self):
+        """Cleaning result cache keys do not depend on how geometries are loaded."""
+
+        geom1 = geometry_cache.load_geometry(self.json_file_path)
+        geom2 = geometry_cache.LightCameraGeometry.from_json_dict(self.json_dict)
+
+        self.assertEqual(canonicalize_params({"geom": geom1}), canonicalize_params({"geom": geom2}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -295,6 +295,71 @@ class TestGeometryConverter(unittest.TestCase):
         # Check whether the input image has changed
 
         np.testing.assert_array_equal(img_2d, img_2d_v2)
+
+
+    #################################################################################################
+    # INDEX MAPS ####################################################################################
+    #################################################################################################
+
+    def test_astri_index_map(self):
+        """Check the ASTRI index maps against the module layout of the camera."""
+
+        index_map = geometry_converter.get_astri_index_map(crop=False)
+
+        self.assertEqual(index_map.shape, (56, 56))
+        self.assertEqual(np.count_nonzero(index_map >= 0), 37*64)
+        np.testing.assert_array_equal(np.sort(index_map[index_map >= 0]), np.arange(37*64))
+
+        # The first module (pixels 0 to 63) is at the bottom of the camera, its rows are flipped
+        np.testing.assert_array_equal(index_map[6*8:7*8, 2*8:3*8], np.arange(64).reshape([8,8])[::-1,:])
+
+        # The cropped image is made of the 25 central modules
+        np.testing.assert_array_equal(geometry_converter.get_astri_index_map(crop=True), index_map[8:-8, 8:-8])
+
+        # Maps are computed once and cannot be modified
+        self.assertIs(geometry_converter.get_astri_index_map(crop=False), index_map)
+        self.assertFalse(index_map.flags.writeable)
+
+
+    def test_1d_2d_1d_astri_batch(self):
+
+        img_1d = np.random.normal(size=(3, 2, 37*64))
+
+        img_2d = geometry_converter.astri_to_2d_array(img_1d, crop=False)
+
+        self.assertEqual(img_2d.shape, (3, 2, 56, 56))
+        np.testing.assert_array_equal(np.isnan(img_2d[1, 0]), geometry_converter.astri_pixel_mask(False) == 0)
+        np.testing.assert_array_equal(img_2d[1, 0], geometry_converter.astri_to_2d_array(img_1d[1, 0], crop=False))
+        np.testing.assert_array_equal(geometry_converter.array_2d_to_astri(img_2d), img_1d)
+
+        img_3d = geometry_converter.astri_to_3d_array(img_1d[0], crop=True)
+
+        self.assertEqual(img_3d.shape, (2, 40, 40))
+        np.testing.assert_array_equal(img_3d[1], geometry_converter.astri_to_2d_array(img_1d[0, 1], crop=True))
+
+
+    def test_1d_2d_1d_gct_batch(self):
+
+        img_1d = np.random.normal(size=(4, 2048))
+
+        img_2d = geometry_converter.gct_to_3d_array(img_1d)
+
+        self.assertEqual(img_2d.shape, (4, 48, 48))
+        np.testing.assert_array_equal(np.isnan(img_2d[2]), geometry_converter.gct_pixel_mask() == 0)
+        np.testing.assert_array_equal(img_2d[2], geometry_converter.gct_to_2d_array(img_1d[2]))
+        np.testing.assert_array_equal(geometry_converter.array_2d_to_gct(img_2d), img_1d)
+
+
+    def test_wrong_image_size(self):
+
+        with self.assertRaises(ValueError):
+            geometry_converter.astri_to_2d_array(np.zeros(2048))
+
+        with self.assertRaises(ValueError):
+            geometry_converter.gct_to_2d_array(np.zeros(37*64))
+
+        with self.assertRaises(ValueError):
+            geometry_converter.array_2d_to_gct(np.zeros([56, 56]))
     
 
 if __name__ == '__main__':
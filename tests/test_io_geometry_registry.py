@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+This module contains unit tests for the "io.geometry_registry" module.
+"""
+
+from datapipe.io import geometry_registry
+from datapipe.io.geometry_registry import GeometryMapping, build_geometry_mapping, get_geometry_mapping
+
+import json
+import numpy as np
+import os
+import tempfile
+
+import unittest
+
+# A 3x3 grid without its top left and bottom right corners
+JSON_DICT = {"cam_id": "test",
+             "pix_x": [0., 1., 1.01, 2., -0.01, 1., 2.],
+             "pix_y": [0., 0., 1., 1., 1., 2., 2.],
+             "pix_area": [1.] * 7}
+
+class TestGeometryRegistry(unittest.TestCase):
+    """
+    Contains unit tests for the "io.geometry_registry" module.
+    """
+
+    def test_build_mapping(self):
+        """Check the mapping derived from pixel positions."""
+
+        mapping = build_geometry_mapping(JSON_DICT)
+
+        np.testing.assert_array_equal(mapping.index_map, [[0, 1, -1], [4, 2, 3], [-1, 5, 6]])
+        np.testing.assert_array_equal(mapping.inverse_index_map, [0, 1, 4, 5, 3, 7, 8])
+        np.testing.assert_array_equal(mapping.pixel_mask, mapping.index_map >= 0)
+        np.testing.assert_allclose(mapping.pixel_pos_2d[:, 1, 0], [-0.005, 1.])
+        np.testing.assert_allclose(mapping.pixel_pos_2d[:, 0, 2], [2., 0.])
+
+        flipped_mapping = build_geometry_mapping(JSON_DICT, flip_rows=True)
+
+        np.testing.assert_array_equal(flipped_mapping.index_map, mapping.index_map[::-1])
+        np.testing.assert_allclose(flipped_mapping.pixel_pos_2d, mapping.pixel_pos_2d[:, ::-1])
+
+    def test_not_a_grid(self):
+
+        json_dict = dict(JSON_DICT, pix_x=[0., 0.1, 1., 2., 0., 1., 2.])
+
+        with self.assertRaises(ValueError):
+            build_geometry_mapping(json_dict)
+
+    def test_conversions(self):
+        """Check 1D <-> 2D conversions of batches of images."""
+
+        mapping = build_geometry_mapping(JSON_DICT)
+
+        img_1d = np.random.normal(size=(4, 2, 7))
+        img_2d = mapping.to_2d(img_1d)
+
+        self.assertEqual(img_2d.shape, (4, 2, 3, 3))
+        np.testing.assert_array_equal(np.isnan(img_2d[3, 1]), ~mapping.pixel_mask)
+        np.testing.assert_array_equal(img_2d[3, 1, 1], img_1d[3, 1, [4, 2, 3]])
+        np.testing.assert_array_equal(mapping.to_1d(img_2d), img_1d)
+
+        with self.assertRaises(ValueError):
+            mapping.to_2d(np.zeros(8))
+
+        with self.assertRaises(ValueError):
+            mapping.to_1d(np.zeros([3, 4]))
+
+    def test_missing_pixels(self):
+        """Pixels not in the 2D images are NaN in 1D images."""
+
+        mapping = GeometryMapping([[2, 0]], num_pixels=3)
+
+        np.testing.assert_array_equal(mapping.to_2d([1., 2., 3.]), [[3., 1.]])
+        np.testing.assert_array_equal(mapping.to_1d([[3., 1.]]), [1., np.nan, 3.])
+
+    def test_save_and_load(self):
+
+        mapping = build_geometry_mapping(JSON_DICT)
+
+        with tempfile.TemporaryDirectory() as tmp_dir_path:
+            mapping_file_path = os.path.join(tmp_dir_path, "test.geom.map.npz")
+            geometry_registry.save_geometry_mapping(mapping, mapping_file_path)
+            loaded_mapping = geometry_registry.load_geometry_mapping(mapping_file_path)
+
+        self.assertEqual(loaded_mapping.name, "test")
+        self.assertEqual(loaded_mapping.num_pixels, 7)
+        np.testing.assert_array_equal(loaded_mapping.index_map, mapping.index_map)
+        np.testing.assert_array_equal(loaded_mapping.pixel_pos_2d, mapping.pixel_pos_2d)
+
+    def test_mapping_file_checksum(self):
+        """Check that mapping files are used only if they have been built
+        from the current geometry JSON file."""
+
+        with tempfile.TemporaryDirectory() as tmp_dir_path:
+            geom_json_file_path = os.path.join(tmp_dir_path, "test.geom.json")
+            mapping_file_path = geometry_registry.get_mapping_file_path(geom_json_file_path)
+
+            with open(geom_json_file_path, "w") as fd:
+                json.dump(JSON_DICT, fd)
+
+            geometry_registry._get_json_file_mapping(geom_json_file_path)
+            self.assertTrue(os.path.isfile(mapping_file_path))
+
+            # The mapping file is used whatever its modification time (e.g. after a checkout)
+            with np.load(mapping_file_path) as npz_file:
+                geom_json_sha1 = str(npz_file["geom_json_sha1"])
+            geometry_registry.save_geometry_mapping(GeometryMapping([[0]], 1, np.zeros((2, 1, 1)), name="saved"), mapping_file_path, geom_json_sha1)
+            os.utime(mapping_file_path, (0, 0))
+
+            self.assertEqual(geometry_registry._get_json_file_mapping(geom_json_file_path).name, "saved")
+
+            # The mapping is built again if the JSON file has changed
+            with open(geom_json_file_path, "w") as fd:
+                json.dump(dict(JSON_DICT, cam_id="modified"), fd)
+
+            self.assertEqual(geometry_registry._get_json_file_mapping(geom_json_file_path).name, "modified")
+            self.assertEqual(geometry_registry.load_geometry_mapping(mapping_file_path).name, "modified")
+
+    def test_registry(self):
+        """Check the mappings of the package geometries."""
+
+        for cam_id, image_shape in (("lstcam2d", (55, 55)), ("DigiCam2D", (48, 48)), ("astri_cropped", (40, 40))):
+            mapping = get_geometry_mapping(cam_id)
+
+            # The 2D images of these cameras are the 1D images reshaped
+            self.assertEqual(mapping.image_shape, image_shape)
+            np.testing.assert_array_equal(mapping.index_map.ravel(), np.arange(mapping.num_pixels))
+
+        mapping = get_geometry_mapping("ASTRICam")
+
+        self.assertIs(get_geometry_mapping("astri"), mapping)
+        self.assertEqual(mapping.image_shape, (56, 56))
+        self.assertEqual(np.count_nonzero(mapping.pixel_mask), 37*64)
+        self.assertFalse(mapping.index_map.flags.writeable)
+
+        # The first row of ASTRI images is the top of the camera
+        self.assertGreater(mapping.pixel_pos_2d[1, 0, 0], mapping.pixel_pos_2d[1, -1, 0])
+
+        with self.assertRaises(ValueError):
+            get_geometry_mapping("unknown_camera")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+This module contains unit tests for the "io.hex_resampler" module.
+"""
+
+from datapipe.io.hex_resampler import build_hex_geometry_mapping, get_hex_geometry_mapping
+
+import importlib
+import numpy as np
+import types
+
+import unittest
+
+try:
+    from astropy import units as u
+    from ctapipe.instrument import CameraGeometry
+except ImportError:
+    CameraGeometry = None
+
+# The hexagonal cameras converted by the simtel_to_fits_* scripts
+HEX_CAM_ID_LIST = ("DigiCam", "FlashCam", "NectarCam", "LSTCam")
+
+def get_ctapipe_converter_function(*function_name_list):
+    """Return the first function of `function_name_list` found in ctapipe's
+    hexagonal geometry converter (the module and the names of these
+    functions depend on the ctapipe version)."""
+
+    for module_name in ("ctapipe.image.geometry_converter", "ctapipe.image.geometry_converter_hex"):
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        for function_name in function_name_list:
+            if hasattr(module, function_name):
+                return getattr(module, function_name)
+
+    raise unittest.SkipTest("ctapipe has no {} function".format(function_name_list[0]))
+
+def hexagonal_grid(radius, pitch=0.05, rotation=0.):
+    """Return the pixel positions of a hexagonal camera of `radius` rings
+    (pixels are shuffled and the camera is rotated by `rotation` degrees)."""
+
+    axial_coordinates = [(q, r) for r in range(-radius, radius + 1)
+                                for q in range(-radius, radius + 1)
+                                if abs(q + r) <= radius]
+    q, r = np.array(axial_coordinates).T
+
+    pix_x = pitch * (q + r / 2.)
+    pix_y = pitch * r * np.sqrt(3.) / 2.
+
+    angle = np.radians(rotation)
+    pixel_pos = np.array([[np.cos(angle), -np.sin(angle)],
+                          [np.sin(angle),  np.cos(angle)]]).dot([pix_x, pix_y])
+
+    return pixel_pos[:, np.random.RandomState(0).permutation(len(q))]
+
+
+class TestHexResampler(unittest.TestCase):
+    """
+    Contains unit tests for the "io.hex_resampler" module.
+    """
+
+    def test_one_pixel_per_bin(self):
+        """Each pixel of regular hexagonal cameras has its own 2D pixel."""
+
+        for rotation in (0., 30., -10.9):
+            pix_x, pix_y = hexagonal_grid(10, rotation=rotation)
+            mapping = build_hex_geometry_mapping(pix_x, pix_y, pix_rotation=rotation)
+
+            self.assertEqual(mapping.image_shape, (21, 21))
+            self.assertEqual(np.count_nonzero(mapping.pixel_mask), len(pix_x))
+
+            # Actual pixels keep their position
+            np.testing.assert_allclose(mapping.pixel_pos_2d[0].ravel()[mapping.inverse_index_map], pix_x)
+            np.testing.assert_allclose(mapping.pixel_pos_2d[1].ravel()[mapping.inverse_index_map], pix_y)
+
+    def test_neighbors(self):
+        """Neighbor pixels are neighbors in 2D images."""
+
+        pix_x, pix_y = hexagonal_grid(5)
+        mapping = build_hex_geometry_mapping(pix_x, pix_y)
+
+        rows, columns = np.unravel_index(mapping.inverse_index_map, mapping.image_shape)
+        distance = np.hypot(pix_x[:, None] - pix_x, pix_y[:, None] - pix_y)
+        neighbor_mask = np.isclose(distance, 0.05)
+
+        self.assertEqual(neighbor_mask.sum(axis=1).max(), 6)
+        self.assertTrue(np.all(np.abs(rows[:, None] - rows)[neighbor_mask] <= 1))
+        self.assertTrue(np.all(np.abs(columns[:, None] - columns)[neighbor_mask] <= 1))
+
+    def test_conversions(self):
+        """Check the conversion of all channels of an event at once."""
+
+        pix_x, pix_y = hexagonal_grid(6)
+        mapping = build_hex_geometry_mapping(pix_x, pix_y)
+
+        img_1d = np.random.normal(size=(2, len(pix_x)))
+        img_2d = mapping.to_2d(img_1d)
+
+        self.assertEqual(img_2d.shape, (2,) + mapping.image_shape)
+        np.testing.assert_array_equal(img_2d[1], mapping.to_2d(img_1d[1]))
+        np.testing.assert_array_equal(np.isnan(img_2d[0]), ~mapping.pixel_mask)
+        np.testing.assert_array_equal(mapping.to_1d(img_2d), img_1d)
+
+    def test_cache(self):
+
+        pix_x, pix_y = hexagonal_grid(4)
+        geom = types.SimpleNamespace(cam_id="TestHexCam", pix_x=pix_x, pix_y=pix_y, pix_rotation=0.)
+
+        mapping = get_hex_geometry_mapping(geom)
+
+        self.assertIs(get_hex_geometry_mapping(geom), mapping)
+        self.assertIsNot(get_hex_geometry_mapping(geom, add_rot=1), mapping)
+        np.testing.assert_array_equal(mapping.index_map, build_hex_geometry_mapping(pix_x, pix_y).index_map)
+
+
+@unittest.skipIf(CameraGeometry is None, "ctapipe is not available")
+class TestHexResamplerCtapipeReference(unittest.TestCase):
+    """
+    Compare the resampling with ctapipe's geometry converter (the one used
+    by the simtel_to_fits_* scripts before `hex_resampler`).
+    """
+
+    def setUp(self):
+        try:
+            self.geom_list = [CameraGeometry.from_name(cam_id) for cam_id in HEX_CAM_ID_LIST]
+        except Exception as e:
+            self.skipTest("the ctapipe camera geometries are not available ({})".format(e))
+
+        self.convert_geometry_1d_to_2d = get_ctapipe_converter_function("convert_geometry_1d_to_2d",
+                                                                        "convert_geometry_hex1d_to_rect2d")
+        self.unskew_hex_pixel_grid = get_ctapipe_converter_function("unskew_hex_pixel_grid")
+        self.reskew_hex_pixel_grid = get_ctapipe_converter_function("reskew_hex_pixel_grid")
+        self.get_orthogonal_grid_edges = get_ctapipe_converter_function("get_orthogonal_grid_edges")
+
+    def test_ctapipe_reference(self):
+        """Check the 2D images and pixel positions pixel for pixel."""
+
+        for geom in self.geom_list:
+            with self.subTest(cam_id=geom.cam_id):
+                mapping = get_hex_geometry_mapping(geom, add_rot=0)
+
+                # 2D images
+                img_1d = np.random.RandomState(0).normal(size=len(geom.pix_x))
+                geom2d, ref_img_2d = self.convert_geometry_1d_to_2d(geom, img_1d, key=None, add_rot=0)
+                geom2d, ref_index_map = self.convert_geometry_1d_to_2d(geom, np.arange(len(geom.pix_x), dtype=np.float64), key=None, add_rot=0)
+
+                np.testing.assert_array_equal(mapping.pixel_mask, geom2d.mask)
+                np.testing.assert_array_equal(mapping.to_2d(img_1d), ref_img_2d)
+                np.testing.assert_array_equal(mapping.to_1d(ref_img_2d), img_1d)
+
+                # Actual pixels keep their position
+                ref_index_array = ref_index_map[geom2d.mask].astype(int)
+                np.testing.assert_allclose(mapping.pixel_pos_2d[0][geom2d.mask], geom.pix_x.to(u.m).value[ref_index_array])
+                np.testing.assert_allclose(mapping.pixel_pos_2d[1][geom2d.mask], geom.pix_y.to(u.m).value[ref_index_array])
+
+                # Blank pixels are the centers of ctapipe's bins sheared back
+                # into the camera frame
+                rot_angle = -(geom.pix_rotation - 30 * u.deg)
+                rot_x, rot_y = self.unskew_hex_pixel_grid(geom.pix_x, geom.pix_y, cam_angle=rot_angle)
+                x_scale = self.get_orthogonal_grid_edges(rot_x, rot_y)[2]
+                ref_blank_x, ref_blank_y = self.reskew_hex_pixel_grid(geom2d.pix_x[~geom2d.mask] / x_scale,
+                                                                      geom2d.pix_y[~geom2d.mask],
+                                                                      cam_angle=rot_angle)
+
+                np.testing.assert_allclose(mapping.pixel_pos_2d[0][~geom2d.mask], u.Quantity(ref_blank_x, u.m).value)
+                np.testing.assert_allclose(mapping.pixel_pos_2d[1][~geom2d.mask], u.Quantity(ref_blank_y, u.m).value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "io.json_lines" module.
+"""
+
+from datapipe.io import json_lines
+
+import json
+import os
+import tempfile
+
+import unittest
+
+class TestJsonLines(unittest.TestCase):
+    """
+    Contains unit tests for the "io.json_lines" module.
+    """
+
+    def setUp(self):
+        fd, self.file_path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.file_path)
+
+    def test_write_and_load(self):
+        """Check that a written file is loaded in the classic JSON layout."""
+
+        with json_lines.JsonLinesWriter(self.file_path) as writer:
+            writer.write_header({"label": "Tailcut", "algo_params": {"high_threshold": 10}})
+            writer.write_image({"input_file_path": "a.fits", "score": [1.]})
+            writer.write_image({"input_file_path": "b.fits", "score": [2.]})
+            writer.write_footer({"benchmark_execution_time_sec": "1.0"})
+
+        self.assertTrue(json_lines.is_json_lines_file(self.file_path))
+
+        json_dict = json_lines.load_json_lines_file(self.file_path)
+
+        expected_json_dict = {"label": "Tailcut",
+                              "algo_params": {"high_threshold": 10},
+                              "benchmark_execution_time_sec": "1.0",
+                              "io": [{"input_file_path": "a.fits", "score": [1.]},
+                                     {"input_file_path": "b.fits", "score": [2.]}]}
+
+        self.assertEqual(json_dict, expected_json_dict)
+
+    def test_truncated_record(self):
+        """Check that a record truncated by an interrupted run is ignored."""
+
+        with json_lines.JsonLinesWriter(self.file_path) as writer:
+            writer.write_header({"label": "Tailcut"})
+            writer.write_image({"input_file_path": "a.fits"})
+
+        with open(self.file_path, "a") as fd:
+            fd.write('{"input_file_path": "b.fi')
+
+        record_list = list(json_lines.iter_json_lines_file(self.file_path))
+
+        self.assertEqual(record_list, [("header", {"label": "Tailcut"}),
+                                       ("image", {"input_file_path": "a.fits"})])
+
+    def test_remove_truncated_record(self):
+        """Check that new records can be appended after removing a truncated record."""
+
+        with json_lines.JsonLinesWriter(self.file_path) as writer:
+            writer.write_header({"label": "Tailcut"})
+            writer.write_image({"input_file_path": "a.fits"})
+
+        self.assertFalse(json_lines.remove_truncated_record(self.file_path))
+
+        with open(self.file_path, "a") as fd:
+            fd.write('{"input_file_path": "b.fi')
+
+        self.assertTrue(json_lines.remove_truncated_record(self.file_path))
+
+        with json_lines.JsonLinesWriter(self.file_path, append=True) as writer:
+            writer.write_image({"input_file_path": "b.fits"})
+
+        json_dict = json_lines.load_json_lines_file(self.file_path)
+
+        self.assertEqual(json_dict["io"], [{"input_file_path": "a.fits"},
+                                           {"input_file_path": "b.fits"}])
+
+    def test_classic_json_file(self):
+        """Check that classic JSON files are not detected as JSON Lines files."""
+
+        with open(self.file_path, "w") as fd:
+            json.dump({"label": "Tailcut", "io": []}, fd, sort_keys=True, indent=4)
+
+        self.assertFalse(json_lines.is_json_lines_file(self.file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "optimization.objectivefunc.tailcut_delta_psi" module.
+"""
+
+from datapipe.io import geom
+from datapipe.io import images
+from datapipe.optimization.objectivefunc.tailcut_delta_psi import ObjectiveFunction
+
+import json
+import numpy as np
+import os
+import tempfile
+import types
+
+import unittest
+
+
+def make_benchmark_file(file_path, event_id, random_state):
+    """Save a noisy elliptical shower image in `file_path`."""
+
+    yy, xx = np.mgrid[0:40, 0:40]
+    angle = random_state.uniform(0., np.pi)
+    center_x, center_y = random_state.uniform(12., 28., 2)
+    u = (xx - center_x) * np.cos(angle) + (yy - center_y) * np.sin(angle)
+    v = -(xx - center_x) * np.sin(angle) + (yy - center_y) * np.cos(angle)
+
+    reference_img = np.round(200. * np.exp(-(u**2 / 32. + v**2 / 4.)))
+    input_img = reference_img + random_state.normal(0., 2., reference_img.shape)
+    pixels_position = np.array(np.meshgrid(np.linspace(-0.14, 0.14, 40), np.linspace(-0.14, 0.14, 40)))
+
+    # Blank pixels
+    reference_img[0, :3] = np.nan
+    input_img[0, :3] = np.nan
+    pixels_position[:, 0, :3] = np.nan
+
+    metadata = {'version': 1, 'cam_id': 'ASTRI_CROPPED', 'tel_id': 1, 'event_id': event_id,
+                'simtel': 'test.simtel', 'tel_trig': 1, 'count': event_id, 'run_id': 1, 'tel_data': 1,
+                'energy': (1., 'TeV'), 'mc_az': (0., 'rad'), 'mc_alt': (1., 'rad'),
+                'mc_corex': (0., 'm'), 'mc_corey': (0., 'm'), 'mc_hfi': (1000., 'm'),
+                'foclen': (2.15, 'm'), 'tel_posx': (0., 'm'), 'tel_posy': (0., 'm'), 'tel_posz': (0., 'm')}
+
+    blank_plane_stack = np.zeros((2, 40, 40))
+
+    images.save_benchmark_images(input_img,
+                                 reference_img,
+                                 blank_plane_stack,
+                                 blank_plane_stack,
+                                 blank_plane_stack,
+                                 pixels_position,
+                                 np.ones((40, 40), dtype=int),
+                                 metadata,
+                                 file_path)
+
+
+class TestTailcutObjectiveFunction(unittest.TestCase):
+    """
+    Contains unit tests for the "ObjectiveFunction" class.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        # The objective function writes its benchmark files in the current directory
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+
+        input_dir = os.path.join(self.tmp_dir.name, "fits")
+        os.makedirs(input_dir)
+
+        random_state = np.random.RandomState(0)
+        for event_id in range(6):
+            make_benchmark_file(os.path.join(input_dir, "img_{}.fits".format(event_id)), event_id, random_state)
+
+        with open(geom.ASTRI_CROPPED_GEOM_FILE, "r") as fd:
+            geom_dict = json.load(fd)
+
+        self.geom = types.SimpleNamespace(cam_id=geom_dict["cam_id"],
+                                          pix_id=geom_dict["pix_id"],
+                                          neighbors=geom_dict["neighbors"])
+        self.input_files = [input_dir]
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_evaluate_grid(self):
+        """Check that evaluate_grid() returns the score of each pair."""
+
+        func = ObjectiveFunction(input_files=self.input_files, geom=self.geom)
+
+        threshold_list = [(10., 5.), (6., 3.), (4., 4.), (8., -1.), (3., 5.), (np.nan, 3.)]    # low > high or NaN for the last pairs
+
+        score_array = func.evaluate_grid(threshold_list)
+
+        for threshold_pair, score in zip(threshold_list, score_array):
+            np.testing.assert_allclose(func.evaluate_grid([threshold_pair]), [func(threshold_pair)])
+            np.testing.assert_allclose(score, func(threshold_pair))
+
+        self.assertTrue(np.all(np.isnan(score_array[-2:])))
+        self.assertTrue(np.all(np.isfinite(score_array[:-2])))
+
+
+if __name__ == '__main__':
+    unittest.main()
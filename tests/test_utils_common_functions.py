@@ -29,10 +29,15 @@ sys.path.append("utils")
 import common_functions as common
 
 import copy
+import json
 import numpy as np
+import os
+import tempfile
 
 import unittest
 
+from datapipe.io import json_lines
+
 class TestCommonFunctions(unittest.TestCase):
     """
     Contains unit tests for the "common_functions" module.
@@ -121,6 +126,46 @@ class TestCommonFunctions(unittest.TestCase):
 
         self.assertEqual(max_value, 30.)
 
+
+    # Test the "image_dict_generator" function ######################
+
+    def test_image_dict_generator(self):
+        """Check that JSON and JSON Lines files give the same images, the
+        same metadata and the same filtered scores."""
+
+        image_dict_list = [{"tel_id": img_index % 2, "npe": float(img_index), "score": [img_index, -img_index], "score_name": ["s1", "s2"]}
+                           for img_index in range(10)]
+        image_dict_list.append({"tel_id": 0, "npe": 0., "error": {"type": "ValueError"}})
+
+        with tempfile.TemporaryDirectory() as tmp_dir_path:
+            json_file_path = os.path.join(tmp_dir_path, "score.json")
+            with open(json_file_path, "w") as fd:
+                json.dump({"label": "test", "io": image_dict_list}, fd)
+
+            json_lines_file_path = os.path.join(tmp_dir_path, "score.jsonl")
+            with json_lines.JsonLinesWriter(json_lines_file_path) as writer:
+                writer.write_header({"label": "test"})
+                for image_dict in image_dict_list:
+                    writer.write_image(image_dict)
+
+            for file_path in (json_file_path, json_lines_file_path):
+                metadata_dict = {}
+                image_dicts = common.image_dict_generator(file_path, metadata_dict)
+                image_dicts = common.image_filter_equals(image_dicts, "tel_id", 0)
+                image_dicts = common.ImageCounter(common.image_filter_range(image_dicts, "npe", min_value=1.))
+
+                score_array, npe_array = common.extract_score_and_metadata_arrays(image_dicts, "s2", "npe")
+
+                self.assertEqual(metadata_dict, {"label": "test"})
+                self.assertEqual(image_dicts.count, 4)
+                np.testing.assert_array_equal(score_array, [-2, -4, -6, -8])
+                np.testing.assert_array_equal(npe_array, [2., 4., 6., 8.])
+
+                # The same filters on the whole file
+                json_dict = common.parse_json_file(file_path)
+                json_dict = common.image_filter_range(common.image_filter_equals(json_dict, "tel_id", 0), "npe", min_value=1.)
+                np.testing.assert_array_equal(common.extract_score_array(json_dict, 1), score_array)
+
 if __name__ == '__main__':
     unittest.main()
 
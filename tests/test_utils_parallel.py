@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "utils.parallel" module.
+"""
+
+from datapipe.utils.parallel import parallel_map
+
+import unittest
+
+def square(x):
+    return x * x
+
+class TestParallelMap(unittest.TestCase):
+    """
+    Contains unit tests for the "utils.parallel" module.
+    """
+
+    def test_sequential(self):
+        """Check the output of parallel_map without worker pool."""
+
+        result_list = list(parallel_map(square, range(20)))
+
+        self.assertEqual(result_list, [x * x for x in range(20)])
+
+    def test_concurrent_futures_order(self):
+        """Check that results are returned in input order (concurrent.futures backend)."""
+
+        result_list = list(parallel_map(square, range(50), num_workers=3, backend="concurrent.futures"))
+
+        self.assertEqual(result_list, [x * x for x in range(50)])
+
+    def test_multiprocessing_order(self):
+        """Check that results are returned in input order (multiprocessing backend)."""
+
+        result_list = list(parallel_map(square, range(50), num_workers=3, backend="multiprocessing"))
+
+        self.assertEqual(result_list, [x * x for x in range(50)])
+
+    def test_wrong_backend(self):
+        """Check that an unknown backend is rejected."""
+
+        with self.assertRaises(ValueError):
+            parallel_map(square, range(5), num_workers=2, backend="foo")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "utils.prefetch" module.
+"""
+
+from datapipe.utils.prefetch import get_num_bytes
+from datapipe.utils.prefetch import prefetch_map
+
+import numpy as np
+import threading
+
+import unittest
+
+class TestPrefetchMap(unittest.TestCase):
+    """
+    Contains unit tests for the "utils.prefetch" module.
+    """
+
+    def test_order(self):
+        """Check that results are returned in input order."""
+
+        result_list = list(prefetch_map(lambda x: x * x, range(50), depth=4, num_threads=3))
+
+        self.assertEqual(result_list, [x * x for x in range(50)])
+
+    def test_depth(self):
+        """Check that no more than `depth` items are loaded in advance."""
+
+        loaded_list = []
+        lock = threading.Lock()
+
+        def load(x):
+            with lock:
+                loaded_list.append(x)
+            return x
+
+        for x in prefetch_map(load, range(20), depth=3):
+            with lock:
+                self.assertLessEqual(len(loaded_list), x + 3)
+
+    def test_max_bytes(self):
+        """Check that the memory cap doesn't prevent the iteration from ending."""
+
+        result_list = list(prefetch_map(lambda x: np.zeros(100) + x, range(10), depth=5, max_bytes=1))
+
+        self.assertEqual([int(a[0]) for a in result_list], list(range(10)))
+
+    def test_wrong_depth(self):
+        """Check that a null depth is rejected."""
+
+        with self.assertRaises(ValueError):
+            prefetch_map(abs, range(5), depth=0)
+
+    def test_get_num_bytes(self):
+        """Check the size of nested containers of arrays."""
+
+        obj = ({"a": np.zeros(10), "b": [np.zeros(5, dtype=np.uint8), "foo"]}, {"c": 1})
+
+        self.assertEqual(get_num_bytes(obj), 85)
+
+
+if __name__ == '__main__':
+    unittest.main()
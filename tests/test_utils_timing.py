@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2017 Jérémie DECOCK (http://www.jdhp.org)
+
+# This script is provided under the terms and conditions of the MIT license:
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains unit tests for the "utils.timing" module.
+"""
+
+from datapipe.utils.timing import StageTimer
+from datapipe.utils.timing import format_timing_report
+
+import unittest
+
+class TestStageTimer(unittest.TestCase):
+    """
+    Contains unit tests for the "utils.timing" module.
+    """
+
+    def test_report(self):
+        """Check the statistics of the timing report."""
+
+        timer = StageTimer()
+
+        for duration_sec in (1., 2., 3., 4.):
+            timer.add("clean", duration_sec)
+
+        timer.add_durations({"assess": 2.})
+
+        report_dict = timer.get_report(wall_time_sec=20.)
+
+        self.assertEqual(list(report_dict.keys()), ["clean", "assess"])
+        self.assertEqual(report_dict["clean"]["num_calls"], 4)
+        self.assertAlmostEqual(report_dict["clean"]["total_sec"], 10.)
+        self.assertAlmostEqual(report_dict["clean"]["mean_sec"], 2.5)
+        self.assertAlmostEqual(report_dict["clean"]["p50_sec"], 2.5)
+        self.assertAlmostEqual(report_dict["clean"]["wall_time_share"], 0.5)
+        self.assertAlmostEqual(report_dict["assess"]["wall_time_share"], 0.1)
+
+        self.assertEqual(len(format_timing_report(report_dict).splitlines()), 3)
+
+    def test_stage(self):
+        """Check that stages are recorded even if an exception is raised."""
+
+        timer = StageTimer()
+
+        with timer.stage("load"):
+            pass
+
+        with self.assertRaises(ValueError):
+            with timer.stage("clean"):
+                raise ValueError()
+
+        self.assertEqual(list(timer.get_total_durations().keys()), ["load", "clean"])
+
+
+if __name__ == '__main__':
+    unittest.main()
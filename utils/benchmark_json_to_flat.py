@@ -303,13 +303,12 @@ def main():
 
     for input_file_path in input_file_list:
         print(input_file_path)
-        json_dict = common.parse_json_file(input_file_path)
+        image_dicts = common.image_dict_generator(input_file_path)
 
         common_lines = [input_file_path]
 
         # Make the file output array
-        io_list = json_dict["io"]
-        file_output_list = [common_lines + extract_columns(image_dict) for image_dict in io_list if "score" in image_dict]
+        file_output_list = [common_lines + extract_columns(image_dict) for image_dict in image_dicts if "score" in image_dict]
         file_output_array = np.array(file_output_list)
 
         # Append the file output array to the global ouput array
@@ -228,11 +228,11 @@ def main():
 
     for input_file_path in input_file_list:
         print(input_file_path)
-        json_dict = common.parse_json_file(input_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(input_file_path, metadata_dict)
 
         # Make the file output array
-        io_list = json_dict["io"]
-        file_output_list = [list(extract_columns(input_file_path, image_dict, json_dict).values()) for image_dict in io_list]
+        file_output_list = [list(extract_columns(input_file_path, image_dict, metadata_dict).values()) for image_dict in image_dicts]
         file_output_array = np.array(file_output_list)
 
         # Append the file output array to the global ouput array
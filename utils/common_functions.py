@@ -30,7 +30,8 @@ from datapipe.denoising import tailcut as tailcut_mod
 from datapipe.denoising import wavelets_mrfilter as wavelets_mod
 from datapipe.benchmark import assess as assess_mod
 
-from datapipe.io import geometry_converter
+from datapipe.io import geometry_cache
+from datapipe.io import json_lines
 import datapipe.io.geom as geom_mod
 
 from datapipe.image.hillas_parameters import get_hillas_parameters
@@ -62,8 +63,64 @@ def get_fits_files_list(directory_path):
 # JSON PARSER #################################################################
 
 def parse_json_file(json_file_path):
-    with open(json_file_path, "r") as fd:
-        json_data = json.load(fd)
+    """Load a benchmark output file (classic JSON or JSON Lines format).
+
+    JSON Lines files are returned in the same layout than classic JSON files
+    (i.e. a dictionary with an "io" list).
+    """
+    if json_lines.is_json_lines_file(json_file_path):
+        json_data = json_lines.load_json_lines_file(json_file_path)
+    else:
+        with open(json_file_path, "r") as fd:
+            json_data = json.load(fd)
+    return json_data
+
+
+def image_dict_generator(json_file_path, metadata_dict=None):
+    """Yield the `io` items (one dictionary per image) of a benchmark output
+    file.
+
+    JSON Lines files are read incrementally (i.e. without loading the whole
+    file in memory).
+
+    If `metadata_dict` is given, it is updated with the experiment metadata
+    (i.e. every item but the `io` list). Items known at the beginning of the
+    run (e.g. "label") are available as soon as the first image is yielded;
+    the metadata are complete once the generator is exhausted.
+    """
+    if json_lines.is_json_lines_file(json_file_path):
+        for record_type, record_dict in json_lines.iter_json_lines_file(json_file_path):
+            if record_type == json_lines.IMAGE_RECORD:
+                yield record_dict
+            elif metadata_dict is not None:
+                metadata_dict.update(record_dict)
+    else:
+        json_dict = parse_json_file(json_file_path)
+        io_list = json_dict.pop("io")
+        if metadata_dict is not None:
+            metadata_dict.update(json_dict)
+        yield from io_list
+
+
+class ImageCounter(object):
+    """Count the image dictionaries of an iterable as they are consumed
+    (e.g. to print the number of images of an `image_dict_generator()`)."""
+
+    def __init__(self, image_dicts):
+        self.count = 0
+        self._image_dicts = image_dicts
+
+    def __iter__(self):
+        for image_dict in self._image_dicts:
+            self.count += 1
+            yield image_dict
+
+
+def _get_image_dicts(json_data):
+    """Return the image dictionaries of `json_data` (either a benchmark
+    dictionary with an `io` list or an iterable of image dictionaries)."""
+    if isinstance(json_data, dict):
+        return json_data["io"]
     return json_data
 
 
@@ -71,7 +128,14 @@ def parse_json_file(json_file_path):
 
 def image_filter_equals(json_dict, key, value, return_copy=True):
     """Return a version of `json_dict` where only `io` list items (images) with
-    `key`==`velue` are kept."""
+    `key`==`velue` are kept.
+
+    If `json_dict` is an iterable of image dictionaries (e.g. an
+    `image_dict_generator()`), a generator of the kept images is returned.
+    """
+
+    if not isinstance(json_dict, dict):
+        return (image_dict for image_dict in json_dict if image_dict[key]==value)
 
     if return_copy:
         json_dict = copy.deepcopy(json_dict)
@@ -83,7 +147,22 @@ def image_filter_equals(json_dict, key, value, return_copy=True):
 
 def image_filter_range(json_dict, key, min_value=None, max_value=None, return_copy=True):
     """Return a version of `json_dict` where only `io` list items (images) with
-    `key`'s value in range `[min_velue ; max_value]` are kept."""
+    `key`'s value in range `[min_velue ; max_value]` are kept.
+
+    If `json_dict` is an iterable of image dictionaries (e.g. an
+    `image_dict_generator()`), a generator of the kept images is returned.
+    """
+
+    if not isinstance(json_dict, dict):
+        image_dicts = json_dict
+
+        if min_value is not None:
+            image_dicts = (image_dict for image_dict in image_dicts if key in image_dict and min_value <= image_dict[key])
+
+        if max_value is not None:
+            image_dicts = (image_dict for image_dict in image_dicts if key in image_dict and image_dict[key] <= max_value)
+
+        return image_dicts
 
     if return_copy:
         json_dict = copy.deepcopy(json_dict)
@@ -101,47 +180,60 @@ def image_filter_range(json_dict, key, min_value=None, max_value=None, return_co
 
 def extract_score_array(json_dict, metric):
 
-    if isinstance(metric, int):
-        score_array = _extract_score_array_index(json_dict, metric)
-    elif isinstance(metric, str):
-        score_array = _extract_score_array_name(json_dict, metric)
-    else:
+    if not isinstance(metric, (int, str)):
         raise TypeError("Wrong type")
 
+    score_list = [_get_image_score(image_dict, metric) for image_dict in _get_image_dicts(json_dict)]
+    score_array = np.array([score for score in score_list if score is not None])
+
     return score_array
 
 
-def _extract_score_array_index(json_dict, score_index):
-    io_list = json_dict["io"]
-    score_list = [image_dict["score"][score_index] for image_dict in io_list if "score" in image_dict]
-    score_array = np.array(score_list)
-    return score_array
+def _get_image_score(image_dict, metric):
+    """Return the `metric` score (an index or a name) of `image_dict` or
+    `None` if this image has no score."""
+
+    if isinstance(metric, int):
+        if "score" in image_dict:
+            return image_dict["score"][metric]
+    elif "score" in image_dict and "score_name" in image_dict:
+        score = [pair[1] for pair in zip(image_dict["score_name"], image_dict["score"]) if pair[0] == metric]   # TODO: a bit dirty...
+        if len(score) != 1:
+            raise Exception("{} has {} occurrences in the score list (should have exactly one occurrence)".format(metric, len(score)))
+        return score[0]
 
+    return None
 
-def _extract_score_array_name(json_dict, metric):
-    io_list = json_dict["io"]
+
+def extract_score_and_metadata_arrays(json_dict, metric, key):
+    """Return the `metric` score array and the `key` metadata array of the
+    images having a score, in a single pass over `json_dict` (images without
+    `key` get a NaN value)."""
+
+    if not isinstance(metric, (int, str)):
+        raise TypeError("Wrong type")
 
     score_list = []
-    for image_dict in io_list:
-        if "score" in image_dict and "score_name" in image_dict:
-            score = [pair[1] for pair in zip(image_dict["score_name"], image_dict["score"]) if pair[0] == metric]   # TODO: a bit dirty...
-            if len(score) != 1:
-                raise Exception("{} has {} occurrences in the score list (should have exactly one occurrence)".format(metric, len(score)))
-            score_list.append(score[0])
-
-    score_array = np.array(score_list)
-    return score_array
+    metadata_list = []
+
+    for image_dict in _get_image_dicts(json_dict):
+        score = _get_image_score(image_dict, metric)
+        if score is not None:
+            score_list.append(score)
+            metadata_list.append(image_dict.get(key, np.nan))
+
+    return np.array(score_list), np.array(metadata_list)
 
 
 def extract_score_2d_array(json_dict, score_index1, score_index2):
-    io_list = json_dict["io"]
+    io_list = _get_image_dicts(json_dict)
     score_list = [(image_dict["score"][score_index1], image_dict["score"][score_index2]) for image_dict in io_list if "score" in image_dict]
     score_2d_array = np.array(score_list)
     return score_2d_array
 
 
 def extract_metadata_array(json_dict, key):
-    io_list = json_dict["io"]
+    io_list = _get_image_dicts(json_dict)
 
     metadata_list = [image_dict[key] for image_dict in io_list if "score" in image_dict]
     metadata_array = np.array(metadata_list)
@@ -150,7 +242,7 @@ def extract_metadata_array(json_dict, key):
 
 
 def extract_metadata_2d_array(json_dict, key1, key2, exclude_aborted=False, aborted_only=False):
-    io_list = json_dict["io"]
+    io_list = _get_image_dicts(json_dict)
 
     if exclude_aborted:
         metadata_list = [(image_dict[key1], image_dict[key2]) for image_dict in io_list if "error" not in image_dict]
@@ -903,7 +995,7 @@ def plot_gui(fig,
     else:
         raise Exception("Unknown cam_id:", fits_metadata_dict['cam_id'])    # TODO
 
-    geom = geometry_converter.json_file_to_geom(geom_path)
+    geom = geometry_cache.load_geometry(geom_path)
     
     initial_time = time.perf_counter()
     tailcut_cleaned_img = tailcut.clean_image(input_img_copy,
@@ -23,18 +23,18 @@ def count_delta_psi(json_file_path,
 
     # FETCH SCORE AND COMPUTE HISTOGRAM #######################################
 
-    json_dict = common.parse_json_file(json_file_path)
+    image_dicts = common.image_dict_generator(json_file_path)
 
     if min_npe is not None:
-        json_dict = common.image_filter_range(json_dict, "img_cleaned_sum_pe", min_value=min_npe)
+        image_dicts = common.image_filter_range(image_dicts, "img_cleaned_sum_pe", min_value=min_npe)
 
     if max_npe is not None:
-        json_dict = common.image_filter_range(json_dict, "img_cleaned_sum_pe", max_value=max_npe)
+        image_dicts = common.image_filter_range(image_dicts, "img_cleaned_sum_pe", max_value=max_npe)
 
     if border:
-        json_dict = common.image_filter_range(json_dict, "img_cleaned_signal_to_border_distance", min_value=1)
+        image_dicts = common.image_filter_range(image_dicts, "img_cleaned_signal_to_border_distance", min_value=1)
 
-    score_array = common.extract_score_array(json_dict, "hillas2_delta_psi_norm2")
+    score_array = common.extract_score_array(image_dicts, "hillas2_delta_psi_norm2")
 
     score_array = np.abs(score_array)
     count = len(score_array[score_array < delta_angle_degrees])
@@ -15,9 +15,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 
-def extract_execution_time_list(json_dict):
-    io_list = json_dict["io"]
-    json_data = [image_dict["execution_time"] for image_dict in io_list if "execution_time" in image_dict]
+def extract_execution_time_list(image_dicts):
+    json_data = [image_dict["execution_time"] for image_dict in image_dicts if "execution_time" in image_dict]
     return json_data
 
 
@@ -58,12 +57,13 @@ if __name__ == '__main__':
     label_list = []
 
     for json_file_path in json_file_path_list:
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
-        execution_time_array = np.array(extract_execution_time_list(json_dict))
+        execution_time_array = np.array(extract_execution_time_list(image_dicts))
         data_list.append(execution_time_array)
 
-        label_list.append(json_dict["label"])
+        label_list.append(metadata_dict["label"])
 
     # PLOT STATISTICS #########################################################
 
@@ -15,15 +15,20 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 
-def extract_data_list(json_dict, key, exclude_aborted, aborted_only):
-    io_list = json_dict["io"]
+def extract_data_lists(image_dicts, key_list, exclude_aborted, aborted_only):
+    """Return one list of values per key of `key_list` (in a single pass over
+    `image_dicts`)."""
 
-    if exclude_aborted:
-        json_data = [image_dict[key] for image_dict in io_list if "error" not in image_dict]
-    elif aborted_only:
-        json_data = [image_dict[key] for image_dict in io_list if "error" in image_dict]
-    else:
-        json_data = [image_dict[key] for image_dict in io_list]
+    json_data = [[] for key in key_list]
+
+    for image_dict in image_dicts:
+        if exclude_aborted and ("error" in image_dict):
+            continue
+        if aborted_only and ("error" not in image_dict):
+            continue
+
+        for key, data_list in zip(key_list, json_data):
+            data_list.append(image_dict[key])
 
     return json_data
 
@@ -67,8 +72,6 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_dict = common.parse_json_file(json_file_path)
-
     data_list = []
     label_list = []
 
@@ -79,8 +82,10 @@ if __name__ == '__main__':
                 "save_tmp_file_time_sec",
                 "scipy_kill_isolated_pixels_time_sec"]
 
-    for key in key_list:
-        data_array = np.array(extract_data_list(json_dict, key, exclude_aborted, aborted_only))
+    image_dicts = common.image_dict_generator(json_file_path)
+
+    for key, key_data_list in zip(key_list, extract_data_lists(image_dicts, key_list, exclude_aborted, aborted_only)):
+        data_array = np.array(key_data_list)
         data_list.append(data_array)
 
         if key == "load_input_image_time_sec":
@@ -19,9 +19,8 @@ HIST_TYPE='bar'
 ALPHA=0.5
 
 
-def extract_execution_time_list(json_dict):
-    io_list = json_dict["io"]
-    json_data = [image_dict["execution_time"] for image_dict in io_list if "execution_time" in image_dict]
+def extract_execution_time_list(image_dicts):
+    json_data = [image_dict["execution_time"] for image_dict in image_dicts if "execution_time" in image_dict]
     return json_data
 
 
@@ -114,16 +113,17 @@ if __name__ == '__main__':
     label_list = []
 
     for json_file_path in json_file_path_list:
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
-        execution_time_list = extract_execution_time_list(json_dict)
+        execution_time_list = extract_execution_time_list(image_dicts)
 
         if max_abscissa is not None:
             execution_time_list = [val for val in execution_time_list if val <= max_abscissa]
 
         data_list.append(np.array(execution_time_list))
 
-        label_list.append(json_dict["label"])
+        label_list.append(metadata_dict["label"])
 
     # PLOT STATISTICS #########################################################
 
@@ -83,10 +83,11 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_dict = common.parse_json_file(json_file_path)
+    metadata_dict = {}
+    image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
-    metadata_array = common.extract_metadata_2d_array(json_dict, key1, key2, exclude_aborted, aborted_only)
-    label = json_dict["label"]
+    metadata_array = common.extract_metadata_2d_array(image_dicts, key1, key2, exclude_aborted, aborted_only)
+    label = metadata_dict["label"]
 
     # PLOT STATISTICS #########################################################
 
@@ -18,15 +18,13 @@ HIST_TYPE='bar'
 ALPHA=0.5
 
 
-def extract_data_list(json_dict, key, exclude_aborted, aborted_only):
-    io_list = json_dict["io"]
-
+def extract_data_list(image_dicts, key, exclude_aborted, aborted_only):
     if exclude_aborted:
-        json_data = [image_dict[key] for image_dict in io_list if "error" not in image_dict]
+        json_data = [image_dict[key] for image_dict in image_dicts if "error" not in image_dict]
     elif aborted_only:
-        json_data = [image_dict[key] for image_dict in io_list if "error" in image_dict]
+        json_data = [image_dict[key] for image_dict in image_dicts if "error" in image_dict]
     else:
-        json_data = [image_dict[key] for image_dict in io_list]
+        json_data = [image_dict[key] for image_dict in image_dicts]
 
     return json_data
 
@@ -95,10 +93,11 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_dict = common.parse_json_file(json_file_path)
+    metadata_dict = {}
+    image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
-    data_array = np.array(extract_data_list(json_dict, key, exclude_aborted, aborted_only))
-    label = json_dict["label"]
+    data_array = np.array(extract_data_list(image_dicts, key, exclude_aborted, aborted_only))
+    label = metadata_dict["label"]
 
     print("{} images".format(data_array.shape[0]))
     print("min:", data_array.min())
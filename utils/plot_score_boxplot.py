@@ -15,9 +15,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 
-def extract_score_list(json_dict, score_index):
-    io_list = json_dict["io"]
-    json_data = [image_dict["score"][score_index] for image_dict in io_list if "score" in image_dict]
+def extract_score_list(image_dicts, score_index):
+    json_data = [image_dict["score"][score_index] for image_dict in image_dicts if "score" in image_dict]
     return json_data
 
 
@@ -64,12 +63,13 @@ if __name__ == '__main__':
     label_list = []
 
     for json_file_path in json_file_path_list:
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
-        score_array = np.array(extract_score_list(json_dict, score_index))
+        score_array = np.array(extract_score_list(image_dicts, score_index))
         data_list.append(score_array)
 
-        label_list.append(json_dict["label"])
+        label_list.append(metadata_dict["label"])
 
 
     # PLOT STATISTICS #########################################################
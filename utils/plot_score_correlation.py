@@ -66,11 +66,12 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_dict = common.parse_json_file(json_file_path)
+    metadata_dict = {}
+    image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
-    score_array = common.extract_score_2d_array(json_dict, score_index1, score_index2)
+    score_array = common.extract_score_2d_array(image_dicts, score_index1, score_index2)
 
-    label = json_dict["label"]
+    label = metadata_dict["label"]
 
     if args.output is None:
         suffix = label + "_i" + str(score_index1) + "_i" + str(score_index2)
@@ -126,21 +126,24 @@ if __name__ == '__main__':
         if not notebook:
             print("Parsing {}...".format(json_file_path))
 
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
         if tel_id is not None:
-            json_dict = common.image_filter_equals(json_dict, "tel_id", tel_id)
+            image_dicts = common.image_filter_equals(image_dicts, "tel_id", tel_id)
 
         if min_npe is not None:
-            json_dict = common.image_filter_range(json_dict, "npe", min_value=min_npe)
+            image_dicts = common.image_filter_range(image_dicts, "npe", min_value=min_npe)
 
         if max_npe is not None:
-            json_dict = common.image_filter_range(json_dict, "npe", max_value=max_npe)
+            image_dicts = common.image_filter_range(image_dicts, "npe", max_value=max_npe)
 
-        if not notebook:
-            print(len(json_dict["io"]), "images")
+        image_dicts = common.ImageCounter(image_dicts)
+
+        score_array = common.extract_score_array(image_dicts, metric)
 
-        score_array = common.extract_score_array(json_dict, metric)
+        if not notebook:
+            print(image_dicts.count, "images")
 
         if min_abscissa is not None:
             score_array = np.array([score for score in score_array if score >= min_abscissa])
@@ -150,7 +153,7 @@ if __name__ == '__main__':
 
         data_list.append(score_array)
 
-        label_list.append(json_dict["label"])
+        label_list.append(metadata_dict["label"])
 
     # PLOT STATISTICS #########################################################
 
@@ -10,8 +10,6 @@ import common_functions as common
 import argparse
 import matplotlib.pyplot as plt
 
-import copy
-
 if __name__ == '__main__':
 
     # PARSE OPTIONS ###########################################################
@@ -91,24 +89,25 @@ if __name__ == '__main__':
         if not notebook:
             print("Parsing {}...".format(json_file_path))
 
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
         if tel_id is not None:
-            json_dict = common.image_filter_equals(json_dict, "tel_id", tel_id)
+            image_dicts = common.image_filter_equals(image_dicts, "tel_id", tel_id)
 
         if key_min is not None and key_max is not None:
-            json_dict = common.image_filter_range(copy.deepcopy(json_dict), key, key_min, key_max)
+            image_dicts = common.image_filter_range(image_dicts, key, key_min, key_max)
 
-        if not notebook:
-            print(len(json_dict["io"]), "images")
+        image_dicts = common.ImageCounter(image_dicts)
 
-        score_array = common.extract_score_array(json_dict, metric)
+        score_array, metadata_array = common.extract_score_and_metadata_arrays(image_dicts, metric, key)
         score_array_list.append(score_array)
-
-        metadata_array = common.extract_metadata_array(json_dict, key)
         metadata_array_list.append(metadata_array)
 
-        label_list.append(json_dict["label"])
+        if not notebook:
+            print(image_dicts.count, "images")
+
+        label_list.append(metadata_dict["label"])
 
     xmin = common.extract_min(score_array_list)
     xmax = common.extract_max(score_array_list)
@@ -11,8 +11,6 @@ import argparse
 from matplotlib import pyplot as plt
 import os
 
-import copy
-
 
 if __name__ == '__main__':
 
@@ -86,29 +84,29 @@ if __name__ == '__main__':
     for json_file_path in json_file_path_list:
         print("Parsing {}...".format(json_file_path))
 
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
         if tel_id is not None:
-            json_dict = common.image_filter_equals(json_dict, "tel_id", tel_id)
+            image_dicts = common.image_filter_equals(image_dicts, "tel_id", tel_id)
 
-        json_dict1 = common.image_filter_range(copy.deepcopy(json_dict), "mc_energy",   0.1,    1.0)  # 1 TeV to 10 TeV
-        json_dict2 = common.image_filter_range(copy.deepcopy(json_dict), "mc_energy",   1.0,   10.0)  # 1 TeV to 10 TeV
-        json_dict3 = common.image_filter_range(copy.deepcopy(json_dict), "mc_energy",  10.0,  100.0)  # 10 TeV to 100 TeV
-        json_dict4 = common.image_filter_range(copy.deepcopy(json_dict), "mc_energy", 100.0, 1000.0)  # 100 TeV to 1000 TeV
+        # Read the file once and split the scores by energy afterward
+        image_dicts = common.ImageCounter(image_dicts)
+        score_array, energy_array = common.extract_score_and_metadata_arrays(image_dicts, metric, "mc_energy")
 
-        print(len(json_dict["io"]), "images")
+        print(image_dicts.count, "images")
 
-        score_array1 = common.extract_score_array(json_dict1, metric)  # 100 GeV to 1 TeV
-        score_array2 = common.extract_score_array(json_dict2, metric)  # 1 TeV to 10 TeV
-        score_array3 = common.extract_score_array(json_dict3, metric)  # 10 TeV to 100 TeV
-        score_array4 = common.extract_score_array(json_dict4, metric)  # 100 TeV to 1000 TeV
+        score_array1 = score_array[(0.1 <= energy_array) & (energy_array <= 1.0)]        # 100 GeV to 1 TeV
+        score_array2 = score_array[(1.0 <= energy_array) & (energy_array <= 10.0)]       # 1 TeV to 10 TeV
+        score_array3 = score_array[(10.0 <= energy_array) & (energy_array <= 100.0)]     # 10 TeV to 100 TeV
+        score_array4 = score_array[(100.0 <= energy_array) & (energy_array <= 1000.0)]   # 100 TeV to 1000 TeV
 
         data_list1.append(score_array1)
         data_list2.append(score_array2)
         data_list3.append(score_array3)
         data_list4.append(score_array4)
 
-        label_list.append(json_dict["label"])
+        label_list.append(metadata_dict["label"])
 
     # PLOT STATISTICS #########################################################
 
@@ -10,8 +10,6 @@ import common_functions as common
 import argparse
 from matplotlib import pyplot as plt
 
-import copy
-
 NPE_RANGE_1 = (   0,      50)
 NPE_RANGE_2 = (  50,     100)
 NPE_RANGE_3 = ( 100,     110)
@@ -100,30 +98,30 @@ if __name__ == '__main__':
         if not notebook:
             print("Parsing {}...".format(json_file_path))
 
-        json_dict = common.parse_json_file(json_file_path)
+        metadata_dict = {}
+        image_dicts = common.image_dict_generator(json_file_path, metadata_dict)
 
         if tel_id is not None:
-            json_dict = common.image_filter_equals(json_dict, "tel_id", tel_id)
+            image_dicts = common.image_filter_equals(image_dicts, "tel_id", tel_id)
 
-        json_dict1 = common.image_filter_range(copy.deepcopy(json_dict), "npe", *NPE_RANGE_1)
-        json_dict2 = common.image_filter_range(copy.deepcopy(json_dict), "npe", *NPE_RANGE_2)
-        json_dict3 = common.image_filter_range(copy.deepcopy(json_dict), "npe", *NPE_RANGE_3)
-        json_dict4 = common.image_filter_range(copy.deepcopy(json_dict), "npe", *NPE_RANGE_4)
+        # Read the file once and split the scores by NPE afterward
+        image_dicts = common.ImageCounter(image_dicts)
+        score_array, npe_array = common.extract_score_and_metadata_arrays(image_dicts, metric, "npe")
 
         if not notebook:
-            print(len(json_dict["io"]), "images")
+            print(image_dicts.count, "images")
 
-        score_array1 = common.extract_score_array(json_dict1, metric)
-        score_array2 = common.extract_score_array(json_dict2, metric)
-        score_array3 = common.extract_score_array(json_dict3, metric)
-        score_array4 = common.extract_score_array(json_dict4, metric)
+        score_array1 = score_array[(NPE_RANGE_1[0] <= npe_array) & (npe_array <= NPE_RANGE_1[1])]
+        score_array2 = score_array[(NPE_RANGE_2[0] <= npe_array) & (npe_array <= NPE_RANGE_2[1])]
+        score_array3 = score_array[(NPE_RANGE_3[0] <= npe_array) & (npe_array <= NPE_RANGE_3[1])]
+        score_array4 = score_array[(NPE_RANGE_4[0] <= npe_array) & (npe_array <= NPE_RANGE_4[1])]
 
         data_list1.append(score_array1)
         data_list2.append(score_array2)
         data_list3.append(score_array3)
         data_list4.append(score_array4)
 
-        label_list.append(json_dict["label"])
+        label_list.append(metadata_dict["label"])
 
     # PLOT STATISTICS #########################################################
 
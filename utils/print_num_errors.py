@@ -12,13 +12,18 @@ import json
 import numpy as np
 
 
-def extract_data_list(json_dict):
-    io_list = json_dict["io"]
+def extract_data_list(json_file_path):
+    num_success = 0
+    aborted_list = []
 
-    success_list = [image_dict for image_dict in io_list if "error" not in image_dict]
-    aborted_list = [image_dict for image_dict in io_list if "error" in image_dict]
+    # Read images one by one (JSON Lines files are not fully loaded in memory)
+    for image_dict in common.image_dict_generator(json_file_path):
+        if "error" in image_dict:
+            aborted_list.append(image_dict)
+        else:
+            num_success += 1
 
-    return success_list, aborted_list
+    return num_success, aborted_list
 
 
 if __name__ == '__main__':
@@ -35,12 +40,10 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_data = common.parse_json_file(json_file_path)
+    num_success, aborted_list = extract_data_list(json_file_path)
 
-    success_list, aborted_list = extract_data_list(json_data)
-
-    print("{} images".format(len(success_list) + len(aborted_list)))
-    print("{} succeeded".format(len(success_list)))
+    print("{} images".format(num_success + len(aborted_list)))
+    print("{} succeeded".format(num_success))
     print("{} failed".format(len(aborted_list)))
 
     if len(aborted_list) > 0:
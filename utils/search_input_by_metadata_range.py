@@ -14,9 +14,8 @@ import sys
 import numpy as np
 
 
-def extract_input_path_and_meta_list(json_dict, key):
-    io_list = json_dict["io"]
-    json_data = [(image_dict["input_file_path"], image_dict[key], image_dict["score"]) for image_dict in io_list if "score" in image_dict]
+def extract_input_path_and_meta_list(image_dicts, key):
+    json_data = [(image_dict["input_file_path"], image_dict[key], image_dict["score"]) for image_dict in image_dicts if "score" in image_dict]
     return json_data
 
 
@@ -58,8 +57,8 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_dict = common.parse_json_file(json_file_path)
-    data_list = extract_input_path_and_meta_list(json_dict, key)
+    image_dicts = common.image_dict_generator(json_file_path)
+    data_list = extract_input_path_and_meta_list(image_dicts, key)
 
     # SETUP RANGE #############################################################
 
@@ -14,13 +14,11 @@ import sys
 import numpy as np
 
 
-def extract_input_path_with_score_and_meta_list(json_dict, score_index, meta_key=None):
-    io_list = json_dict["io"]
-
+def extract_input_path_with_score_and_meta_list(image_dicts, score_index, meta_key=None):
     if meta_key is None:
-        json_data = [(image_dict["input_file_path"], float(image_dict["score"][score_index])) for image_dict in io_list if "score" in image_dict]
+        json_data = [(image_dict["input_file_path"], float(image_dict["score"][score_index])) for image_dict in image_dicts if "score" in image_dict]
     else:
-        json_data = [(image_dict["input_file_path"], float(image_dict["score"][score_index], image_dict[meta_key])) for image_dict in io_list if "score" in image_dict]
+        json_data = [(image_dict["input_file_path"], float(image_dict["score"][score_index], image_dict[meta_key])) for image_dict in image_dicts if "score" in image_dict]
 
     return json_data
 
@@ -75,8 +73,8 @@ if __name__ == '__main__':
 
     # FETCH SCORE #############################################################
 
-    json_dict = common.parse_json_file(json_file_path)
-    data_list = extract_input_path_with_score_and_meta_list(json_dict, score_index, metadata_key)
+    image_dicts = common.image_dict_generator(json_file_path)
+    data_list = extract_input_path_with_score_and_meta_list(image_dicts, score_index, metadata_key)
 
     # SETUP SCORE RANGE #######################################################
 
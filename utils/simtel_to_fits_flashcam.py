@@ -44,7 +44,7 @@ from datapipe import __version__ as VERSION
 print(ctapipe.__version__)
 print(pyhessio.__version__)
 
-import ctapipe.image.geometry_converter as ctapipe_geom_converter
+from datapipe.io.hex_resampler import get_hex_geometry_mapping
 from ctapipe.instrument import CameraGeometry
 
 # calibrator
@@ -129,40 +129,25 @@ def extract_images(simtel_file_path,
 
                     # CONVERTING GEOMETRY (1D TO 2D) ##########################
 
-                    buffer_id_str = geom.cam_id + "0"
+                    # The resampling of the camera is computed once; all
+                    # channels of an array are converted at once
+                    hex_mapping = get_hex_geometry_mapping(geom, add_rot=0)
 
-                    geom2d, pe_image_2d =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pe_image,              buffer_id_str, add_rot=0)
-                    geom2d, calibrated_image_2d =   ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, calibrated_image[0],   buffer_id_str, add_rot=0)
+                    pe_image_2d = hex_mapping.to_2d(pe_image)
+                    calibrated_image_2d = hex_mapping.to_2d(calibrated_image[0])
 
-                    geom2d, uncalibrated_image_2d = ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, uncalibrated_image[0], buffer_id_str, add_rot=0)
-                    geom2d, pedestal_2d =           ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, pedestal[0],           buffer_id_str, add_rot=0)
-                    geom2d, gains_2d =              ctapipe_geom_converter.convert_geometry_1d_to_2d(geom, gain[0],               buffer_id_str, add_rot=0)
+                    # Datapipe fits files keep all channels and thus takes 3D arrays...
+                    uncalibrated_image_2d = hex_mapping.to_2d(uncalibrated_image[:1])
+                    pedestal_2d =           hex_mapping.to_2d(pedestal[:1])
+                    gains_2d =              hex_mapping.to_2d(gain[:1])
 
-                    # Make a mock pixel position array...
-                    pixel_pos_2d = np.array(np.meshgrid(np.linspace(pixel_pos[0].min(), pixel_pos[0].max(), pe_image_2d.shape[0]),
-                                                        np.linspace(pixel_pos[1].min(), pixel_pos[1].max(), pe_image_2d.shape[1])))
+                    pixel_pos_2d = np.array(hex_mapping.pixel_pos_2d)
 
                     # PUT NAN IN BLANK PIXELS #################################
 
-                    calibrated_image_2d[np.logical_not(geom2d.mask)] = np.nan
-                    pe_image_2d[np.logical_not(geom2d.mask)] = np.nan
-
-                    uncalibrated_image_2d[np.logical_not(geom2d.mask)] = np.nan
-                    pedestal_2d[np.logical_not(geom2d.mask)] = np.nan
-                    gains_2d[np.logical_not(geom2d.mask)] = np.nan
-
-                    pixel_pos_2d[0,np.logical_not(geom2d.mask)] = np.nan
-                    pixel_pos_2d[1,np.logical_not(geom2d.mask)] = np.nan
-
-                    ###########################################################
-
-                    # The ctapipe geometry converter operate on one channel
-                    # only and then takes and return a 2D array but datapipe
-                    # fits files keep all channels and thus takes 3D arrays...
-
-                    uncalibrated_image_2d = np.array([uncalibrated_image_2d])
-                    pedestal_2d =           np.array([pedestal_2d])
-                    gains_2d =              np.array([gains_2d])
+                    # (blank pixels of converted images are already NaN)
+                    pixel_pos_2d[0, np.logical_not(hex_mapping.pixel_mask)] = np.nan
+                    pixel_pos_2d[1, np.logical_not(hex_mapping.pixel_mask)] = np.nan
 
                     ###########################################################
 
@@ -183,7 +168,7 @@ def extract_images(simtel_file_path,
 
                     # GET PIXEL MASK ##########################################
 
-                    pixel_mask = geom2d.mask.astype(int)  # 1 for pixels with actual data, 0 for virtual (blank) pixels
+                    pixel_mask = hex_mapping.pixel_mask.astype(int)  # 1 for pixels with actual data, 0 for virtual (blank) pixels
 
                     # MAKE METADATA ###########################################
 
@@ -13,9 +13,8 @@ import math
 import numpy as np
 import operator
 
-def extract_score_list(json_dict, score_index):
-    io_list = json_dict["io"]
-    json_data = [image_dict["score"][score_index] for image_dict in io_list if "score" in image_dict]
+def extract_score_list(image_dicts, score_index):
+    json_data = [image_dict["score"][score_index] for image_dict in image_dicts if "score" in image_dict]
     return json_data
 
 
@@ -44,8 +43,8 @@ if __name__ == '__main__':
 
     for json_file_path in json_file_path_list:
         try:
-            json_dict = common.parse_json_file(json_file_path)
-            score_array = np.array(extract_score_list(json_dict, score_index))
+            image_dicts = common.image_dict_generator(json_file_path)
+            score_array = np.array(extract_score_list(image_dicts, score_index))
             mean_score = score_array.mean()
             if math.isnan(mean_score):
                 error_list.append(json_file_path)